@@ -0,0 +1,31 @@
+"""扩展Project表新增context_revision字段
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 00:00:00.000000
+
+说明：
+- projects.context_revision：AI 上下文修订号，角色/世界观/章节/知识图谱写路径提交前 +1
+- AIContextBuilder 的项目上下文快照缓存以此判断是否过期
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0009"
+down_revision: str | None = "0008"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "projects",
+        sa.Column("context_revision", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("projects", "context_revision")
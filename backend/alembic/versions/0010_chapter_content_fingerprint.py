@@ -0,0 +1,35 @@
+"""扩展Chapter表新增正文指纹与摘要来源指纹字段
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 00:00:00.000000
+
+说明：
+- chapters.content_fingerprint / content_sketch：规范化正文指纹与分片草图，随正文写入维护
+- chapters.summary_source_fingerprint / summary_source_sketch：生成 L2/L3 摘要时的正文快照
+- 摘要失效改为比较指纹 + 变更幅度；存量数据为空时仍按 summary_source_word_count 判断
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0010"
+down_revision: str | None = "0009"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column("chapters", sa.Column("content_fingerprint", sa.String(length=16), nullable=True))
+    op.add_column("chapters", sa.Column("content_sketch", sa.Text(), nullable=True))
+    op.add_column("chapters", sa.Column("summary_source_fingerprint", sa.String(length=16), nullable=True))
+    op.add_column("chapters", sa.Column("summary_source_sketch", sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("chapters", "summary_source_sketch")
+    op.drop_column("chapters", "summary_source_fingerprint")
+    op.drop_column("chapters", "content_sketch")
+    op.drop_column("chapters", "content_fingerprint")
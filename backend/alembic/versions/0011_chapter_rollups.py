@@ -0,0 +1,47 @@
+"""新增章节摘要树上层节点表
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 00:00:00.000000
+
+说明：
+- chapter_rollups：按扇出对齐的篇章 / 卷 / 部梗概，由 summary_brief 逐层合并
+- (project_id, level, node_index) 唯一；source_fingerprint 记录子节点摘要指纹，用于增量重建
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0011"
+down_revision: str | None = "0010"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "chapter_rollups",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("project_id", sa.Integer(), nullable=False),
+        sa.Column("level", sa.Integer(), nullable=False),
+        sa.Column("node_index", sa.Integer(), nullable=False),
+        sa.Column("first_chapter_number", sa.Integer(), nullable=False),
+        sa.Column("last_chapter_number", sa.Integer(), nullable=False),
+        sa.Column("summary", sa.Text(), nullable=True),
+        sa.Column("source_fingerprint", sa.String(length=16), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("project_id", "level", "node_index", name="uq_chapter_rollup_node"),
+    )
+    op.create_index("ix_chapter_rollups_id", "chapter_rollups", ["id"], unique=False)
+    op.create_index("ix_chapter_rollups_project_id", "chapter_rollups", ["project_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_chapter_rollups_project_id", table_name="chapter_rollups")
+    op.drop_index("ix_chapter_rollups_id", table_name="chapter_rollups")
+    op.drop_table("chapter_rollups")
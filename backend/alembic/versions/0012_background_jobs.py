@@ -0,0 +1,55 @@
+"""新增持久化后台任务表
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17 00:00:00.000000
+
+说明：
+- background_jobs：BackgroundTaskRunner 的持久化任务（状态、优先级、重试次数、租约、幂等键）
+- 领取索引 (status, priority, run_after)；idempotency_key 唯一，任务结束后清空
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0012"
+down_revision: str | None = "0011"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "background_jobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=50), nullable=False),
+        sa.Column("task_key", sa.String(length=100), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=True),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("priority", sa.Integer(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("timeout_seconds", sa.Integer(), nullable=False),
+        sa.Column("run_after", sa.DateTime(), nullable=False),
+        sa.Column("lease_owner", sa.String(length=64), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("idempotency_key", sa.String(length=200), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("idempotency_key"),
+    )
+    op.create_index("ix_background_jobs_id", "background_jobs", ["id"], unique=False)
+    op.create_index("ix_background_jobs_task_key", "background_jobs", ["task_key"], unique=False)
+    op.create_index("ix_background_jobs_claim", "background_jobs", ["status", "priority", "run_after"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_background_jobs_claim", table_name="background_jobs")
+    op.drop_index("ix_background_jobs_task_key", table_name="background_jobs")
+    op.drop_index("ix_background_jobs_id", table_name="background_jobs")
+    op.drop_table("background_jobs")
@@ -0,0 +1,35 @@
+"""后台任务新增调度类别与所属用户
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-17 00:00:00.000000
+
+说明：
+- background_jobs.work_class：interactive / batch / background，决定 priority
+- background_jobs.user_id：发起用户，同一优先级内按用户公平领取并限制单用户并发
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0013"
+down_revision: str | None = "0012"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "background_jobs",
+        sa.Column("work_class", sa.String(length=20), nullable=False, server_default="background"),
+    )
+    op.add_column("background_jobs", sa.Column("user_id", sa.Integer(), nullable=True))
+    op.create_index("ix_background_jobs_user_id", "background_jobs", ["user_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_background_jobs_user_id", table_name="background_jobs")
+    op.drop_column("background_jobs", "user_id")
+    op.drop_column("background_jobs", "work_class")
@@ -0,0 +1,31 @@
+"""后台任务新增公平排队标签
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-17 00:00:00.000000
+
+说明：
+- background_jobs.fair_tag：入队时分配的用户虚拟完成时间，同一优先级内按其升序领取，
+  状态存在表里，多个 worker 看到的公平顺序一致
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0014"
+down_revision: str | None = "0013"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "background_jobs",
+        sa.Column("fair_tag", sa.Float(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("background_jobs", "fair_tag")
@@ -166,10 +166,10 @@ async def stream_run_events(
     db: AsyncSession = Depends(get_db),
     user: User = Depends(require_active_user),
 ):
-    """SSE 事件流 — 流式获取运行过程中的实时事件"""
+    """SSE 事件流 — 流式获取运行过程中的实时事件；断线重连时按 Last-Event-ID 续传"""
     service = AIWorkflowService(db)
     return EventSourceResponse(
-        service.stream_events(run_id, user.id),
+        service.stream_events(run_id, user.id, last_event_id=request.headers.get("last-event-id")),
         ping=15,
         headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -183,7 +183,7 @@ async def start_stream_run(
     db: AsyncSession = Depends(get_db),
     user: User = Depends(require_active_user),
 ):
-    """启动后台流式运行，并注册 event_queue 供 /stream 实时消费"""
+    """启动后台流式运行，并在事件总线上打开事件流供 /stream 实时订阅"""
     service = AIWorkflowService(db)
-    run, _queue = await service.start_stream_run(run_id, user.id)
+    run = await service.start_stream_run(run_id, user.id)
     return RunResponse.model_validate(run)
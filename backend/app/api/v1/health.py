@@ -73,5 +73,6 @@ async def diagnostics(db: AsyncSession = Depends(get_db)):
         "debug": settings.app.debug,
         "db_url_masked": settings.db.url.split("@")[-1] if "@" in settings.db.url else "(local)",
         "background_tasks_active": background_runner.active_count,
+        "background_jobs_active": background_runner.active_job_count,
         "asyncio_tasks": len(asyncio.all_tasks()),
     }
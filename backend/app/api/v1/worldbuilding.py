@@ -8,6 +8,7 @@ from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps.auth import require_active_user
+from app.application.context_cache import bump_project_revision
 from app.application.entity_integrity import cleanup_entity_references
 from app.application.project_service import ProjectService
 from app.core.character_templates import build_character_template_registry
@@ -70,6 +71,7 @@ def _register_crud(
         entity = model(**body.model_dump(), project_id=project_id)
         repo = _Repo(db)
         await repo.create(entity)
+        await bump_project_revision(db, project_id)
         await db.commit()
         await db.refresh(entity)
         return entity
@@ -128,6 +130,7 @@ def _register_crud(
         entity = await get_entity(item_id, db, user)
         for key, value in body.model_dump(exclude_unset=True).items():
             setattr(entity, key, value)
+        await bump_project_revision(db, entity.project_id)
         await db.commit()
         await db.refresh(entity)
         return entity
@@ -151,6 +154,7 @@ def _register_crud(
             entity_id=item_id,
         )
         await db.delete(entity)
+        await bump_project_revision(db, entity.project_id)
         await db.commit()
         return {"message": f"{label} '{entity.name}' 已成功删除"}
 
@@ -4,26 +4,46 @@ AI 上下文构建器 — 从项目数据统一组装 LLM 上下文
 职责：
 - 按项目 ID 聚合角色、世界观、地点、组织、章节摘要
 - 为不同工作流提供不同粒度的上下文（outline/chat/revision）
-- 控制上下文体积（截断策略）
-- 章节分层注入：L1 当前章全文 / L2 近 3 章详细 / L3 更早 ≤6 章简要（共 ≤10 章）
+- 控制上下文体积（截断策略；chat 上下文按 token 预算装箱，见 context_packer）
+- 章节分层注入：L1 当前章全文 / L2 近 3 章详细 / L3 更早 ≤6 章简要（共 ≤10 章），
+  更早的剧情由篇章 / 卷梗概补齐（见 chapter_rollup_service）
+- 项目上下文快照缓存：按 projects.context_revision 失效（见 context_cache）
+- chat 实体相关度：按当前章节段与用户消息里的提及（mention_index）挑选、排序实体
 """
 
 import asyncio
+import copy
 import logging
-from dataclasses import dataclass
+from collections import defaultdict
+from dataclasses import dataclass, field
 
-from sqlalchemy import nullslast, select
+from sqlalchemy import Integer, String, Text, and_, cast, func, literal, null, nullslast, or_, select, union_all
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.ext.asyncio import AsyncSession
-
-from app.infrastructure.db.models.manuscript import Chapter
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.application.chapter_rollup_service import ROLLUP_FANOUT, ROLLUP_LABELS, ChapterRollupService, covering_nodes
+from app.application.context_cache import ContextSnapshot, ProjectContextCache, project_context_cache
+from app.application.context_packer import ContextPacker, estimate_tokens
+from app.domain.content_fingerprint import change_ratio, content_fingerprint, content_sketch
+from app.domain.mention_index import MentionIndex
+from app.infrastructure.db.models.manuscript import Chapter, ChapterRollup
 from app.infrastructure.db.models.projects import Project
 from app.infrastructure.db.models.story_knowledge import EntityRelationship, EntityStateEvent
 from app.infrastructure.db.models.worldbuilding import Character, Location, Organization, Worldview
+from app.infrastructure.llm.response_cache import with_response_cache
+from app.infrastructure.task.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+# 进程级：并发请求对同一章节同一版正文的摘要生成只执行一次
+summary_flights = SingleFlight()
+
 MAX_CONTEXT_CHARS = 8000
-CHAT_CONTEXT_MAX_CHARS = 4000
+CHAT_CONTEXT_MAX_TOKENS = 2500  # chat 项目上下文的估算 token 预算
+CHAT_FOCUS_BACKGROUND_LIMIT = 5  # 有实体被提及时，每类再带上的未提及实体条数
+CHAT_FOCUS_MAX_TOKENS = 800  # 用户消息提及实体段的估算 token 预算
 
 # ── 分层章节摘要参数 ─────────────────────────────────────────────────────
 TIERED_TOTAL_CHAPTERS = 10  # L1 + L2 + L3 共最多注入这么多章
@@ -31,6 +51,30 @@ TIERED_L2_MAX = 3  # L2 详细概括最多几章（当前章前 3 章）
 TIERED_L3_MAX = 6  # L3 简要概括最多几章（L2 之前的 6 章）
 TIERED_L2_TARGET_CHARS = 500  # L2 详细概括目标字数
 TIERED_L3_TARGET_CHARS = 150  # L3 简要概括目标字数
+TIERED_SUMMARY_CONCURRENCY = 3  # 单次刷新同时在途的摘要 LLM 调用上限
+TIERED_SUMMARY_CHANGE_THRESHOLD = 0.2  # 正文变更幅度（草图估算）达到该值才重新生成摘要
+_TIERED_SUMMARY_FIELDS = (
+    "summary_detailed",
+    "summary_brief",
+    "summary_source_word_count",
+    "summary_source_fingerprint",
+    "summary_source_sketch",
+)
+# L2/L3 窗口行的列投影：不含 content
+_TIERED_WINDOW_COLUMNS = (
+    Chapter.id,
+    Chapter.project_id,
+    Chapter.chapter_number,
+    Chapter.title,
+    Chapter.word_count,
+    Chapter.content_fingerprint,
+    Chapter.content_sketch,
+    Chapter.summary_detailed,
+    Chapter.summary_brief,
+    Chapter.summary_source_word_count,
+    Chapter.summary_source_fingerprint,
+    Chapter.summary_source_sketch,
+)
 
 
 def _truncate(text: str, max_len: int = 500) -> str:
@@ -39,6 +83,67 @@ def _truncate(text: str, max_len: int = 500) -> str:
     return text[:max_len] + "…"
 
 
+# ── 项目上下文实体桶 ─────────────────────────────────────────────────────
+# (entity_type, ctx 键, 模型, 注入条数上限 None=不限, 详情字段 [(字段, 截断长度)])
+_ENTITY_BUCKETS = (
+    (
+        "character",
+        "characters",
+        Character,
+        None,
+        (("description", 200), ("personality", 200), ("background", 200), ("appearance", 200)),
+    ),
+    ("worldview", "worldviews", Worldview, 10, (("description", 300), ("rules", 300), ("magic_system", 200))),
+    ("location", "locations", Location, 15, (("description", 200), ("geography", 150))),
+    ("organization", "organizations", Organization, 10, (("description", 200), ("purpose", 150))),
+)
+_ENTITY_DETAIL_SLOTS = max(len(fields) for *_, fields in _ENTITY_BUCKETS)
+
+
+def _entity_bucket_statement(project_id: int):
+    """四类实体对齐成同一行形状后 UNION ALL：entity_type, id, name, f0..f3, organization_id。
+
+    详情列在 SQL 侧用 substr 截到「截断长度 + 1」，Python 侧 _truncate 结果与整列读取一致。
+    """
+    selects = []
+    for entity_type, _ctx_key, model, _limit, fields in _ENTITY_BUCKETS:
+        columns = [
+            literal(entity_type, String).label("entity_type"),
+            model.id.label("id"),
+            model.name.label("name"),
+        ]
+        for slot in range(_ENTITY_DETAIL_SLOTS):
+            if slot < len(fields):
+                field_name, max_len = fields[slot]
+                columns.append(func.substr(getattr(model, field_name), 1, max_len + 1).label(f"f{slot}"))
+            else:
+                columns.append(cast(null(), Text).label(f"f{slot}"))
+        organization_id = model.organization_id if model is Character else cast(null(), Integer)
+        columns.append(organization_id.label("organization_id"))
+        selects.append(select(*columns).where(model.project_id == project_id))
+    return union_all(*selects)
+
+
+def _summary_field(level: str) -> str:
+    return "summary_detailed" if level == "detailed" else "summary_brief"
+
+
+def _other_level(level: str) -> str:
+    return "brief" if level == "detailed" else "detailed"
+
+
+def split_tiered_window(window: list[Chapter]) -> tuple[list[Chapter], list[Chapter]]:
+    """把 L1 之前按序排列的章节切成 (L2, L3)：L2 取最后 3 章，L3 取其前至多 6 章。"""
+    l2_start = max(0, len(window) - TIERED_L2_MAX)
+    l2_chapters = window[l2_start:]
+
+    # L1+L2 已占用的章数；剩下的额度给 L3
+    used = 1 + len(l2_chapters)
+    l3_budget = min(TIERED_L3_MAX, TIERED_TOTAL_CHAPTERS - used)
+    l3_start = max(0, l2_start - l3_budget)
+    return l2_chapters, window[l3_start:l2_start]
+
+
 @dataclass
 class TieredChapterContext:
     """分层章节上下文聚合结果。"""
@@ -47,18 +152,54 @@ class TieredChapterContext:
     l2: list[Chapter]  # 近 3 章（用 summary_detailed）
     l3: list[Chapter]  # 更早 ≤6 章（用 summary_brief）
     summary_errors: list[Exception]  # 摘要生成期间收集的异常（不致命）
+    pending_chapter_ids: list[int] = field(default_factory=list)  # 只读模式下摘要过期、待后台刷新的章节
+    rollups: list[ChapterRollup] = field(default_factory=list)  # L3 之前：对齐的篇章 / 卷梗概
+    earlier: list[Chapter] = field(default_factory=list)  # L3 之前、不足一个篇章的零散章节（用 summary_brief）
+
+
+def _missing_summary_note(tiered: TieredChapterContext, chapter: Chapter) -> str:
+    if chapter.id in tiered.pending_chapter_ids:
+        return "（摘要后台生成中，本章已跳过）"
+    return "（摘要生成失败，本章已跳过）"
 
 
 def count_tokens_estimate(text: str) -> int:
-    """粗略估算 token 数，按中文经验值 len / 1.6。"""
-    return max(1, int(len(text) // 1.6))
+    """粗略估算 token 数：中日韩字符按经验值 1.6 字/token，其余 4 字符/token。"""
+    return max(1, int(estimate_tokens(text)))
+
+
+def _name_desc_line(name: str, desc: str) -> str:
+    return f"- {name}：{desc}" if desc else f"- {name}"
+
+
+def _relationship_line(rel: dict, field_limit: int) -> str:
+    source = rel.get("source_name") or f"{rel.get('source_type')}#{rel.get('source_id')}"
+    target = rel.get("target_name") or f"{rel.get('target_type')}#{rel.get('target_id')}"
+    relation = rel.get("relation_type") or "related_to"
+    line = f"- {source} --{relation}--> {target}"
+    desc = _truncate(rel.get("description", ""), field_limit) if field_limit else ""
+    return f"{line}: {desc}" if desc else line
+
+
+def _state_event_line(event: dict, field_limit: int) -> str:
+    entity = event.get("entity_name") or f"{event.get('entity_type')}#{event.get('entity_id')}"
+    key = event.get("state_key") or "state"
+    line = f"- {entity} / {key}"
+    value = _truncate(event.get("new_value", ""), field_limit) if field_limit else ""
+    summary = _truncate(event.get("summary", ""), field_limit) if field_limit else ""
+    if value:
+        line += f": {value}"
+    if summary:
+        line += f" ({summary})"
+    return line
 
 
 class AIContextBuilder:
     """项目上下文构建器"""
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, *, cache: ProjectContextCache | None = None):
         self.db = db
+        self.cache = cache if cache is not None else project_context_cache
 
     async def get_project_context(
         self,
@@ -73,105 +214,189 @@ class AIContextBuilder:
           - "full": 完整上下文（角色+世界观+地点+组织+章节摘要）
           - "outline": 大纲生成用（角色+世界观+前文摘要）
           - "chat": 对话用（精简版）
+
+        修订号未变时直接返回缓存快照的副本，只花一次单列查询。
         """
-        project = await self._get_project(project_id)
-        if not project:
+        snapshot = await self._get_context_snapshot(project_id, mode)
+        if snapshot is None:
             return {}
+        return copy.deepcopy(snapshot.ctx)
+
+    async def get_chat_context_text(
+        self,
+        project_id: int,
+        max_tokens: int = CHAT_CONTEXT_MAX_TOKENS,
+        *,
+        focus_texts: list[str | None] | None = None,
+    ) -> str:
+        """chat 用上下文文本：get_project_context(mode="chat") + format_for_chat_with_budget。
+
+        focus_texts：按时间顺序的当前写作文本（章节段、用户消息……）。其中提及的实体
+        按提及得分排在各类最前并优先获得详细写法，未提及的每类只带 CHAT_FOCUS_BACKGROUND_LIMIT 条；
+        没有任何提及时与不传相同，走按修订号缓存的默认渲染。
+        """
+        snapshot = await self._get_context_snapshot(project_id, "chat")
+        if snapshot is None:
+            return self.format_for_chat_with_budget({}, max_tokens)
+        if focus_texts:
+            focused = self._focus_chat_context(snapshot, focus_texts)
+            if focused is not None:
+                return self.format_for_chat_with_budget(focused, max_tokens)
+        text = snapshot.chat_texts.get(max_tokens)
+        if text is None:
+            text = self.format_for_chat_with_budget(snapshot.ctx, max_tokens)
+            snapshot.chat_texts[max_tokens] = text
+        return text
 
+    async def get_chat_focus_text(
+        self,
+        project_id: int,
+        focus_text: str | None,
+        max_tokens: int = CHAT_FOCUS_MAX_TOKENS,
+    ) -> str:
+        """focus_text（通常是最新用户消息）提及的实体及其关系、状态的详细写法；没有提及时返回空串。
+
+        与 get_chat_context_text 分开渲染：项目上下文只随修订号和章节段变化，可作为提示缓存前缀，
+        本段每轮随消息变化，放在缓存断点之后。
+        """
+        if not focus_text:
+            return ""
+        snapshot = await self._get_context_snapshot(project_id, "chat")
+        if snapshot is None:
+            return ""
+        scores = self._mention_scores(snapshot, [focus_text])
+        if not scores:
+            return ""
+
+        ctx: dict = {}
+        for entity_type, ctx_key, *_rest in _ENTITY_BUCKETS:
+            ctx[ctx_key] = sorted(
+                (item for item in snapshot.entity_pool.get(ctx_key, []) if (entity_type, item["id"]) in scores),
+                key=lambda item, t=entity_type: -scores[(t, item["id"])],
+            )
+        ctx["relationships"] = [
+            rel
+            for rel in snapshot.ctx.get("relationships") or []
+            if (rel["source_type"], rel["source_id"]) in scores or (rel["target_type"], rel["target_id"]) in scores
+        ]
+        ctx["state_events"] = [
+            event
+            for event in snapshot.ctx.get("state_events") or []
+            if (event["entity_type"], event["entity_id"]) in scores
+        ]
+        return self.format_for_chat_with_budget(ctx, max_tokens, list_empty_characters=False)
+
+    async def _get_context_snapshot(self, project_id: int, mode: str) -> ContextSnapshot | None:
+        result = await self.db.execute(
+            select(Project.context_revision, Project.name, Project.description).where(Project.id == project_id)
+        )
+        project = result.one_or_none()
+        if project is None:
+            return None
+        snapshot = self.cache.get(project_id, mode, project.context_revision)
+        if snapshot is not None:
+            return snapshot
+        ctx, entity_pool = await self._build_project_context(project_id, project, mode)
+        entity_pool = entity_pool if mode == "chat" else None
+        return self.cache.put(project_id, mode, project.context_revision, ctx, entity_pool=entity_pool)
+
+    async def _build_project_context(self, project_id: int, project, mode: str) -> tuple[dict, dict[str, list[dict]]]:
+        """缓存未命中时构建：实体四桶一条 UNION ALL，关系/状态各一条，名称映射复用已载入行。
+
+        返回 (ctx, 不截条数的实体池)；实体池只在 chat 模式随快照缓存，供相关度排序。
+        """
         ctx = {
             "project_name": project.name,
             "project_description": _truncate(project.description, 1000),
         }
+        entity_pool: dict[str, list[dict]] = {}
 
         if mode in ("full", "outline", "chat"):
-            ctx["characters"] = await self._get_characters(project_id)
-
-        if mode in ("full", "outline", "chat"):
-            ctx["worldviews"] = await self._get_worldviews(project_id)
-            ctx["locations"] = await self._get_locations(project_id)
-            ctx["organizations"] = await self._get_organizations(project_id)
-            entity_names = await self._get_entity_name_lookup(project_id)
+            buckets, entity_names, entity_pool = await self._get_entity_buckets(project_id)
+            ctx.update(buckets)
             ctx["relationships"] = await self._get_relationships(project_id, entity_names)
             ctx["state_events"] = await self._get_state_events(project_id, entity_names)
 
         if mode in ("full", "outline"):
             ctx["previous_chapters"] = await self._get_chapter_summaries(project_id)
 
-        return ctx
+        return ctx, entity_pool
 
-    async def _get_project(self, project_id: int) -> Project | None:
-        result = await self.db.execute(select(Project).where(Project.id == project_id))
-        return result.scalar_one_or_none()
+    async def _get_entity_buckets(
+        self, project_id: int
+    ) -> tuple[dict[str, list[dict]], dict[tuple[str, int], str], dict[str, list[dict]]]:
+        """一次往返取回角色/世界观/地点/组织，并顺带得到全量 (type, id) → name 映射与实体池。
 
-    async def _get_characters(self, project_id: int) -> list[dict]:
-        result = await self.db.execute(
-            select(Character).where(Character.project_id == project_id).order_by(Character.id)
-        )
-        return [
-            {
-                "id": c.id,
-                "name": c.name,
-                "description": _truncate(c.description, 200),
-                "personality": _truncate(c.personality, 200),
-                "background": _truncate(c.background, 200),
-                "appearance": _truncate(c.appearance, 200),
-                "organization_id": c.organization_id,
-            }
-            for c in result.scalars().all()
-        ]
+        超出注入条数上限的行仍参与名称映射（关系/状态事件可能引用它们）和实体池（被提及时
+        可进入 chat 上下文），详情列已在 SQL 侧截到上限 +1 字，额外传输量有界。
+        """
+        result = await self.db.execute(_entity_bucket_statement(project_id))
+        rows_by_type: dict[str, list] = defaultdict(list)
+        for row in result.all():
+            rows_by_type[row.entity_type].append(row)
+
+        buckets: dict[str, list[dict]] = {}
+        entity_names: dict[tuple[str, int], str] = {}
+        entity_pool: dict[str, list[dict]] = {}
+        for entity_type, ctx_key, _model, limit, fields in _ENTITY_BUCKETS:
+            items: list[dict] = []
+            for row in sorted(rows_by_type.get(entity_type, []), key=lambda r: r.id):
+                entity_names[(entity_type, row.id)] = row.name
+                item = {"id": row.id, "name": row.name}
+                for slot, (field_name, max_len) in enumerate(fields):
+                    item[field_name] = _truncate(getattr(row, f"f{slot}"), max_len)
+                if entity_type == "character":
+                    item["organization_id"] = row.organization_id
+                items.append(item)
+            entity_pool[ctx_key] = items
+            buckets[ctx_key] = items if limit is None else items[:limit]
+        return buckets, entity_names, entity_pool
 
-    async def _get_worldviews(self, project_id: int) -> list[dict]:
-        result = await self.db.execute(select(Worldview).where(Worldview.project_id == project_id).limit(10))
-        return [
-            {
-                "id": w.id,
-                "name": w.name,
-                "description": _truncate(w.description, 300),
-                "rules": _truncate(w.rules, 300),
-                "magic_system": _truncate(w.magic_system, 200),
-            }
-            for w in result.scalars().all()
-        ]
+    @staticmethod
+    def _mention_scores(snapshot: ContextSnapshot, focus_texts: list[str | None]) -> dict[tuple[str, int], float]:
+        """focus 文本中各实体的提及得分（越靠后的文本权重越高）；提及索引随快照缓存"""
+        if snapshot.mention_index is None:
+            snapshot.mention_index = MentionIndex(
+                (item["name"], (entity_type, item["id"]))
+                for entity_type, ctx_key, *_rest in _ENTITY_BUCKETS
+                for item in snapshot.entity_pool.get(ctx_key, [])
+                if item.get("name")
+            )
+        return snapshot.mention_index.scores((text, weight) for weight, text in enumerate(focus_texts, start=1) if text)
 
-    async def _get_locations(self, project_id: int) -> list[dict]:
-        result = await self.db.execute(select(Location).where(Location.project_id == project_id).limit(15))
-        return [
-            {
-                "id": loc.id,
-                "name": loc.name,
-                "description": _truncate(loc.description, 200),
-                "geography": _truncate(loc.geography, 150),
-            }
-            for loc in result.scalars().all()
-        ]
+    @staticmethod
+    def _focus_chat_context(snapshot: ContextSnapshot, focus_texts: list[str | None]) -> dict | None:
+        """按提及得分重排 chat 上下文；没有任何实体被提及时返回 None。
 
-    async def _get_organizations(self, project_id: int) -> list[dict]:
-        result = await self.db.execute(select(Organization).where(Organization.project_id == project_id).limit(10))
-        return [
-            {
-                "id": org.id,
-                "name": org.name,
-                "description": _truncate(org.description, 200),
-                "purpose": _truncate(org.purpose, 150),
-            }
-            for org in result.scalars().all()
-        ]
+        越靠后的 focus 文本权重越高（用户消息 > 章节段），同一文本内越靠后的提及得分越高。
+        关系与状态事件按所涉实体的得分前移，便于打包器优先给它们详细写法。
+        """
+        scores = AIContextBuilder._mention_scores(snapshot, focus_texts)
+        if not scores:
+            return None
+
+        ctx = dict(snapshot.ctx)
+        for entity_type, ctx_key, *_rest in _ENTITY_BUCKETS:
+            pool = snapshot.entity_pool.get(ctx_key, [])
+            mentioned = sorted(
+                (item for item in pool if (entity_type, item["id"]) in scores),
+                key=lambda item, t=entity_type: -scores[(t, item["id"])],
+            )
+            background = [item for item in pool if (entity_type, item["id"]) not in scores]
+            ctx[ctx_key] = mentioned + background[:CHAT_FOCUS_BACKGROUND_LIMIT]
 
-    async def _get_entity_name_lookup(self, project_id: int) -> dict[tuple[str, int], str]:
-        lookup: dict[tuple[str, int], str] = {}
-        model_pairs = (
-            ("character", Character),
-            ("worldview", Worldview),
-            ("location", Location),
-            ("organization", Organization),
+        def _edge_score(*keys: tuple[str, int]) -> float:
+            return max(scores.get(key, 0.0) for key in keys)
+
+        ctx["relationships"] = sorted(
+            ctx.get("relationships") or [],
+            key=lambda rel: -_edge_score((rel["source_type"], rel["source_id"]), (rel["target_type"], rel["target_id"])),
         )
-        for entity_type, model in model_pairs:
-            rows = await self.db.execute(
-                select(model.id, model.name).where(model.project_id == project_id)
-            )
-            for entity_id, name in rows.all():
-                lookup[(entity_type, entity_id)] = name
-        return lookup
+        ctx["state_events"] = sorted(
+            ctx.get("state_events") or [],
+            key=lambda event: -_edge_score((event["entity_type"], event["entity_id"])),
+        )
+        return ctx
 
     async def _get_relationships(
         self,
@@ -256,7 +481,7 @@ class AIContextBuilder:
         - 输入 refs 形如 [{"type":"character","id":1}, ...]
         - 输出 dict 形如 {"characters":[...], "locations":[...], ...}（仅包含有命中的桶）
 
-        与 `_get_characters` 等批量方法的区别：
+        与 `_get_entity_buckets` 批量加载的区别：
         - 这里按 ID 集合精筛，不限制条数（调用方应在更上层做数量上限）
         - 复用相同的字段截断策略，保持 prompt 注入风格一致
         """
@@ -400,7 +625,7 @@ class AIContextBuilder:
 
     def format_for_chat(self, ctx: dict) -> str:
         """格式化 chat 用轻量上下文：项目元数据 + 角色基础列表。"""
-        text = self._format_chat_characters(ctx, field_limit=200, compact=False)
+        text = self._format_chat_characters(ctx, field_limit=200)
         wb_text = self._format_chat_worldbuilding(ctx, field_limit=120)
         graph_text = self._format_chat_graph(ctx, field_limit=120)
         if wb_text:
@@ -415,114 +640,253 @@ class AIContextBuilder:
         self,
         project_id: int,
         current_chapter_id: int,
-        chat_model,
+        chat_model=None,
     ) -> "TieredChapterContext":
         """
-        按 L1/L2/L3 分层选择章节并按需生成摘要。
+        按 L1/L2/L3 分层选择章节，可选按需生成摘要。
 
         - L1 = current_chapter（全文，不截断）
         - L2 = current 之前 chapter_number 排序的最多 3 章（用 summary_detailed）
         - L3 = L2 之前的最多 6 章（用 summary_brief），与 L1+L2 合计 ≤10 章
-        - 三层之外的章节不注入（远处摘要也是噪音）
+        - L3 之前的章节由摘要树补齐：已生成的对齐篇章 / 卷梗概（rollups）+ 不足一个篇章的
+          零散章节简要（earlier），条数 O(log n)
+        - 窗口与零散章节同一次查询（L1 之前至多 TIERED_TOTAL_CHAPTERS-1 + ROLLUP_FANOUT-1 行），
+          content 仅加载 L1 与摘要待生成的章节
 
-        如果 L2/L3 章节的 summary 字段缺失或 word_count 与
-        summary_source_word_count 不一致 → 调用 chat_model 重新生成并落库。
-        L2 / L3 各自的所有缺失摘要任务用 asyncio.gather 并发执行。
+        chat_model=None（chat 路径）：只读已有摘要，不等 LLM；摘要缺失或过期的章节
+        记入 TieredChapterContext.pending_chapter_ids，由调用方交给后台预生成
+        （chapter_summary_service）。
 
-        chat_model 由调用方提供（来自 _get_config_and_model），失败时
-        TieredChapterContext.summary_errors 收集异常，调用方按需降级。
+        传入 chat_model：过期摘要调用 refresh_chapter_summaries 当场重新生成并落库，
+        失败时 TieredChapterContext.summary_errors 收集异常，调用方按需降级。
         """
-        # 1. 拉取本项目所有章节（按 chapter_number 升序）
-        result = await self.db.execute(
-            select(Chapter).where(Chapter.project_id == project_id).order_by(Chapter.chapter_number)
-        )
-        all_chapters = list(result.scalars().all())
-        if not all_chapters:
+        # 1. L1：当前章整行（需要全文）；不属于本项目时退化为最末章
+        l1_chapter = await self._load_l1_chapter(project_id, current_chapter_id)
+        if l1_chapter is None:
             return TieredChapterContext(l1=None, l2=[], l3=[], summary_errors=[])
 
-        # 2. 找当前章的位置
-        current_idx = next(
-            (i for i, ch in enumerate(all_chapters) if ch.id == current_chapter_id),
-            None,
+        # 2. L1 之前的窗口 + 可能落在零散段的更早章节，只取元数据与摘要列
+        rows = await self._load_previous_chapter_window(
+            project_id, l1_chapter, limit=TIERED_TOTAL_CHAPTERS - 1 + ROLLUP_FANOUT - 1
         )
-        if current_idx is None:
-            # 章节 id 不属于本项目，退化为"取末尾章作为 L1"
-            logger.warning(
-                "current_chapter_id=%s 不属于项目 %s，退化为最末章作为 L1",
-                current_chapter_id,
-                project_id,
+        window = rows[-(TIERED_TOTAL_CHAPTERS - 1) :]
+        older = rows[: len(rows) - len(window)]
+
+        # 3. 切 L2 / L3 滑动窗口
+        l2_chapters, l3_chapters = split_tiered_window(window)
+        targets = [(ch, "detailed") for ch in l2_chapters] + [(ch, "brief") for ch in l3_chapters]
+
+        # 4. 只读：过期章节交给后台；否则按需生成（并发）
+        if chat_model is None:
+            pending = [
+                ch.id for ch, level in targets if (ch.word_count or 0) > 0 and self._summary_outdated(ch, level)
+            ]
+            rollups, earlier = await self._load_earlier_outline(project_id, window or [l1_chapter], older)
+            return TieredChapterContext(
+                l1=l1_chapter,
+                l2=list(l2_chapters),
+                l3=list(l3_chapters),
+                summary_errors=[],
+                pending_chapter_ids=pending,
+                rollups=rollups,
+                earlier=earlier,
             )
-            current_idx = len(all_chapters) - 1
 
-        l1_chapter = all_chapters[current_idx]
+        window_moved = any(self._summary_outdated(ch, level) for ch, level in targets)
+        summary_errors = await self.refresh_chapter_summaries(targets, chat_model)
+        if older and window_moved:
+            # 窗口前移时，窗口之前最近的篇章可能刚闭合；其余节点由后台预生成维护
 
-        # 3. 切 L2 / L3 滑动窗口
-        l2_start = max(0, current_idx - TIERED_L2_MAX)
-        l2_chapters = all_chapters[l2_start:current_idx]  # 最多 3 章
+            async def _chat_model():
+                return chat_model
 
-        # L1+L2 已占用的章数；剩下的额度给 L3
-        used = 1 + len(l2_chapters)
-        l3_budget = min(TIERED_L3_MAX, TIERED_TOTAL_CHAPTERS - used)
-        l3_start = max(0, l2_start - l3_budget)
-        l3_chapters = all_chapters[l3_start:l2_start]
+            summary_errors += await ChapterRollupService(self.db).refresh_ancestors(
+                project_id, [window[0].chapter_number - 1], _chat_model
+            )
+        rollups, earlier = await self._load_earlier_outline(project_id, window or [l1_chapter], older)
+        return TieredChapterContext(
+            l1=l1_chapter,
+            l2=list(l2_chapters),
+            l3=list(l3_chapters),
+            summary_errors=summary_errors,
+            rollups=rollups,
+            earlier=earlier,
+        )
 
-        # 4. 按需生成 L2 / L3 摘要（并发）
-        summary_errors: list[Exception] = []
+    async def _load_earlier_outline(
+        self, project_id: int, window: list[Chapter], older: list[Chapter]
+    ) -> tuple[list[ChapterRollup], list[Chapter]]:
+        """L3 窗口之前：对齐节点覆盖 [1, 剩余叶子起点)，剩余叶子取 older 中序号不小于起点的章节。"""
+        if not older:
+            return [], []
+        nodes, remainder_start = covering_nodes(window[0].chapter_number or 0)
+        earlier = [ch for ch in older if (ch.chapter_number or 0) >= remainder_start]
+        return await ChapterRollupService(self.db).load_nodes(project_id, nodes), earlier
+
+    async def refresh_chapter_summaries(
+        self,
+        targets: list[tuple[Chapter, str]],
+        chat_model,
+    ) -> list[Exception]:
+        """为 (章节, level) 中摘要缺失或过期的项生成摘要并提交，返回收集到的异常。
 
-        async def _ensure_l2_summary(ch: Chapter) -> None:
-            if not self._is_summary_stale(ch, "detailed"):
-                return
-            try:
-                summary = await self._generate_chapter_summary(
-                    ch, chat_model, target_chars=TIERED_L2_TARGET_CHARS, level="detailed"
-                )
-                ch.summary_detailed = summary
-                ch.summary_source_word_count = ch.word_count or 0
-            except Exception as exc:  # noqa: BLE001
-                logger.warning("L2 摘要生成失败 chapter_id=%s: %s", ch.id, exc, exc_info=True)
-                summary_errors.append(exc)
+        level: "detailed"（L2）/ "brief"（L3）。待生成项用 asyncio.gather 并发执行，
+        同时在途的 LLM 调用不超过 TIERED_SUMMARY_CONCURRENCY；相同 (章节, level, 正文指纹)
+        经进程级 summary_flights 合并。摘要缺失/过期的章节才补拉正文（生成摘要要用）。
+        """
+        await self._load_chapter_contents([ch for ch, level in targets if self._summary_outdated(ch, level)])
+        stale = [(ch, level) for ch, level in targets if self._is_summary_stale(ch, level)]
+        if not stale:
+            return []
 
-        async def _ensure_l3_summary(ch: Chapter) -> None:
-            if not self._is_summary_stale(ch, "brief"):
-                return
+        summary_errors: list[Exception] = []
+        semaphore = asyncio.Semaphore(TIERED_SUMMARY_CONCURRENCY)
+        refreshed: set[int] = set()
+
+        # 两级摘要共用一份来源快照：本轮只重生成一级时，另一级若也已过期，
+        # 快照前移后会被误判为新鲜 —— 先记下，生成后清空让它下次按需重生成
+        stale_keys = {(ch.id, level) for ch, level in stale}
+        orphaned: list[tuple[Chapter, str]] = []
+        for ch, level in stale:
+            other = _other_level(level)
+            if (
+                (ch.id, other) not in stale_keys
+                and getattr(ch, _summary_field(other), None)
+                and self._summary_outdated(ch, other)
+            ):
+                orphaned.append((ch, other))
+
+        async def _ensure_summary(ch: Chapter, level: str) -> None:
+            target_chars = TIERED_L2_TARGET_CHARS if level == "detailed" else TIERED_L3_TARGET_CHARS
+            fingerprint = content_fingerprint(ch.content)
+            sketch = content_sketch(ch.content)
+            # 同一章同一级别、同一版正文的并发生成（两个标签页、chat + 后台预生成）只调一次 LLM
+            key = (ch.id, level, fingerprint)
             try:
-                summary = await self._generate_chapter_summary(
-                    ch, chat_model, target_chars=TIERED_L3_TARGET_CHARS, level="brief"
-                )
-                ch.summary_brief = summary
+                async with semaphore:
+                    summary = await summary_flights.do(
+                        key,
+                        lambda: self._generate_chapter_summary(
+                            ch, chat_model, target_chars=target_chars, level=level
+                        ),
+                    )
+                setattr(ch, _summary_field(level), summary)
                 ch.summary_source_word_count = ch.word_count or 0
+                ch.summary_source_fingerprint = fingerprint
+                ch.summary_source_sketch = sketch
+                refreshed.add(ch.id)
             except Exception as exc:  # noqa: BLE001
-                logger.warning("L3 摘要生成失败 chapter_id=%s: %s", ch.id, exc, exc_info=True)
+                logger.warning("%s 摘要生成失败 chapter_id=%s: %s", level, ch.id, exc, exc_info=True)
                 summary_errors.append(exc)
 
-        tasks = [_ensure_l2_summary(ch) for ch in l2_chapters] + [
-            _ensure_l3_summary(ch) for ch in l3_chapters
-        ]
-        if tasks:
-            await asyncio.gather(*tasks)
-            # 任何摘要写入需 commit；如失败章节字段维持 None / 旧值
-            await self.db.commit()
-            for ch in l2_chapters + l3_chapters:
-                await self.db.refresh(ch)
+        await asyncio.gather(*(_ensure_summary(ch, level) for ch, level in stale))
+        for ch, other in orphaned:
+            if ch.id in refreshed:
+                setattr(ch, _summary_field(other), None)
+        # 任何摘要写入需 commit；如失败章节字段维持 None / 旧值
+        await self.db.commit()
+        for ch in {ch.id: ch for ch, _level in stale}.values():
+            await self.db.refresh(ch, attribute_names=list(_TIERED_SUMMARY_FIELDS))
+        return summary_errors
+
+    async def outdated_summary_targets(
+        self,
+        project_id: int,
+        chapter: Chapter,
+        *,
+        include_window: bool = False,
+    ) -> list[tuple[Chapter, str]]:
+        """后台预生成用：该章两级摘要（之后先当 L2 再当 L3）+ 可选的前序 L2/L3 窗口，只留缺失/过期项。"""
+        targets = [(chapter, "detailed"), (chapter, "brief")]
+        if include_window:
+            l2_chapters, l3_chapters = split_tiered_window(
+                await self._load_previous_chapter_window(project_id, chapter)
+            )
+            targets += [(ch, "detailed") for ch in l2_chapters] + [(ch, "brief") for ch in l3_chapters]
+        return [(ch, level) for ch, level in targets if self._summary_outdated(ch, level)]
 
-        return TieredChapterContext(
-            l1=l1_chapter,
-            l2=list(l2_chapters),
-            l3=list(l3_chapters),
-            summary_errors=summary_errors,
+    async def _load_l1_chapter(self, project_id: int, current_chapter_id: int) -> Chapter | None:
+        result = await self.db.execute(
+            select(Chapter).where(Chapter.id == current_chapter_id, Chapter.project_id == project_id)
+        )
+        chapter = result.scalar_one_or_none()
+        if chapter is not None:
+            return chapter
+
+        result = await self.db.execute(
+            select(Chapter)
+            .where(Chapter.project_id == project_id)
+            .order_by(Chapter.chapter_number.desc(), Chapter.id.desc())
+            .limit(1)
+        )
+        chapter = result.scalar_one_or_none()
+        if chapter is not None:
+            # 章节 id 不属于本项目，退化为"取末尾章作为 L1"
+            logger.warning(
+                "current_chapter_id=%s 不属于项目 %s，退化为最末章作为 L1",
+                current_chapter_id,
+                project_id,
+            )
+        return chapter
+
+    async def _load_previous_chapter_window(
+        self, project_id: int, l1_chapter: Chapter, *, limit: int = TIERED_TOTAL_CHAPTERS - 1
+    ) -> list[Chapter]:
+        """L1 之前按 (chapter_number, id) 倒序取 limit 行（默认 TIERED_TOTAL_CHAPTERS-1），返回升序列表。
+
+        content 不在投影内（load_only），避免每条消息把整本书正文拉进内存；
+        需要生成摘要的章节再由 _load_chapter_contents 补拉。
+        """
+        number = l1_chapter.chapter_number or 0
+        result = await self.db.execute(
+            select(Chapter)
+            .options(load_only(*_TIERED_WINDOW_COLUMNS))
+            .where(
+                Chapter.project_id == project_id,
+                or_(
+                    Chapter.chapter_number < number,
+                    and_(Chapter.chapter_number == number, Chapter.id < l1_chapter.id),
+                ),
+            )
+            .order_by(Chapter.chapter_number.desc(), Chapter.id.desc())
+            .limit(limit)
         )
+        return list(reversed(result.scalars().all()))
+
+    async def _load_chapter_contents(self, chapters: list[Chapter]) -> None:
+        """一次查询补齐窗口行的 content（已加载的跳过）。"""
+        pending = {ch.id: ch for ch in chapters if "content" in sa_inspect(ch).unloaded}
+        if not pending:
+            return
+        result = await self.db.execute(select(Chapter.id, Chapter.content).where(Chapter.id.in_(pending)))
+        for chapter_id, content in result.all():
+            set_committed_value(pending[chapter_id], "content", content)
 
     @staticmethod
     def _is_summary_stale(chapter: Chapter, level: str) -> bool:
-        """判断章节摘要是否过期或缺失。"""
-        if not chapter.content or not chapter.content.strip():
-            return False  # 空章节没必要生成摘要
-        target_field = "summary_detailed" if level == "detailed" else "summary_brief"
-        existing = getattr(chapter, target_field, None)
+        """判断章节摘要是否过期或缺失。先看摘要字段，未过期时不触碰 content。"""
+        if not AIContextBuilder._summary_outdated(chapter, level):
+            return False
+        # 空章节没必要生成摘要
+        return bool(chapter.content and chapter.content.strip())
+
+    @staticmethod
+    def _summary_outdated(chapter: Chapter, level: str) -> bool:
+        """只看摘要与指纹/草图列，不触碰正文（窗口行未加载 content）。
+
+        - 摘要缺失 → 过期
+        - 没有来源指纹的旧摘要 → 退回 word_count 快照比较
+        - 指纹一致（含纯空白改动）→ 新鲜
+        - 指纹不同 → 草图估算变更幅度 ≥ TIERED_SUMMARY_CHANGE_THRESHOLD 才算过期，小修小改沿用旧摘要
+        """
+        existing = getattr(chapter, _summary_field(level), None)
         if not existing:
             return True
-        # word_count 快照对不上 → 摘要过期
-        return (chapter.word_count or 0) != (chapter.summary_source_word_count or 0)
+        if not chapter.summary_source_fingerprint or not chapter.content_fingerprint:
+            return (chapter.word_count or 0) != (chapter.summary_source_word_count or 0)
+        if chapter.content_fingerprint == chapter.summary_source_fingerprint:
+            return False
+        return change_ratio(chapter.summary_source_sketch, chapter.content_sketch) >= TIERED_SUMMARY_CHANGE_THRESHOLD
 
     @staticmethod
     async def _generate_chapter_summary(
@@ -559,6 +923,7 @@ class AIContextBuilder:
             f"章节正文：\n{chapter.content or ''}"
         )
 
+        chat_model = with_response_cache(chat_model)
         try:
             structured = chat_model.with_structured_output(ChapterSummarySchema, method="json_mode")
         except TypeError:
@@ -586,6 +951,21 @@ class AIContextBuilder:
         """
         parts: list[str] = []
 
+        # L3 之前的篇章 / 卷梗概与零散章节简要
+        if tiered.rollups or tiered.earlier:
+            lines = ["【更早剧情梗概】"]
+            for node in tiered.rollups:
+                label = ROLLUP_LABELS.get(node.level, "篇章")
+                lines.append(
+                    f"- 第{node.first_chapter_number}–{node.last_chapter_number}章（{label}）：{node.summary.strip()}"
+                )
+            for ch in tiered.earlier:
+                summary = (ch.summary_brief or "").strip()
+                if summary:
+                    lines.append(f"- 第{ch.chapter_number}章《{ch.title or '未命名'}》：{summary}")
+            if len(lines) > 1:
+                parts.append("\n".join(lines))
+
         # L3 简要（最早的章节先呈现，让 AI 按时间顺序读）
         if tiered.l3:
             lines = ["【小说前情简述】"]
@@ -594,7 +974,7 @@ class AIContextBuilder:
                 if summary:
                     lines.append(f"- 第{ch.chapter_number}章《{ch.title or '未命名'}》：{summary}")
                 else:
-                    lines.append(f"- 第{ch.chapter_number}章《{ch.title or '未命名'}》：（摘要生成失败，本章已跳过）")
+                    lines.append(f"- 第{ch.chapter_number}章《{ch.title or '未命名'}》：{_missing_summary_note(tiered, ch)}")
             parts.append("\n".join(lines))
 
         # L2 详细
@@ -605,7 +985,7 @@ class AIContextBuilder:
                 if summary:
                     lines.append(f"\n第{ch.chapter_number}章《{ch.title or '未命名'}》：\n{summary}")
                 else:
-                    lines.append(f"\n第{ch.chapter_number}章《{ch.title or '未命名'}》：（摘要生成失败，本章已跳过）")
+                    lines.append(f"\n第{ch.chapter_number}章《{ch.title or '未命名'}》：{_missing_summary_note(tiered, ch)}")
             parts.append("\n".join(lines))
 
         # L1 当前章全文（或截断后）
@@ -623,58 +1003,85 @@ class AIContextBuilder:
 
         return "\n\n".join(parts)
 
-    def format_for_chat_with_budget(self, ctx: dict, max_chars: int = CHAT_CONTEXT_MAX_CHARS) -> str:
-        """按角色数量自适应预算格式化 chat 上下文。"""
-        characters = ctx.get("characters") or []
-        count = len(characters)
-        if count > 8:
-            text = self._format_chat_characters(ctx, field_limit=100, compact=True)
-        else:
-            field_limit = 200 if count <= 3 else max(100, 200 - (count - 3) * 20)
-            text = self._format_chat_characters(ctx, field_limit=field_limit, compact=False)
+    def format_for_chat_with_budget(
+        self,
+        ctx: dict,
+        max_tokens: int = CHAT_CONTEXT_MAX_TOKENS,
+        *,
+        max_chars: int | None = None,
+        list_empty_characters: bool = True,
+    ) -> str:
+        """按估算 token 预算（可选再加字符上限）格式化 chat 上下文。
 
-        # 追加世界观/地点/组织（如存在）
-        wb_text = self._format_chat_worldbuilding(ctx, field_limit=120)
-        if wb_text:
-            text = text + "\n\n" + wb_text
-        graph_text = self._format_chat_graph(ctx, field_limit=120)
-        if graph_text:
-            text = text + "\n\n" + graph_text
+        各段只渲染一次：每个条目给出「仅名字 / 名字 + 简述 / 完整」几种写法，由 ContextPacker
+        先保证每个条目至少露名，再按 角色 > 简介 > 世界观 > 地点 > 组织 > 关系 > 状态 的优先级
+        逐级换成更详细的写法。只有必选片段（项目名、角色标题）本身超出预算时才硬截断。
+        """
+        packer = ContextPacker(max_tokens, max_chars=max_chars)
+        self._add_chat_fragments(packer, ctx, list_empty_characters=list_empty_characters)
+        text = packer.pack()
+        if max_chars is not None and len(text) > max_chars:
+            return text[: max(0, max_chars - 8)] + "\n…（已截断）"
+        return text
 
-        if len(text) <= max_chars:
-            return text
-
-        # 降级 1：更紧凑的角色格式 + 保留世界building
-        if count <= 8:
-            text = self._format_chat_characters(ctx, field_limit=100, compact=False)
-            wb_text = self._format_chat_worldbuilding(ctx, field_limit=80)
-            graph_text = self._format_chat_graph(ctx, field_limit=80)
-            if wb_text:
-                text = text + "\n\n" + wb_text
-            if graph_text:
-                text = text + "\n\n" + graph_text
-            if len(text) <= max_chars:
-                return text
-
-        # 降级 2：最紧凑角色格式 + 保留世界building
-        text = self._format_chat_characters(ctx, field_limit=100, compact=True)
-        wb_text = self._format_chat_worldbuilding(ctx, field_limit=60)
-        graph_text = self._format_chat_graph(ctx, field_limit=60)
-        if wb_text:
-            text = text + "\n\n" + wb_text
-        if graph_text:
-            text = text + "\n\n" + graph_text
-        if len(text) <= max_chars:
-            return text
+    @staticmethod
+    def _add_chat_fragments(packer: ContextPacker, ctx: dict, *, list_empty_characters: bool = True) -> None:
+        if ctx.get("project_name"):
+            packer.add(packer.section(priority=0), [f"项目：{ctx['project_name']}"], required=True)
+        if ctx.get("project_description"):
+            description = ctx["project_description"]
+            packer.add(
+                packer.section(priority=2),
+                [f"简介：{_truncate(description, 150)}", f"简介：{_truncate(description, 600)}"],
+            )
+
+        characters = ctx.get("characters") or []
+        section = packer.section("【角色基础列表】", priority=1, required=bool(characters) or list_empty_characters)
+        if not characters and list_empty_characters:
+            packer.add(section, ["暂无角色。"], required=True)
+        for c in characters:
+            name = c.get("name", "未命名")
+            packer.add(
+                section,
+                [
+                    f"- {name}",
+                    _name_desc_line(name, _truncate(c.get("description", ""), 100)),
+                    "\n".join(
+                        [
+                            f"- {name}",
+                            f"  描述：{_truncate(c.get('description', ''), 200)}",
+                            f"  性格：{_truncate(c.get('personality', ''), 200)}",
+                            f"  背景：{_truncate(c.get('background', ''), 200)}",
+                            f"  外貌：{_truncate(c.get('appearance', ''), 200)}",
+                        ]
+                    ),
+                ],
+            )
 
-        # 降级 3：仅保留角色，丢弃世界building
-        text = self._format_chat_characters(ctx, field_limit=100, compact=True)
-        if len(text) <= max_chars:
-            return text
+        for priority, (header, key) in enumerate(
+            (("【世界观】", "worldviews"), ("【地点】", "locations"), ("【组织】", "organizations")), start=3
+        ):
+            section = packer.section(header, priority=priority)
+            for entity in ctx.get(key) or []:
+                name = entity.get("name", "未命名")
+                description = entity.get("description", "")
+                packer.add(
+                    section,
+                    [
+                        f"- {name}",
+                        _name_desc_line(name, _truncate(description, 60)),
+                        _name_desc_line(name, _truncate(description, 120)),
+                    ],
+                )
 
-        return text[: max(0, max_chars - 8)] + "\n…（已截断）"
+        section = packer.section("[Known Relationships]", priority=6)
+        for rel in ctx.get("relationships") or []:
+            packer.add(section, [_relationship_line(rel, limit) for limit in (0, 60, 120)])
+        section = packer.section("[State Timeline]", priority=7)
+        for event in ctx.get("state_events") or []:
+            packer.add(section, [_state_event_line(event, limit) for limit in (0, 60, 120)])
 
-    def _format_chat_characters(self, ctx: dict, *, field_limit: int, compact: bool) -> str:
+    def _format_chat_characters(self, ctx: dict, *, field_limit: int) -> str:
         parts = []
         if ctx.get("project_name"):
             parts.append(f"项目：{ctx['project_name']}")
@@ -688,10 +1095,6 @@ class AIContextBuilder:
         else:
             for c in characters:
                 name = c.get("name", "未命名")
-                if compact:
-                    desc = _truncate(c.get("description", ""), field_limit)
-                    lines.append(f"- {name}：{desc}" if desc else f"- {name}")
-                    continue
                 lines.append(
                     "\n".join(
                         [
@@ -714,27 +1117,25 @@ class AIContextBuilder:
         if worldviews:
             lines = ["【世界观】"]
             for w in worldviews:
-                name = w.get("name", "未命名")
-                desc = _truncate(w.get("description", ""), field_limit)
-                lines.append(f"- {name}：{desc}" if desc else f"- {name}")
+                lines.append(_name_desc_line(w.get("name", "未命名"), _truncate(w.get("description", ""), field_limit)))
             sections.append("\n".join(lines))
 
         locations = ctx.get("locations") or []
         if locations:
             lines = ["【地点】"]
             for loc in locations:
-                name = loc.get("name", "未命名")
-                desc = _truncate(loc.get("description", ""), field_limit)
-                lines.append(f"- {name}：{desc}" if desc else f"- {name}")
+                lines.append(
+                    _name_desc_line(loc.get("name", "未命名"), _truncate(loc.get("description", ""), field_limit))
+                )
             sections.append("\n".join(lines))
 
         organizations = ctx.get("organizations") or []
         if organizations:
             lines = ["【组织】"]
             for org in organizations:
-                name = org.get("name", "未命名")
-                desc = _truncate(org.get("description", ""), field_limit)
-                lines.append(f"- {name}：{desc}" if desc else f"- {name}")
+                lines.append(
+                    _name_desc_line(org.get("name", "未命名"), _truncate(org.get("description", ""), field_limit))
+                )
             sections.append("\n".join(lines))
 
         return "\n\n".join(sections) if sections else ""
@@ -745,31 +1146,13 @@ class AIContextBuilder:
         relationships = ctx.get("relationships") or []
         if relationships:
             lines = ["[Known Relationships]"]
-            for rel in relationships:
-                source = rel.get("source_name") or f"{rel.get('source_type')}#{rel.get('source_id')}"
-                target = rel.get("target_name") or f"{rel.get('target_type')}#{rel.get('target_id')}"
-                relation = rel.get("relation_type") or "related_to"
-                desc = _truncate(rel.get("description", ""), field_limit)
-                line = f"- {source} --{relation}--> {target}"
-                if desc:
-                    line += f": {desc}"
-                lines.append(line)
+            lines += [_relationship_line(rel, field_limit) for rel in relationships]
             sections.append("\n".join(lines))
 
         state_events = ctx.get("state_events") or []
         if state_events:
             lines = ["[State Timeline]"]
-            for event in state_events:
-                entity = event.get("entity_name") or f"{event.get('entity_type')}#{event.get('entity_id')}"
-                key = event.get("state_key") or "state"
-                value = _truncate(event.get("new_value", ""), field_limit)
-                summary = _truncate(event.get("summary", ""), field_limit)
-                line = f"- {entity} / {key}"
-                if value:
-                    line += f": {value}"
-                if summary:
-                    line += f" ({summary})"
-                lines.append(line)
+            lines += [_state_event_line(event, field_limit) for event in state_events]
             sections.append("\n".join(lines))
 
         return "\n\n".join(sections) if sections else ""
@@ -4,8 +4,8 @@
 - generate_chapter_outline：项目校验 → 模型构建 → workflow 查询/创建 → session/run 创建 → 图执行
 - cancel_run：状态机检查 → 后台取消 → 状态更新
 - list_runs：多表过滤聚合
-- start_stream_run：queue 注册 → 后台任务提交
-- stream_events：返回 AsyncIterator（SSE 包装留在 API 层）
+- start_stream_run：事件总线注册 → 后台任务提交
+- stream_events：订阅事件总线 / 回放历史，返回 AsyncIterator（SSE 包装留在 API 层）
 """
 
 import asyncio
@@ -29,6 +29,7 @@ from app.infrastructure.db.models.ai_runtime import (
 )
 from app.infrastructure.db.models.model_configs import ModelConfig
 from app.infrastructure.db.models.projects import Project
+from app.infrastructure.events import EventsExpired, get_run_event_bus
 from app.infrastructure.secrets import get_encryption_service
 from app.infrastructure.task.runner import background_runner
 from app.schemas.ai import ChapterOutlineRequest, ChapterOutlineResponse, RunListResponse, RunResponse
@@ -37,11 +38,49 @@ from .project_service import ProjectService
 
 logger = logging.getLogger(__name__)
 
-# 内存中的 run -> queue 注册表（running run 的实时 SSE 订阅）
-RUN_QUEUES: dict[int, asyncio.Queue] = {}
-
 _encryption_service = get_encryption_service()
 
+_NODE_EVENT_TYPES = frozenset({"node_start", "node_end"})
+
+
+# ---------- SSE 事件 id ----------
+# SSE id 为 "{事件总线 id}/{水位}"：水位 w 表示 sequence < w 的落库事件客户端都已收到。
+# 重连时总线缓冲已越过游标，据水位只回放客户端缺的落库事件，不重复也不遗漏。
+# 实时事件的 sequence 与落库 sequence 的对应：节点事件 payload sequence = 落库 sequence + 1，
+# token / usage 沿用所在节点的 payload sequence。
+
+
+def _parse_event_id(event_id: str | None) -> tuple[str | None, int | None]:
+    """拆出事件总线游标与水位；旧格式（只有总线 id）的水位为 None"""
+    if not event_id:
+        return None, None
+    cursor, _, watermark = event_id.rpartition("/")
+    if cursor and watermark.isdigit():
+        return cursor, int(watermark)
+    return event_id, None
+
+
+def _format_event_id(cursor: str, watermark: int) -> str:
+    return f"{cursor}/{watermark}"
+
+
+def _event_sequence(event: dict) -> int | None:
+    sequence = event.get("sequence")
+    return sequence if isinstance(sequence, int) and sequence >= 0 else None
+
+
+def _persisted_before(event: dict) -> int | None:
+    """实时事件之前已落库事件的 sequence 上界（不含）；事件不带 sequence 时为 None（不限）"""
+    sequence = _event_sequence(event)
+    if sequence is None:
+        return None
+    return sequence - 1 if event.get("type") in _NODE_EVENT_TYPES else sequence
+
+
+def _persisted_watermark(event: dict) -> int:
+    """收到实时事件后的水位（节点事件本身也已落库）"""
+    return _event_sequence(event) or 0
+
 
 class AIWorkflowService:
     """AI 工作流业务服务"""
@@ -67,8 +106,9 @@ class AIWorkflowService:
             raise ForbiddenError("该模型配置没有保存 API 密钥")
         return cfg
 
-    def _build_model_from_config(self, model_cfg: ModelConfig):
+    async def _build_model_from_config(self, model_cfg: ModelConfig):
         """从 ModelConfig 构建 LangChain ChatModel"""
+        from app.infrastructure.llm.model_pool import chat_model_pool
         from app.infrastructure.llm.provider_adapters import ProviderConfig, get_provider
 
         provider = get_provider(model_cfg.model_type)
@@ -81,7 +121,7 @@ class AIWorkflowService:
             api_url=model_cfg.api_url,
             proxy_url=model_cfg.proxy_url if model_cfg.enable_proxy else None,
         )
-        return provider.build_chat_model(pcfg)
+        return await chat_model_pool.get(provider, pcfg, model_config_id=model_cfg.id)
 
     async def _get_run_with_access(self, run_id: int, user_id: int) -> AIRun:
         """获取 Run 并校验用户权限（通过 session → workflow → project 链路）"""
@@ -110,7 +150,7 @@ class AIWorkflowService:
 
         # 2. 获取模型配置 & 构建 Provider
         model_cfg = await self._get_user_model_config(body.model_config_id, user_id)
-        model = self._build_model_from_config(model_cfg)
+        model = await self._build_model_from_config(model_cfg)
 
         # 3. 确保工作流注册已加载
         import app.infrastructure.graph.workflows  # noqa: F401
@@ -265,15 +305,14 @@ class AIWorkflowService:
 
     # ---------- SSE 流式 ----------
 
-    async def start_stream_run(self, run_id: int, user_id: int) -> tuple[AIRun, asyncio.Queue]:
-        """启动后台流式运行，并注册 event_queue 供 /stream 实时消费"""
+    async def start_stream_run(self, run_id: int, user_id: int) -> AIRun:
+        """启动后台流式运行，并在事件总线上打开事件流供 /stream 实时订阅"""
         run = await self._get_run_with_access(run_id, user_id)
         if run.status != RunStatus.PENDING.value:
             raise ForbiddenError(f"当前状态 '{run.status}' 不可启动流式运行")
 
-        # 创建 queue 并注册
-        queue: asyncio.Queue = asyncio.Queue(maxsize=256)
-        RUN_QUEUES[run_id] = queue
+        event_bus = get_run_event_bus()
+        await event_bus.open(run_id)
 
         # 重建 runner（需要与当前 db session 解耦，后台任务使用新 session）
         async def _background_task():
@@ -287,12 +326,12 @@ class AIWorkflowService:
 
                     from app.infrastructure.graph.runner import GraphRunner
 
-                    GraphRunner(session, event_queue=queue)
+                    GraphRunner(session, event_bus=event_bus)
                     # 这里需要一个模型和 input_state；实际场景由调用方在创建 run 时保留
                     # 为保持简单，consume_events 需要 model/input_state；
-                    # 但 start-stream 作为通用端点，目前只做 queue 注册和状态变更。
+                    # 但 start-stream 作为通用端点，目前只做事件流注册和状态变更。
                     # 真正的后台执行应由具体业务端点触发。本端点仅作示范：
-                    # 如果 run 有 input_data，可解析后调用 runner.consume_events。
+                    # 如果 run 有 input_data，可解析后调用 runner.execute_stream。
                     # 为兼容性，这里仅把 run 状态推进到 running。
                     run_obj.status = RunStatus.RUNNING.value
                     run_obj.started_at = datetime.now(UTC)
@@ -302,25 +341,28 @@ class AIWorkflowService:
                 except Exception:
                     logger.exception("start-stream background task failed for run %s", run_id)
                 finally:
-                    RUN_QUEUES.pop(run_id, None)
+                    await event_bus.close(run_id)
 
         background_runner.submit(run_id, _background_task())
-        return run, queue
+        return run
 
-    async def stream_events(self, run_id: int, user_id: int) -> AsyncIterator[dict]:
-        """SSE 事件流 — 流式获取运行过程中的实时事件"""
-        run = await self._get_run_with_access(run_id, user_id)
+    async def stream_events(self, run_id: int, user_id: int, last_event_id: str | None = None) -> AsyncIterator[dict]:
+        """SSE 事件流 — 订阅运行的实时事件，支持 Last-Event-ID 断点续传
 
-        # 如果 run 已完成，直接 replay 历史事件
-        if run.status in (RunStatus.SUCCEEDED.value, RunStatus.FAILED.value, RunStatus.CANCELLED.value):
-            async for item in self._replay_events(run_id, run.status):
-                yield item
-            return
+        - 事件总线上有该 run 的事件流（运行中或刚结束，可能由其他 worker 发布）：从 last_event_id 之后读取；
+          缓冲已越过该位置时先回放游标之后、缓冲最早事件之前的落库事件，再从缓冲最早处继续
+        - 没有事件流且 run 已结束：回放数据库中的历史事件
+        """
+        run = await self._get_run_with_access(run_id, user_id)
 
-        # run 仍在进行中 — 从注册表拉取实时事件
-        queue = RUN_QUEUES.get(run_id)
-        if queue is None:
-            # 没有活跃的 queue，返回静态提示
+        event_bus = get_run_event_bus()
+        if not await event_bus.has_stream(run_id):
+            # 如果 run 已完成，直接 replay 历史事件
+            if run.status in (RunStatus.SUCCEEDED.value, RunStatus.FAILED.value, RunStatus.CANCELLED.value):
+                async for item in self._replay_events(run_id, run.status):
+                    yield item
+                return
+            # 没有活跃的事件流，返回静态提示
             yield {
                 "event": "info",
                 "data": json.dumps(
@@ -330,29 +372,61 @@ class AIWorkflowService:
             }
             return
 
-        # 实时消费 queue 中的事件
-        try:
-            while True:
-                event = await asyncio.wait_for(queue.get(), timeout=60.0)
-                yield {
-                    "event": event.get("type", "message"),
-                    "data": json.dumps(event, ensure_ascii=False),
-                }
-                if event.get("type") in ("done", "error", "cancelled"):
-                    break
-        except TimeoutError:
-            yield {
-                "event": "heartbeat",
-                "data": json.dumps({"type": "heartbeat"}, ensure_ascii=False),
-            }
-        except asyncio.CancelledError:
-            raise
+        cursor, watermark = _parse_event_id(last_event_id)
+        # 重新订阅后的第一个实时事件之前，检查落库事件是否有客户端没收到的缺口
+        check_gap = watermark is not None
+        watermark = watermark or 0
+        while True:
+            try:
+                async for event_id, event in event_bus.subscribe(run_id, cursor):
+                    if check_gap:
+                        check_gap = False
+                        async for item in self._replay_persisted_events(
+                            run_id, cursor, after=watermark, before=_persisted_before(event)
+                        ):
+                            yield item
+                    cursor = event_id
+                    watermark = max(watermark, _persisted_watermark(event))
+                    yield {
+                        "id": _format_event_id(event_id, watermark),
+                        "event": event.get("type", "message"),
+                        "data": json.dumps(event, ensure_ascii=False),
+                    }
+                if check_gap:
+                    # 缓冲已读完：剩余的落库事件全部补上
+                    async for item in self._replay_persisted_events(run_id, cursor, after=watermark):
+                        yield item
+                return
+            except EventsExpired as exc:
+                # 缓冲已越过游标：游标与缓冲最早事件之间的落库节点事件补齐历史，token 片段不落库无法补回
+                logger.info("run %s events up to %s expired, replaying from DB", run_id, exc.resume_after)
+                cursor = exc.resume_after
+                check_gap = True
 
     async def _replay_events(self, run_id: int, run_status: str) -> AsyncIterator[dict]:
         """回放已落库的历史事件"""
-        result = await self.db.execute(
-            select(AIRunEvent).where(AIRunEvent.run_id == run_id).order_by(AIRunEvent.sequence)
-        )
+        async for item in self._replay_persisted_events(run_id, None):
+            yield item
+        yield {
+            "event": "done",
+            "data": json.dumps({"type": "done", "status": run_status}, ensure_ascii=False),
+        }
+
+    async def _replay_persisted_events(
+        self,
+        run_id: int,
+        bus_cursor: str | None,
+        *,
+        after: int = 0,
+        before: int | None = None,
+    ) -> AsyncIterator[dict]:
+        """回放 sequence 在 [after, before) 内的落库事件；bus_cursor 不为空时附带可续传的 SSE id"""
+        if before is not None and before <= after:
+            return
+        stmt = select(AIRunEvent).where(AIRunEvent.run_id == run_id, AIRunEvent.sequence >= after)
+        if before is not None:
+            stmt = stmt.where(AIRunEvent.sequence < before)
+        result = await self.db.execute(stmt.order_by(AIRunEvent.sequence))
         for evt in result.scalars().all():
             payload = {
                 "type": evt.event_type,
@@ -364,11 +438,10 @@ class AIWorkflowService:
                     payload["data"] = json.loads(evt.data)
                 except json.JSONDecodeError:
                     payload["data"] = evt.data
-            yield {
+            item = {
                 "event": payload.get("type", "message"),
                 "data": json.dumps(payload, ensure_ascii=False),
             }
-        yield {
-            "event": "done",
-            "data": json.dumps({"type": "done", "status": run_status}, ensure_ascii=False),
-        }
+            if bus_cursor is not None:
+                item["id"] = _format_event_id(bus_cursor, evt.sequence + 1)
+            yield item
@@ -0,0 +1,253 @@
+"""章节摘要树 — 超长篇的篇章 / 卷 / 部梗概
+
+职责：
+- 以各章 summary_brief 为叶子，按扇出 ROLLUP_FANOUT 对齐分组逐层合并：
+  level 1 = 篇章（K 章）、level 2 = 卷（K² 章）、level 3 = 部（K³ 章）
+- 节点存 chapter_rollups，source_fingerprint 记录生成时子节点摘要的指纹；
+  某章摘要变化只沿祖先链向上重建，指纹不变即停止 —— 每次编辑 O(log n) 次 LLM 调用
+- 只为「已闭合」的节点生成（项目里已有超出其范围的章节），写作中的篇章不反复重建
+- covering_nodes 给出覆盖 [1, before) 的最少对齐节点，L3 窗口之前的剧情由它们补齐
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from app.domain.content_fingerprint import content_fingerprint
+from app.infrastructure.db.models.manuscript import Chapter, ChapterRollup
+from app.infrastructure.llm.response_cache import with_response_cache
+from app.infrastructure.task.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# 进程级：同一节点同一组子摘要的并发重建只执行一次
+rollup_flights = SingleFlight()
+
+ROLLUP_FANOUT = 10  # 每个节点合并的下一层节点数
+ROLLUP_MAX_LEVEL = 3  # 最高层级（部 = 1000 章）
+ROLLUP_TARGET_CHARS = 300  # 单个节点梗概目标字数
+ROLLUP_CONCURRENCY = 3  # 同层同时在途的 LLM 调用上限
+ROLLUP_LABELS = {1: "篇章", 2: "卷", 3: "部"}
+
+RollupNode = tuple[int, int]  # (level, node_index)
+
+
+def node_range(level: int, node_index: int) -> tuple[int, int]:
+    """节点覆盖的章节序号闭区间。"""
+    span = ROLLUP_FANOUT**level
+    return node_index * span + 1, (node_index + 1) * span
+
+
+def parent_node(node: RollupNode) -> RollupNode:
+    level, node_index = node
+    return level + 1, node_index // ROLLUP_FANOUT
+
+
+def covering_nodes(before_number: int) -> tuple[list[RollupNode], int]:
+    """覆盖章节 [1, before_number) 的对齐节点（大节点优先，按时间顺序）与剩余叶子起点。
+
+    剩余叶子 [remainder_start, before_number) 不足一个篇章，由调用方用各章 summary_brief 补齐。
+    """
+    nodes: list[RollupNode] = []
+    start = 1
+    for level in range(ROLLUP_MAX_LEVEL, 0, -1):
+        span = ROLLUP_FANOUT**level
+        while start + span <= before_number:
+            nodes.append((level, (start - 1) // span))
+            start += span
+    return nodes, start
+
+
+class ChapterRollupService:
+    """章节摘要树的读取与增量重建"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def load_nodes(self, project_id: int, nodes: list[RollupNode]) -> list[ChapterRollup]:
+        """按给定顺序返回已生成的节点，缺失（尚未生成）的跳过。"""
+        if not nodes:
+            return []
+        result = await self.db.execute(
+            select(ChapterRollup).where(
+                ChapterRollup.project_id == project_id,
+                or_(*(and_(ChapterRollup.level == lv, ChapterRollup.node_index == idx) for lv, idx in nodes)),
+            )
+        )
+        by_node = {(row.level, row.node_index): row for row in result.scalars().all()}
+        return [by_node[node] for node in nodes if node in by_node and by_node[node].summary]
+
+    async def refresh_ancestors(
+        self,
+        project_id: int,
+        chapter_numbers: list[int],
+        get_chat_model: Callable[[], Awaitable[Any]],
+    ) -> list[Exception]:
+        """沿给定章节的祖先链自底向上重建过期节点，返回收集到的异常。
+
+        每层一次查询取现有节点、一次查询取子节点摘要；子摘要指纹与 source_fingerprint 一致
+        的节点跳过。需要调用 LLM 时才 await get_chat_model()，返回 None 则放弃本轮。
+        """
+        max_number = await self.db.scalar(
+            select(func.max(Chapter.chapter_number)).where(Chapter.project_id == project_id)
+        )
+        if not max_number:
+            return []
+
+        errors: list[Exception] = []
+        chat_model = None
+        dirty: set[RollupNode] = {(1, (n - 1) // ROLLUP_FANOUT) for n in chapter_numbers if n and n > 0}
+        for level in range(1, ROLLUP_MAX_LEVEL + 1):
+            # 只处理已闭合的节点
+            dirty = {node for node in dirty if node_range(*node)[1] < max_number}
+            if not dirty:
+                break
+
+            existing = await self._load_level(project_id, level, dirty)
+            children = await self._load_children(project_id, level, dirty)
+            stale: list[tuple[RollupNode, list[str], str]] = []
+            for node in sorted(dirty):
+                lines = children.get(node)
+                if not lines:
+                    continue
+                fingerprint = content_fingerprint("\n".join(lines))
+                current = existing.get(node)
+                if current is not None and current.summary and current.source_fingerprint == fingerprint:
+                    continue
+                stale.append((node, lines, fingerprint))
+
+            if stale:
+                if chat_model is None:
+                    chat_model = await get_chat_model()
+                if chat_model is None:
+                    return errors
+                errors += await self._rebuild(project_id, stale, existing, chat_model)
+
+            # 父节点总要核对一遍：旧数据里子节点可能早已生成而父节点缺失
+            dirty = {parent_node(node) for node in dirty}
+        return errors
+
+    async def _rebuild(
+        self,
+        project_id: int,
+        stale: list[tuple[RollupNode, list[str], str]],
+        existing: dict[RollupNode, ChapterRollup],
+        chat_model,
+    ) -> list[Exception]:
+        errors: list[Exception] = []
+        semaphore = asyncio.Semaphore(ROLLUP_CONCURRENCY)
+
+        async def _build(node: RollupNode, lines: list[str], fingerprint: str) -> None:
+            level, node_index = node
+            first, last = node_range(level, node_index)
+            try:
+                async with semaphore:
+                    summary = await rollup_flights.do(
+                        (project_id, level, node_index, fingerprint),
+                        lambda: self._generate_rollup_summary(chat_model, level, first, last, lines),
+                    )
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("梗概生成失败 project=%s level=%s index=%s: %s", project_id, level, node_index, exc)
+                errors.append(exc)
+                return
+            row = existing.get(node)
+            if row is None:
+                row = ChapterRollup(
+                    project_id=project_id,
+                    level=level,
+                    node_index=node_index,
+                    first_chapter_number=first,
+                    last_chapter_number=last,
+                )
+                self.db.add(row)
+                existing[node] = row
+            row.summary = summary
+            row.source_fingerprint = fingerprint
+
+        await asyncio.gather(*(_build(node, lines, fp) for node, lines, fp in stale))
+        await self.db.commit()
+        return errors
+
+    async def _load_level(self, project_id: int, level: int, nodes: set[RollupNode]) -> dict[RollupNode, ChapterRollup]:
+        result = await self.db.execute(
+            select(ChapterRollup).where(
+                ChapterRollup.project_id == project_id,
+                ChapterRollup.level == level,
+                ChapterRollup.node_index.in_([idx for _lv, idx in nodes]),
+            )
+        )
+        return {(row.level, row.node_index): row for row in result.scalars().all()}
+
+    async def _load_children(self, project_id: int, level: int, nodes: set[RollupNode]) -> dict[RollupNode, list[str]]:
+        """节点 → 按时间顺序的子摘要行。level 1 的子节点是各章 summary_brief，之上是下一层梗概。"""
+        children: dict[RollupNode, list[str]] = {}
+        if level == 1:
+            ranges = [node_range(*node) for node in nodes]
+            result = await self.db.execute(
+                select(Chapter)
+                .options(load_only(Chapter.id, Chapter.chapter_number, Chapter.title, Chapter.summary_brief))
+                .where(
+                    Chapter.project_id == project_id,
+                    Chapter.summary_brief.isnot(None),
+                    or_(*(Chapter.chapter_number.between(first, last) for first, last in ranges)),
+                )
+                .order_by(Chapter.chapter_number, Chapter.id)
+            )
+            for ch in result.scalars().all():
+                summary = (ch.summary_brief or "").strip()
+                if summary:
+                    node = (1, (ch.chapter_number - 1) // ROLLUP_FANOUT)
+                    children.setdefault(node, []).append(
+                        f"第{ch.chapter_number}章《{ch.title or '未命名'}》：{summary}"
+                    )
+            return children
+
+        child_indexes = [idx * ROLLUP_FANOUT + offset for _lv, idx in nodes for offset in range(ROLLUP_FANOUT)]
+        result = await self.db.execute(
+            select(ChapterRollup)
+            .where(
+                ChapterRollup.project_id == project_id,
+                ChapterRollup.level == level - 1,
+                ChapterRollup.node_index.in_(child_indexes),
+            )
+            .order_by(ChapterRollup.node_index)
+        )
+        for row in result.scalars().all():
+            if row.summary:
+                node = (level, row.node_index // ROLLUP_FANOUT)
+                children.setdefault(node, []).append(
+                    f"第{row.first_chapter_number}–{row.last_chapter_number}章：{row.summary.strip()}"
+                )
+        return children
+
+    @staticmethod
+    async def _generate_rollup_summary(chat_model, level: int, first: int, last: int, lines: list[str]) -> str:
+        """调用 LLM 把下一层摘要合并为一个节点梗概。失败抛异常由调用方 collect。"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        from app.schemas.legacy_ai import ChapterSummarySchema
+
+        label = ROLLUP_LABELS.get(level, "篇章")
+        system_prompt = (
+            "你是一个小说剧情梗概整理器。严格按以下 JSON schema 输出：\n"
+            '{ "summary": "string，梗概内容" }\n\n'
+            f"请把以下按时间顺序排列的摘要合并为约 {ROLLUP_TARGET_CHARS} 字的{label}梗概，"
+            "保留主线进展、关键转折和人物关系变化，不要逐条复述，不要补充原文没有的情节。"
+        )
+        user_content = f"范围：第{first}–{last}章\n\n" + "\n".join(f"- {line}" for line in lines)
+
+        chat_model = with_response_cache(chat_model)
+        try:
+            structured = chat_model.with_structured_output(ChapterSummarySchema, method="json_mode")
+        except TypeError:
+            structured = chat_model.with_structured_output(ChapterSummarySchema)
+
+        result = await structured.ainvoke([SystemMessage(content=system_prompt), HumanMessage(content=user_content)])
+        if isinstance(result, ChapterSummarySchema):
+            return result.summary.strip()
+        return ChapterSummarySchema.model_validate(result).summary.strip()
@@ -4,6 +4,7 @@
 - create / update / delete chapter，word_count 计算，next_number 分配
 - batch_publish 事务编排（验证→状态变更→flush→stats 更新→异常回滚）
 - project stats 重算（从 ChapterRepository 移出）
+- 正文变更后调度 L2/L3 摘要后台预生成（chapter_summary_service）
 """
 
 import logging
@@ -12,7 +13,10 @@ from collections.abc import Sequence
 from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.application.chapter_summary_service import chapter_summary_scheduler
+from app.application.context_cache import bump_project_revision
 from app.application.knowledge_graph_service import KnowledgeGraphService
+from app.core.config import get_settings
 from app.core.exceptions import NotFoundError
 from app.domain.word_count import calculate_word_count
 
@@ -61,10 +65,13 @@ class ChapterService:
             order_index=next_ord,
         )
         await self.ch_repo.create(chapter)
+        await bump_project_revision(self.db, project_id)
         await self.db.commit()
         await self.db.refresh(chapter)
         await self._update_project_stats(project_id)
         await self.db.commit()
+        # 新章写作时第一条聊天消息要用前序窗口的 L2/L3 摘要，一并补齐
+        self._schedule_summary_refresh(chapter, user_id, include_window=True)
         if body.status == "published":
             await self._trigger_chapter_analysis(chapter, user_id)
         return chapter
@@ -81,6 +88,7 @@ class ChapterService:
             raise NotFoundError("章节不存在或无权访问")
 
         old_status = chapter.status
+        old_fingerprint = chapter.content_fingerprint
         data = body.model_dump(exclude_unset=True)
         if "content" in data and data["content"] is not None:
             data["word_count"] = calculate_word_count(data["content"])
@@ -88,10 +96,14 @@ class ChapterService:
         for key, value in data.items():
             setattr(chapter, key, value)
 
+        await bump_project_revision(self.db, chapter.project_id)
         await self.db.commit()
         await self.db.refresh(chapter)
         await self._update_project_stats(chapter.project_id)
         await self.db.commit()
+        if chapter.content_fingerprint != old_fingerprint:
+            # 纯空白改动指纹不变，不必刷新摘要
+            self._schedule_summary_refresh(chapter, user_id)
         if old_status != "published" and chapter.status == "published":
             await self._trigger_chapter_analysis(chapter, user_id)
         return chapter
@@ -104,6 +116,7 @@ class ChapterService:
 
         project_id = chapter.project_id
         await self.db.delete(chapter)
+        await bump_project_revision(self.db, project_id)
         await self.db.commit()
         await self._update_project_stats(project_id)
         await self.db.commit()
@@ -161,6 +174,7 @@ class ChapterService:
             )
             .values(status=body.new_status)
         )
+        await bump_project_revision(self.db, body.project_id)
         await self.db.commit()
         await self._update_project_stats(body.project_id)
         await self.db.commit()
@@ -190,6 +204,7 @@ class ChapterService:
             if published:
                 await self.db.flush()
                 await self._update_project_stats(body.project_id)
+                await bump_project_revision(self.db, body.project_id)
 
             await self.db.commit()
             for chapter in published:
@@ -198,8 +213,8 @@ class ChapterService:
             await self.db.rollback()
             raise
 
-        for chapter in published:
-            await self._trigger_chapter_analysis(chapter, user_id)
+        if published:
+            await self._trigger_batch_chapter_analysis(body.project_id, published, user_id)
 
         return {
             "success": len(failed) == 0,
@@ -228,6 +243,15 @@ class ChapterService:
             project.word_count = words.scalar_one_or_none() or 0
             project.chapter_count = count.scalar_one_or_none() or 0
 
+    def _schedule_summary_refresh(self, chapter: Chapter, user_id: int, *, include_window: bool = False) -> None:
+        """正文变更后按章节防抖调度摘要预生成（不阻塞响应）"""
+        if not get_settings().ai.summary_prefetch_enabled:
+            return
+        try:
+            chapter_summary_scheduler.schedule(chapter.project_id, chapter.id, user_id, include_window=include_window)
+        except Exception:
+            logger.exception("Failed to schedule summary refresh for chapter %s", chapter.id)
+
     async def _trigger_chapter_analysis(self, chapter: Chapter, user_id: int) -> None:
         """章节发布后触发异步知识分析（不阻塞响应）"""
         try:
@@ -237,3 +261,15 @@ class ChapterService:
                 await self.db.commit()
         except Exception:
             logger.exception("Failed to trigger chapter analysis for chapter %s", chapter.id)
+
+    async def _trigger_batch_chapter_analysis(self, project_id: int, chapters: list[Chapter], user_id: int) -> None:
+        """批量发布后提交一个多章节合并分析任务（实体快照只加载一次，按故事顺序落库）"""
+        try:
+            kg_service = KnowledgeGraphService(self.db)
+            run_ids = await kg_service.submit_batch_chapter_analysis(
+                project_id, [chapter.id for chapter in chapters], user_id
+            )
+            if run_ids:
+                await self.db.commit()
+        except Exception:
+            logger.exception("Failed to trigger batch chapter analysis for project %s", project_id)
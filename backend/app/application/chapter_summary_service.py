@@ -0,0 +1,215 @@
+"""章节分层摘要后台预生成
+
+职责：
+- ChapterService 创建/更新章节正文后，按章节防抖调度摘要刷新
+- 防抖到期后经 background_runner 执行：为该章生成 L2 详细 + L3 简要摘要；
+  新建章节时顺带补齐其前序窗口（写新章时第一条聊天消息要用的 L2/L3）
+- 章节摘要就绪后沿摘要树向上增量重建篇章 / 卷梗概（chapter_rollup_service）
+- chat 路径只读摘要（get_tiered_chapter_context 不传 chat_model），
+  过期章节同样交给这里，聊天请求不等 LLM
+
+防抖为尾沿触发：窗口内的重复调度只推迟到期时间；生成过程中又有新调度，
+本轮结束后再跑一轮，不打断进行中的 LLM 调用。
+"""
+
+import asyncio
+import json
+import logging
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.application.ai_context_builder import AIContextBuilder
+from app.application.chapter_rollup_service import ChapterRollupService
+from app.core.config import get_settings
+from app.core.model_scenarios import CHAT_SCENARIO, DEFAULT_SCENARIOS, MODEL_SCENARIOS
+from app.domain.ai_runtime.enums import WorkClass
+from app.infrastructure.db.models.manuscript import Chapter
+from app.infrastructure.db.models.model_configs import ModelConfig
+from app.infrastructure.secrets import get_encryption_service
+from app.infrastructure.task.runner import BackgroundTaskRunner, background_runner
+from app.infrastructure.task.scheduler import work_context
+
+logger = logging.getLogger(__name__)
+
+# 防抖 + 最多 9 章 × 2 级摘要，留足余量
+SUMMARY_TASK_TIMEOUT = 600
+
+SummaryJob = Callable[[int, int, int, bool], Awaitable[None]]
+
+
+def _task_key(chapter_id: int) -> str:
+    return f"chapter-summary-{chapter_id}"
+
+
+async def _get_summary_model(db: AsyncSession, user_id: int):
+    """用户第一个授权 chat 场景且有 API Key 的模型配置 → ChatModel；没有则 None。"""
+    from app.infrastructure.llm.model_pool import chat_model_pool
+    from app.infrastructure.llm.provider_adapters import ProviderConfig, get_provider
+
+    result = await db.execute(
+        select(ModelConfig)
+        .where(ModelConfig.user_id == user_id, ModelConfig.api_key.isnot(None))
+        .order_by(ModelConfig.id)
+    )
+    for cfg in result.scalars().all():
+        if CHAT_SCENARIO not in _parse_scenarios(cfg.scenarios):
+            continue
+        provider = get_provider(cfg.model_type)
+        pcfg = ProviderConfig(
+            api_key=get_encryption_service().decrypt(cfg.api_key),
+            model_name=cfg.model_name or "",
+            temperature=float(cfg.temperature) if cfg.temperature else 0.7,
+            max_tokens=cfg.max_tokens or 2000,
+            api_url=cfg.api_url,
+            proxy_url=cfg.proxy_url if cfg.enable_proxy else None,
+        )
+        return await chat_model_pool.get(provider, pcfg, model_config_id=cfg.id)
+    return None
+
+
+def _parse_scenarios(raw: str | None) -> list[str]:
+    if raw is None:
+        return MODEL_SCENARIOS.copy()
+    try:
+        parsed = json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        return DEFAULT_SCENARIOS.copy()
+    return parsed if isinstance(parsed, list) else DEFAULT_SCENARIOS.copy()
+
+
+async def refresh_chapter_summaries(
+    project_id: int,
+    chapter_id: int,
+    user_id: int,
+    include_window: bool,
+    *,
+    chat_model=None,
+    _db_session: AsyncSession | None = None,
+) -> None:
+    """刷新单章（及可选的前序窗口）摘要。支持注入 _db_session / chat_model 供测试使用。"""
+    if _db_session is not None:
+        session = _db_session
+        should_close = False
+    else:
+        from app.infrastructure.db.session import get_session_factory
+
+        session = get_session_factory()()
+        should_close = True
+
+    try:
+        result = await session.execute(
+            select(Chapter).where(Chapter.id == chapter_id, Chapter.project_id == project_id)
+        )
+        chapter = result.scalar_one_or_none()
+        if chapter is None:
+            return
+
+        model_lookup_done = chat_model is not None
+
+        async def _chat_model():
+            # 章节摘要与梗概都新鲜时不查模型配置
+            nonlocal chat_model, model_lookup_done
+            if not model_lookup_done:
+                model_lookup_done = True
+                chat_model = await _get_summary_model(session, user_id)
+                if chat_model is None:
+                    logger.info("No chat model config for user %s, skipping summary prefetch", user_id)
+            return chat_model
+
+        errors: list[Exception] = []
+        builder = AIContextBuilder(session)
+        targets = await builder.outdated_summary_targets(project_id, chapter, include_window=include_window)
+        if targets:
+            if await _chat_model() is None:
+                return
+            errors += await builder.refresh_chapter_summaries(targets, chat_model)
+
+        # 本章所在篇章，以及新建本章后刚闭合的前一篇章
+        number = chapter.chapter_number or 0
+        errors += await ChapterRollupService(session).refresh_ancestors(project_id, [number - 1, number], _chat_model)
+        if errors:
+            logger.warning("Summary prefetch chapter=%s finished with %d error(s)", chapter_id, len(errors))
+    finally:
+        if should_close:
+            await session.close()
+
+
+class ChapterSummaryScheduler:
+    """按章节防抖的摘要预生成调度器（单例）"""
+
+    def __init__(
+        self,
+        runner: BackgroundTaskRunner = background_runner,
+        *,
+        job: SummaryJob = refresh_chapter_summaries,
+        debounce_seconds: float | None = None,
+    ):
+        self.runner = runner
+        self.job = job
+        self._debounce_seconds = debounce_seconds
+        self._due: dict[int, float] = {}  # chapter_id → 到期时刻（loop.time()）
+        self._requests: dict[int, tuple[int, int, bool]] = {}  # chapter_id → (project_id, user_id, include_window)
+        self._active: set[int] = set()  # 已有防抖循环在跑的章节
+
+    @property
+    def debounce_seconds(self) -> float:
+        if self._debounce_seconds is not None:
+            return self._debounce_seconds
+        return get_settings().ai.summary_debounce_seconds
+
+    def schedule(
+        self,
+        project_id: int,
+        chapter_id: int,
+        user_id: int,
+        *,
+        include_window: bool = False,
+        delay: float | None = None,
+    ) -> None:
+        """登记一次摘要刷新；同一章节在防抖窗口内的多次调度合并为一次。
+
+        delay: 覆盖防抖秒数（chat 路径发现的过期章节不是编辑中，可立即跑）。
+        """
+        loop = asyncio.get_running_loop()
+        self._due[chapter_id] = loop.time() + (self.debounce_seconds if delay is None else delay)
+        previous = self._requests.get(chapter_id)
+        include_window = include_window or (previous is not None and previous[2])
+        self._requests[chapter_id] = (project_id, user_id, include_window)
+        if chapter_id not in self._active:
+            self._start(chapter_id)
+
+    def pending(self, chapter_id: int) -> bool:
+        return chapter_id in self._due
+
+    def _start(self, chapter_id: int) -> None:
+        self._active.add(chapter_id)
+        info = self.runner.submit(_task_key(chapter_id), self._debounced(chapter_id), timeout=SUMMARY_TASK_TIMEOUT)
+        info.task.add_done_callback(lambda _task: self._on_done(chapter_id))
+
+    def _on_done(self, chapter_id: int) -> None:
+        # 任务彻底结束（含 runner 登记清理）后才释放；结束前刚好又来了调度则再起一轮
+        self._active.discard(chapter_id)
+        if chapter_id in self._due:
+            self._start(chapter_id)
+
+    async def _debounced(self, chapter_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        while chapter_id in self._due:
+            wait = self._due[chapter_id] - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            del self._due[chapter_id]
+            project_id, user_id, include_window = self._requests.pop(chapter_id)
+            try:
+                # 预生成是自动后台工作，模型调用排在交互与批量请求之后
+                with work_context(WorkClass.BACKGROUND, user_id):
+                    await self.job(project_id, chapter_id, user_id, include_window)
+            except Exception:
+                logger.exception("Summary prefetch failed chapter=%s", chapter_id)
+
+
+# 全局单例
+chapter_summary_scheduler = ChapterSummaryScheduler()
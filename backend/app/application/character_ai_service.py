@@ -12,6 +12,7 @@ from app.application.project_service import ProjectService
 from app.core.exceptions import ForbiddenError, NotFoundError, ValidationError
 from app.core.model_scenarios import DEFAULT_SCENARIOS, MODEL_SCENARIOS
 from app.infrastructure.db.models.model_configs import ModelConfig
+from app.infrastructure.llm.response_cache import with_response_cache
 from app.infrastructure.secrets import get_encryption_service
 from app.schemas.character_ai import (
     MAX_CHARACTERS_PER_BATCH,
@@ -67,6 +68,7 @@ class CharacterAIService:
 
     async def _get_config_and_model(self, config_id: int, user_id: int):
         """获取已授权的模型配置并构建 ChatModel。"""
+        from app.infrastructure.llm.model_pool import chat_model_pool
         from app.infrastructure.llm.provider_adapters import ProviderConfig, get_provider
 
         cfg = await self._get_model_config(config_id, user_id)
@@ -89,7 +91,7 @@ class CharacterAIService:
             presence_penalty=float(cfg.presence_penalty) if cfg.presence_penalty else 0.0,
             stop_sequences=self._parse_stop_sequences(cfg.stop_sequences),
         )
-        return cfg, provider.build_chat_model(pcfg)
+        return cfg, await chat_model_pool.get(provider, pcfg, model_config_id=cfg.id)
 
     @staticmethod
     def _parse_stop_sequences(raw: str | None) -> list[str] | None:
@@ -275,7 +277,8 @@ class CharacterAIService:
         model_config_id: int,
     ) -> CharacterPlan:
         """Step 1：规划阶段，独立 retry 2 次。失败抛 ValidationError。"""
-        structured = self._build_structured_model(chat_model, CharacterPlan)
+        # 重试提示带 retry 标记，与首次不同，不会命中首次的缓存结果
+        structured = self._build_structured_model(with_response_cache(chat_model), CharacterPlan)
 
         last_error: Exception | None = None
         for attempt in range(2):
@@ -0,0 +1,102 @@
+"""项目上下文快照缓存 — 按项目修订号（projects.context_revision）失效
+
+职责：
+- bump_project_revision：所有会影响 AI 上下文的写路径在提交前调用，修订号 +1
+- ProjectContextCache：进程内 LRU，按 (project_id, mode) 缓存已构建的上下文 dict、
+  format_for_chat_with_budget 渲染结果，以及 chat 相关度排序用的全量实体池与提及索引；
+  命中条件是修订号与库中一致
+
+修订号存在数据库里，多个 worker 各自持有缓存也不会读到过期快照：
+读路径先查一次 context_revision（单列单行），不一致就重建。
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.infrastructure.db.models.projects import Project
+
+if TYPE_CHECKING:
+    from app.domain.mention_index import MentionIndex
+
+DEFAULT_MAX_ENTRIES = 256
+
+
+async def bump_project_revision(db: AsyncSession, project_id: int | None) -> None:
+    """项目上下文修订号 +1（随调用方事务一起提交）。"""
+    if project_id is None:
+        return
+    await db.execute(
+        update(Project)
+        .where(Project.id == project_id)
+        .values(context_revision=Project.context_revision + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@dataclass
+class ContextSnapshot:
+    """某项目某 mode 在指定修订号下的上下文快照。"""
+
+    revision: int
+    ctx: dict
+    chat_texts: dict[int, str] = field(default_factory=dict)  # max_tokens → 渲染文本
+    entity_pool: dict[str, list[dict]] = field(default_factory=dict)  # ctx 键 → 不截条数的全部实体
+    mention_index: MentionIndex | None = None  # 由 entity_pool 的名字按需构建
+
+
+class ProjectContextCache:
+    """进程内项目上下文快照缓存（LRU，条目数有上限）。"""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[int, str], ContextSnapshot] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, project_id: int, mode: str, revision: int) -> ContextSnapshot | None:
+        key = (project_id, mode)
+        snapshot = self._entries.get(key)
+        if snapshot is None or snapshot.revision != revision:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return snapshot
+
+    def put(
+        self,
+        project_id: int,
+        mode: str,
+        revision: int,
+        ctx: dict,
+        *,
+        entity_pool: dict[str, list[dict]] | None = None,
+    ) -> ContextSnapshot:
+        key = (project_id, mode)
+        snapshot = ContextSnapshot(revision=revision, ctx=ctx, entity_pool=entity_pool or {})
+        self._entries[key] = snapshot
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, project_id: int | None = None) -> None:
+        """丢弃某项目（None = 全部）的快照。项目删除后 id 可能被复用，需显式清理。"""
+        if project_id is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == project_id]:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# 全局单例
+project_context_cache = ProjectContextCache()
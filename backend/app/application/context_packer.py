@@ -0,0 +1,157 @@
+"""上下文打包器 — 按优先级把已渲染片段装进 token 预算
+
+职责：
+- 调用方把每个段落（标题 + 条目）一次性渲染成片段；每个条目给出从省到详的若干变体
+- 按估算 token（可选再加字符上限）贪心装箱：
+  1. 覆盖：按优先级为每个条目放入最省的变体（先让每个实体都被提到）
+  2. 充实：逐级把条目升级到更详细的变体，只要增量装得下
+- 段落标题随该段第一个入选条目计费；required 条目/标题不受预算约束
+- 输出顺序与段落登记顺序、条目登记顺序一致，与装箱顺序无关
+
+每个片段的成本只算一次，装箱是加减法，不需要反复重渲染整段文本。
+"""
+
+import re
+from dataclasses import dataclass, field
+
+# CJK 统一表意文字、假名、全角标点等：按中文经验值每 1.6 字一个 token；其余按每 4 字符一个 token
+_WIDE_CHAR_RE = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+_WIDE_CHARS_PER_TOKEN = 1.6
+_NARROW_CHARS_PER_TOKEN = 4.0
+
+
+def estimate_tokens(text: str) -> float:
+    """按字符类别估算 token 数（浮点，便于片段成本累加）。"""
+    if not text:
+        return 0.0
+    wide = len(_WIDE_CHAR_RE.findall(text))
+    return wide / _WIDE_CHARS_PER_TOKEN + (len(text) - wide) / _NARROW_CHARS_PER_TOKEN
+
+
+@dataclass
+class _Cost:
+    tokens: float
+    chars: int
+
+    @classmethod
+    def of(cls, text: str, separator: int) -> "_Cost":
+        # separator：与前一片段之间的换行数（条目 1 个，段落 2 个）
+        return cls(estimate_tokens(text) + separator / _NARROW_CHARS_PER_TOKEN, len(text) + separator)
+
+
+@dataclass
+class _Section:
+    header: str | None
+    priority: int
+    required: bool
+    header_cost: _Cost
+    items: list["_Item"] = field(default_factory=list)
+
+    @property
+    def shown(self) -> bool:
+        return self.required or any(item.level >= 0 for item in self.items)
+
+
+@dataclass
+class _Item:
+    section: _Section
+    priority: tuple[int, int]
+    variants: list[str]
+    costs: list[_Cost]
+    required: bool
+    level: int = -1  # 已选变体下标，-1 = 未入选
+
+
+class ContextPacker:
+    """一次性渲染、按预算装箱的上下文拼装器"""
+
+    def __init__(self, max_tokens: int, *, max_chars: int | None = None):
+        self.max_tokens = max_tokens
+        self.max_chars = max_chars
+        self._sections: list[_Section] = []
+        self._used = _Cost(0.0, 0)
+
+    def section(self, header: str | None = None, *, priority: int = 0, required: bool = False) -> _Section:
+        """登记一个段落；priority 越小越先装，required 段落即使没有条目也输出标题。"""
+        section = _Section(
+            header=header,
+            priority=priority,
+            required=required,
+            header_cost=_Cost.of(header, 2) if header else _Cost(0.0, 2),
+        )
+        self._sections.append(section)
+        return section
+
+    def add(self, section: _Section, variants: list[str], *, required: bool = False) -> None:
+        """登记一个条目；variants 从最省到最详，空串会被忽略。"""
+        variants = [text for text in variants if text]
+        if not variants:
+            return
+        separator = 1 if section.header else 2
+        section.items.append(
+            _Item(
+                section=section,
+                priority=(section.priority, len(section.items)),
+                variants=variants,
+                costs=[_Cost.of(text, separator) for text in variants],
+                required=required,
+            )
+        )
+
+    def pack(self) -> str:
+        """装箱并按登记顺序渲染。"""
+        self._used = _Cost(0.0, 0)
+        for section in self._sections:
+            for item in section.items:
+                item.level = -1
+            if section.required:
+                self._charge(section.header_cost)
+
+        items = sorted((item for section in self._sections for item in section.items), key=lambda item: item.priority)
+        for item in items:
+            if item.required:
+                self._select(item, 0, force=True)
+        for item in items:
+            if item.level < 0:
+                self._select(item, 0)
+
+        max_level = max((len(item.variants) for item in items), default=0)
+        for level in range(1, max_level):
+            for item in items:
+                if item.level == level - 1 and level < len(item.variants):
+                    self._select(item, level)
+
+        parts: list[str] = []
+        for section in self._sections:
+            if not section.shown:
+                continue
+            lines = [section.header] if section.header else []
+            lines += [item.variants[item.level] for item in section.items if item.level >= 0]
+            if section.header:
+                parts.append("\n".join(lines))
+            else:
+                parts.extend(lines)
+        return "\n\n".join(parts)
+
+    def _select(self, item: _Item, level: int, *, force: bool = False) -> bool:
+        delta = _Cost(item.costs[level].tokens, item.costs[level].chars)
+        if item.level >= 0:
+            delta.tokens -= item.costs[item.level].tokens
+            delta.chars -= item.costs[item.level].chars
+        elif not item.section.shown:
+            delta.tokens += item.section.header_cost.tokens
+            delta.chars += item.section.header_cost.chars
+        if not force and not self._fits(delta):
+            return False
+        self._charge(delta)
+        item.level = level
+        return True
+
+    def _fits(self, delta: _Cost) -> bool:
+        if self._used.tokens + delta.tokens > self.max_tokens:
+            return False
+        return self.max_chars is None or self._used.chars + delta.chars <= self.max_chars
+
+    def _charge(self, delta: _Cost) -> None:
+        self._used.tokens += delta.tokens
+        self._used.chars += delta.chars
@@ -3,8 +3,10 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import json
 import logging
+from collections.abc import AsyncIterator, Sequence
 from datetime import UTC, datetime
 from typing import Any
 
@@ -13,11 +15,15 @@ from sqlalchemy import func, nullslast, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
+from app.application.context_cache import bump_project_revision
 from app.application.project_service import ProjectService
+from app.core.config import get_settings
 from app.core.exceptions import ConflictError, ForbiddenError, NotFoundError, ValidationError
 from app.core.model_scenarios import DEFAULT_SCENARIOS, KNOWLEDGE_UPDATE_SCENARIO, MODEL_SCENARIOS
-from app.domain.ai_runtime.enums import RunStatus
-from app.infrastructure.db.models.ai_runtime import AIRun, LangGraphSession, LangGraphWorkflow
+from app.domain.ai_runtime.enums import JobStatus, RunStatus, WorkClass
+from app.domain.mention_index import MentionIndex
+from app.domain.text_chunks import split_paragraph_chunks
+from app.infrastructure.db.models.ai_runtime import AIRun, BackgroundJob, LangGraphSession, LangGraphWorkflow
 from app.infrastructure.db.models.manuscript import Chapter
 from app.infrastructure.db.models.model_configs import ModelConfig
 from app.infrastructure.db.models.projects import Project
@@ -28,8 +34,10 @@ from app.infrastructure.db.models.story_knowledge import (
     ProposalOperation,
 )
 from app.infrastructure.db.models.worldbuilding import Character, Location, Organization, Worldview
+from app.infrastructure.llm.response_cache import with_response_cache
 from app.infrastructure.secrets import get_encryption_service
-from app.infrastructure.task.runner import background_runner
+from app.infrastructure.task.jobs import register_job_handler
+from app.infrastructure.task.runner import DEFAULT_TIMEOUT, background_runner
 from app.schemas.knowledge import (
     ChapterAnalysisStatusResponse,
     ChapterKnowledgeAnalysisDraft,
@@ -47,9 +55,6 @@ from app.schemas.knowledge import (
 
 logger = logging.getLogger(__name__)
 
-# 章节分析后台任务并发限流（避免批量发布时瞬间爆 N 个 LLM 调用）
-_CHAPTER_ANALYSIS_SEMAPHORE = asyncio.Semaphore(2)
-
 try:
     from langchain_core.exceptions import OutputParserException
 except ImportError:  # pragma: no cover
@@ -115,6 +120,10 @@ DEFAULT_TERMINAL_RELATIONSHIP_EFFECTS = {
 
 ACTIVE_PROPOSAL_STATUSES = {"pending", "conflicted"}
 ACTIVE_OPERATION_STATUSES = {"pending", "conflicted"}
+CHAPTER_ANALYSIS_JOB = "chapter_analysis"
+CHAPTER_BATCH_ANALYSIS_JOB = "chapter_batch_analysis"
+BATCH_ANALYSIS_SECONDS_PER_CHAPTER = 60  # 批量分析任务超时：在单章超时之上每章追加的秒数
+ANALYSIS_HISTORY_LIMIT = 50  # 分析提示中携带的最近关系 / 状态事件条数
 CHAPTER_ANALYSIS_SOURCE = "chapter_analysis"
 
 
@@ -169,6 +178,7 @@ class KnowledgeGraphService:
             return chat_model.with_structured_output(schema)
 
     async def _get_config_and_model(self, config_id: int, user_id: int):
+        from app.infrastructure.llm.model_pool import chat_model_pool
         from app.infrastructure.llm.provider_adapters import ProviderConfig, get_provider
 
         result = await self.db.execute(
@@ -199,7 +209,7 @@ class KnowledgeGraphService:
             presence_penalty=float(cfg.presence_penalty) if cfg.presence_penalty else 0.0,
             stop_sequences=self._parse_stop_sequences(cfg.stop_sequences),
         )
-        return cfg, provider.build_chat_model(pcfg)
+        return cfg, await chat_model_pool.get(provider, pcfg, model_config_id=cfg.id)
 
     @staticmethod
     def _parse_stop_sequences(raw: str | None) -> list[str] | None:
@@ -278,8 +288,13 @@ class KnowledgeGraphService:
         project_id: int,
         chapter_id: int,
         user_id: int,
+        *,
+        work_class: WorkClass = WorkClass.BACKGROUND,
     ) -> int | None:
-        """提交章节知识分析后台任务。返回 AIRun.id，None 表示去重跳过或没有可用模型。"""
+        """提交章节知识分析后台任务。返回 AIRun.id，None 表示去重跳过或没有可用模型。
+
+        work_class：发布单章后的自动分析为 background，批量发布为用户触发的 batch。
+        """
         existing = await self._list_existing_chapter_analysis(project_id, chapter_id)
         if existing:
             logger.info("Chapter %s already has pending proposals, skipping analysis", chapter_id)
@@ -290,6 +305,10 @@ class KnowledgeGraphService:
             logger.warning("No knowledge_update model config found for user %s, skipping analysis", user_id)
             return None
 
+        if await self._chapters_with_active_analysis(project_id, [chapter_id]):
+            logger.info("Chapter %s already has a queued or running analysis job, skipping", chapter_id)
+            return None
+
         workflow = await self._get_or_create_knowledge_workflow(project_id, cfg.id)
         session = await self._get_or_create_knowledge_session(workflow.id, chapter_id)
 
@@ -307,13 +326,113 @@ class KnowledgeGraphService:
         self.db.add(run)
         await self.db.flush()
 
-        coro = _run_chapter_analysis_background(
-            run.id, project_id, chapter_id, user_id, cfg.id,
+        # 持久化入队，随调用方事务提交；进程重启或崩溃后由租约过期重新领取
+        await background_runner.enqueue(
+            self.db,
+            CHAPTER_ANALYSIS_JOB,
+            {
+                "run_id": run.id,
+                "project_id": project_id,
+                "chapter_id": chapter_id,
+                "user_id": user_id,
+                "model_config_id": cfg.id,
+            },
+            key=run.id,
+            work_class=work_class,
+            user_id=user_id,
+            idempotency_key=f"{CHAPTER_ANALYSIS_JOB}:{chapter_id}",
         )
-        background_runner.submit(run.id, coro)
         logger.info("Submitted chapter analysis background task run=%s chapter=%s", run.id, chapter_id)
         return run.id
 
+    async def submit_batch_chapter_analysis(
+        self,
+        project_id: int,
+        chapter_ids: Sequence[int],
+        user_id: int,
+        *,
+        work_class: WorkClass = WorkClass.BATCH,
+    ) -> list[int]:
+        """提交多章节合并分析任务（批量发布）。
+
+        每章仍各建一个 AIRun 以便按章节查询状态；已有待处理提案或分析任务的章节跳过。
+        返回新建的 AIRun.id 列表，空列表表示全部跳过或没有可用模型。
+        """
+        cfg = await self._get_default_knowledge_model_config(user_id)
+        if cfg is None:
+            logger.warning("No knowledge_update model config found for user %s, skipping analysis", user_id)
+            return []
+
+        chapter_ids = list(dict.fromkeys(chapter_ids))
+        busy = await self._chapters_with_active_analysis(project_id, chapter_ids)
+        workflow = await self._get_or_create_knowledge_workflow(project_id, cfg.id)
+        runs: list[tuple[AIRun, int]] = []
+        for chapter_id in chapter_ids:
+            if chapter_id in busy or await self._list_existing_chapter_analysis(project_id, chapter_id):
+                continue
+            session = await self._get_or_create_knowledge_session(workflow.id, chapter_id)
+            run = AIRun(
+                session_id=session.id,
+                workflow_type="knowledge_update",
+                status=RunStatus.PENDING.value,
+                input_data=_dump_json({
+                    "project_id": project_id,
+                    "chapter_id": chapter_id,
+                    "user_id": user_id,
+                    "model_config_id": cfg.id,
+                }),
+            )
+            self.db.add(run)
+            runs.append((run, chapter_id))
+        if not runs:
+            logger.info("All chapters in batch already analysed or queued project=%s", project_id)
+            return []
+        await self.db.flush()
+
+        digest = hashlib.sha1(",".join(str(chapter_id) for _run, chapter_id in runs).encode()).hexdigest()[:16]
+        await background_runner.enqueue(
+            self.db,
+            CHAPTER_BATCH_ANALYSIS_JOB,
+            {
+                "project_id": project_id,
+                "user_id": user_id,
+                "model_config_id": cfg.id,
+                "runs": [{"run_id": run.id, "chapter_id": chapter_id} for run, chapter_id in runs],
+            },
+            key=f"chapter-analysis-batch-{runs[0][0].id}",
+            work_class=work_class,
+            user_id=user_id,
+            idempotency_key=f"{CHAPTER_BATCH_ANALYSIS_JOB}:{project_id}:{digest}",
+            timeout=DEFAULT_TIMEOUT + BATCH_ANALYSIS_SECONDS_PER_CHAPTER * len(runs),
+        )
+        logger.info("Submitted batch chapter analysis project=%s chapters=%s", project_id, len(runs))
+        return [run.id for run, _chapter_id in runs]
+
+    async def _chapters_with_active_analysis(self, project_id: int, chapter_ids: Sequence[int]) -> set[int]:
+        """chapter_ids 中已在排队 / 执行中的分析任务里的章节。
+
+        单章任务按幂等键 chapter_analysis:{chapter_id} 查找；批量任务的幂等键是章节集合的摘要，
+        按项目前缀找出未结束的批量任务，再看其 payload 中的章节。两条入队路径都据此去重，
+        同一章节不会同时出现在两个任务里被重复分析。
+        """
+        single_keys = {f"{CHAPTER_ANALYSIS_JOB}:{chapter_id}": chapter_id for chapter_id in chapter_ids}
+        result = await self.db.execute(
+            select(BackgroundJob.idempotency_key, BackgroundJob.payload).where(
+                BackgroundJob.status.in_([JobStatus.QUEUED.value, JobStatus.RUNNING.value]),
+                or_(
+                    BackgroundJob.idempotency_key.in_(list(single_keys)),
+                    BackgroundJob.idempotency_key.like(f"{CHAPTER_BATCH_ANALYSIS_JOB}:{project_id}:%"),
+                ),
+            )
+        )
+        busy: set[int] = set()
+        for idempotency_key, payload in result.all():
+            if idempotency_key in single_keys:
+                busy.add(single_keys[idempotency_key])
+            else:
+                busy.update(item["chapter_id"] for item in (_load_json(payload) or {}).get("runs", []))
+        return busy & set(chapter_ids)
+
     async def get_latest_chapter_analysis_run(
         self,
         project_id: int,
@@ -368,25 +487,169 @@ class KnowledgeGraphService:
         existing = await self._list_existing_chapter_analysis(project_id, chapter_id)
         if existing and not force:
             logger.info("Chapter %s has existing pending proposals, returning cached", chapter_id)
-            return ChapterKnowledgeAnalysisResponse(
-                success=True,
-                project_id=project_id,
-                chapter_id=chapter_id,
-                proposal_count=len(existing),
-                skipped_proposal_count=0,
-                proposals=[self._proposal_response(proposal) for proposal in existing],
-                message="本章已有待处理知识变更提案",
-            )
+            return self._existing_analysis_response(project_id, chapter_id, existing)
 
         _cfg, chat_model = await self._get_config_and_model(model_config_id, user_id)
         entities = await self._load_analysis_entities(project_id)
-        prompt = self._build_chapter_analysis_prompt(chapter, entities)
-        structured_model = self._build_structured_model(chat_model, ChapterKnowledgeAnalysisDraft)
+        draft = await self._draft_chapter_analysis(chat_model, chapter, entities)
+        return await self._apply_chapter_analysis_draft(project_id, user_id, chapter, draft, entities)
+
+    async def analyze_chapters(
+        self,
+        project_id: int,
+        chapter_ids: Sequence[int],
+        user_id: int,
+        *,
+        model_config_id: int,
+        concurrency: int | None = None,
+    ) -> AsyncIterator[tuple[int, ChapterKnowledgeAnalysisResponse | Exception]]:
+        """按故事顺序批量分析多个章节（批量发布）。
+
+        实体快照只加载一次，每章结果落库后就地更新快照，后续章节的提示基于更新后的快照；
+        模型调用流水线并发，结果严格按章节顺序落库。concurrency 限制已发起调用、尚未落库的章节数：
+        第 k 章的提示包含第 k - concurrency 章及之前的全部结果（concurrency=1 即逐章串行）；
+        长章节的分段调用与其他章节共用同一个调用名额，同时进行的模型调用总数同样不超过 concurrency。
+        逐章产出 (chapter_id, 分析结果或异常)，单章失败不影响其余章节。
+        """
+        await self.project_service.require_user_project(project_id, user_id)
+        result = await self.db.execute(
+            select(Chapter)
+            .where(Chapter.project_id == project_id, Chapter.id.in_(list(chapter_ids)))
+            .order_by(Chapter.order_index, Chapter.chapter_number, Chapter.id)
+        )
+        chapters = list(result.scalars().all())
+        for chapter in chapters:
+            # 脱离 session：单章落库失败回滚时不会让后续章节的正文过期
+            self.db.expunge(chapter)
+        found = {chapter.id for chapter in chapters}
+        for chapter_id in chapter_ids:
+            if chapter_id not in found:
+                yield chapter_id, NotFoundError("章节不存在或不属于当前项目")
+
+        cached: dict[int, list[EntityChangeProposal]] = {}
+        for chapter in chapters:
+            existing = await self._list_existing_chapter_analysis(project_id, chapter.id)
+            if existing:
+                cached[chapter.id] = existing
+        pending = [chapter for chapter in chapters if chapter.id not in cached]
+
+        entities: dict[str, list[dict[str, Any]]] = {}
+        tasks: dict[int, asyncio.Task] = {}
+        concurrency = concurrency or get_settings().ai.knowledge_analysis_concurrency
+        semaphore = asyncio.Semaphore(concurrency)
+        limiter = asyncio.Semaphore(concurrency)
+        if pending:
+            _cfg, chat_model = await self._get_config_and_model(model_config_id, user_id)
+            entities = await self._load_analysis_entities(project_id)
+
+            async def invoke(chapter: Chapter) -> ChapterKnowledgeAnalysisDraft:
+                # 拿到名额时才构建提示，带上此前已落库章节对快照的更新；名额在本章落库后归还
+                await semaphore.acquire()
+                return await self._draft_chapter_analysis(chat_model, chapter, entities, limiter=limiter)
+
+            tasks = {chapter.id: asyncio.create_task(invoke(chapter)) for chapter in pending}
+
+        try:
+            for chapter in chapters:
+                if chapter.id in cached:
+                    yield chapter.id, self._existing_analysis_response(project_id, chapter.id, cached[chapter.id])
+                    continue
+                outcome: ChapterKnowledgeAnalysisResponse | Exception
+                try:
+                    draft = await tasks[chapter.id]
+                except Exception as exc:
+                    logger.warning("Batch analysis failed for chapter %s: %s", chapter.id, exc)
+                    outcome = exc
+                else:
+                    try:
+                        outcome = await self._apply_chapter_analysis_draft(
+                            project_id, user_id, chapter, draft, entities
+                        )
+                    except Exception as exc:
+                        logger.exception("Failed to apply batch analysis for chapter %s", chapter.id)
+                        await self.db.rollback()
+                        outcome = exc
+                semaphore.release()
+                yield chapter.id, outcome
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    def _existing_analysis_response(
+        self,
+        project_id: int,
+        chapter_id: int,
+        existing: list[EntityChangeProposal],
+    ) -> ChapterKnowledgeAnalysisResponse:
+        return ChapterKnowledgeAnalysisResponse(
+            success=True,
+            project_id=project_id,
+            chapter_id=chapter_id,
+            proposal_count=len(existing),
+            skipped_proposal_count=0,
+            proposals=[self._proposal_response(proposal) for proposal in existing],
+            message="本章已有待处理知识变更提案",
+        )
+
+    async def _draft_chapter_analysis(
+        self,
+        chat_model,
+        chapter: Chapter,
+        entities: dict[str, list[dict[str, Any]]],
+        *,
+        limiter: asyncio.Semaphore | None = None,
+    ) -> ChapterKnowledgeAnalysisDraft:
+        """章节分析草稿。正文超过 knowledge_analysis_chunk_chars 时按段落分段（map-reduce）：
+
+        各段带着只含本段提到的实体的精简快照并发分析，结果按段落顺序确定性地合并去重，
+        单次调用的提示长度与耗时不随章节长度增长。limiter 为模型调用名额，批量分析时由各章节共用，
+        未传入时按 knowledge_analysis_concurrency 新建。
+        """
+        settings = get_settings().ai
+        limiter = limiter or asyncio.Semaphore(settings.knowledge_analysis_concurrency)
+        chunks = split_paragraph_chunks(chapter.content, settings.knowledge_analysis_chunk_chars)
+        if len(chunks) <= 1:
+            async with limiter:
+                return await self._invoke_chapter_analysis(chat_model, chapter, entities)
+
+        index = self._entity_mention_index(entities)
+
+        async def analyze(part: int, chunk: str) -> ChapterKnowledgeAnalysisDraft:
+            async with limiter:
+                return await self._invoke_chapter_analysis(
+                    chat_model,
+                    chapter,
+                    self._prune_analysis_entities(entities, index, chunk),
+                    content=chunk,
+                    part=(part, len(chunks)),
+                )
+
+        logger.info("Chapter %s analysed in %s chunks", chapter.id, len(chunks))
+        drafts = await asyncio.gather(*(analyze(part, chunk) for part, chunk in enumerate(chunks, 1)))
+        return self._merge_chunk_drafts(drafts)
+
+    async def _invoke_chapter_analysis(
+        self,
+        chat_model,
+        chapter: Chapter,
+        entities: dict[str, list[dict[str, Any]]],
+        *,
+        content: str | None = None,
+        part: tuple[int, int] | None = None,
+    ) -> ChapterKnowledgeAnalysisDraft:
+        """调用模型得到章节（或其中一段）的分析草稿；输出无法解析时绕过响应缓存重试一次"""
+        prompt = self._build_chapter_analysis_prompt(chapter, entities, content=content, part=part)
+        structured_model = self._build_structured_model(
+            with_response_cache(chat_model), ChapterKnowledgeAnalysisDraft
+        )
 
         from langchain_core.messages import HumanMessage, SystemMessage
 
         last_error: Exception | None = None
-        for _attempt in range(2):
+        for attempt in range(2):
+            if attempt:
+                # 重试的提示与首次相同：绕过响应缓存，否则会再次拿到同一份无法解析的输出
+                structured_model = self._build_structured_model(chat_model, ChapterKnowledgeAnalysisDraft)
             try:
                 result = await structured_model.ainvoke(
                     [
@@ -394,18 +657,25 @@ class KnowledgeGraphService:
                         HumanMessage(content=prompt),
                     ]
                 )
-                draft = (
+                return (
                     result
                     if isinstance(result, ChapterKnowledgeAnalysisDraft)
                     else ChapterKnowledgeAnalysisDraft.model_validate(result)
                 )
-                break
             except _PARSE_EXCEPTIONS as exc:
                 last_error = exc
-        else:
-            logger.error("Chapter analysis parsing failed for chapter %s: %s", chapter_id, last_error)
-            raise ValidationError("章节知识影响分析失败：模型输出无法解析", detail=str(last_error))
+        logger.error("Chapter analysis parsing failed for chapter %s: %s", chapter.id, last_error)
+        raise ValidationError("章节知识影响分析失败：模型输出无法解析", detail=str(last_error))
 
+    async def _apply_chapter_analysis_draft(
+        self,
+        project_id: int,
+        user_id: int,
+        chapter: Chapter,
+        draft: ChapterKnowledgeAnalysisDraft,
+        entities: dict[str, list[dict[str, Any]]],
+    ) -> ChapterKnowledgeAnalysisResponse:
+        """元数据直写、其余生成待审核提案；生成的提案同时记入 entities 快照"""
         proposals: list[EntityChangeProposalResponse] = []
         skipped = 0
         auto_written = 0
@@ -432,6 +702,7 @@ class KnowledgeGraphService:
                 canon_operations.append(op_draft)
 
             if metadata_applied:
+                await bump_project_revision(self.db, project_id)
                 await self.db.commit()
                 auto_written += metadata_applied
 
@@ -440,6 +711,7 @@ class KnowledgeGraphService:
                 body = self._proposal_body_from_draft(chapter.id, canon_draft, entities)
                 if body is not None:
                     proposals.append(await self.create_proposal(project_id, user_id, body))
+                    self._record_proposal_in_snapshot(entities, body)
                 else:
                     skipped += 1
             else:
@@ -461,6 +733,82 @@ class KnowledgeGraphService:
             message="章节知识影响分析完成" if (proposals or auto_written) else "未发现可写入的知识变更",
         )
 
+    def _record_proposal_in_snapshot(
+        self,
+        entities: dict[str, list[dict[str, Any]]],
+        body: EntityChangeProposalCreate,
+    ) -> None:
+        """把待审核提案的影响记入分析快照（标记 pending），供同一批次后续章节的提示与实体解析使用"""
+        names = {
+            (entity_type, item["id"]): item["name"]
+            for entity_type in ENTITY_MODELS
+            for item in entities.get(entity_type, [])
+            if item.get("id") is not None
+        }
+
+        def ref_name(entity_type: str | None, entity_id: int | None, ref: Any) -> str | None:
+            if isinstance(ref, dict) and ref.get("name"):
+                return ref["name"]
+            return names.get((entity_type, entity_id))
+
+        for operation in body.operations:
+            payload = operation.payload if isinstance(operation.payload, dict) else {}
+            if operation.operation_type == "entity_create" and operation.entity_type and payload.get("name"):
+                entities.setdefault(operation.entity_type, []).append({"id": None, **payload, "pending": True})
+            elif operation.operation_type == "entity_field_update":
+                for item in entities.get(operation.entity_type or "", []):
+                    if item.get("id") == operation.entity_id and operation.field_name in item:
+                        item[operation.field_name] = operation.new_value
+            elif operation.operation_type == "relationship_upsert":
+                entities.setdefault("relationships", []).insert(
+                    0,
+                    {
+                        "source_type": operation.entity_type,
+                        "source_id": operation.entity_id,
+                        "source_name": ref_name(
+                            operation.entity_type, operation.entity_id, payload.get("pending_source_ref")
+                        ),
+                        "relation_type": operation.relation_type,
+                        "target_type": operation.target_type,
+                        "target_id": operation.target_id,
+                        "target_name": ref_name(
+                            operation.target_type, operation.target_id, payload.get("pending_target_ref")
+                        ),
+                        "description": payload.get("description"),
+                        "pending": True,
+                    },
+                )
+            elif operation.operation_type == "relationship_delete":
+                entities["relationships"] = [
+                    item
+                    for item in entities.get("relationships", [])
+                    if not (
+                        item.get("source_type") == operation.entity_type
+                        and item.get("source_id") == operation.entity_id
+                        and item.get("relation_type") == operation.relation_type
+                        and item.get("target_type") == operation.target_type
+                        and item.get("target_id") == operation.target_id
+                    )
+                ]
+            elif operation.operation_type == "entity_state_event":
+                entities.setdefault("state_events", []).insert(
+                    0,
+                    {
+                        "entity_type": operation.entity_type,
+                        "entity_id": operation.entity_id,
+                        "entity_name": ref_name(
+                            operation.entity_type, operation.entity_id, payload.get("pending_entity_ref")
+                        ),
+                        "state_key": operation.state_key,
+                        "new_value": operation.new_value,
+                        "chapter_id": body.chapter_id,
+                        "pending": True,
+                    },
+                )
+        for key in ("relationships", "state_events"):
+            if key in entities:
+                del entities[key][ANALYSIS_HISTORY_LIMIT:]
+
     async def create_proposal(
         self,
         project_id: int,
@@ -591,6 +939,9 @@ class KnowledgeGraphService:
             operation.status = "rejected"
             operation.conflict_reason = None
 
+        if accepted_ops:
+            # 冲突分支由路由层 commit，已应用的部分同样需要让上下文快照失效
+            await bump_project_revision(self.db, proposal.project_id)
         for operation in self._operations_in_apply_order(accepted_ops):
             # Bug 1: 幂等兜底——已应用过的 operation 直接跳过
             if operation.applied_at is not None:
@@ -775,7 +1126,7 @@ class KnowledgeGraphService:
             select(EntityRelationship)
             .where(EntityRelationship.project_id == project_id, EntityRelationship.status == "active")
             .order_by(EntityRelationship.updated_at.desc(), EntityRelationship.id.desc())
-            .limit(50)
+            .limit(ANALYSIS_HISTORY_LIMIT)
         )
         entities["relationships"] = [
             {
@@ -801,7 +1152,7 @@ class KnowledgeGraphService:
                 EntityStateEvent.created_at.desc(),
                 EntityStateEvent.id.desc(),
             )
-            .limit(50)
+            .limit(ANALYSIS_HISTORY_LIMIT)
         )
         entities["state_events"] = [
             {
@@ -828,26 +1179,172 @@ class KnowledgeGraphService:
             "所有输出必须符合结构化 schema，并以 JSON 对象形式返回（json）。"
         )
 
-    def _build_chapter_analysis_prompt(self, chapter: Chapter, entities: dict[str, list[dict[str, Any]]]) -> str:
-        return "\n\n".join(
-            [
-                "请分析本章是否造成角色、组织、地点、世界观的状态或关系变化。",
-                "可用 operation_type：entity_create、entity_field_update、relationship_upsert、relationship_delete、entity_state_event。",
-                "章节中首次出现且会影响后续剧情的新角色、组织、地点或世界观设定，使用 entity_create；entity_name 填名称，payload 填可写字段。",
-                "同一个 proposal 中，后续 relationship_upsert/entity_state_event 可以用 entity_name/target_name 指向刚 entity_create 的新实体。",
-                "字段更新只能使用下面 allowed_fields 中的英文字段名；不确定时优先生成 entity_state_event。",
-                "关系建议使用英文 relation_type，例如 ally_of、enemy_of、member_of、controls、located_in、believes_in、affected_by。",
-                "关系行为不要靠枚举：需要反向关系时在 payload.policy.inverse_relation_type 写反向 relation_type；需要唯一当前关系时写 payload.policy.exclusive_scope=source_relation 或 target_relation。",
-                "状态事件会造成关系收束时，在 payload.relationship_effects 写 [{action:'deactivate', scope:'entity|source|target', relation_type?:'located_in'}]。",
-                "每个 proposal 应是一个故事事件，operations 是这个事件造成的具体影响。",
-                "低风险元数据（如角色最后出现章节、提及次数、候选标签）请使用 extra_attributes 下的 last_seen_chapter、mention_count、candidate_tags，与正史字段更新区分开。",
-                f"章节：第 {chapter.chapter_number} 章《{chapter.title}》",
-                f"章节正文：\n{chapter.content or ''}",
-                "allowed_fields：\n" + _dump_json({key: sorted(value) for key, value in ENTITY_ALLOWED_FIELDS.items()}),
-                "已知实体、已有关系 relationships、最近状态 state_events：\n" + _dump_json(entities),
-            ]
+    def _build_chapter_analysis_prompt(
+        self,
+        chapter: Chapter,
+        entities: dict[str, list[dict[str, Any]]],
+        *,
+        content: str | None = None,
+        part: tuple[int, int] | None = None,
+    ) -> str:
+        """part=(序号, 总段数) 时 content 为章节中的一段，entities 为按本段精简的快照"""
+        heading = f"章节：第 {chapter.chapter_number} 章《{chapter.title}》"
+        if part is not None:
+            heading += f"（第 {part[0]}/{part[1]} 段，只分析本段正文，其余段落由其他调用分析）"
+        sections = [
+            "请分析本章是否造成角色、组织、地点、世界观的状态或关系变化。",
+            "可用 operation_type：entity_create、entity_field_update、relationship_upsert、relationship_delete、entity_state_event。",
+            "章节中首次出现且会影响后续剧情的新角色、组织、地点或世界观设定，使用 entity_create；entity_name 填名称，payload 填可写字段。",
+            "同一个 proposal 中，后续 relationship_upsert/entity_state_event 可以用 entity_name/target_name 指向刚 entity_create 的新实体。",
+            "字段更新只能使用下面 allowed_fields 中的英文字段名；不确定时优先生成 entity_state_event。",
+            "关系建议使用英文 relation_type，例如 ally_of、enemy_of、member_of、controls、located_in、believes_in、affected_by。",
+            "关系行为不要靠枚举：需要反向关系时在 payload.policy.inverse_relation_type 写反向 relation_type；需要唯一当前关系时写 payload.policy.exclusive_scope=source_relation 或 target_relation。",
+            "状态事件会造成关系收束时，在 payload.relationship_effects 写 [{action:'deactivate', scope:'entity|source|target', relation_type?:'located_in'}]。",
+            "每个 proposal 应是一个故事事件，operations 是这个事件造成的具体影响。",
+            "低风险元数据（如角色最后出现章节、提及次数、候选标签）请使用 extra_attributes 下的 last_seen_chapter、mention_count、candidate_tags，与正史字段更新区分开。",
+            heading,
+            f"章节正文：\n{(chapter.content if content is None else content) or ''}",
+            "allowed_fields：\n" + _dump_json({key: sorted(value) for key, value in ENTITY_ALLOWED_FIELDS.items()}),
+            "已知实体、已有关系 relationships、最近状态 state_events：\n" + _dump_json(entities),
+        ]
+        if part is not None:
+            sections.append(
+                "已知实体只列出本段提到的实体及其关系、状态；known_entity_names 是项目的全部实体名，"
+                "本段提到其中的名字时不要再用 entity_create 新建。"
+            )
+        if self._snapshot_has_pending(entities):
+            sections.append(
+                "标记 pending=true 的条目来自本批次前面章节、尚待审核的提案，视为已发生的剧情；"
+                "pending 的新实体尚未入库，本章需要引用时仍在同一 proposal 中用 entity_create 声明。"
+            )
+        return "\n\n".join(sections)
+
+    @staticmethod
+    def _snapshot_has_pending(entities: dict[str, list[dict[str, Any]]]) -> bool:
+        return any(item.get("pending") for items in entities.values() if isinstance(items, list) for item in items)
+
+    @staticmethod
+    def _entity_mention_index(entities: dict[str, list[dict[str, Any]]]) -> MentionIndex:
+        return MentionIndex(
+            (item["name"], (entity_type, str(item["name"]).strip().casefold()))
+            for entity_type in ENTITY_MODELS
+            for item in entities.get(entity_type, [])
+            if item.get("name")
         )
 
+    @staticmethod
+    def _prune_analysis_entities(
+        entities: dict[str, list[dict[str, Any]]],
+        index: MentionIndex,
+        text: str,
+    ) -> dict[str, Any]:
+        """只保留 text 中提到的实体、涉及它们的关系与状态事件，另附全部实体名供去重"""
+        mentioned = {key for _start, _end, keys in index.matches(text) for key in keys}
+
+        def is_mentioned(entity_type: str | None, name: Any) -> bool:
+            return bool(name) and (entity_type, str(name).strip().casefold()) in mentioned
+
+        pruned: dict[str, Any] = {
+            entity_type: [item for item in entities.get(entity_type, []) if is_mentioned(entity_type, item.get("name"))]
+            for entity_type in ENTITY_MODELS
+        }
+        pruned["relationships"] = [
+            item
+            for item in entities.get("relationships", [])
+            if is_mentioned(item.get("source_type"), item.get("source_name"))
+            or is_mentioned(item.get("target_type"), item.get("target_name"))
+        ]
+        pruned["state_events"] = [
+            item
+            for item in entities.get("state_events", [])
+            if is_mentioned(item.get("entity_type"), item.get("entity_name"))
+        ]
+        pruned["known_entity_names"] = {
+            entity_type: [item["name"] for item in entities.get(entity_type, []) if item.get("name")]
+            for entity_type in ENTITY_MODELS
+        }
+        return pruned
+
+    @staticmethod
+    def _merge_chunk_drafts(drafts: Sequence[ChapterKnowledgeAnalysisDraft]) -> ChapterKnowledgeAnalysisDraft:
+        """按段落顺序合并分段分析结果（与各段调用的完成顺序无关）。
+
+        - 完全相同的 operation 只保留首次出现
+        - 同一实体同一字段的 entity_field_update 只保留一条，取最后一段的值（剧情以靠后者为准）；
+          extra_attributes 元数据按键合并
+        - 新建同名实体的提案并入首个新建它的提案，同一提案内对新实体的引用仍可解析
+        - 合并后没有 operation 的提案丢弃
+        """
+
+        def norm(value: Any) -> str:
+            return str(value or "").strip().casefold()
+
+        def created_key(op: KnowledgeOperationDraft) -> tuple[str | None, str]:
+            payload = op.payload if isinstance(op.payload, dict) else {}
+            return op.entity_type, norm(op.entity_name or payload.get("name"))
+
+        def operation_key(op: KnowledgeOperationDraft) -> tuple:
+            if op.operation_type == "entity_create":
+                return ("entity_create", *created_key(op))
+            return (
+                op.operation_type,
+                op.entity_type,
+                norm(op.entity_name),
+                op.field_name,
+                op.relation_type,
+                op.target_type,
+                norm(op.target_name),
+                op.state_key,
+                json.dumps(op.new_value, ensure_ascii=False, sort_keys=True, default=str),
+            )
+
+        merged: list[tuple[KnowledgeProposalDraft, list[KnowledgeOperationDraft], list[str]]] = []
+        creators: dict[tuple[str | None, str], int] = {}
+        field_updates: dict[tuple[str | None, str, str | None], tuple[int, int]] = {}
+        seen: set[tuple] = set()
+        notes: list[str] = []
+
+        for draft in drafts:
+            if draft.notes:
+                notes.append(draft.notes)
+            for proposal in draft.proposals:
+                creates = [created_key(op) for op in proposal.operations if op.operation_type == "entity_create"]
+                target = next((creators[key] for key in creates if key in creators), None)
+                if target is None:
+                    target = len(merged)
+                    merged.append((proposal, [], []))
+                for key in creates:
+                    creators.setdefault(key, target)
+                operations, evidence = merged[target][1], merged[target][2]
+                if proposal.evidence and proposal.evidence not in evidence:
+                    evidence.append(proposal.evidence)
+
+                for op in proposal.operations:
+                    key = operation_key(op)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    if op.operation_type == "entity_field_update":
+                        field_key = (op.entity_type, norm(op.entity_name), op.field_name)
+                        if field_key in field_updates:
+                            at, position = field_updates[field_key]
+                            previous = merged[at][1][position]
+                            new_value = op.new_value
+                            if isinstance(previous.new_value, dict) and isinstance(new_value, dict):
+                                new_value = {**previous.new_value, **new_value}
+                            merged[at][1][position] = previous.model_copy(update={"new_value": new_value})
+                            continue
+                        field_updates[field_key] = (target, len(operations))
+                    operations.append(op)
+
+        proposals = [
+            proposal.model_copy(update={"operations": operations, "evidence": "\n".join(evidence) or None})
+            for proposal, operations, evidence in merged
+            if operations
+        ]
+        # 各段提案数之和可能超过单次输出的上限，合并结果不再按 schema 校验
+        return ChapterKnowledgeAnalysisDraft.model_construct(proposals=proposals, notes="\n".join(notes) or None)
+
     def _proposal_body_from_draft(
         self,
         chapter_id: int,
@@ -2170,9 +2667,13 @@ async def _run_chapter_analysis_background(
     user_id: int,
     model_config_id: int,
     *,
+    reraise: bool = False,
     _db_session: AsyncSession | None = None,
 ) -> None:
-    """章节知识分析后台任务。支持注入 _db_session 供测试使用。"""
+    """章节知识分析后台任务。支持注入 _db_session 供测试使用。
+
+    reraise=True 时在标记 AIRun failed 后重新抛出异常，交给持久化任务队列按退避重试。
+    """
     if _db_session is not None:
         session = _db_session
         should_close = False
@@ -2193,16 +2694,17 @@ async def _run_chapter_analysis_background(
 
         run.status = RunStatus.RUNNING.value
         run.started_at = _now()
+        run.error_message = None
         await session.commit()
 
-        async with _CHAPTER_ANALYSIS_SEMAPHORE:
-            service = KnowledgeGraphService(session)
-            await service.analyze_chapter(
-                project_id,
-                chapter_id,
-                user_id,
-                model_config_id=model_config_id,
-            )
+        # 批量发布时的 LLM 调用由模型所属 API Key 的限流器排队（rate_limiter.provider_rate_limiters）
+        service = KnowledgeGraphService(session)
+        await service.analyze_chapter(
+            project_id,
+            chapter_id,
+            user_id,
+            model_config_id=model_config_id,
+        )
 
         run.status = RunStatus.SUCCEEDED.value
         run.finished_at = _now()
@@ -2238,6 +2740,133 @@ async def _run_chapter_analysis_background(
                 await session.commit()
             except Exception:
                 logger.exception("Failed to update AIRun to failed state run=%s", run_id)
+        if reraise:
+            raise
+    finally:
+        if should_close:
+            await session.close()
+
+
+async def _mark_analysis_run_failed(payload: dict, error: str) -> None:
+    """任务最终失败（含执行进程反复中断）时，确保 AIRun 不停留在 pending / running"""
+    from app.infrastructure.db.session import get_session_factory
+
+    async with get_session_factory()() as session:
+        run = await session.get(AIRun, payload["run_id"])
+        if run is None or run.status in (RunStatus.SUCCEEDED.value, RunStatus.FAILED.value):
+            return
+        run.status = RunStatus.FAILED.value
+        run.error_message = (error or "后台任务多次中断，已放弃")[:500]
+        run.finished_at = _now()
+        await session.commit()
+
+
+@register_job_handler(CHAPTER_ANALYSIS_JOB, on_exhausted=_mark_analysis_run_failed)
+async def _chapter_analysis_job(payload: dict) -> None:
+    """持久化任务入口：每次（重试）执行都重新分析该章节"""
+    await _run_chapter_analysis_background(
+        payload["run_id"],
+        payload["project_id"],
+        payload["chapter_id"],
+        payload["user_id"],
+        payload["model_config_id"],
+        reraise=True,
+    )
+
+
+async def _run_batch_chapter_analysis_background(
+    payload: dict,
+    *,
+    _db_session: AsyncSession | None = None,
+) -> None:
+    """多章节合并分析任务：逐章更新各自的 AIRun。支持注入 _db_session 供测试使用。
+
+    已成功的章节在重试时跳过；有章节失败时在全部章节处理完后抛出异常，
+    交给持久化任务队列按退避重试失败的章节。
+    """
+    if _db_session is not None:
+        session = _db_session
+        should_close = False
+    else:
+        from app.infrastructure.db.session import get_session_factory
+
+        session = get_session_factory()()
+        should_close = True
+
+    runs: dict[int, AIRun] = {}
+    try:
+        run_ids = {item["run_id"]: item["chapter_id"] for item in payload["runs"]}
+        result = await session.execute(select(AIRun).where(AIRun.id.in_(list(run_ids))))
+        for run in result.scalars().all():
+            if run.status != RunStatus.SUCCEEDED.value:
+                runs[run_ids[run.id]] = run
+        if not runs:
+            return
+
+        started_at = _now()
+        for run in runs.values():
+            run.status = RunStatus.RUNNING.value
+            run.started_at = started_at
+            run.error_message = None
+            run.finished_at = None
+        await session.commit()
+
+        service = KnowledgeGraphService(session)
+        failed = 0
+        async for chapter_id, outcome in service.analyze_chapters(
+            payload["project_id"],
+            list(runs),
+            payload["user_id"],
+            model_config_id=payload["model_config_id"],
+        ):
+            run = runs.pop(chapter_id, None)
+            if run is None:
+                continue
+            if isinstance(outcome, Exception):
+                failed += 1
+                run.status = RunStatus.FAILED.value
+                run.error_message = str(outcome)[:500] or type(outcome).__name__
+            else:
+                run.status = RunStatus.SUCCEEDED.value
+            run.finished_at = _now()
+            await session.commit()
+
+        if failed:
+            raise RuntimeError(f"{failed} 个章节知识分析失败")
+    except asyncio.CancelledError:
+        await _fail_remaining_runs(session, runs, "分析超时或被取消")
+        raise
+    except Exception as exc:
+        logger.exception("Batch chapter analysis failed project=%s", payload.get("project_id"))
+        await _fail_remaining_runs(session, runs, str(exc)[:500])
+        raise
     finally:
         if should_close:
             await session.close()
+
+
+async def _fail_remaining_runs(session: AsyncSession, runs: dict[int, AIRun], error: str) -> None:
+    """批量任务中断时，未产出结果的章节 AIRun 标记 failed"""
+    if not runs:
+        return
+    try:
+        finished_at = _now()
+        for run in runs.values():
+            run.status = RunStatus.FAILED.value
+            run.error_message = error
+            run.finished_at = finished_at
+        await session.commit()
+    except Exception:
+        logger.exception("Failed to update batch AIRuns to failed state")
+
+
+async def _mark_batch_analysis_runs_failed(payload: dict, error: str) -> None:
+    """批量任务最终失败时，确保各章节的 AIRun 不停留在 pending / running"""
+    for item in payload.get("runs", []):
+        await _mark_analysis_run_failed(item, error)
+
+
+@register_job_handler(CHAPTER_BATCH_ANALYSIS_JOB, on_exhausted=_mark_batch_analysis_runs_failed)
+async def _chapter_batch_analysis_job(payload: dict) -> None:
+    """持久化任务入口：批量发布的多章节合并分析"""
+    await _run_batch_chapter_analysis_background(payload)
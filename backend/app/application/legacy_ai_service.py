@@ -15,6 +15,7 @@ from datetime import datetime
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import get_settings
 from app.core.exceptions import ForbiddenError, NotFoundError, ValidationError
 from app.infrastructure.db.models.model_configs import ModelConfig
 from app.infrastructure.secrets import get_encryption_service
@@ -64,6 +65,7 @@ class LegacyAIService:
 
     async def _get_config_and_model(self, config_id: int, user_id: int):
         """获取模型配置并构建 ChatModel"""
+        from app.infrastructure.llm.model_pool import chat_model_pool
         from app.infrastructure.llm.provider_adapters import ProviderConfig, get_provider
 
         result = await self.db.execute(
@@ -88,7 +90,7 @@ class LegacyAIService:
             api_url=cfg.api_url,
             proxy_url=cfg.proxy_url if cfg.enable_proxy else None,
         )
-        return provider.build_chat_model(pcfg)
+        return await chat_model_pool.get(provider, pcfg, model_config_id=cfg.id)
 
     async def _build_chat_system_prompt(
         self,
@@ -106,10 +108,7 @@ class LegacyAIService:
         from app.application.prompt_template_service import PromptTemplateService
 
         template = await PromptTemplateService(self.db).get_template(prompt_template_id, user_id)
-        context_builder = AIContextBuilder(self.db)
-        project_context = context_builder.format_for_chat_with_budget(
-            await context_builder.get_project_context(project.id, mode="chat")
-        )
+        project_context = await AIContextBuilder(self.db).get_chat_context_text(project.id, focus_texts=[message])
         recent_history = history[-10:] if history else []
         history_lines = [
             f"助手: {msg.get('content', '')}" if msg.get("role") == "assistant" else f"用户: {msg.get('content', '')}"
@@ -175,23 +174,32 @@ class LegacyAIService:
         chat_model,
         *,
         stage: dict,
+        user_id: int,
     ) -> str | None:
         """获取分层章节上下文并按 stage 渲染为 prompt 段。
 
         无 current_chapter_id 时返回 None（向后兼容旧无章节注入路径）。
-        摘要生成失败的章节在渲染段中标记『（摘要生成失败，本章已跳过）』，
-        不致命；只有 LLM context 超限错误才会冒出到外层降级链。
+        开启摘要预生成（AI_SUMMARY_PREFETCH_ENABLED）时只读已有摘要，缺失的章节
+        标记『（摘要后台生成中，本章已跳过）』；关闭时按需当场生成，失败的章节标记
+        『（摘要生成失败，本章已跳过）』。都不致命；只有 LLM context 超限错误才会冒出到外层降级链。
         """
         if not current_chapter_id:
             return None
         from app.application.ai_context_builder import AIContextBuilder
+        from app.application.chapter_summary_service import chapter_summary_scheduler
 
         builder = AIContextBuilder(self.db)
-        tiered = await builder.get_tiered_chapter_context(
-            project_id=project_id,
-            current_chapter_id=current_chapter_id,
-            chat_model=chat_model,
-        )
+        if get_settings().ai.summary_prefetch_enabled:
+            # 只读已有摘要，过期章节交给后台立即生成，本次对话不等 LLM
+            tiered = await builder.get_tiered_chapter_context(project_id, current_chapter_id)
+            for chapter_id in tiered.pending_chapter_ids:
+                chapter_summary_scheduler.schedule(project_id, chapter_id, user_id, delay=0)
+        else:
+            tiered = await builder.get_tiered_chapter_context(
+                project_id=project_id,
+                current_chapter_id=current_chapter_id,
+                chat_model=chat_model,
+            )
         return AIContextBuilder.render_tiered_chapter_segment(
             tiered,
             l1_tail_chars=stage["l1_tail_chars"],
@@ -214,7 +222,8 @@ class LegacyAIService:
 
         import app.infrastructure.graph.workflows  # noqa: F401
         from app.infrastructure.graph.chat_assistant_types import ChatAssistantContext
-        from app.infrastructure.graph.registry import graph_registry
+        from app.infrastructure.graph.instrumentation import RunMetricsHandler, with_callback
+        from app.infrastructure.graph.registry import bind_model, graph_registry
 
         injected_system_prompt = await self._build_chat_system_prompt(
             project=project,
@@ -224,11 +233,13 @@ class LegacyAIService:
             prompt_template_id=prompt_template_id,
         )
 
-        graph = graph_registry.get("chat_assistant")(model=model)
+        graph = graph_registry.compile("chat_assistant")
+        # 与 chat_stream 相同：节点耗时、TTFT、生成速度与 provider 调用数计入 metrics
+        config = with_callback(bind_model(model), RunMetricsHandler("chat_assistant"))
         last_error: Exception | None = None
         for stage in DEGRADATION_STAGES:
             chapter_segment = await self._load_tiered_chapter_segment(
-                project_id, current_chapter_id, model, stage=stage
+                project_id, current_chapter_id, model, stage=stage, user_id=user_id
             )
             context = ChatAssistantContext(
                 project_id=project_id,
@@ -239,6 +250,7 @@ class LegacyAIService:
             try:
                 result = await graph.ainvoke(
                     {"messages": self._build_chat_messages(message, history)},
+                    config=config,
                     context=context,
                 )
                 break
@@ -285,7 +297,8 @@ class LegacyAIService:
 
         import app.infrastructure.graph.workflows  # noqa: F401
         from app.infrastructure.graph.chat_assistant_types import ChatAssistantContext
-        from app.infrastructure.graph.registry import graph_registry
+        from app.infrastructure.graph.instrumentation import RunMetricsHandler, with_callback
+        from app.infrastructure.graph.registry import bind_model, graph_registry
         from app.infrastructure.graph.sse_events import stream_agent_events
 
         injected_system_prompt = await self._build_chat_system_prompt(
@@ -296,7 +309,9 @@ class LegacyAIService:
             prompt_template_id=prompt_template_id,
         )
 
-        graph = graph_registry.get("chat_assistant")(model=model)
+        graph = graph_registry.compile("chat_assistant")
+        # 节点耗时、TTFT、生成速度与 provider 调用数经回调计入 metrics
+        config = with_callback(bind_model(model), RunMetricsHandler("chat_assistant"))
 
         # 流式场景：先尝试每个 stage 的"准备阶段"——因为 SSE 一旦开始 yield 就无法回滚，
         # 这里只是把章节段渲染为 stage[0] 默认值；如果整个 ainvoke 在第一个 chunk 之前抛
@@ -305,7 +320,7 @@ class LegacyAIService:
             last_error: Exception | None = None
             for stage in DEGRADATION_STAGES:
                 chapter_segment = await self._load_tiered_chapter_segment(
-                    project_id, current_chapter_id, model, stage=stage
+                    project_id, current_chapter_id, model, stage=stage, user_id=user_id
                 )
                 context = ChatAssistantContext(
                     project_id=project_id,
@@ -316,7 +331,7 @@ class LegacyAIService:
                 input_state = {"messages": self._build_chat_messages(message, history)}
                 stage_started = False
                 try:
-                    async for event in stream_agent_events(graph, input_state, context=context):
+                    async for event in stream_agent_events(graph, input_state, context=context, config=config):
                         stage_started = True
                         yield event
                     if prompt_template_id is not None:
@@ -4,6 +4,7 @@
 - CRUD + 加密/解密/遮盖
 - stop_sequences JSON 序列化
 - provider 连接测试、模型列表
+- 配置更新 / 删除后失效 ChatModel 复用池中的对应实例
 """
 
 import json
@@ -15,6 +16,7 @@ from app.core.exceptions import NotFoundError
 from app.core.model_scenarios import DEFAULT_SCENARIOS
 from app.infrastructure.db.models.model_configs import ModelConfig
 from app.infrastructure.db.repositories.base import BaseRepository
+from app.infrastructure.llm.model_pool import chat_model_pool
 from app.infrastructure.secrets import get_encryption_service
 from app.schemas.model_configs import (
     ListModelsRequest,
@@ -165,6 +167,7 @@ class ModelConfigService:
             setattr(cfg, key, value)
 
         await self.db.commit()
+        chat_model_pool.invalidate(config_id)
         await self.db.refresh(cfg)
         return self._attach_masked_key(cfg)
 
@@ -173,6 +176,7 @@ class ModelConfigService:
         cfg = await self._get_user_config(config_id, user_id)
         await self.db.delete(cfg)
         await self.db.commit()
+        chat_model_pool.invalidate(config_id)
         return {"message": f"模型配置 '{cfg.name}' 已成功删除"}
 
     # ---------- 连接测试 & 模型列表 ----------
@@ -8,6 +8,7 @@
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.application.context_cache import bump_project_revision, project_context_cache
 from app.core.exceptions import ConflictError, NotFoundError
 from app.infrastructure.db.models.projects import Project
 from app.infrastructure.db.repositories.project import ProjectRepository
@@ -59,6 +60,7 @@ class ProjectService:
         project = await self.require_user_project(project_id, user_id)
         for key, value in body.model_dump(exclude_unset=True).items():
             setattr(project, key, value)
+        await bump_project_revision(self.db, project_id)
         await self.db.commit()
         await self.db.refresh(project)
         return project
@@ -68,4 +70,5 @@ class ProjectService:
         project = await self.require_user_project(project_id, user_id)
         await self.db.delete(project)
         await self.db.commit()
+        project_context_cache.invalidate(project_id)
         return {"message": f"项目 '{project.name}' 已成功删除"}
@@ -8,6 +8,7 @@ from __future__ import annotations
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.application.context_cache import bump_project_revision
 from app.application.entity_integrity import cleanup_entity_references
 from app.core.exceptions import NotFoundError
 from app.infrastructure.db.models.projects import Project
@@ -71,6 +72,7 @@ class WorldbuildingService:
         model = _get_model(entity_type)
         entity = model(**data, project_id=project_id)
         self.db.add(entity)
+        await bump_project_revision(self.db, project_id)
         await self.db.commit()
         await self.db.refresh(entity)
         return entity
@@ -88,6 +90,7 @@ class WorldbuildingService:
         entity = await self._require_entity(project_id, model, entity_id, user_id)
         for key, value in data.items():
             setattr(entity, key, value)
+        await bump_project_revision(self.db, project_id)
         await self.db.commit()
         await self.db.refresh(entity)
         return entity
@@ -109,6 +112,7 @@ class WorldbuildingService:
             entity_id=entity_id,
         )
         await self.db.delete(entity)
+        await bump_project_revision(self.db, project_id)
         await self.db.commit()
 
     async def get_entity_by_id(
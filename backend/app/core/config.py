@@ -3,6 +3,8 @@
 使用 Pydantic Settings 统一管理所有配置项
 """
 
+from typing import Literal
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -125,6 +127,148 @@ class FeatureFlags(BaseSettings):
     )
 
 
+class AISettings(BaseSettings):
+    """AI 运行时配置"""
+
+    summary_prefetch_enabled: bool = Field(
+        default=True,
+        description="章节正文变更后是否在后台预生成 L2/L3 分层摘要",
+    )
+    summary_debounce_seconds: float = Field(
+        default=30.0,
+        ge=0,
+        description="同一章节摘要预生成的防抖窗口（秒），窗口内的重复保存只触发一次",
+    )
+    knowledge_analysis_concurrency: int = Field(
+        default=4,
+        ge=1,
+        description="批量发布时多章节知识分析同时进行的模型调用数，结果仍按章节顺序落库",
+    )
+    knowledge_analysis_chunk_chars: int = Field(
+        default=6000,
+        ge=0,
+        description="章节知识分析的分段阈值（字）：正文更长时按段落分段并发分析再合并，0 表示不分段",
+    )
+    model_pool_size: int = Field(
+        default=32,
+        ge=1,
+        description="进程内复用的 ChatModel 实例上限（按模型配置指纹 LRU 淘汰）",
+    )
+    llm_requests_per_minute: int = Field(
+        default=0,
+        ge=0,
+        description="同一 API Key 每分钟最多发起的模型调用数（0 = 不限流，默认）；遇 429 自动减半再逐步回升",
+    )
+    llm_tokens_per_minute: int = Field(
+        default=0,
+        ge=0,
+        description="同一 API Key 每分钟最多消耗的 token 数（0 = 不限）",
+    )
+    llm_queue_timeout_seconds: float = Field(
+        default=120.0,
+        gt=0,
+        description="模型调用排队等待限流令牌的最长时间（秒），超时返回 429",
+    )
+    llm_cache_enabled: bool = Field(
+        default=False,
+        description="是否为摘要 / 知识分析 / 角色规划等确定性调用启用本地 LLM 响应缓存",
+    )
+    llm_cache_sampled: bool = Field(
+        default=False,
+        description="temperature > 0 的模型是否也走响应缓存（默认绕过）",
+    )
+    llm_cache_path: str = Field(
+        default="./llm_cache.db",
+        description="LLM 响应缓存的 SQLite 文件路径",
+    )
+    llm_cache_max_entries: int = Field(
+        default=5000,
+        ge=1,
+        description="LLM 响应缓存条目上限（按最近访问 LRU 淘汰）",
+    )
+    llm_cache_ttl_seconds: float = Field(
+        default=7 * 24 * 3600,
+        gt=0,
+        description="LLM 响应缓存条目有效期（秒）",
+    )
+    stream_coalesce_ms: float = Field(
+        default=50.0,
+        ge=0,
+        description="流式输出合并窗口（毫秒）：窗口内的 token 片段合成一个事件推送（0 = 不按时间合并）",
+    )
+    stream_coalesce_chars: int = Field(
+        default=64,
+        ge=0,
+        description="流式输出合并的字符数上限，攒够即推送（与合并窗口同为 0 时逐片段推送）",
+    )
+    run_event_flush_seconds: float = Field(
+        default=1.0,
+        ge=0,
+        description="运行事件（AIRunEvent）缓冲批量落库的间隔（秒）；节点结束与终止状态总会立即落库",
+    )
+    run_event_bus: Literal["memory", "redis"] = Field(
+        default="memory",
+        description="run 实时事件总线后端：memory（单进程）/ redis（多 worker 共享，SSE 可落在任意 worker）",
+    )
+    run_event_bus_url: str | None = Field(
+        default=None,
+        description="redis 事件总线地址，如 redis://localhost:6379/0",
+    )
+    task_run_in_api: bool = Field(
+        default=True,
+        description="API 进程是否执行持久化后台任务；部署独立 worker（python -m app.worker）时设为 false，API 只入队",
+    )
+    task_poll_seconds: float = Field(
+        default=2.0,
+        gt=0,
+        description="持久化后台任务的轮询间隔（秒）：领取到期的排队 / 重试任务与租约过期的任务",
+    )
+    task_lease_seconds: int = Field(
+        default=60,
+        ge=5,
+        description="后台任务租约时长（秒），执行期间每 1/3 租约续租；进程崩溃后租约过期即被重新领取",
+    )
+    task_concurrency: int = Field(
+        default=4,
+        ge=1,
+        description="单个进程同时执行的持久化后台任务数上限",
+    )
+    task_user_concurrency: int = Field(
+        default=2,
+        ge=0,
+        description="同一用户在所有 worker 上同时执行的持久化后台任务数上限（0 不限），防止一个用户的批量任务占满并发",
+    )
+    task_max_attempts: int = Field(
+        default=3,
+        ge=1,
+        description="后台任务最多执行次数（含首次），用尽后标记 failed",
+    )
+    task_retry_base_seconds: float = Field(
+        default=10.0,
+        ge=0,
+        description="后台任务失败重试的基础退避（秒），按 2^(次数-1) 递增",
+    )
+    task_retry_max_seconds: float = Field(
+        default=600.0,
+        ge=0,
+        description="后台任务重试退避上限（秒）",
+    )
+    scripted_provider_enabled: bool = Field(
+        default=False,
+        description="是否允许使用离线回放的 scripted provider（压测 / 基准测试用，生产环境勿开）",
+    )
+    scripted_provider_script: str | None = Field(
+        default=None,
+        description="scripted provider 的录制脚本 JSON 路径；为空时按参数生成占位回复",
+    )
+
+    model_config = SettingsConfigDict(
+        env_prefix="AI_",
+        env_file=".env",
+        extra="ignore",
+    )
+
+
 class Settings:
     """聚合所有配置，统一入口"""
 
@@ -135,6 +279,7 @@ class Settings:
         self.encryption = EncryptionSettings()
         self.cors = CORSSettings()
         self.ff = FeatureFlags()
+        self.ai = AISettings()
 
     @property
     def is_dev(self) -> bool:
@@ -70,6 +70,14 @@ class ExternalServiceError(AppException):
     message = "外部服务调用失败"
 
 
+class ProviderBusyError(AppException):
+    """模型服务限流队列已满（排队超时）"""
+
+    status_code = 429
+    error_code = "PROVIDER_BUSY"
+    message = "模型服务繁忙，请稍后再试"
+
+
 # ── FastAPI 异常处理器注册 ────────────────────────────────────
 
 
@@ -4,6 +4,11 @@
 职责：
 - 收集请求量、响应时间、错误率
 - 收集 AI run 成功率、耗时、token 使用量
+- 收集 LLM 调用的输入 token 与 provider 提示缓存命中 / 写入 token
+- 收集模型调用的首 token 时间（TTFT）与输出 token/s、图节点与工具调用耗时
+- 收集 LLM 响应缓存命中 / 未命中
+- 收集 provider 限流：排队等待时长、排队超时拒绝数、provider 返回 429 次数
+- 收集图编译缓存：编译耗时与命中缓存节省的编译时间
 - 提供 /metrics 端点供运维查询
 - 预留 Prometheus 导出接口
 
@@ -80,13 +85,38 @@ class MetricsCollector:
         self.ai_run_latency = _Histogram()  # seconds
         self.ai_tokens_used = _Counter()
 
+        # ── LLM 调用 token / 提示缓存 ──
+        self.llm_input_tokens = _Counter()
+        self.llm_output_tokens = _Counter()
+        self.llm_cache_read_tokens = _Counter()
+        self.llm_cache_creation_tokens = _Counter()
+
         # ── Provider 指标 ──
         self.provider_calls: dict[str, int] = defaultdict(int)
         self.provider_errors: dict[str, int] = defaultdict(int)
+        self.llm_ttft: dict[str, _Histogram] = defaultdict(_Histogram)  # seconds
+        self.llm_tokens_per_second: dict[str, _Histogram] = defaultdict(_Histogram)
+
+        # ── LLM 响应缓存 ──
+        self.llm_cache_hits = _Counter()
+        self.llm_cache_misses = _Counter()
+
+        # ── Provider 限流（按限流器标签：provider:key 指纹）──
+        self.rate_limit_wait: dict[str, _Histogram] = defaultdict(_Histogram)  # seconds
+        self.rate_limit_rejections: dict[str, int] = defaultdict(int)
+        self.rate_limit_throttled: dict[str, int] = defaultdict(int)
+
+        # ── AI 工作调度（按队列 scope 与调度类别）──
+        self.scheduler_queued: dict[tuple[str, str], int] = defaultdict(int)
+        self.scheduler_wait: dict[tuple[str, str], _Histogram] = defaultdict(_Histogram)  # seconds
 
         # ── Graph 节点指标 ──
         self.node_latency: dict[str, _Histogram] = defaultdict(_Histogram)
 
+        # ── Graph 编译缓存（按 workflow_type）──
+        self.graph_compile_latency: dict[str, _Histogram] = defaultdict(_Histogram)  # ms, 未命中
+        self.graph_compile_saved: dict[str, _Histogram] = defaultdict(_Histogram)  # ms, 命中
+
         self._started_at = time.time()
 
     # ── HTTP 记录 ──
@@ -116,14 +146,70 @@ class MetricsCollector:
         if tokens:
             self.ai_tokens_used.inc(tokens)
 
+    def record_llm_usage(
+        self,
+        *,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cache_read_tokens: int = 0,
+        cache_creation_tokens: int = 0,
+    ) -> None:
+        """单次模型调用的 token 用量；cache_* 为输入 token 中命中 / 写入提示缓存的部分。"""
+        self.llm_input_tokens.inc(input_tokens)
+        self.llm_output_tokens.inc(output_tokens)
+        self.llm_cache_read_tokens.inc(cache_read_tokens)
+        self.llm_cache_creation_tokens.inc(cache_creation_tokens)
+
     def record_provider_call(self, provider: str, error: bool = False) -> None:
         self.provider_calls[provider] = self.provider_calls.get(provider, 0) + 1
         if error:
             self.provider_errors[provider] = self.provider_errors.get(provider, 0) + 1
 
+    def record_llm_latency(
+        self,
+        provider: str,
+        *,
+        ttft_s: float | None = None,
+        tokens_per_second: float | None = None,
+    ) -> None:
+        """单次模型调用的首 token 时间与输出速度（按 provider）。"""
+        if ttft_s is not None:
+            self.llm_ttft[provider].observe(ttft_s)
+        if tokens_per_second is not None:
+            self.llm_tokens_per_second[provider].observe(tokens_per_second)
+
+    def record_llm_cache(self, *, hit: bool) -> None:
+        (self.llm_cache_hits if hit else self.llm_cache_misses).inc()
+
+    def record_rate_limit_wait(self, limiter: str, wait_s: float) -> None:
+        self.rate_limit_wait[limiter].observe(wait_s)
+
+    def record_rate_limit_rejection(self, limiter: str) -> None:
+        self.rate_limit_rejections[limiter] = self.rate_limit_rejections.get(limiter, 0) + 1
+
+    def record_rate_limit_throttled(self, limiter: str) -> None:
+        self.rate_limit_throttled[limiter] = self.rate_limit_throttled.get(limiter, 0) + 1
+
+    def adjust_queue_depth(self, scope: str, work_class: str, delta: int) -> None:
+        self.scheduler_queued[(scope, work_class)] += delta
+
+    def set_queue_depth(self, scope: str, depths: dict[str, int]) -> None:
+        """整体覆盖某个队列各类别的排队数（由数据库统计得出的队列）"""
+        for key in [key for key in self.scheduler_queued if key[0] == scope]:
+            self.scheduler_queued[key] = 0
+        for work_class, depth in depths.items():
+            self.scheduler_queued[(scope, work_class)] = depth
+
+    def record_queue_wait(self, scope: str, work_class: str, wait_s: float) -> None:
+        self.scheduler_wait[(scope, work_class)].observe(wait_s)
+
     def record_node(self, node_name: str, duration_s: float) -> None:
         self.node_latency[node_name].observe(duration_s)
 
+    def record_graph_compile(self, workflow_type: str, *, hit: bool, compile_s: float) -> None:
+        """未命中记录实际编译耗时；命中记录该图当初的编译耗时（即本次节省的时间）。"""
+        (self.graph_compile_saved if hit else self.graph_compile_latency)[workflow_type].observe(compile_s * 1000)
+
     # ── 快照导出 ──
 
     def snapshot(self) -> dict:
@@ -144,13 +230,64 @@ class MetricsCollector:
                 "run_latency_s": self.ai_run_latency.snapshot(),
                 "tokens_used": self.ai_tokens_used.value,
             },
+            "llm_usage": {
+                "input_tokens": self.llm_input_tokens.value,
+                "output_tokens": self.llm_output_tokens.value,
+                "cache_read_tokens": self.llm_cache_read_tokens.value,
+                "cache_creation_tokens": self.llm_cache_creation_tokens.value,
+                "cache_hit_ratio": (
+                    round(self.llm_cache_read_tokens.value / self.llm_input_tokens.value, 4)
+                    if self.llm_input_tokens.value
+                    else 0
+                ),
+            },
             "providers": {
                 "calls": dict(self.provider_calls),
                 "errors": dict(self.provider_errors),
             },
+            "llm_latency": {
+                provider: {
+                    "ttft_s": self.llm_ttft[provider].snapshot(),
+                    "tokens_per_second": self.llm_tokens_per_second[provider].snapshot(),
+                }
+                for provider in sorted(set(self.llm_ttft) | set(self.llm_tokens_per_second))
+            },
+            "llm_response_cache": {
+                "hits": self.llm_cache_hits.value,
+                "misses": self.llm_cache_misses.value,
+                "hit_ratio": (
+                    round(self.llm_cache_hits.value / (self.llm_cache_hits.value + self.llm_cache_misses.value), 4)
+                    if self.llm_cache_hits.value + self.llm_cache_misses.value
+                    else 0
+                ),
+            },
+            "rate_limits": {
+                "queue_wait_s": {name: hist.snapshot() for name, hist in self.rate_limit_wait.items()},
+                "rejections": dict(self.rate_limit_rejections),
+                "throttled": dict(self.rate_limit_throttled),
+            },
+            "scheduler": self._scheduler_snapshot(),
             "nodes": {name: hist.snapshot() for name, hist in self.node_latency.items()},
+            "graph_cache": {
+                workflow_type: {
+                    "hits": self.graph_compile_saved[workflow_type].count,
+                    "misses": self.graph_compile_latency[workflow_type].count,
+                    "compile_ms": self.graph_compile_latency[workflow_type].snapshot(),
+                    "saved_ms": round(self.graph_compile_saved[workflow_type].total, 2),
+                }
+                for workflow_type in sorted(set(self.graph_compile_latency) | set(self.graph_compile_saved))
+            },
         }
 
+    def _scheduler_snapshot(self) -> dict:
+        queues: dict[str, dict] = {}
+        for scope, work_class in sorted(set(self.scheduler_queued) | set(self.scheduler_wait)):
+            queues.setdefault(scope, {})[work_class] = {
+                "queued": self.scheduler_queued.get((scope, work_class), 0),
+                "wait_s": self.scheduler_wait[(scope, work_class)].snapshot(),
+            }
+        return queues
+
 
 # 全局单例
 metrics = MetricsCollector()
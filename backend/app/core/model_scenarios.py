@@ -13,6 +13,7 @@ MODEL_SCENARIOS: list[str] = [
 DEFAULT_SCENARIOS: list[str] = ["writing", "chat"]
 
 KNOWLEDGE_UPDATE_SCENARIO = "knowledge_update"
+CHAT_SCENARIO = "chat"
 
 
 def validate_scenarios(values: list[str]) -> list[str]:
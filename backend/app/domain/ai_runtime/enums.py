@@ -14,6 +14,24 @@ class RunStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+class JobStatus(str, Enum):
+    """持久化后台任务状态"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class WorkClass(str, Enum):
+    """AI 工作的调度类别（优先级由高到低）"""
+
+    INTERACTIVE = "interactive"  # 用户正在等待的请求：对话、同步生成
+    BATCH = "batch"  # 用户主动触发的批量任务：批量发布后的知识分析
+    BACKGROUND = "background"  # 系统自动触发的后台任务：发布后分析、摘要预生成
+
+
 class EventType(str, Enum):
     """AI 运行事件类型"""
 
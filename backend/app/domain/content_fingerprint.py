@@ -0,0 +1,63 @@
+"""正文指纹与变更幅度 — 领域逻辑
+
+章节摘要失效判断用：
+- content_fingerprint：规范化正文（去掉全部空白）的 sha256 前 16 位，换行、缩进、
+  空格等纯空白改动不改变指纹
+- content_sketch：规范化正文 4 字符分片的 bottom-k 草图（k=64），几百字节
+- change_ratio：由两份草图估算 Jaccard 距离，0 = 无变化，1 = 完全改写
+
+草图随正文一起落库，判断摘要是否过期时不必加载正文本身。
+"""
+
+import hashlib
+import heapq
+import re
+import zlib
+
+SHINGLE_SIZE = 4
+SKETCH_SIZE = 64
+
+
+def normalize_content(content: str | None) -> str:
+    """去掉全部空白（含全角空格）。中文正文里空白只影响排版，不影响内容。"""
+    if not content:
+        return ""
+    return re.sub(r"\s+", "", content)
+
+
+def content_fingerprint(content: str | None) -> str:
+    """规范化正文的 sha256 前 16 位十六进制。"""
+    return hashlib.sha256(normalize_content(content).encode("utf-8")).hexdigest()[:16]
+
+
+def content_sketch(content: str | None) -> str:
+    """规范化正文分片哈希中最小的 SKETCH_SIZE 个，逗号分隔的十六进制。"""
+    text = normalize_content(content)
+    if not text:
+        return ""
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i : i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = {zlib.crc32(shingle.encode("utf-8")) for shingle in shingles}
+    return ",".join(f"{h:x}" for h in heapq.nsmallest(SKETCH_SIZE, hashes))
+
+
+def change_ratio(old_sketch: str | None, new_sketch: str | None) -> float:
+    """两份草图之间的估算变更幅度（1 - Jaccard 相似度）。"""
+    old = _parse_sketch(old_sketch)
+    new = _parse_sketch(new_sketch)
+    if not old and not new:
+        return 0.0
+    if not old or not new:
+        return 1.0
+    # bottom-k 估计：取并集中最小的 k 个，统计同时出现在两份草图中的比例
+    union = heapq.nsmallest(SKETCH_SIZE, old | new)
+    shared = sum(1 for h in union if h in old and h in new)
+    return 1.0 - shared / len(union)
+
+
+def _parse_sketch(sketch: str | None) -> set[int]:
+    if not sketch:
+        return set()
+    return {int(part, 16) for part in sketch.split(",") if part}
@@ -0,0 +1,112 @@
+"""实体提及索引 — 领域逻辑
+
+按项目实体名构建 Aho-Corasick 自动机，一遍扫描统计正文 / 用户消息里各实体被提到的
+次数与位置，供 chat 上下文按相关度挑选实体：
+- 匹配取最左最长、互不重叠（「李明」不会再算一次「李」开头的其他名字）
+- ASCII 名字要求词边界（"Al" 不命中 "Also"），大小写不敏感
+- 少于 MIN_PATTERN_LENGTH 字的名字不入索引，单字名误命中太多
+- scores：每次命中按所在文本权重 × (1 + 位置 / 文本长度) 计分，越靠后（越新）越重
+"""
+
+from collections import deque
+from collections.abc import Hashable, Iterable
+
+MIN_PATTERN_LENGTH = 2
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and (ch.isalnum() or ch == "_")
+
+
+class MentionIndex:
+    """多模式匹配自动机：名字 → 实体 key（同名实体共享命中）"""
+
+    def __init__(self, patterns: Iterable[tuple[str, Hashable]]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # 以该状态结尾的模式：(模式长度, 实体 key 列表)
+        self._out: list[list[tuple[int, list[Hashable]]]] = [[]]
+        self._terminal: dict[int, list[Hashable]] = {}
+        for name, key in patterns:
+            self._add(name.strip().lower(), key)
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self._terminal)
+
+    def _add(self, pattern: str, key: Hashable) -> None:
+        if len(pattern) < MIN_PATTERN_LENGTH:
+            return
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        keys = self._terminal.get(state)
+        if keys is None:
+            keys = self._terminal[state] = []
+            self._out[state].append((len(pattern), keys))
+        if key not in keys:
+            keys.append(key)
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def matches(self, text: str) -> list[tuple[int, int, list[Hashable]]]:
+        """最左最长、不重叠的命中：[(起点, 终点(不含), 实体 key 列表)]，按起点排序。"""
+        if not text or not self._terminal:
+            return []
+        lowered = text.lower()
+        found: list[tuple[int, int, list[Hashable]]] = []
+        state = 0
+        for pos, ch in enumerate(lowered):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, keys in self._out[state]:
+                start, end = pos + 1 - length, pos + 1
+                if self._on_boundary(lowered, start, end):
+                    found.append((start, end, keys))
+
+        found.sort(key=lambda m: (m[0], m[0] - m[1]))
+        selected: list[tuple[int, int, list[Hashable]]] = []
+        last_end = 0
+        for start, end, keys in found:
+            if start >= last_end:
+                selected.append((start, end, keys))
+                last_end = end
+        return selected
+
+    @staticmethod
+    def _on_boundary(text: str, start: int, end: int) -> bool:
+        if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+            return False
+        return not (_is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]))
+
+    def scores(self, texts: Iterable[tuple[str, float]]) -> dict[Hashable, float]:
+        """(文本, 权重) 序列 → 实体 key 的提及得分；未被提及的 key 不出现在结果中。"""
+        result: dict[Hashable, float] = {}
+        for text, weight in texts:
+            if not text:
+                continue
+            length = len(text)
+            for _start, end, keys in self.matches(text):
+                score = weight * (1.0 + end / length)
+                for key in keys:
+                    result[key] = result.get(key, 0.0) + score
+        return result
@@ -0,0 +1,60 @@
+"""正文分段 — 领域逻辑
+
+长章节按段落边界切成不超过 max_chars 字的片段，供分段（map-reduce）知识分析使用：
+- 以换行为段落边界，相邻段落依次合并，直到再加一段就超过 max_chars
+- 单个段落超长时在句末标点（含其后的引号 / 括号）处切开，单句仍超长才按字数硬切
+- 空白段落丢弃；片段内的段落以单个换行连接，除段间空白外与原文一致
+"""
+
+import re
+
+# 一句：到句末标点（连同紧随的右引号 / 右括号）为止，或到段尾
+_SENTENCE = re.compile(r".+?(?:[。！？!?；;…]+[”’\"」』）)]*|$)", re.S)
+
+
+def split_paragraph_chunks(content: str | None, max_chars: int) -> list[str]:
+    """按段落边界切分正文；max_chars <= 0 或正文不超长时整体作为一段返回。"""
+    if not content or not content.strip():
+        return []
+    if max_chars <= 0 or len(content) <= max_chars:
+        return [content]
+
+    pieces: list[str] = []
+    for paragraph in content.splitlines():
+        if not paragraph.strip():
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+        else:
+            pieces.extend(_split_long_paragraph(paragraph, max_chars))
+
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for piece in pieces:
+        if current and size + 1 + len(piece) > max_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        size += len(piece) + (1 if current else 0)
+        current.append(piece)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _split_long_paragraph(paragraph: str, max_chars: int) -> list[str]:
+    parts: list[str] = []
+    current = ""
+    for sentence in _SENTENCE.findall(paragraph):
+        if len(current) + len(sentence) <= max_chars:
+            current += sentence
+            continue
+        if current:
+            parts.append(current)
+        while len(sentence) > max_chars:
+            parts.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        current = sentence
+    if current:
+        parts.append(current)
+    return parts
@@ -8,11 +8,12 @@ from app.infrastructure.db.models.ai_runtime import (  # noqa: F401
     AIGeneratedContent,
     AIRun,
     AIRunEvent,
+    BackgroundJob,
     LangGraphSession,
     LangGraphWorkflow,
 )
 from app.infrastructure.db.models.auth import TokenBlacklist, User  # noqa: F401
-from app.infrastructure.db.models.manuscript import Chapter, Draft  # noqa: F401
+from app.infrastructure.db.models.manuscript import Chapter, ChapterRollup, Draft  # noqa: F401
 from app.infrastructure.db.models.model_configs import ModelConfig  # noqa: F401
 from app.infrastructure.db.models.projects import Project  # noqa: F401
 from app.infrastructure.db.models.prompts import PromptTemplate  # noqa: F401
@@ -1,6 +1,6 @@
-"""AI Runtime 模型：工作流、会话、运行、事件、生成内容"""
+"""AI Runtime 模型：工作流、会话、运行、事件、生成内容、后台任务"""
 
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text, func
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, Text, func
 from sqlalchemy.orm import relationship
 
 from app.infrastructure.db.base import Base, TimestampMixin
@@ -99,3 +99,34 @@ class AIRunEvent(Base):
     created_at = Column(DateTime, nullable=False, server_default=func.now())
 
     run = relationship("AIRun", back_populates="events")
+
+
+class BackgroundJob(Base, TimestampMixin):
+    """持久化后台任务（BackgroundTaskRunner 的任务表）
+
+    worker 领取任务时写入 lease_owner / lease_expires_at 并定期续租；
+    租约过期（进程崩溃或重启）的 running 任务会被重新领取。
+    priority 由调度类别（work_class）决定，同一优先级内按入队时分配的 fair_tag（用户的虚拟完成时间）公平领取。
+    """
+
+    __tablename__ = "background_jobs"
+    __table_args__ = (Index("ix_background_jobs_claim", "status", "priority", "run_after"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    task_key = Column(String(100), nullable=False, index=True)
+    payload = Column(Text)
+    status = Column(String(20), nullable=False, default="queued")
+    priority = Column(Integer, nullable=False, default=0)
+    work_class = Column(String(20), nullable=False, default="background")
+    user_id = Column(Integer, nullable=True, index=True)
+    fair_tag = Column(Float, nullable=False, default=0.0)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    timeout_seconds = Column(Integer, nullable=False, default=300)
+    run_after = Column(DateTime, nullable=False)
+    lease_owner = Column(String(64), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    idempotency_key = Column(String(200), nullable=True, unique=True)
+    last_error = Column(Text)
+    finished_at = Column(DateTime, nullable=True)
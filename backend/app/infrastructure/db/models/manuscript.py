@@ -1,8 +1,9 @@
 """章节与草稿模型"""
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, ForeignKey, Integer, String, Text, UniqueConstraint
+from sqlalchemy.orm import relationship, validates
 
+from app.domain.content_fingerprint import content_fingerprint, content_sketch
 from app.infrastructure.db.base import Base, TimestampMixin
 
 
@@ -19,14 +20,49 @@ class Chapter(Base, TimestampMixin):
     status = Column(String(20), default="draft")
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
 
-    # 分层摘要缓存——由 AIContextBuilder.get_tiered_chapter_context 写入
-    # 失效规则：word_count != summary_source_word_count → 摘要过期需重新生成
+    # 正文指纹与草图——随 content 赋值自动维护（见 _sync_content_fingerprint）
+    content_fingerprint = Column(String(16))
+    content_sketch = Column(Text)
+
+    # 分层摘要缓存——由 AIContextBuilder.refresh_chapter_summaries 写入
+    # 失效规则：正文指纹与 summary_source_fingerprint 不同，且草图估算的变更幅度
+    # 达到阈值 → 摘要过期需重新生成；无指纹的旧数据退回 word_count 快照比较
     summary_detailed = Column(Text)  # L2 用：约 500 字详细概括
     summary_brief = Column(Text)  # L3 用：约 150 字简要概括
     summary_source_word_count = Column(Integer)  # 生成摘要时章节 word_count 快照
+    summary_source_fingerprint = Column(String(16))  # 生成摘要时的正文指纹
+    summary_source_sketch = Column(Text)  # 生成摘要时的正文草图
 
     project = relationship("Project", back_populates="chapters")
 
+    @validates("content")
+    def _sync_content_fingerprint(self, _key, value):
+        self.content_fingerprint = content_fingerprint(value)
+        self.content_sketch = content_sketch(value)
+        return value
+
+
+class ChapterRollup(Base, TimestampMixin):
+    """章节摘要树的上层节点：level 1 = 篇章，level 2 = 卷，level 3 = 部。
+
+    第 level 层第 node_index 个节点覆盖 chapter_number ∈ [first_chapter_number, last_chapter_number]，
+    即按扇出 K 对齐的 K^level 章；summary 由下一层（level 1 为各章 summary_brief）合并生成。
+    """
+
+    __tablename__ = "chapter_rollups"
+    __table_args__ = (UniqueConstraint("project_id", "level", "node_index", name="uq_chapter_rollup_node"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    level = Column(Integer, nullable=False)
+    node_index = Column(Integer, nullable=False)
+    first_chapter_number = Column(Integer, nullable=False)
+    last_chapter_number = Column(Integer, nullable=False)
+    summary = Column(Text)
+    source_fingerprint = Column(String(16))  # 生成时子节点摘要的指纹，不变则无需重建
+
+    project = relationship("Project", back_populates="chapter_rollups")
+
 
 class Draft(Base, TimestampMixin):
     __tablename__ = "drafts"
@@ -15,6 +15,9 @@ class Project(Base, TimestampMixin):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     word_count = Column(Integer, default=0)
     chapter_count = Column(Integer, default=0)
+    # AI 上下文修订号——角色/世界观/章节/知识图谱写路径提交前 +1，
+    # 供 app.application.context_cache 判断快照是否过期
+    context_revision = Column(Integer, nullable=False, default=0, server_default="0")
 
     # 关系
     owner = relationship("User", back_populates="projects")
@@ -23,6 +26,7 @@ class Project(Base, TimestampMixin):
     organizations = relationship("Organization", back_populates="project", cascade="all, delete-orphan")
     worldviews = relationship("Worldview", back_populates="project", cascade="all, delete-orphan")
     chapters = relationship("Chapter", back_populates="project", cascade="all, delete-orphan")
+    chapter_rollups = relationship("ChapterRollup", back_populates="project", cascade="all, delete-orphan")
     drafts = relationship("Draft", back_populates="project", cascade="all, delete-orphan")
     entity_relationships = relationship("EntityRelationship", back_populates="project", cascade="all, delete-orphan")
     entity_state_events = relationship("EntityStateEvent", back_populates="project", cascade="all, delete-orphan")
@@ -0,0 +1,15 @@
+"""运行事件分发基础设施"""
+
+from .bus import InMemoryRunEventBus, RunEventBus, close_run_event_bus, get_run_event_bus
+from .hub import EventsExpired, RunChannel, RunEventHub, run_event_hub
+
+__all__ = [
+    "EventsExpired",
+    "InMemoryRunEventBus",
+    "RunChannel",
+    "RunEventBus",
+    "RunEventHub",
+    "close_run_event_bus",
+    "get_run_event_bus",
+    "run_event_hub",
+]
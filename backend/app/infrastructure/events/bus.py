@@ -0,0 +1,106 @@
+"""
+Run Event Bus — run 事件的发布 / 订阅接口（可插拔后端）
+
+执行图的进程（发布方）与处理 SSE 的进程（订阅方）在多 worker 部署下可能不同，
+GraphRunner 与 AIWorkflowService 只依赖 RunEventBus 接口：
+- memory：进程内 RunEventHub（默认，单 worker）
+- redis：Redis Stream（XADD MAXLEN 作环形缓冲，XREAD BLOCK 订阅），多 worker / 多机共享
+
+事件 id 为字符串且在单个 run 内单调递增，可直接用作 SSE id / Last-Event-ID。
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator
+
+from app.core.config import AISettings, get_settings
+
+from .hub import RunEventHub, run_event_hub
+
+logger = logging.getLogger(__name__)
+
+
+class RunEventBus(ABC):
+    """run 事件总线"""
+
+    @abstractmethod
+    async def open(self, run_id: int) -> None:
+        """开始一个 run 的事件流（订阅方据此判断 run 是否有实时事件）"""
+
+    @abstractmethod
+    async def publish(self, run_id: int, event: dict) -> str:
+        """发布事件并返回事件 id；终止事件（done / error / cancelled）同时结束事件流"""
+
+    @abstractmethod
+    async def close(self, run_id: int) -> None:
+        """结束事件流；已发布的事件在保留期内仍可回放"""
+
+    @abstractmethod
+    async def has_stream(self, run_id: int) -> bool:
+        """run 是否有进行中或保留期内的事件流"""
+
+    @abstractmethod
+    def subscribe(self, run_id: int, after_id: str | None = None) -> AsyncIterator[tuple[str, dict]]:
+        """产出 after_id 之后的 (id, event)，事件流结束且读完后停止。
+
+        after_id 之后的事件已被挤出缓冲时抛 EventsExpired。
+        """
+
+    async def aclose(self) -> None:
+        """释放后端连接（默认无连接可释放）"""
+        return None
+
+
+class InMemoryRunEventBus(RunEventBus):
+    """进程内后端：直接使用 RunEventHub"""
+
+    def __init__(self, hub: RunEventHub):
+        self.hub = hub
+
+    async def open(self, run_id: int) -> None:
+        self.hub.open(run_id)
+
+    async def publish(self, run_id: int, event: dict) -> str:
+        return str(self.hub.publish(run_id, event) or "")
+
+    async def close(self, run_id: int) -> None:
+        self.hub.close(run_id)
+
+    async def has_stream(self, run_id: int) -> bool:
+        return self.hub.get(run_id) is not None
+
+    async def subscribe(self, run_id: int, after_id: str | None = None) -> AsyncIterator[tuple[str, dict]]:
+        channel = self.hub.get(run_id)
+        if channel is None:
+            return
+        cursor = int(after_id) if after_id and after_id.isdigit() else 0
+        async for event_id, event in channel.subscribe(cursor):
+            yield str(event_id), event
+
+
+_bus: RunEventBus | None = None
+
+
+def get_run_event_bus(settings: AISettings | None = None) -> RunEventBus:
+    """进程级事件总线，按 AI_RUN_EVENT_BUS 选择后端（首次调用时创建）"""
+    global _bus
+    if _bus is None:
+        settings = settings or get_settings().ai
+        if settings.run_event_bus == "redis":
+            from .redis_bus import RedisRunEventBus
+
+            if not settings.run_event_bus_url:
+                raise ValueError("AI_RUN_EVENT_BUS=redis 需要配置 AI_RUN_EVENT_BUS_URL")
+            _bus = RedisRunEventBus.from_url(settings.run_event_bus_url)
+        else:
+            _bus = InMemoryRunEventBus(run_event_hub)
+        logger.info("run 事件总线后端: %s", settings.run_event_bus)
+    return _bus
+
+
+async def close_run_event_bus() -> None:
+    """关闭事件总线连接，应用关闭时调用。"""
+    global _bus
+    if _bus is not None:
+        await _bus.aclose()
+        _bus = None
@@ -0,0 +1,140 @@
+"""
+Run Event Hub — 单次 run 的事件广播（多订阅者 + 重放环形缓冲）
+
+职责：
+- 每个 run 一个 RunChannel：事件按到达顺序分配单调递增 id，保存在有界环形缓冲中
+- 任意多个订阅者各自持有游标（上次收到的 id）读取，互不抢占；慢订阅者不阻塞发布方
+- 订阅者落后到缓冲之外（或带着过旧的 Last-Event-ID 重连）时抛 EventsExpired，
+  由调用方改走数据库回放
+- 收到终止事件（done / error / cancelled）或 close() 后，订阅者读完缓冲即结束；
+  已关闭的 channel 保留一段时间，供迟到 / 重连的订阅者回放
+
+注意：单进程内存方案；跨进程部署经 RunEventBus 切换到 Redis 后端（见 bus.py）。
+"""
+
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+
+TERMINAL_EVENT_TYPES = frozenset({"done", "error", "cancelled"})
+
+# 单个 run 缓冲的事件数（token 已合并，一次运行通常只有几百条事件）
+DEFAULT_CAPACITY = 1024
+# 已关闭 channel 的保留时间（秒）
+DEFAULT_RETENTION_SECONDS = 300
+
+
+class EventsExpired(Exception):
+    """请求的游标之后的事件已被挤出缓冲；resume_after 为仍可读取的最早位置（之前的事件已丢失）"""
+
+    def __init__(self, resume_after: str):
+        super().__init__(f"events up to {resume_after} are no longer buffered")
+        self.resume_after = resume_after
+
+
+class RunChannel:
+    """单个 run 的事件广播通道"""
+
+    def __init__(self, run_id: int, capacity: int = DEFAULT_CAPACITY):
+        self.run_id = run_id
+        self._buffer: deque[tuple[int, dict]] = deque(maxlen=capacity)
+        self._last_id = 0
+        self._changed = asyncio.Event()
+        self.closed = False
+        self.closed_at: float | None = None
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    @property
+    def oldest_id(self) -> int:
+        """缓冲中最早事件的 id；缓冲为空时为下一个将分配的 id"""
+        return self._buffer[0][0] if self._buffer else self._last_id + 1
+
+    def publish(self, event: dict) -> int:
+        """追加事件并唤醒订阅者（不阻塞），返回分配的 id；终止事件会关闭 channel"""
+        if self.closed:
+            return self._last_id
+        self._last_id += 1
+        self._buffer.append((self._last_id, event))
+        if event.get("type") in TERMINAL_EVENT_TYPES:
+            self.close()
+        else:
+            self._wake()
+        return self._last_id
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.closed_at = time.monotonic()
+            self._wake()
+
+    def _wake(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self, after_id: int = 0) -> AsyncIterator[tuple[int, dict]]:
+        """从 after_id 之后开始逐条产出 (id, event)，channel 关闭且读完后结束。
+
+        after_id 之后的事件已不在缓冲中时抛 EventsExpired。
+        """
+        cursor = after_id
+        while True:
+            changed = self._changed
+            if cursor + 1 < self.oldest_id:
+                raise EventsExpired(str(self.oldest_id - 1))
+            pending = [item for item in self._buffer if item[0] > cursor]
+            for event_id, event in pending:
+                cursor = event_id
+                yield event_id, event
+            if pending:
+                continue
+            if self.closed:
+                return
+            await changed.wait()
+
+
+class RunEventHub:
+    """run_id → RunChannel 注册表"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, retention_seconds: float = DEFAULT_RETENTION_SECONDS):
+        self.capacity = capacity
+        self.retention_seconds = retention_seconds
+        self._channels: dict[int, RunChannel] = {}
+
+    def open(self, run_id: int) -> RunChannel:
+        """为 run 创建 channel；已有未关闭的 channel 时直接返回"""
+        self._prune()
+        channel = self._channels.get(run_id)
+        if channel is None or channel.closed:
+            channel = RunChannel(run_id, self.capacity)
+            self._channels[run_id] = channel
+        return channel
+
+    def get(self, run_id: int) -> RunChannel | None:
+        return self._channels.get(run_id)
+
+    def publish(self, run_id: int, event: dict) -> int | None:
+        channel = self._channels.get(run_id)
+        return channel.publish(event) if channel is not None else None
+
+    def close(self, run_id: int) -> None:
+        channel = self._channels.get(run_id)
+        if channel is not None:
+            channel.close()
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        expired = [
+            run_id
+            for run_id, channel in self._channels.items()
+            if channel.closed and now - channel.closed_at >= self.retention_seconds
+        ]
+        for run_id in expired:
+            del self._channels[run_id]
+
+
+# 全局单例
+run_event_hub = RunEventHub()
@@ -0,0 +1,139 @@
+"""
+Redis Run Event Bus — 基于 Redis Stream 的跨进程 run 事件总线
+
+键布局（prefix 默认 ainovel）：
+- {prefix}:run:{run_id}:events  Stream，XADD MAXLEN 保留最近 maxlen 条事件（环形缓冲），id 即事件 id
+- {prefix}:run:{run_id}:state   "open" / "closed"；关闭后与 Stream 一起在 retention 秒后过期
+
+订阅：XREAD BLOCK 等待新事件；读到终止事件，或超时无新事件且状态已不是 open 时结束。
+Last-Event-ID 之后有条目已被裁掉（XINFO STREAM 的 max-deleted-entry-id，Redis 7+）时抛 EventsExpired，
+resume_after 为最早留存条目的前一个 id，由调用方回放数据库后从该处续读。
+
+依赖 redis（redis.asyncio）；客户端按接口注入，任何实现同名命令的 Redis 兼容客户端都可使用。
+"""
+
+import json
+import re
+from collections.abc import AsyncIterator
+from typing import Any
+
+from .bus import RunEventBus
+from .hub import DEFAULT_CAPACITY, DEFAULT_RETENTION_SECONDS, TERMINAL_EVENT_TYPES, EventsExpired
+
+# 事件流处于 open 状态的最长时间（秒），防止发布进程崩溃后订阅方永远等待
+OPEN_TTL_SECONDS = 6 * 3600
+
+_STREAM_ID = re.compile(r"^\d+(-\d+)?$")
+
+
+def _text(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def _id_key(stream_id: str) -> tuple[int, int]:
+    ms, _, seq = stream_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _predecessor(stream_id: str) -> str:
+    """紧邻 stream_id 之前的 id（XREAD 从它之后读即从 stream_id 开始）"""
+    ms, seq = _id_key(stream_id)
+    return f"{ms}-{seq - 1}" if seq else f"{ms - 1}-{2**64 - 1}"
+
+
+class RedisRunEventBus(RunEventBus):
+    """Redis Stream 后端"""
+
+    def __init__(
+        self,
+        client: Any,
+        *,
+        prefix: str = "ainovel",
+        maxlen: int = DEFAULT_CAPACITY,
+        retention_seconds: int = DEFAULT_RETENTION_SECONDS,
+        block_ms: int = 5000,
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.maxlen = maxlen
+        self.retention_seconds = retention_seconds
+        self.block_ms = block_ms
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RedisRunEventBus":
+        from redis.asyncio import Redis
+
+        return cls(Redis.from_url(url), **kwargs)
+
+    def _stream_key(self, run_id: int) -> str:
+        return f"{self.prefix}:run:{run_id}:events"
+
+    def _state_key(self, run_id: int) -> str:
+        return f"{self.prefix}:run:{run_id}:state"
+
+    async def open(self, run_id: int) -> None:
+        await self.client.delete(self._stream_key(run_id))
+        await self.client.set(self._state_key(run_id), "open", ex=OPEN_TTL_SECONDS)
+
+    async def publish(self, run_id: int, event: dict) -> str:
+        event_id = await self.client.xadd(
+            self._stream_key(run_id),
+            {"event": json.dumps(event, ensure_ascii=False, default=str)},
+            maxlen=self.maxlen,
+            approximate=False,
+        )
+        if event.get("type") in TERMINAL_EVENT_TYPES:
+            await self.close(run_id)
+        return _text(event_id)
+
+    async def close(self, run_id: int) -> None:
+        await self.client.set(self._state_key(run_id), "closed", ex=self.retention_seconds)
+        await self.client.expire(self._stream_key(run_id), self.retention_seconds)
+
+    async def has_stream(self, run_id: int) -> bool:
+        return bool(await self.client.exists(self._state_key(run_id)))
+
+    async def subscribe(self, run_id: int, after_id: str | None = None) -> AsyncIterator[tuple[str, dict]]:
+        stream = self._stream_key(run_id)
+        cursor = after_id if after_id and _STREAM_ID.match(after_id) else "0-0"
+        if cursor != "0-0":
+            resume_after = await self._expired_resume_point(stream, cursor)
+            if resume_after is not None:
+                raise EventsExpired(resume_after)
+
+        while True:
+            response = await self.client.xread({stream: cursor}, count=100, block=self.block_ms)
+            entries = []
+            # RESP2 返回 [[stream, [(id, fields), ...]]]，RESP3 返回 {stream: [[(id, fields), ...]]}
+            for _name, items in response.items() if isinstance(response, dict) else response or []:
+                entries.extend(items[0] if items and isinstance(items[0], list) else items)
+            for raw_id, fields in entries:
+                cursor = _text(raw_id)
+                event = json.loads(_text(fields.get(b"event", fields.get("event"))))
+                yield cursor, event
+                if event.get("type") in TERMINAL_EVENT_TYPES:
+                    return
+            if not entries and _text(await self.client.get(self._state_key(run_id)) or b"") != "open":
+                return
+
+    async def _expired_resume_point(self, stream: str, cursor: str) -> str | None:
+        """cursor 之后有条目已被裁掉时返回续读位置（最早留存条目的前一个 id），否则 None。
+
+        只裁掉了 cursor 自身（及更早）的条目不算丢失。Redis 7 之前没有裁剪信息，
+        按最早留存条目晚于 cursor 保守判断。
+        """
+        if not await self.client.exists(stream):
+            return None
+        info = await self.client.xinfo_stream(stream)
+        first = info.get("first-entry")
+        max_deleted = info.get("max-deleted-entry-id")
+        if max_deleted is not None:
+            lost = _id_key(_text(max_deleted)) > _id_key(cursor)
+        else:
+            lost = bool(first) and _id_key(_text(first[0])) > _id_key(cursor)
+        if not lost:
+            return None
+        return _predecessor(_text(first[0])) if first else _text(info["last-generated-id"])
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
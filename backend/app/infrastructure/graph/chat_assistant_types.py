@@ -23,3 +23,4 @@ class ChatAssistantContext:
 
 class ChatAssistantState(AgentState):
     project_context: NotRequired[str]
+    focus_context: NotRequired[str]
@@ -0,0 +1,122 @@
+"""Token-chunk coalescing for streamed model output.
+
+模型流式输出的每个 chunk 往往只有一两个字；逐个变成事件会带来成千上万次 json.dumps、
+queue put 与 SSE 帧。TokenCoalescer 把相邻文本攒成一段再发：
+- 攒够 max_chars 字符，或距本段第一个字已过 interval_ms 毫秒，即可刷出
+- 时间条件在每个到达的事件上检查；调用方用 with_flush_deadline 等待下一个事件，
+  模型中途停顿、到时限仍无新事件时也会按时刷出，不必等下一个 chunk；
+  节点 / 工具边界、模型调用结束与终止状态由调用方强制 flush
+- interval_ms 与 max_chars 都为 0 时不合并，每个 chunk 原样刷出
+"""
+
+import asyncio
+import contextlib
+import time
+from collections.abc import AsyncIterable, AsyncIterator, Callable
+from typing import Any
+
+from app.core.config import get_settings
+
+
+class TokenCoalescer:
+    """按时间 / 字符数合并流式文本片段"""
+
+    def __init__(
+        self,
+        *,
+        interval_ms: float | None = None,
+        max_chars: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if interval_ms is None or max_chars is None:
+            settings = get_settings().ai
+            interval_ms = settings.stream_coalesce_ms if interval_ms is None else interval_ms
+            max_chars = settings.stream_coalesce_chars if max_chars is None else max_chars
+        self.interval = interval_ms / 1000
+        self.max_chars = max_chars
+        self._clock = clock
+        self._parts: list[str] = []
+        self._size = 0
+        self._started_at = 0.0
+        self.source: str | None = None  # 本段第一个片段的来源（如模型节点名）
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._parts)
+
+    def add(self, text: str, source: str | None = None) -> str | None:
+        """追加片段；达到刷出条件时返回合并后的文本，否则返回 None。
+
+        source 记录本段第一个片段的来源；来源可能变化时（并行的模型调用），调用方应先比较
+        self.source 并 flush，避免把两路输出拼进同一段。
+        """
+        if not text:
+            return self.flush_if_due()
+        if not self._parts:
+            self._started_at = self._clock()
+            self.source = source
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.max_chars or self._clock() - self._started_at >= self.interval:
+            return self.flush()
+        return None
+
+    def time_left(self) -> float | None:
+        """距本段应刷出还剩的秒数；没有缓冲时返回 None。"""
+        if not self._parts:
+            return None
+        return max(0.0, self.interval - (self._clock() - self._started_at))
+
+    def flush_if_due(self) -> str | None:
+        """距本段开始已超过 interval 则刷出（供非文本事件到达时调用）。"""
+        if self._parts and self._clock() - self._started_at >= self.interval:
+            return self.flush()
+        return None
+
+    def flush(self) -> str | None:
+        """无条件刷出缓冲；没有内容时返回 None。"""
+        if not self._parts:
+            return None
+        text = "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+        return text
+
+
+async def with_flush_deadline(events: AsyncIterable[Any], coalescer: TokenCoalescer) -> AsyncIterator[Any | None]:
+    """逐个产出 events；coalescer 有缓冲且到刷出时限仍没有新事件时产出 None，调用方据此 flush_if_due。
+
+    等待中的 __anext__ 在超时后继续保留（不取消），下一轮接着等同一个事件。
+    """
+    iterator = aiter(events)
+    pending: asyncio.Future | None = None
+    try:
+        while True:
+            timeout = coalescer.time_left()
+            if pending is None and timeout is None:
+                try:
+                    event = await anext(iterator)
+                except StopAsyncIteration:
+                    return
+                yield event
+                continue
+            if pending is None:
+                pending = asyncio.ensure_future(anext(iterator))
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield None
+                continue
+            task, pending = pending, None
+            try:
+                event = task.result()
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        if pending is not None:
+            pending.cancel()
+            with contextlib.suppress(BaseException):
+                await pending
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
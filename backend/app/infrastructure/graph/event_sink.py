@@ -0,0 +1,82 @@
+"""
+Run Event Sink — AIRunEvent 的缓冲批量写入
+
+LangGraph 对每个内部 runnable 都会发 on_chain_start / on_chain_end；逐条 add + flush
+会让一次对话在流式循环里产生几十次同步 INSERT。RunEventSink：
+- 只记录图节点事件（事件名等于其所在的 langgraph_node，排除 __start__ 等内部节点），
+  相当于 sse_events.NODE_LABELS 的白名单，但对所有工作流通用
+- 事件先进内存缓冲，按时间间隔、节点结束与终止状态批量 flush（一次 INSERT 多行）
+- 终止状态与 run 本身的状态变更同一次 flush 落库
+"""
+
+import json
+import time
+from collections.abc import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.domain.ai_runtime.enums import EventType
+from app.infrastructure.db.models.ai_runtime import AIRunEvent
+
+
+def is_node_event(event: dict) -> bool:
+    """astream_events 的事件是否对应图（含子图）中的节点本身，而非节点内部的 runnable"""
+    name = event.get("name") or ""
+    metadata = event.get("metadata") or {}
+    return bool(name) and not name.startswith("__") and metadata.get("langgraph_node") == name
+
+
+class RunEventSink:
+    """单次 run 的事件缓冲，批量写入 AIRunEvent"""
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        run_id: int,
+        *,
+        flush_interval: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.db = db
+        self.run_id = run_id
+        self.flush_interval = get_settings().ai.run_event_flush_seconds if flush_interval is None else flush_interval
+        self._clock = clock
+        self._buffer: list[AIRunEvent] = []
+        self._last_flush = clock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def record(
+        self,
+        event_type: EventType,
+        node_name: str | None,
+        seq: int,
+        data: dict | None = None,
+    ) -> int:
+        """缓冲一条事件并返回下一个序列号（不触发数据库写入）"""
+        self._buffer.append(
+            AIRunEvent(
+                run_id=self.run_id,
+                event_type=event_type.value,
+                node_name=node_name,
+                sequence=seq,
+                data=json.dumps(data, ensure_ascii=False) if data else None,
+            )
+        )
+        return seq + 1
+
+    async def flush(self) -> None:
+        """写入缓冲的事件；session 中其他待写变更（如 run 状态）一并 flush"""
+        self._last_flush = self._clock()
+        if self._buffer:
+            self.db.add_all(self._buffer)
+            self._buffer = []
+        await self.db.flush()
+
+    async def flush_if_due(self) -> None:
+        """距上次 flush 超过间隔且有缓冲时写入"""
+        if self._buffer and self._clock() - self._last_flush >= self.flush_interval:
+            await self.flush()
@@ -0,0 +1,149 @@
+"""
+Run Instrumentation — 图执行的耗时与 token 采集（LangChain callback）
+
+RunMetricsHandler 挂在一次图调用的 config.callbacks 上，对流式与非流式调用一视同仁：
+- 图节点耗时（事件名等于其 langgraph_node 的 chain，同 event_sink.is_node_event）与工具调用耗时
+- 模型调用：首 token 时间（TTFT）、输出 token/s、按 provider 计的调用数与错误数
+- 累计 usage_metadata，供 runner 回填 AIRun.tokens_used
+
+输入 / 缓存 token 仍由 chat_assistant 的 record_usage 中间件计入 llm_usage，这里不重复记录。
+"""
+
+import time
+from collections.abc import Callable
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages.ai import UsageMetadata, add_usage
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+
+from app.core.metrics import metrics
+
+
+def _usage_of(response: LLMResult) -> UsageMetadata | None:
+    usage = None
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            if message is not None and getattr(message, "usage_metadata", None):
+                usage = add_usage(usage, message.usage_metadata)
+    return usage
+
+
+class RunMetricsHandler(BaseCallbackHandler):
+    """单次图调用的指标采集；节点名以 "{scope}.{node}" 记录，区分不同工作流的同名节点"""
+
+    run_inline = True  # 回调只做计时与计数，直接在事件循环中执行，不进线程池
+
+    def __init__(self, scope: str | None = None, *, clock: Callable[[], float] = time.monotonic):
+        self.scope = scope
+        self.usage: UsageMetadata | None = None
+        self._clock = clock
+        self._spans: dict[UUID, tuple[str, float]] = {}
+        self._llm_calls: dict[UUID, tuple[str, float]] = {}
+        self._first_token: dict[UUID, float] = {}
+
+    @property
+    def total_tokens(self) -> int:
+        return self.usage.get("total_tokens", 0) if self.usage else 0
+
+    def _label(self, name: str) -> str:
+        return f"{self.scope}.{name}" if self.scope else name
+
+    def _finish_span(self, run_id: UUID) -> None:
+        span = self._spans.pop(run_id, None)
+        if span is not None:
+            metrics.record_node(span[0], self._clock() - span[1])
+
+    # ── 节点 / 工具 ──
+
+    def on_chain_start(
+        self,
+        serialized: dict[str, Any],
+        inputs: dict[str, Any],
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        name = kwargs.get("name") or ""
+        if name and not name.startswith("__") and (metadata or {}).get("langgraph_node") == name:
+            self._spans[run_id] = (self._label(name), self._clock())
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_span(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_span(run_id)
+
+    def on_tool_start(self, serialized: dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self._spans[run_id] = (self._label(f"tool:{name}"), self._clock())
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_span(run_id)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish_span(run_id)
+
+    # ── 模型调用 ──
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list,
+        *,
+        run_id: UUID,
+        metadata: dict[str, Any] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        provider = (metadata or {}).get("ls_provider") or "unknown"
+        self._llm_calls[run_id] = (provider, self._clock())
+
+    def on_llm_new_token(self, token: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        if run_id not in self._first_token and run_id in self._llm_calls:
+            self._first_token[run_id] = self._clock()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._llm_calls.pop(run_id, None)
+        first_token_at = self._first_token.pop(run_id, None)
+        usage = _usage_of(response)
+        if usage:
+            self.usage = add_usage(self.usage, usage)
+        if call is None:
+            return
+        provider, started_at = call
+        metrics.record_provider_call(provider)
+
+        ended_at = self._clock()
+        output_tokens = usage.get("output_tokens", 0) if usage else 0
+        # 非流式调用没有逐 token 回调：TTFT 取整段耗时，生成速度按整段计算
+        ttft = (first_token_at if first_token_at is not None else ended_at) - started_at
+        generation_s = ended_at - (first_token_at if first_token_at is not None else started_at)
+        metrics.record_llm_latency(
+            provider,
+            ttft_s=ttft,
+            tokens_per_second=output_tokens / generation_s if output_tokens and generation_s > 0 else None,
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._first_token.pop(run_id, None)
+        call = self._llm_calls.pop(run_id, None)
+        metrics.record_provider_call(call[0] if call else "unknown", error=True)
+
+
+def with_callback(config: RunnableConfig | None, handler: BaseCallbackHandler) -> RunnableConfig:
+    """返回追加了 handler 的 config 副本（保留调用方已有的 callbacks）"""
+    config = dict(config or {})
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        config["callbacks"] = [handler]
+    elif isinstance(callbacks, list):
+        config["callbacks"] = [*callbacks, handler]
+    else:
+        manager = callbacks.copy()
+        manager.add_handler(handler, inherit=True)
+        config["callbacks"] = manager
+    return config
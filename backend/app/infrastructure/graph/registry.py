@@ -1,40 +1,81 @@
 """
-Graph Registry — 按 workflow_type 注册和查找图构造函数
+Graph Registry — 按 workflow_type 注册和查找图构造函数，并缓存编译好的图
 
 用法:
     from app.infrastructure.graph import graph_registry
 
     @graph_registry.register("chapter_outline")
-    def build_chapter_outline_graph(model, **kwargs):
+    def build_chapter_outline_graph(model=None, **kwargs):
         ...
         return compiled_graph
 
-    graph = graph_registry.get("chapter_outline")
+    graph = graph_registry.compile("chapter_outline", checkpointer=checkpointer)
+    await graph.ainvoke(state, config=bind_model(model))
+
+编译缓存:
+- 图的拓扑与模型无关：compile() 按 (workflow_type, 构造函数, 工具实例, checkpointer) 缓存编译结果，
+  构造时 model=None；本次调用的模型经 config["configurable"]["model"] 传入，节点 / 中间件用
+  bound_model() 取出（config 中的非基本类型值不会写入 checkpoint 元数据）
+- 命中时把该图当初的编译耗时记为节省的时间，计入 MetricsCollector
 """
 
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
 from typing import Any, Protocol
 
 from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+from langgraph.config import get_config
 from langgraph.graph.state import CompiledStateGraph
 
+from app.core.metrics import metrics
+
+MODEL_CONFIG_KEY = "model"
+
+# 编译缓存条目上限（workflow_type × 工具集 × checkpointer 的组合数通常很小）
+_MAX_COMPILED = 32
+
 
 class GraphBuilder(Protocol):
-    """图构造函数签名"""
+    """图构造函数签名；model 为 None 时节点在运行时从 config 取模型"""
+
+    def __call__(self, model: BaseChatModel | None = None, **kwargs: Any) -> CompiledStateGraph: ...
 
-    def __call__(self, model: BaseChatModel, **kwargs: Any) -> CompiledStateGraph: ...
+
+def bind_model(model: BaseChatModel, config: RunnableConfig | None = None) -> RunnableConfig:
+    """返回在 configurable 中携带本次调用模型的 config（不修改传入的 config）"""
+    bound = dict(config or {})
+    bound["configurable"] = {**(bound.get("configurable") or {}), MODEL_CONFIG_KEY: model}
+    return bound
+
+
+def bound_model(config: RunnableConfig | None = None) -> BaseChatModel | None:
+    """取本次调用绑定的模型；未传 config 时读取当前图执行上下文，不在图内执行时返回 None"""
+    if config is None:
+        try:
+            config = get_config()
+        except RuntimeError:
+            return None
+    return (config.get("configurable") or {}).get(MODEL_CONFIG_KEY)
 
 
 class GraphRegistry:
     """工作流图注册表"""
 
-    def __init__(self):
+    def __init__(self, max_compiled: int = _MAX_COMPILED):
         self._builders: dict[str, GraphBuilder] = {}
+        self.max_compiled = max_compiled
+        # key → (编译好的图, 编译耗时秒数, checkpointer, 工具)；保留 checkpointer 与工具的引用使 key 中的 id 不被复用
+        self._compiled: OrderedDict[tuple, tuple[CompiledStateGraph, float, Any, tuple | None]] = OrderedDict()
 
     def register(self, workflow_type: str):
         """装饰器：注册图构造函数"""
 
         def decorator(fn: GraphBuilder) -> GraphBuilder:
             self._builders[workflow_type] = fn
+            self._compiled.clear()
             return fn
 
         return decorator
@@ -46,6 +87,41 @@ class GraphRegistry:
             raise ValueError(f"未注册的工作流类型: {workflow_type}（可用: {available}）")
         return builder
 
+    def compile(
+        self,
+        workflow_type: str,
+        *,
+        checkpointer: Any = None,
+        tools: Sequence[BaseTool] | None = None,
+    ) -> CompiledStateGraph:
+        """取编译好的图（不绑定模型）；同一 (类型, 工具集, checkpointer) 只编译一次"""
+        builder = self.get(workflow_type)
+        # 按工具实例而非名称区分：同名的不同工具实例编译出的图不能互相复用
+        tool_set = tuple(tools) if tools is not None else None
+        tool_ids = tuple(id(tool) for tool in tool_set) if tool_set is not None else None
+        key = (workflow_type, builder, tool_ids, id(checkpointer))
+        cached = self._compiled.get(key)
+        if cached is not None:
+            self._compiled.move_to_end(key)
+            metrics.record_graph_compile(workflow_type, hit=True, compile_s=cached[1])
+            return cached[0]
+
+        build_kwargs: dict[str, Any] = {"checkpointer": checkpointer}
+        if tool_set is not None:
+            build_kwargs["tools"] = list(tool_set)
+        started = time.perf_counter()
+        graph = builder(model=None, **build_kwargs)
+        elapsed = time.perf_counter() - started
+        metrics.record_graph_compile(workflow_type, hit=False, compile_s=elapsed)
+
+        self._compiled[key] = (graph, elapsed, checkpointer, tool_set)
+        while len(self._compiled) > self.max_compiled:
+            self._compiled.popitem(last=False)
+        return graph
+
+    def clear_compiled(self) -> None:
+        self._compiled.clear()
+
     @property
     def registered_types(self) -> list[str]:
         return sorted(self._builders.keys())
@@ -4,8 +4,9 @@ Graph Runner — 执行图、采集事件、管理运行生命周期
 职责:
 1. 创建/恢复会话
 2. 启动 run（调用图）
-3. 事件采集（node_start/end, token, error）
-4. Token 回填（usage_metadata）
+3. 事件采集（node_start/end, token, error）；token 按时间 / 字符数合并后再推送，
+   节点事件经 RunEventSink 缓冲批量落库
+4. Token 回填（usage_metadata，经 RunMetricsHandler 回调累计）与节点 / 模型调用耗时指标
 5. 结果落库
 """
 
@@ -24,11 +25,15 @@ from app.core.metrics import metrics
 from app.domain.ai_runtime.enums import EventType, RunStatus
 from app.infrastructure.db.models.ai_runtime import (
     AIRun,
-    AIRunEvent,
     LangGraphSession,
 )
+from app.infrastructure.events import RunEventBus
 
-from .registry import graph_registry
+from .coalescer import TokenCoalescer, with_flush_deadline
+from .event_sink import RunEventSink, is_node_event
+from .instrumentation import RunMetricsHandler, with_callback
+from .registry import bind_model, graph_registry
+from .sse_events import chunk_text
 
 logger = logging.getLogger(__name__)
 
@@ -41,10 +46,12 @@ class GraphRunner:
         db: AsyncSession,
         checkpointer: BaseCheckpointSaver | None = None,
         event_queue: asyncio.Queue | None = None,
+        event_bus: RunEventBus | None = None,
     ):
         self.db = db
         self.checkpointer = checkpointer
         self.event_queue = event_queue
+        self.event_bus = event_bus
 
     async def get_or_create_session(
         self,
@@ -104,13 +111,20 @@ class GraphRunner:
         }
         return payload
 
+    def _token_payload(self, run_id: int, node: str | None, sequence: int, text: str) -> dict:
+        """合并后的一段模型输出（data.content 为本段全部文本）"""
+        return self._make_event_payload("token", node, sequence, data={"content": text}, run_id=run_id)
+
     async def _push_event(self, payload: dict) -> None:
-        """推送事件到 queue（如果已注册）"""
-        if self.event_queue is not None:
+        """推送事件：发布到 run 事件总线，并写入 consume_events 的 queue（满时等待）"""
+        if self.event_bus is not None:
             try:
-                self.event_queue.put_nowait(payload)
-            except asyncio.QueueFull:
-                logger.warning("Event queue full, dropping event: %s", payload.get("type"))
+                await self.event_bus.publish(payload["run_id"], payload)
+            except Exception:
+                # 实时广播失败不影响 run 本身（结果与节点事件仍会落库）
+                logger.warning("Failed to publish run event %s", payload.get("type"), exc_info=True)
+        if self.event_queue is not None:
+            await self.event_queue.put(payload)
 
     async def execute(
         self,
@@ -126,35 +140,32 @@ class GraphRunner:
         await self.db.flush()
 
         seq = 0
-        total_usage = None
         started_at = datetime.now(UTC)
+        sink = RunEventSink(self.db, run.id)
+        instrumentation = RunMetricsHandler(run.workflow_type)
 
         try:
-            builder = graph_registry.get(run.workflow_type)
-            graph = builder(model, checkpointer=self.checkpointer, **graph_kwargs)
+            graph = graph_registry.compile(
+                run.workflow_type,
+                checkpointer=self.checkpointer,
+                tools=graph_kwargs.get("tools"),
+            )
 
             # 记录开始事件
-            seq = await self._record_event(
-                run.id,
-                EventType.NODE_START,
-                "graph",
-                seq,
-            )
+            seq = sink.record(EventType.NODE_START, "graph", seq)
             payload = self._make_event_payload("node_start", "graph", seq, run_id=run.id)
             await self._push_event(payload)
 
-            config = graph_kwargs.get("config")
+            # 编译缓存中的图不含模型：本次调用的模型经 config 绑定
+            config = with_callback(bind_model(model, graph_kwargs.get("config")), instrumentation)
             context = graph_kwargs.get("context")
-            invoke_kwargs = {}
-            if self.checkpointer is not None and config is not None:
-                invoke_kwargs["config"] = config
+            invoke_kwargs = {"config": config}
             if context is not None:
                 invoke_kwargs["context"] = context
             result = await graph.ainvoke(input_state, **invoke_kwargs)
 
             # 记录完成事件
-            seq = await self._record_event(
-                run.id,
+            seq = sink.record(
                 EventType.NODE_END,
                 "graph",
                 seq,
@@ -170,8 +181,8 @@ class GraphRunner:
             await self._push_event(payload)
 
             # Token 回填
-            if total_usage:
-                run.tokens_used = total_usage.get("total_tokens", 0)
+            if instrumentation.usage:
+                run.tokens_used = instrumentation.total_tokens
 
             run.status = RunStatus.SUCCEEDED
             run.output_data = (
@@ -184,7 +195,7 @@ class GraphRunner:
                 else str(result)
             )
             run.finished_at = datetime.now(UTC)
-            await self.db.flush()
+            await sink.flush()
 
             # 记录 metrics
             duration = (run.finished_at - started_at).total_seconds()
@@ -206,9 +217,9 @@ class GraphRunner:
             logger.info("Graph run %s was cancelled", run.id)
             run.status = RunStatus.CANCELLED
             run.finished_at = datetime.now(UTC)
-            if total_usage:
-                run.tokens_used = total_usage.get("total_tokens", 0)
-            await self.db.flush()
+            if instrumentation.usage:
+                run.tokens_used = instrumentation.total_tokens
+            await sink.flush()
             duration = (run.finished_at - started_at).total_seconds()
             metrics.record_ai_run(succeeded=False, duration_s=duration, tokens=run.tokens_used or 0)
             await self._push_event(
@@ -222,19 +233,13 @@ class GraphRunner:
 
         except Exception as exc:
             logger.exception("Graph run %s failed", run.id)
-            await self._record_event(
-                run.id,
-                EventType.ERROR,
-                None,
-                seq + 1,
-                data={"error": str(exc)},
-            )
+            sink.record(EventType.ERROR, None, seq + 1, data={"error": str(exc)})
             run.status = RunStatus.FAILED
             run.error_message = str(exc)
             run.finished_at = datetime.now(UTC)
-            if total_usage:
-                run.tokens_used = total_usage.get("total_tokens", 0)
-            await self.db.flush()
+            if instrumentation.usage:
+                run.tokens_used = instrumentation.total_tokens
+            await sink.flush()
             duration = (run.finished_at - started_at).total_seconds()
             metrics.record_ai_run(succeeded=False, duration_s=duration, tokens=run.tokens_used or 0)
             await self._push_event(
@@ -261,57 +266,72 @@ class GraphRunner:
         await self.db.flush()
 
         seq = 0
-        total_usage = None
         started_at = datetime.now(UTC)
+        coalescer = TokenCoalescer()
+        sink = RunEventSink(self.db, run.id)
+        instrumentation = RunMetricsHandler(run.workflow_type)
+        streamed_usage = None  # on_chat_model_end 事件中的 usage；图不经 LangChain 回调执行时兜底
 
         try:
-            builder = graph_registry.get(run.workflow_type)
-            graph = builder(model, checkpointer=self.checkpointer, **graph_kwargs)
+            graph = graph_registry.compile(
+                run.workflow_type,
+                checkpointer=self.checkpointer,
+                tools=graph_kwargs.get("tools"),
+            )
 
-            config = graph_kwargs.get("config")
+            config = with_callback(bind_model(model, graph_kwargs.get("config")), instrumentation)
             context = graph_kwargs.get("context")
-            stream_kwargs = {"version": "v2"}
-            if self.checkpointer is not None and config is not None:
-                stream_kwargs["config"] = config
+            stream_kwargs = {"version": "v2", "config": config}
             if context is not None:
                 stream_kwargs["context"] = context
             stream_iter = graph.astream_events(input_state, **stream_kwargs)
-            async for event in stream_iter:
+            async for event in with_flush_deadline(stream_iter, coalescer):
+                if event is None:
+                    # 模型停顿：到时限仍无新 chunk，推出已缓冲的文本
+                    source = coalescer.source
+                    text = coalescer.flush_if_due()
+                    if text:
+                        payload = self._token_payload(run.id, source, seq, text)
+                        await self._push_event(payload)
+                        yield payload
+                    continue
                 kind = event.get("event", "")
                 name = event.get("name", "")
+                node_event = kind in ("on_chain_start", "on_chain_end") and is_node_event(event)
+                await sink.flush_if_due()
+
+                # 节点边界与模型调用结束时先推出缓冲的 token，保证事件顺序
+                if kind != "on_chat_model_stream" and coalescer.pending:
+                    source = coalescer.source
+                    boundary = node_event or kind == "on_chat_model_end"
+                    text = coalescer.flush() if boundary else coalescer.flush_if_due()
+                    if text:
+                        payload = self._token_payload(run.id, source, seq, text)
+                        await self._push_event(payload)
+                        yield payload
 
-                if kind == "on_chain_start":
-                    seq = await self._record_event(
-                        run.id,
-                        EventType.NODE_START,
-                        name,
-                        seq,
-                    )
+                if kind == "on_chain_start" and node_event:
+                    seq = sink.record(EventType.NODE_START, name, seq)
                     payload = self._make_event_payload("node_start", name, seq, run_id=run.id)
                     await self._push_event(payload)
                     yield payload
 
-                elif kind == "on_chain_end":
-                    seq = await self._record_event(
-                        run.id,
-                        EventType.NODE_END,
-                        name,
-                        seq,
-                    )
+                elif kind == "on_chain_end" and node_event:
+                    seq = sink.record(EventType.NODE_END, name, seq)
                     payload = self._make_event_payload("node_end", name, seq, run_id=run.id)
                     await self._push_event(payload)
                     yield payload
+                    # 事件先推给消费方，再在节点边界落库
+                    await sink.flush()
 
                 elif kind == "on_chat_model_stream":
-                    chunk = event.get("data", {}).get("chunk")
-                    if chunk and hasattr(chunk, "content") and chunk.content:
-                        payload = self._make_event_payload(
-                            "token",
-                            name,
-                            seq,
-                            data={"content": chunk.content},
-                            run_id=run.id,
-                        )
+                    if coalescer.pending and coalescer.source != name:
+                        payload = self._token_payload(run.id, coalescer.source, seq, coalescer.flush())
+                        await self._push_event(payload)
+                        yield payload
+                    text = coalescer.add(chunk_text(event.get("data", {}).get("chunk")), source=name)
+                    if text:
+                        payload = self._token_payload(run.id, name, seq, text)
                         await self._push_event(payload)
                         yield payload
 
@@ -319,7 +339,7 @@ class GraphRunner:
                     output = event.get("data", {}).get("output")
                     if output and hasattr(output, "usage_metadata") and output.usage_metadata:
                         usage = output.usage_metadata
-                        total_usage = add_usage(total_usage, usage)
+                        streamed_usage = add_usage(streamed_usage, usage)
                         payload = self._make_event_payload(
                             "usage",
                             name,
@@ -334,11 +354,16 @@ class GraphRunner:
                         await self._push_event(payload)
                         yield payload
 
+            if coalescer.pending:
+                payload = self._token_payload(run.id, coalescer.source, seq, coalescer.flush())
+                await self._push_event(payload)
+                yield payload
+
             run.status = RunStatus.SUCCEEDED
             run.finished_at = datetime.now(UTC)
-            if total_usage:
-                run.tokens_used = total_usage.get("total_tokens", 0)
-            await self.db.flush()
+            if instrumentation.usage or streamed_usage:
+                run.tokens_used = (instrumentation.usage or streamed_usage).get("total_tokens", 0)
+            await sink.flush()
 
             duration = (run.finished_at - started_at).total_seconds()
             metrics.record_ai_run(succeeded=True, duration_s=duration, tokens=run.tokens_used or 0)
@@ -354,11 +379,15 @@ class GraphRunner:
 
         except asyncio.CancelledError:
             logger.info("Graph stream run %s was cancelled", run.id)
+            if coalescer.pending:
+                payload = self._token_payload(run.id, coalescer.source, seq, coalescer.flush())
+                await self._push_event(payload)
+                yield payload
             run.status = RunStatus.CANCELLED
             run.finished_at = datetime.now(UTC)
-            if total_usage:
-                run.tokens_used = total_usage.get("total_tokens", 0)
-            await self.db.flush()
+            if instrumentation.usage or streamed_usage:
+                run.tokens_used = (instrumentation.usage or streamed_usage).get("total_tokens", 0)
+            await sink.flush()
             duration = (run.finished_at - started_at).total_seconds()
             metrics.record_ai_run(succeeded=False, duration_s=duration, tokens=run.tokens_used or 0)
             payload = self._make_event_payload("cancelled", sequence=seq + 1, run_id=run.id)
@@ -368,19 +397,17 @@ class GraphRunner:
 
         except Exception as exc:
             logger.exception("Graph stream run %s failed", run.id)
-            await self._record_event(
-                run.id,
-                EventType.ERROR,
-                None,
-                seq + 1,
-                data={"error": str(exc)},
-            )
+            if coalescer.pending:
+                payload = self._token_payload(run.id, coalescer.source, seq, coalescer.flush())
+                await self._push_event(payload)
+                yield payload
+            sink.record(EventType.ERROR, None, seq + 1, data={"error": str(exc)})
             run.status = RunStatus.FAILED
             run.error_message = str(exc)
             run.finished_at = datetime.now(UTC)
-            if total_usage:
-                run.tokens_used = total_usage.get("total_tokens", 0)
-            await self.db.flush()
+            if instrumentation.usage or streamed_usage:
+                run.tokens_used = (instrumentation.usage or streamed_usage).get("total_tokens", 0)
+            await sink.flush()
             duration = (run.finished_at - started_at).total_seconds()
             metrics.record_ai_run(succeeded=False, duration_s=duration, tokens=run.tokens_used or 0)
             payload = self._make_event_payload(
@@ -441,23 +468,3 @@ class GraphRunner:
                     await task
                 except asyncio.CancelledError:
                     pass
-
-    async def _record_event(
-        self,
-        run_id: int,
-        event_type: EventType,
-        node_name: str | None,
-        seq: int,
-        data: dict | None = None,
-    ) -> int:
-        """记录事件并返回下一个序列号"""
-        evt = AIRunEvent(
-            run_id=run_id,
-            event_type=event_type.value,
-            node_name=node_name,
-            sequence=seq,
-            data=json.dumps(data, ensure_ascii=False) if data else None,
-        )
-        self.db.add(evt)
-        await self.db.flush()
-        return seq + 1
@@ -6,6 +6,8 @@ import json
 from collections.abc import AsyncIterator
 from typing import Any
 
+from app.infrastructure.graph.coalescer import TokenCoalescer, with_flush_deadline
+
 EVENT_NODE_START = "node_start"
 EVENT_NODE_END = "node_end"
 EVENT_TOOL_START = "tool_start"
@@ -33,7 +35,7 @@ def truncate_tool_result(result: str, max_len: int = 200) -> tuple[str, bool]:
     return result[: max_len - 1] + "…", True
 
 
-def _chunk_text(chunk) -> str:
+def chunk_text(chunk) -> str:
     """Extract only human-visible text from an AIMessageChunk-like object."""
     if getattr(chunk, "tool_call_chunks", None):
         return ""
@@ -68,12 +70,31 @@ async def stream_agent_events(graph, input_state, *, context, config=None) -> As
     if config is not None:
         kwargs["config"] = config
 
+    coalescer = TokenCoalescer()
     try:
-        async for event in graph.astream_events(input_state, **kwargs):
+        async for event in with_flush_deadline(graph.astream_events(input_state, **kwargs), coalescer):
+            if event is None:
+                text = coalescer.flush_if_due()
+                if text:
+                    yield serialize_event(EVENT_TEXT, {"chunk": text})
+                continue
             kind = event.get("event")
             name = event.get("name", "")
             data = event.get("data") or {}
 
+            if kind == "on_chat_model_stream":
+                text = coalescer.add(chunk_text(data.get("chunk")))
+                if text:
+                    yield serialize_event(EVENT_TEXT, {"chunk": text})
+                continue
+
+            # Node / tool boundaries and model-call ends always flush buffered text first
+            boundary = kind == "on_chat_model_end" or kind in {"on_tool_start", "on_tool_end"}
+            boundary = boundary or (kind in {"on_chain_start", "on_chain_end"} and name in NODE_LABELS)
+            text = coalescer.flush() if boundary else coalescer.flush_if_due()
+            if text:
+                yield serialize_event(EVENT_TEXT, {"chunk": text})
+
             if kind == "on_chain_start" and name in NODE_LABELS:
                 yield serialize_event(EVENT_NODE_START, {"name": name, "label": NODE_LABELS[name]})
             elif kind == "on_chain_end" and name in NODE_LABELS:
@@ -86,11 +107,13 @@ async def stream_agent_events(graph, input_state, *, context, config=None) -> As
                     EVENT_TOOL_END,
                     {"name": name, "result": result, "truncated": truncated},
                 )
-            elif kind == "on_chat_model_stream":
-                text = _chunk_text(data.get("chunk"))
-                if text:
-                    yield serialize_event(EVENT_TEXT, {"chunk": text})
+        text = coalescer.flush()
+        if text:
+            yield serialize_event(EVENT_TEXT, {"chunk": text})
         yield serialize_event(EVENT_DONE, {})
     except Exception as exc:
+        text = coalescer.flush()
+        if text:
+            yield serialize_event(EVENT_TEXT, {"chunk": text})
         yield serialize_event(EVENT_ERROR, {"message": str(exc)})
         yield serialize_event(EVENT_DONE, {})
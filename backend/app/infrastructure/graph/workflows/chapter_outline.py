@@ -7,10 +7,11 @@
 
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
 from typing_extensions import TypedDict
 
-from app.infrastructure.graph.registry import graph_registry
+from app.infrastructure.graph.registry import bound_model, graph_registry
 
 # ---------- 状态定义 ----------
 
@@ -74,15 +75,18 @@ def build_prompt(state: ChapterOutlineState) -> dict:
     }
 
 
-def _make_generate_outline(model: BaseChatModel):
-    """闭包：将 model 注入到节点函数中"""
+def _make_generate_outline(model: BaseChatModel | None):
+    """闭包：优先使用本次调用绑定的模型（见 registry.bind_model），否则用构造时传入的 model"""
 
-    async def generate_outline(state: ChapterOutlineState) -> dict:
+    async def generate_outline(state: ChapterOutlineState, config: RunnableConfig) -> dict:
         messages = [
             SystemMessage(content=state["system_prompt"]),
             HumanMessage(content=state["user_prompt"]),
         ]
-        response = await model.ainvoke(messages)
+        llm = bound_model(config) or model
+        if llm is None:
+            raise RuntimeError("chapter_outline 图未绑定模型")
+        response = await llm.ainvoke(messages)
         return {"raw_output": response.content}
 
     return generate_outline
@@ -111,7 +115,7 @@ def format_output(state: ChapterOutlineState) -> dict:
 
 
 @graph_registry.register("chapter_outline")
-def build_chapter_outline_graph(model: BaseChatModel, checkpointer=None, **kwargs):
+def build_chapter_outline_graph(model: BaseChatModel | None = None, checkpointer=None, **kwargs):
     """构建章节大纲生成图"""
     graph = StateGraph(ChapterOutlineState)
 
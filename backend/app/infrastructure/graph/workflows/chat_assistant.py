@@ -2,72 +2,139 @@
 
 from __future__ import annotations
 
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
 from contextlib import AbstractAsyncContextManager
 from typing import Any
 
 from langchain.agents import create_agent
-from langchain.agents.middleware import ModelRequest, dynamic_prompt
+from langchain.agents.middleware import ModelRequest, dynamic_prompt, wrap_model_call
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.tools import BaseTool
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.state import CompiledStateGraph
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.application.ai_context_builder import AIContextBuilder
+from app.core.metrics import metrics
 from app.infrastructure.graph.chat_assistant_types import ChatAssistantContext, ChatAssistantState
-from app.infrastructure.graph.registry import graph_registry
+from app.infrastructure.graph.registry import bound_model, graph_registry
 from app.infrastructure.graph.tools import CHAT_TOOLS
+from app.infrastructure.llm.prompt_cache import PromptBlock, build_system_message, cached_token_counts
 
 BASE_SYSTEM_PROMPT = """你是 AINovel 的小说写作助手。
 你必须基于当前项目设定回答；信息不足时先调用工具查询，不要编造项目内事实。"""
 
 
 async def _load_project_context(
-    project_id: int, session_factory: Callable[[], AbstractAsyncContextManager[AsyncSession]]
-) -> str:
+    project_id: int,
+    session_factory: Callable[[], AbstractAsyncContextManager[AsyncSession]],
+    focus_texts: list[str | None] | None = None,
+    message: str | None = None,
+) -> tuple[str, str]:
+    """(项目上下文, 消息提及的实体段)；前者按 focus_texts 排序，后者只随 message 变化"""
     async with session_factory() as db:
         builder = AIContextBuilder(db)
-        ctx = await builder.get_project_context(project_id, mode="chat")
-        return builder.format_for_chat_with_budget(ctx)
+        project_context = await builder.get_chat_context_text(project_id, focus_texts=focus_texts)
+        return project_context, await builder.get_chat_focus_text(project_id, message)
+
+
+def _latest_user_text(state: ChatAssistantState) -> str | None:
+    for message in reversed(state.get("messages") or []):
+        if isinstance(message, HumanMessage):
+            return message.text
+    return None
 
 
 async def inject_context(state: ChatAssistantState, runtime) -> dict[str, str]:
-    """Load lightweight project context before the agent runs."""
+    """Load lightweight project context before the agent runs.
+
+    The project context is ranked by the chapter segment only, so it stays byte-identical
+    across turns of the same chapter and revision and can sit in the provider prompt cache.
+    Entities mentioned in the latest user message go into a separate focus block.
+    """
     ctx: ChatAssistantContext = runtime.context
-    project_context = await _load_project_context(ctx.project_id, ctx.session_factory)
-    return {"project_context": project_context}
+    project_context, focus_context = await _load_project_context(
+        ctx.project_id,
+        ctx.session_factory,
+        [ctx.chapter_context_segment],
+        message=_latest_user_text(state),
+    )
+    return {"project_context": project_context, "focus_context": focus_context}
 
 
 @dynamic_prompt
 async def project_prompt(request: ModelRequest[ChatAssistantContext]) -> SystemMessage:
-    """Build the per-request system prompt from injected state and context."""
+    """Build the per-request system prompt from injected state and context.
+
+    Blocks go from stable to volatile so provider prompt caches can reuse the prefix:
+    base prompt, project context (changes with the project revision and the chapter segment),
+    chapter segment (changes when the chapter is edited), then per-turn blocks: entities
+    mentioned in the latest message and the rendered template (embeds the message).
+    Anthropic models get cache breakpoints after the project context and the chapter segment.
+    """
     ctx = request.runtime.context
-    parts = [
-        BASE_SYSTEM_PROMPT,
-        "# 项目上下文\n" + (request.state.get("project_context") or ""),
+    blocks = [
+        PromptBlock(BASE_SYSTEM_PROMPT),
+        PromptBlock("# 项目上下文\n" + (request.state.get("project_context") or ""), cache_breakpoint=True),
     ]
     # 分层章节段（L1 全文 + L2 详细 + L3 简要），由调用方按降级链预渲染
     if ctx.chapter_context_segment:
-        parts.append("# 章节内容\n" + ctx.chapter_context_segment)
+        blocks.append(PromptBlock("# 章节内容\n" + ctx.chapter_context_segment, cache_breakpoint=True))
+    # 本轮消息提到的实体：每轮变化，放在最后一个缓存断点之后
+    if request.state.get("focus_context"):
+        blocks.append(PromptBlock("# 本轮提及的设定\n" + request.state["focus_context"]))
     if ctx.injected_system_prompt:
-        parts.append("# 用户提示词模板\n" + ctx.injected_system_prompt)
-    return SystemMessage(content="\n\n".join(parts))
+        blocks.append(PromptBlock("# 用户提示词模板\n" + ctx.injected_system_prompt))
+    return build_system_message(blocks, request.model)
+
+
+@wrap_model_call
+async def record_usage(request: ModelRequest[ChatAssistantContext], handler):
+    """Record token usage, including provider prompt-cache reads and writes."""
+    response = await handler(request)
+    for message in response.result:
+        if isinstance(message, AIMessage) and message.usage_metadata:
+            usage = message.usage_metadata
+            cache_read, cache_creation = cached_token_counts(usage)
+            metrics.record_llm_usage(
+                input_tokens=usage.get("input_tokens", 0),
+                output_tokens=usage.get("output_tokens", 0),
+                cache_read_tokens=cache_read,
+                cache_creation_tokens=cache_creation,
+            )
+    return response
+
+
+@wrap_model_call
+async def invocation_model(request: ModelRequest[ChatAssistantContext], handler):
+    """Swap in the model bound to this invocation; cached graphs are compiled without one."""
+    model = bound_model()
+    if model is not None:
+        request = request.override(model=model)
+    elif request.model is None:
+        raise RuntimeError("chat_assistant graph has no model bound for this invocation")
+    return await handler(request)
 
 
 @graph_registry.register("chat_assistant")
 def build_chat_assistant_graph(
-    model: BaseChatModel,
+    model: BaseChatModel | None = None,
     checkpointer=None,
     store=None,
+    tools: Sequence[BaseTool] | None = None,
     **kwargs: Any,
 ) -> CompiledStateGraph:
-    """Build the chat assistant graph."""
+    """Build the chat assistant graph.
+
+    ``model`` may be None when compiling for the registry cache; the model is then
+    bound per invocation through ``registry.bind_model``.
+    """
     agent = create_agent(
         model=model,
-        tools=CHAT_TOOLS,
+        tools=CHAT_TOOLS if tools is None else list(tools),
         system_prompt=BASE_SYSTEM_PROMPT,
-        middleware=[project_prompt],
+        middleware=[invocation_model, record_usage, project_prompt],
         state_schema=ChatAssistantState,
         context_schema=ChatAssistantContext,
         name="chat_assistant_agent",
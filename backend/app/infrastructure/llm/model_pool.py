@@ -0,0 +1,150 @@
+"""
+ChatModel 连接池 — 按 ProviderConfig 指纹复用模型实例
+
+职责：
+- 同一 (provider, ProviderConfig) 只构建一次 ChatModel，连同其 httpx 客户端 / 连接池一起复用，
+  省掉每次请求的 SDK 客户端构建与 TLS 握手
+- 容量有限，按 LRU 淘汰；指纹是配置的 sha256，API Key 不以明文出现在 key 里
+- 新建实例挂上所属 API Key 的限流器（rate_limiter.provider_rate_limiters）
+- ModelConfigService 更新 / 删除配置时按 model_config_id 失效对应条目
+- 被淘汰的实例可能仍在服务进行中的请求，其 httpx 客户端延迟 CLOSE_GRACE_SECONDS 再关闭；
+  应用关闭时 aclose() 立即关闭全部
+
+注意：仅在单进程（单事件循环）内复用；ChatModel 本身无请求级状态，可被并发请求共享。
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+
+from app.core.config import get_settings
+
+from .provider_adapters import BaseProvider, ProviderConfig
+from .rate_limiter import provider_rate_limiters
+
+logger = logging.getLogger(__name__)
+
+# 淘汰后等待进行中的请求（含流式输出）结束再关闭客户端
+CLOSE_GRACE_SECONDS = 600.0
+
+# 自建 httpx 客户端的字段（ChatOpenAI 系；未设代理时 SDK 用的是进程级共享客户端，不归池管）
+_HTTP_CLIENT_FIELDS = ("http_async_client", "http_client")
+
+
+def config_fingerprint(provider_type: str, config: ProviderConfig) -> str:
+    """(provider_type, ProviderConfig) 的稳定指纹。"""
+    payload = json.dumps([provider_type, dataclasses.asdict(config)], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _close_model(model: BaseChatModel) -> None:
+    for field in _HTTP_CLIENT_FIELDS:
+        client = getattr(model, field, None)
+        try:
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            elif isinstance(client, httpx.Client):
+                client.close()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("关闭模型 HTTP 客户端失败: %s", exc)
+
+
+class ChatModelPool:
+    """LRU 的 ChatModel 复用池"""
+
+    def __init__(self, max_entries: int | None = None):
+        """max_entries 未指定时每次读取 AI_MODEL_POOL_SIZE"""
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, BaseChatModel] = OrderedDict()
+        # model_config_id → 由该配置构建的指纹（配置改动后旧指纹要一并失效）
+        self._by_config: dict[int, set[str]] = {}
+        self._owners: dict[str, set[int]] = {}
+        # 已淘汰、待关闭的实例：(可关闭时刻, 模型)
+        self._retiring: list[tuple[float, BaseChatModel]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def max_entries(self) -> int:
+        return self._max_entries if self._max_entries is not None else get_settings().ai.model_pool_size
+
+    async def get(
+        self,
+        provider: BaseProvider,
+        config: ProviderConfig,
+        *,
+        model_config_id: int | None = None,
+    ) -> BaseChatModel:
+        """命中则返回池中实例，否则构建并放入；构建失败（如 URL 校验）原样抛出，不入池。"""
+        await self._sweep()
+        key = config_fingerprint(provider.provider_type, config)
+        model = self._entries.get(key)
+        if model is not None:
+            self._entries.move_to_end(key)
+        else:
+            model = provider.build_chat_model(config)
+            provider_rate_limiters.attach(model, provider.provider_type, config)
+            self._entries[key] = model
+        if model_config_id is not None:
+            # 内容相同的两份配置共享实例，任一份变更都让它失效
+            self._by_config.setdefault(model_config_id, set()).add(key)
+            self._owners.setdefault(key, set()).add(model_config_id)
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._retire(oldest)
+        return model
+
+    def invalidate(self, model_config_id: int) -> int:
+        """失效某个模型配置构建的全部实例，返回失效条数。"""
+        keys = self._by_config.pop(model_config_id, set())
+        for key in keys:
+            self._retire(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        """丢弃全部条目（不关闭客户端，交给 GC），测试隔离用。"""
+        self._entries.clear()
+        self._by_config.clear()
+        self._owners.clear()
+        self._retiring.clear()
+
+    async def aclose(self) -> None:
+        """关闭全部实例（含待关闭的），应用关闭时调用。"""
+        for key in list(self._entries):
+            self._retire(key)
+        retiring, self._retiring = self._retiring, []
+        for _deadline, model in retiring:
+            await _close_model(model)
+
+    def _retire(self, key: str) -> None:
+        model = self._entries.pop(key, None)
+        for owner in self._owners.pop(key, ()):
+            keys = self._by_config.get(owner)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_config[owner]
+        if model is not None:
+            self._retiring.append((time.monotonic() + CLOSE_GRACE_SECONDS, model))
+
+    async def _sweep(self) -> None:
+        if not self._retiring:
+            return
+        now = time.monotonic()
+        due = [model for deadline, model in self._retiring if deadline <= now]
+        if not due:
+            return
+        self._retiring = [(deadline, model) for deadline, model in self._retiring if deadline > now]
+        for model in due:
+            await _close_model(model)
+
+
+# 全局单例
+chat_model_pool = ChatModelPool()
@@ -0,0 +1,58 @@
+"""
+Provider 提示缓存适配
+
+职责：
+- 系统提示按「稳定 → 易变」的块顺序拼装：前缀不变时 OpenAI 的自动前缀缓存即可命中
+- Anthropic 需要显式断点：在标记的块末尾加 cache_control（ephemeral），最多 4 个
+- 其他 provider 不认识 cache_control 字段，仍拼成单个字符串
+- 从 usage_metadata.input_token_details 读出缓存命中 / 写入的 token 数（LangChain 统一口径）
+"""
+
+from dataclasses import dataclass
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import SystemMessage
+
+# Anthropic 单次请求最多 4 个 cache_control 断点
+MAX_CACHE_BREAKPOINTS = 4
+
+_CACHE_CONTROL_LLM_TYPES = {"anthropic-chat"}
+
+
+@dataclass(frozen=True)
+class PromptBlock:
+    """系统提示的一个块；cache_breakpoint=True 表示缓存前缀到此为止（含本块）"""
+
+    text: str
+    cache_breakpoint: bool = False
+
+
+def supports_cache_control(model: BaseChatModel | None) -> bool:
+    """模型是否接受 content block 上的 cache_control（bind_tools 等包装会先解开）。"""
+    while model is not None and hasattr(model, "bound"):
+        model = model.bound
+    return getattr(model, "_llm_type", None) in _CACHE_CONTROL_LLM_TYPES
+
+
+def build_system_message(blocks: list[PromptBlock], model: BaseChatModel | None = None) -> SystemMessage:
+    """按块顺序组装系统消息；空块跳过，块之间以空行分隔。"""
+    blocks = [block for block in blocks if block.text]
+    if not supports_cache_control(model):
+        return SystemMessage(content="\n\n".join(block.text for block in blocks))
+
+    # 断点超过上限时保留最靠后的几个：前缀越长，命中省下的越多
+    breakpoints = [i for i, block in enumerate(blocks) if block.cache_breakpoint][-MAX_CACHE_BREAKPOINTS:]
+    content: list[dict] = []
+    for i, block in enumerate(blocks):
+        text = block.text if i == len(blocks) - 1 else block.text + "\n\n"
+        item: dict = {"type": "text", "text": text}
+        if i in breakpoints:
+            item["cache_control"] = {"type": "ephemeral"}
+        content.append(item)
+    return SystemMessage(content=content)
+
+
+def cached_token_counts(usage_metadata: dict | None) -> tuple[int, int]:
+    """(缓存命中读取的输入 token, 写入缓存的输入 token)；provider 未返回时为 0。"""
+    details = (usage_metadata or {}).get("input_token_details") or {}
+    return int(details.get("cache_read") or 0), int(details.get("cache_creation") or 0)
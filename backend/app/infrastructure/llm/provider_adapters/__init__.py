@@ -12,6 +12,7 @@ from .base import BaseProvider, ModelInfo, ProviderConfig
 from .custom_provider import CustomProvider
 from .gemini_provider import GeminiProvider
 from .openai_provider import OpenAIProvider
+from .scripted_provider import ScriptedProvider
 
 _REGISTRY: dict[str, BaseProvider] = {
     "openai": OpenAIProvider(),
@@ -19,6 +20,8 @@ _REGISTRY: dict[str, BaseProvider] = {
     "anthropic": AnthropicProvider(),
     "gemini": GeminiProvider(),
     "custom": CustomProvider(),
+    # 离线回放（压测 / 基准测试），需 AI_SCRIPTED_PROVIDER_ENABLED=true 才能构建模型
+    "scripted": ScriptedProvider(),
 }
 
 
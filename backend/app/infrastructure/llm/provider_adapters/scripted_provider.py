@@ -0,0 +1,361 @@
+"""Scripted (offline replay) Provider Adapter
+
+不连任何外部服务的 Provider，用于压测 / 基准测试 chat、SSE、知识分析等链路：
+- 回复来自录制脚本（AI_SCRIPTED_PROVIDER_SCRIPT 指向的 JSON），没有脚本时按长度生成占位文本；
+  structured output 按 schema 名取录制结果，没有则按 JSON Schema 合成最小合法实例
+- 流式输出按 tokens_per_second 逐 token 吐出，首个 token 前等待 ttft 秒
+- 每次调用返回 usage_metadata（输入按字符估算，输出按实际 token 数）
+- 错误注入：每第 N 次调用失败（context_length / rate_limit / server），可选在流式吐出若干 token 后失败；
+  输入超过 max_context_tokens 时抛与真实 provider 文案一致的 context 超限错误
+
+运行参数写在模型配置的 model_name 里，形如 "tps=80,ttft=0.3,output_tokens=400,error=rate_limit,every=5"。
+默认不注册可用：需设置 AI_SCRIPTED_PROVIDER_ENABLED=true。
+
+脚本格式：
+    {
+      "responses": ["第一条回复", "第二条回复"],          # 自由文本调用，按顺序循环
+      "structured": {"ChapterSummarySchema": [{"summary": "..."}]}  # 按 schema 名循环
+    }
+"""
+
+import asyncio
+import json
+import re
+import time
+from collections.abc import AsyncIterator, Iterator
+from operator import itemgetter
+from pathlib import Path
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.output_parsers import JsonOutputParser, PydanticOutputParser
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableMap, RunnablePassthrough
+from pydantic import BaseModel, Field, PrivateAttr
+
+from app.core.config import get_settings
+
+from .base import BaseProvider, ModelInfo, ProviderConfig
+
+# CJK 单字算一个 token，其余每 4 个字符一个 token（与上下文打包的估算口径一致）
+_WIDE_CHARS = r"\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef"
+_TOKEN_RE = re.compile(rf"[{_WIDE_CHARS}]|[^{_WIDE_CHARS}]{{1,4}}")
+_FILLER = "夜色沉沉，远处的灯火一盏接一盏亮起，她握紧了手中的信，转身走进风里。"
+
+_ERRORS = {
+    "context_length": (
+        400,
+        "This model's maximum context length is {limit} tokens. However, your messages resulted in "
+        "{tokens} tokens. (context_length_exceeded)",
+    ),
+    "rate_limit": (429, "Rate limit reached for scripted model. Please try again in 1s."),
+    "server": (500, "The scripted server had an error while processing your request."),
+}
+
+
+class ScriptedProviderError(Exception):
+    """注入的 provider 错误；status_code 与真实 SDK 异常同名，供限流 / 重试逻辑识别"""
+
+    def __init__(self, kind: str, message: str, status_code: int):
+        super().__init__(message)
+        self.kind = kind
+        self.status_code = status_code
+
+
+def split_tokens(text: str) -> list[str]:
+    """按估算口径切分 token，流式输出的每个 chunk 即一个 token。"""
+    return _TOKEN_RE.findall(text)
+
+
+def _message_tokens(messages: list[BaseMessage]) -> int:
+    return sum(len(split_tokens(str(message.content))) for message in messages)
+
+
+def _example_from_schema(schema: dict, defs: dict) -> Any:
+    """按 JSON Schema 合成满足长度 / 数量下限的最小实例。"""
+    if "$ref" in schema:
+        return _example_from_schema(defs[schema["$ref"].rsplit("/", 1)[-1]], defs)
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            options = [option for option in schema[key] if option.get("type") != "null"]
+            return _example_from_schema(options[0] if options else {"type": "null"}, defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+    if "default" in schema and schema["default"] is not None:
+        return schema["default"]
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: _example_from_schema(prop, defs) for name, prop in (schema.get("properties") or {}).items()}
+    if kind == "array":
+        item = _example_from_schema(schema.get("items") or {"type": "string"}, defs)
+        return [item] * max(1, schema.get("minItems", 1))
+    if kind == "string":
+        return (_FILLER * 4)[: max(schema.get("minLength", 0), min(schema.get("maxLength", 24), 24))]
+    if kind == "integer":
+        return max(1, schema.get("minimum", 1))
+    if kind == "number":
+        return float(max(1, schema.get("minimum", 1)))
+    if kind == "boolean":
+        return False
+    return None
+
+
+class ScriptedChatModel(BaseChatModel):
+    """按脚本 / 参数回放的离线 ChatModel"""
+
+    model_name: str = "scripted"
+    responses: list[str] = Field(default_factory=list)
+    structured: dict[str, list[Any]] = Field(default_factory=dict)
+    tokens_per_second: float = 50.0
+    ttft: float = 0.2
+    output_tokens: int = 200
+    max_context_tokens: int = 0  # 0 = 不限
+    error: str | None = None  # context_length / rate_limit / server
+    error_every: int = 0  # 每第 N 次调用注入一次错误；0 = 不注入
+    error_after_tokens: int = 0  # 流式时先吐出这么多 token 再失败
+
+    _calls: int = PrivateAttr(default=0)
+    _cursors: dict[str, int] = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model_name": self.model_name}
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        # 回放模型不发起工具调用，只回文本
+        return self
+
+    def with_structured_output(self, schema, *, method: str = "json_mode", include_raw: bool = False, **kwargs):
+        if isinstance(schema, type) and issubclass(schema, BaseModel):
+            parser = PydanticOutputParser(pydantic_object=schema)
+        else:
+            parser = JsonOutputParser()
+        model = self.bind(scripted_schema=schema)
+        if not include_raw:
+            return model | parser
+        # 与 LangChain 的约定一致：返回 {"raw", "parsed", "parsing_error"}，解析失败不抛出
+        parsed = RunnablePassthrough.assign(parsed=itemgetter("raw") | parser, parsing_error=lambda _: None)
+        unparsed = RunnablePassthrough.assign(parsed=lambda _: None)
+        return RunnableMap(raw=model) | parsed.with_fallbacks([unparsed], exception_key="parsing_error")
+
+    # ── 回复内容 ──
+
+    def _next(self, key: str, items: list[Any]) -> Any:
+        cursor = self._cursors.get(key, 0)
+        self._cursors[key] = cursor + 1
+        return items[cursor % len(items)]
+
+    def _reply_text(self, schema: Any) -> str:
+        if schema is not None:
+            if isinstance(schema, type) and issubclass(schema, BaseModel):
+                name, json_schema = schema.__name__, schema.model_json_schema()
+            else:
+                json_schema = dict(schema)
+                name = json_schema.get("title", "schema")
+            recorded = self.structured.get(name)
+            payload = (
+                self._next(name, recorded)
+                if recorded
+                else _example_from_schema(json_schema, json_schema.get("$defs", {}))
+            )
+            return json.dumps(payload, ensure_ascii=False)
+        if self.responses:
+            return self._next("", self.responses)
+        return (_FILLER * (self.output_tokens // len(_FILLER) + 1))[: self.output_tokens]
+
+    def _check_errors(self, input_tokens: int) -> ScriptedProviderError | None:
+        """返回本次调用要注入的错误（调用计数在此递增）。"""
+        self._calls += 1
+        if self.max_context_tokens and input_tokens > self.max_context_tokens:
+            return self._make_error("context_length", input_tokens)
+        if self.error and self.error_every and self._calls % self.error_every == 0:
+            return self._make_error(self.error, input_tokens)
+        return None
+
+    def _make_error(self, kind: str, input_tokens: int) -> ScriptedProviderError:
+        status_code, template = _ERRORS.get(kind, _ERRORS["server"])
+        message = template.format(limit=self.max_context_tokens or 8192, tokens=input_tokens)
+        return ScriptedProviderError(kind, message, status_code)
+
+    def _usage(self, input_tokens: int, output_tokens: int) -> dict:
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+
+    def _prepare(
+        self, messages: list[BaseMessage], kwargs: dict
+    ) -> tuple[int, list[str], ScriptedProviderError | None]:
+        input_tokens = _message_tokens(messages)
+        error = self._check_errors(input_tokens)
+        tokens = split_tokens(self._reply_text(kwargs.get("scripted_schema")))
+        if error is not None:
+            # 非流式直接失败；流式先吐出 error_after_tokens 个 token 再失败
+            tokens = tokens[: self.error_after_tokens]
+        return input_tokens, tokens, error
+
+    def _generation_delay(self, tokens: list[str], error: ScriptedProviderError | None) -> float:
+        if error is not None or self.tokens_per_second <= 0:
+            return self.ttft
+        return self.ttft + len(tokens) / self.tokens_per_second
+
+    # ── 非流式 ──
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        input_tokens, tokens, error = self._prepare(messages, kwargs)
+        time.sleep(self._generation_delay(tokens, error))
+        if error is not None:
+            raise error
+        return self._result(tokens, input_tokens)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        input_tokens, tokens, error = self._prepare(messages, kwargs)
+        await asyncio.sleep(self._generation_delay(tokens, error))
+        if error is not None:
+            raise error
+        return self._result(tokens, input_tokens)
+
+    def _result(self, tokens: list[str], input_tokens: int) -> ChatResult:
+        message = AIMessage(content="".join(tokens), usage_metadata=self._usage(input_tokens, len(tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    # ── 流式 ──
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        input_tokens, tokens, error = self._prepare(messages, kwargs)
+        time.sleep(self.ttft)
+        for index, token in enumerate(tokens):
+            if index and self.tokens_per_second > 0:
+                time.sleep(1 / self.tokens_per_second)
+            chunk = self._chunk(token, index, tokens, input_tokens, error)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        if error is not None:
+            raise error
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        input_tokens, tokens, error = self._prepare(messages, kwargs)
+        await asyncio.sleep(self.ttft)
+        for index, token in enumerate(tokens):
+            if index and self.tokens_per_second > 0:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = self._chunk(token, index, tokens, input_tokens, error)
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        if error is not None:
+            raise error
+
+    def _chunk(
+        self,
+        token: str,
+        index: int,
+        tokens: list[str],
+        input_tokens: int,
+        error: ScriptedProviderError | None,
+    ) -> ChatGenerationChunk:
+        # usage 挂在最后一个 chunk 上（与 OpenAI stream_usage 一致）；中途失败的流不报 usage
+        last = index == len(tokens) - 1 and error is None
+        message = AIMessageChunk(content=token, usage_metadata=self._usage(input_tokens, len(tokens)) if last else None)
+        if last:
+            message.chunk_position = "last"
+        return ChatGenerationChunk(message=message)
+
+
+def parse_model_options(model_name: str) -> dict[str, Any]:
+    """解析 model_name 里的 "key=value" 参数（逗号或分号分隔）；非参数部分作为模型名。"""
+    aliases = {
+        "tps": "tokens_per_second",
+        "every": "error_every",
+        "context": "max_context_tokens",
+        "fail_after": "error_after_tokens",
+    }
+    options: dict[str, Any] = {}
+    for part in re.split(r"[,;]", model_name or ""):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" not in part:
+            options["model_name"] = part
+            continue
+        key, value = (item.strip() for item in part.split("=", 1))
+        key = aliases.get(key, key)
+        if key == "error":
+            options[key] = value
+        elif key in ("tokens_per_second", "ttft"):
+            options[key] = float(value)
+        elif key in ("output_tokens", "error_every", "max_context_tokens", "error_after_tokens"):
+            options[key] = int(value)
+        else:
+            raise ValueError(f"未知的 scripted 参数: {key}")
+    return options
+
+
+def load_script(path: str | None) -> dict[str, Any]:
+    if not path:
+        return {}
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {
+        "responses": [str(item) for item in data.get("responses") or []],
+        "structured": {name: list(items) for name, items in (data.get("structured") or {}).items()},
+    }
+
+
+class ScriptedProvider(BaseProvider):
+    provider_type = "scripted"
+
+    def build_chat_model(self, config: ProviderConfig) -> BaseChatModel:
+        settings = get_settings().ai
+        if not settings.scripted_provider_enabled:
+            raise ValueError("scripted provider 未启用（设置 AI_SCRIPTED_PROVIDER_ENABLED=true）")
+        options = parse_model_options(config.model_name)
+        if options.get("error") and options["error"] not in _ERRORS:
+            raise ValueError(f"未知的注入错误类型: {options['error']}（支持: {', '.join(_ERRORS)}）")
+        return ScriptedChatModel(**load_script(settings.scripted_provider_script), **options)
+
+    async def test_connection(self, config: ProviderConfig) -> bool:
+        self.build_chat_model(config)
+        return True
+
+    async def list_models(self, config: ProviderConfig) -> list[ModelInfo]:
+        return [
+            ModelInfo(value="scripted", label="scripted（默认 50 tokens/s）"),
+            ModelInfo(value="tps=200,ttft=0.1", label="scripted 快速"),
+            ModelInfo(value="tps=20,ttft=1.5", label="scripted 慢速"),
+            ModelInfo(value="error=rate_limit,every=5", label="scripted 每 5 次 429"),
+            ModelInfo(value="context=4096", label="scripted 4K 上下文"),
+        ]
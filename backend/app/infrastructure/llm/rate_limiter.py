@@ -0,0 +1,272 @@
+"""
+Provider 自适应限流 — 按 API Key 共享的请求 / token 令牌桶
+
+职责：
+- 同一 (provider, api_url, api_key) 的所有 ChatModel 共用一个限流器：provider 的配额是按 Key 算的，
+  与用户建了几份模型配置无关
+- 请求桶（RPM）：每次模型调用前取一个令牌；桶容量 = BURST_SECONDS 秒的配额，允许短时突发
+- token 桶（TPM）：调用结束后按 usage_metadata 扣除实际用量，可以扣成负数，
+  余额为负时后续调用排队等回补（调用前无法准确预估 token）
+- 排队：按调度类别与用户公平排序（task.scheduler.FairQueue：对话等交互请求先于批量与后台任务，
+  同类别内按用户轮转，一个用户的大批量调用不会饿死其他用户），超过 queue_timeout 仍拿不到令牌则抛 ProviderBusyError（429），不无限堆积
+- AIMD：provider 返回 429 时把当前 RPM 减半（冷却期内只减一次），并遵守 Retry-After；
+  之后每次成功调用加回 ADDITIVE_STEP，直至配置上限
+
+通过 LangChain 的 rate_limiter 字段接入：BaseChatModel 在每次真正请求 provider 前调用 aacquire，
+invoke / stream / with_structured_output / bind_tools 都会经过；反馈经 callbacks 回传。
+
+注意：仅在单进程内生效；多 worker 部署时各自按配额限流，需要按 worker 数折算配置。
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from app.core.config import AISettings, get_settings
+from app.core.exceptions import ProviderBusyError
+from app.core.metrics import metrics
+from app.infrastructure.task.scheduler import FairQueue
+
+from .provider_adapters import ProviderConfig
+from .response_cache import is_cached_result
+
+logger = logging.getLogger(__name__)
+
+BURST_SECONDS = 10.0  # 请求桶容量：允许突发的秒数
+MIN_RATE_RATIO = 0.05  # AIMD 下限：配置 RPM 的比例
+ADDITIVE_STEP = 1.0  # 每次成功调用回升的 RPM
+DECREASE_COOLDOWN_SECONDS = 5.0  # 同一波 429 只减一次速率
+MAX_LIMITERS = 1024  # 进程内保留的限流器个数（按 Key LRU）
+
+
+def _retry_after_seconds(exc: BaseException) -> float | None:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """provider SDK 的限流异常：HTTP 429，或 openai / anthropic 的 RateLimitError、Google 的 ResourceExhausted。"""
+    for candidate in (exc, getattr(exc, "__cause__", None)):
+        if candidate is None:
+            continue
+        if getattr(candidate, "status_code", None) == 429:
+            return True
+        response = getattr(candidate, "response", None)
+        if getattr(response, "status_code", None) == 429:
+            return True
+        if type(candidate).__name__ in ("RateLimitError", "ResourceExhausted"):
+            return True
+    return False
+
+
+def _usage_tokens(response: LLMResult) -> int:
+    total = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            total += int(usage.get("total_tokens") or 0)
+    if not total:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        total = int(usage.get("total_tokens") or 0)
+    return total
+
+
+class _Feedback(BaseCallbackHandler):
+    """把调用结果回传给限流器：成功 → 扣 token、加速；429 → 减速；命中响应缓存的结果不回传。"""
+
+    run_inline = True
+
+    def __init__(self, limiter: "ProviderRateLimiter"):
+        self.limiter = limiter
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        if is_cached_result(response):
+            return
+        self.limiter.on_success(_usage_tokens(response))
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        if is_rate_limit_error(error):
+            self.limiter.on_rate_limited(_retry_after_seconds(error))
+
+
+class ProviderRateLimiter(BaseRateLimiter):
+    """单个 API Key 的令牌桶 + 公平等待队列 + AIMD"""
+
+    def __init__(
+        self,
+        label: str,
+        *,
+        requests_per_minute: float,
+        tokens_per_minute: float = 0,
+        queue_timeout: float = 120.0,
+    ):
+        self.label = label
+        self.max_rpm = float(requests_per_minute)
+        self.rpm = self.max_rpm
+        self.tpm = float(tokens_per_minute)
+        self.queue_timeout = queue_timeout
+        self.feedback = _Feedback(self)
+
+        now = time.monotonic()
+        self._requests = self._request_capacity
+        self._tokens = self.tpm
+        self._refilled_at = now
+        self._paused_until = 0.0
+        self._decreased_at = float("-inf")
+        self._state_lock = threading.Lock()
+        # 同一时刻只有队首在等令牌；队首由调度类别与用户的公平顺序决定
+        self._queue = FairQueue("provider", capacity=1)
+
+    @property
+    def _request_capacity(self) -> float:
+        return max(1.0, self.rpm * BURST_SECONDS / 60)
+
+    # ── BaseRateLimiter ──
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        started = time.monotonic()
+        while True:
+            wait = self._take()
+            if wait <= 0:
+                self._record_wait(started)
+                return True
+            if not blocking:
+                return False
+            if time.monotonic() + wait - started > self.queue_timeout:
+                self._reject()
+            time.sleep(wait)
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        if not blocking:
+            return self._take() <= 0
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._wait_turn(), timeout=self.queue_timeout)
+        except TimeoutError:
+            self._reject()
+        self._record_wait(started)
+        return True
+
+    async def _wait_turn(self) -> None:
+        async with self._queue.slot():
+            while (wait := self._take()) > 0:
+                await asyncio.sleep(wait)
+
+    # ── 反馈 ──
+
+    def on_success(self, tokens: int) -> None:
+        with self._state_lock:
+            self._refill(time.monotonic())
+            if self.tpm:
+                self._tokens -= tokens
+            self.rpm = min(self.max_rpm, self.rpm + ADDITIVE_STEP)
+
+    def on_rate_limited(self, retry_after: float | None = None) -> None:
+        metrics.record_rate_limit_throttled(self.label)
+        with self._state_lock:
+            now = time.monotonic()
+            self._refill(now)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if now - self._decreased_at < DECREASE_COOLDOWN_SECONDS:
+                return
+            self._decreased_at = now
+            self.rpm = max(self.max_rpm * MIN_RATE_RATIO, self.rpm / 2)
+            self._requests = min(self._requests, self._request_capacity)
+        logger.warning("provider 限流 %s：RPM 降至 %.1f", self.label, self.rpm)
+
+    # ── 令牌桶 ──
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._requests = min(self._request_capacity, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _take(self) -> float:
+        """能取到请求令牌则扣除并返回 0，否则返回还需等待的秒数。"""
+        with self._state_lock:
+            now = time.monotonic()
+            self._refill(now)
+            waits = [self._paused_until - now]
+            if self._requests < 1:
+                waits.append((1 - self._requests) * 60 / self.rpm)
+            if self.tpm and self._tokens < 0:
+                waits.append(-self._tokens * 60 / self.tpm)
+            wait = max(waits)
+            if wait > 0:
+                return wait
+            self._requests -= 1
+            return 0.0
+
+    def _record_wait(self, started: float) -> None:
+        metrics.record_rate_limit_wait(self.label, time.monotonic() - started)
+
+    def _reject(self) -> None:
+        metrics.record_rate_limit_rejection(self.label)
+        raise ProviderBusyError(detail={"limiter": self.label, "queue_timeout_s": self.queue_timeout})
+
+
+class RateLimiterRegistry:
+    """API Key → 限流器（LRU，上限 MAX_LIMITERS）"""
+
+    def __init__(self, settings: AISettings | None = None):
+        self._settings = settings
+        self._limiters: OrderedDict[str, ProviderRateLimiter] = OrderedDict()
+
+    def get(self, provider_type: str, config: ProviderConfig) -> ProviderRateLimiter | None:
+        """该 Key 的限流器；未配置 RPM（0）时返回 None 表示不限流。"""
+        settings = self._settings or get_settings().ai
+        if settings.llm_requests_per_minute <= 0:
+            return None
+        digest = hashlib.sha256(f"{provider_type}|{config.api_url or ''}|{config.api_key}".encode()).hexdigest()
+        limiter = self._limiters.get(digest)
+        if limiter is None:
+            limiter = ProviderRateLimiter(
+                f"{provider_type}:{digest[:8]}",
+                requests_per_minute=settings.llm_requests_per_minute,
+                tokens_per_minute=settings.llm_tokens_per_minute,
+                queue_timeout=settings.llm_queue_timeout_seconds,
+            )
+            self._limiters[digest] = limiter
+            while len(self._limiters) > MAX_LIMITERS:
+                self._limiters.popitem(last=False)
+        else:
+            self._limiters.move_to_end(digest)
+        return limiter
+
+    def attach(self, model: Any, provider_type: str, config: ProviderConfig) -> None:
+        """给新建的 ChatModel 挂上所属 Key 的限流器与反馈回调。"""
+        if not isinstance(model, BaseChatModel):
+            return
+        limiter = self.get(provider_type, config)
+        if limiter is None:
+            return
+        model.rate_limiter = limiter
+        callbacks = model.callbacks
+        if callbacks is None:
+            model.callbacks = [limiter.feedback]
+        elif isinstance(callbacks, list):
+            model.callbacks = [*callbacks, limiter.feedback]
+        else:
+            callbacks.add_handler(limiter.feedback)
+
+
+# 全局单例
+provider_rate_limiters = RateLimiterRegistry()
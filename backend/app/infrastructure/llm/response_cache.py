@@ -0,0 +1,195 @@
+"""
+LLM 响应缓存 — 确定性调用（摘要 / 知识分析 / 角色规划）的本地持久化缓存
+
+职责：
+- 实现 LangChain BaseCache：key = sha256(llm_string, prompt)。llm_string 由模型序列化出
+  provider 类型、模型名、temperature、stop 以及 structured output 的 schema（response_format / tools），
+  prompt 是整组消息的序列化 —— 即 (provider, model, temperature, 消息, schema) 全部参与
+- 存本地 SQLite：条目数上限按最近访问时间 LRU 淘汰，超过 TTL 的条目视为未命中并删除
+- 默认关闭；开启后 temperature > 0 的模型仍绕过缓存（同一提示本就期望不同输出），
+  除非显式允许 llm_cache_sampled
+- 命中 / 未命中计入 MetricsCollector
+- 命中返回的 generation 在 generation_info 中带 CACHED_GENERATION_KEY 标记，
+  限流器反馈据此跳过（LangChain 对缓存命中同样触发 on_llm_end）
+
+只对 ainvoke / invoke 生效（LangChain 在真正请求 provider 前查缓存）；流式输出不经过缓存。
+调用方按次启用：with_response_cache(chat_model) 返回挂了缓存的浅拷贝，池中的共享实例不受影响。
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation, LLMResult
+
+from app.core.config import AISettings, get_settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 每写入这么多次检查一次容量，避免每次 update 都 COUNT(*)
+_EVICT_CHECK_INTERVAL = 32
+
+# 命中缓存的 generation 的 generation_info 标记（只在读出时添加，不写入缓存）
+CACHED_GENERATION_KEY = "from_response_cache"
+
+
+def _cache_key(prompt: str, llm_string: str) -> str:
+    return hashlib.sha256(f"{llm_string}\0{prompt}".encode()).hexdigest()
+
+
+def _dump_generations(generations: RETURN_VAL_TYPE) -> str | None:
+    items = []
+    for generation in generations:
+        if not isinstance(generation, ChatGeneration):
+            return None
+        items.append({"message": message_to_dict(generation.message), "info": generation.generation_info})
+    return json.dumps(items, ensure_ascii=False)
+
+
+def _load_generations(raw: str) -> list[Generation]:
+    items = json.loads(raw)
+    messages = messages_from_dict([item["message"] for item in items])
+    return [
+        ChatGeneration(message=message, generation_info={**(item.get("info") or {}), CACHED_GENERATION_KEY: True})
+        for message, item in zip(messages, items, strict=True)
+    ]
+
+
+def is_cached_result(response: LLMResult) -> bool:
+    """本次调用的结果是否全部来自响应缓存（没有真正请求 provider）"""
+    generations = [generation for batch in response.generations for generation in batch]
+    return bool(generations) and all(
+        (generation.generation_info or {}).get(CACHED_GENERATION_KEY) for generation in generations
+    )
+
+
+class SQLiteResponseCache(BaseCache):
+    """SQLite 存储、LRU + TTL 的 LLM 响应缓存（线程安全，单连接加锁）"""
+
+    def __init__(self, path: str, *, max_entries: int, ttl_seconds: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_llm_response_cache_accessed_at ON llm_response_cache (accessed_at)"
+        )
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = _cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                self._conn.execute("UPDATE llm_response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        if row is None:
+            metrics.record_llm_cache(hit=False)
+            return None
+        try:
+            generations = _load_generations(row[0])
+        except (ValueError, KeyError, TypeError) as exc:
+            logger.warning("LLM 缓存条目损坏，已忽略: %s", exc)
+            metrics.record_llm_cache(hit=False)
+            return None
+        metrics.record_llm_cache(hit=True)
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        raw = _dump_generations(return_val)
+        if raw is None:
+            return
+        key = _cache_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, raw, now, now),
+            )
+            self._writes += 1
+            if self._writes % _EVICT_CHECK_INTERVAL == 0:
+                self._evict(now)
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_response_cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM llm_response_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        overflow = self._conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM llm_response_cache WHERE key IN "
+                "(SELECT key FROM llm_response_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+
+
+_cache: SQLiteResponseCache | None = None
+
+
+def get_response_cache(settings: AISettings | None = None) -> SQLiteResponseCache | None:
+    """进程级缓存实例；未开启时返回 None（首次开启时才创建数据库文件）。"""
+    global _cache
+    settings = settings or get_settings().ai
+    if not settings.llm_cache_enabled:
+        return None
+    if _cache is None:
+        _cache = SQLiteResponseCache(
+            settings.llm_cache_path,
+            max_entries=settings.llm_cache_max_entries,
+            ttl_seconds=settings.llm_cache_ttl_seconds,
+        )
+    return _cache
+
+
+def close_response_cache() -> None:
+    """关闭缓存连接，应用关闭时调用。"""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+
+def with_response_cache(chat_model: Any) -> Any:
+    """返回挂上响应缓存的模型浅拷贝；未开启、temperature > 0 未允许或非 ChatModel 时原样返回。"""
+    if not isinstance(chat_model, BaseChatModel):
+        return chat_model
+    settings = get_settings().ai
+    temperature = getattr(chat_model, "temperature", None) or 0
+    if temperature > 0 and not settings.llm_cache_sampled:
+        return chat_model
+    cache = get_response_cache(settings)
+    if cache is None:
+        return chat_model
+    return chat_model.model_copy(update={"cache": cache})
@@ -1,5 +1,14 @@
 """后台任务基础设施"""
 
+from .jobs import JobHandler, JobStore, register_job_handler
 from .runner import BackgroundTaskRunner, background_runner
+from .singleflight import SingleFlight
 
-__all__ = ["BackgroundTaskRunner", "background_runner"]
+__all__ = [
+    "BackgroundTaskRunner",
+    "JobHandler",
+    "JobStore",
+    "SingleFlight",
+    "background_runner",
+    "register_job_handler",
+]
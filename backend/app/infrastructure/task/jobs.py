@@ -0,0 +1,364 @@
+"""
+持久化任务队列 — background_jobs 表的入队 / 领取 / 续租 / 完成 / 重试
+
+职责：
+- 任务按 kind 分派给 register_job_handler 注册的处理函数，参数为 JSON payload
+- 领取：排队且到期（run_after <= now），或租约已过期（持有者崩溃 / 重启）的 running 任务；
+  priority 由调度类别决定（interactive > batch > background），同一优先级内按入队时分配的
+  公平标签（fair_tag，用户的虚拟完成时间）排序，已达单用户并发上限的用户跳过（pick_fair_job）；
+  单用户并发按表中所有 worker 的 running 任务计数；条件 UPDATE 保证多个 worker 不会领到同一任务
+- 失败按指数退避重新排队，执行次数用尽后标记 failed 并回调 on_exhausted
+- 幂等键只在任务未结束时生效（结束时清空），结束后同一键可再次入队
+
+执行与调度见 runner.BackgroundTaskRunner。
+"""
+
+import json
+import logging
+from collections.abc import Awaitable, Callable, Mapping, Sequence
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import aliased
+
+from app.core.metrics import metrics
+from app.domain.ai_runtime.enums import JobStatus, WorkClass
+from app.infrastructure.db.models.ai_runtime import BackgroundJob
+
+from .scheduler import JOB_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+CLAIM_WINDOW = 50  # 每次领取时参与公平挑选的候选任务数
+
+JobFunc = Callable[[dict], Awaitable[None]]
+ExhaustedCallback = Callable[[dict, str], Awaitable[None]]
+
+
+@dataclass(frozen=True)
+class JobHandler:
+    """任务处理函数；on_exhausted 在任务最终失败时调用（参数为 payload 与最后一次错误）"""
+
+    kind: str
+    func: JobFunc
+    on_exhausted: ExhaustedCallback | None = None
+
+
+_handlers: dict[str, JobHandler] = {}
+
+
+def register_job_handler(kind: str, *, on_exhausted: ExhaustedCallback | None = None):
+    """注册任务处理函数（装饰器）。处理函数须可重复执行：重试与租约过期都会再次调用。"""
+
+    def decorator(func: JobFunc) -> JobFunc:
+        _handlers[kind] = JobHandler(kind, func, on_exhausted)
+        return func
+
+    return decorator
+
+
+def get_job_handler(kind: str) -> JobHandler | None:
+    return _handlers.get(kind)
+
+
+def retry_delay(attempts: int, *, base: float, cap: float) -> float:
+    """第 attempts 次执行失败后的退避秒数：base * 2^(attempts-1)，不超过 cap"""
+    return min(cap, base * 2 ** max(attempts - 1, 0))
+
+
+def _now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def new_job(
+    kind: str,
+    payload: dict,
+    *,
+    task_key: str,
+    max_attempts: int,
+    timeout: int,
+    work_class: WorkClass = WorkClass.BACKGROUND,
+    user_id: int | None = None,
+    priority: int | None = None,
+    idempotency_key: str | None = None,
+    fair_tag: float = 0.0,
+) -> BackgroundJob:
+    """priority 默认取调度类别对应的优先级；fair_tag 由 next_fair_tag 计算"""
+    return BackgroundJob(
+        kind=kind,
+        task_key=task_key,
+        payload=json.dumps(payload, ensure_ascii=False),
+        status=JobStatus.QUEUED.value,
+        priority=JOB_PRIORITY[work_class] if priority is None else priority,
+        work_class=work_class.value,
+        user_id=user_id,
+        attempts=0,
+        max_attempts=max_attempts,
+        timeout_seconds=timeout,
+        run_after=_now(),
+        idempotency_key=idempotency_key,
+        fair_tag=fair_tag,
+    )
+
+
+async def next_fair_tag(db: AsyncSession, work_class: WorkClass, user_id: int | None) -> float:
+    """新任务的公平标签（与 scheduler.FairQueue 相同的按用户公平排队，状态存在表里，跨 worker 一致）。
+
+    标签 = max(类别虚拟时间, 该用户未结束任务的最大标签) + 1，类别虚拟时间取未结束任务的最小标签 - 1：
+    一次排入 100 个任务的用户标签依次为 V+1…V+100，随后到达的用户从 V+1 开始，与其交替领取。
+    """
+    unfinished = (
+        BackgroundJob.work_class == work_class.value,
+        BackgroundJob.status.in_([JobStatus.QUEUED.value, JobStatus.RUNNING.value]),
+    )
+    lowest = (await db.execute(select(func.min(BackgroundJob.fair_tag)).where(*unfinished))).scalar()
+    virtual_time = max(0.0, lowest - 1) if lowest is not None else 0.0
+    if user_id is None:
+        return virtual_time + 1
+    user_last = (
+        await db.execute(select(func.max(BackgroundJob.fair_tag)).where(*unfinished, BackgroundJob.user_id == user_id))
+    ).scalar()
+    return max(virtual_time, user_last or 0.0) + 1
+
+
+async def find_active_job(db: AsyncSession, idempotency_key: str) -> BackgroundJob | None:
+    """幂等键对应的未结束任务"""
+    result = await db.execute(
+        select(BackgroundJob).where(
+            BackgroundJob.idempotency_key == idempotency_key,
+            BackgroundJob.status.in_([JobStatus.QUEUED.value, JobStatus.RUNNING.value]),
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+def pick_fair_job(
+    candidates: Sequence[BackgroundJob],
+    running_by_user: Mapping[int, int],
+    per_user_limit: int = 0,
+) -> BackgroundJob | None:
+    """从按 priority 降序、fair_tag 升序、id 升序排列的候选中挑选第一个未达单用户并发上限的任务"""
+    for job in candidates:
+        if not (per_user_limit and job.user_id is not None and running_by_user.get(job.user_id, 0) >= per_user_limit):
+            return job
+    return None
+
+
+class JobStore:
+    """background_jobs 的状态变更；每个操作使用独立 session 并立即提交"""
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        *,
+        lease_seconds: float,
+        retry_base_seconds: float,
+        retry_max_seconds: float,
+    ):
+        self.session_factory = session_factory
+        self.lease_seconds = lease_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+
+    @staticmethod
+    def _live_running(job, now: datetime):
+        return and_(job.status == JobStatus.RUNNING.value, job.lease_expires_at >= now)
+
+    @staticmethod
+    def _claimable(now: datetime):
+        return or_(
+            and_(BackgroundJob.status == JobStatus.QUEUED.value, BackgroundJob.run_after <= now),
+            and_(BackgroundJob.status == JobStatus.RUNNING.value, BackgroundJob.lease_expires_at < now),
+        )
+
+    async def claim(
+        self,
+        owner: str,
+        job_id: int | None = None,
+        *,
+        per_user_limit: int = 0,
+    ) -> BackgroundJob | None:
+        """领取一个可执行任务（指定 job_id 时只领取该任务）。
+
+        per_user_limit：单用户同时执行的任务数上限（0 不限），按所有 worker 租约有效的 running 任务计数；
+        领取的条件 UPDATE 再次校验计数，并发领取也不会越过上限。租约过期且执行次数已用尽的任务（反复导致进程崩溃）直接标记 failed 并原样返回，
+        调用方据 status 判断是否执行。没有可领取的任务或被其他 worker 抢先时返回 None。
+        """
+        now = _now()
+        async with self.session_factory() as db:
+            stmt = select(BackgroundJob).where(self._claimable(now))
+            if job_id is not None:
+                stmt = stmt.where(BackgroundJob.id == job_id)
+            result = await db.execute(
+                stmt.order_by(BackgroundJob.priority.desc(), BackgroundJob.fair_tag, BackgroundJob.id).limit(
+                    CLAIM_WINDOW
+                )
+            )
+            candidates = result.scalars().all()
+            running_by_user: dict[int, int] = {}
+            users = {job.user_id for job in candidates if job.user_id is not None}
+            if per_user_limit and users:
+                counts = await db.execute(
+                    select(BackgroundJob.user_id, func.count())
+                    .where(self._live_running(BackgroundJob, now), BackgroundJob.user_id.in_(users))
+                    .group_by(BackgroundJob.user_id)
+                )
+                running_by_user = dict(counts.all())
+            job = pick_fair_job(candidates, running_by_user, per_user_limit)
+            if job is None:
+                return None
+            queued_since = job.run_after if job.status == JobStatus.QUEUED.value else None
+
+            if job.attempts >= job.max_attempts:
+                values = {
+                    "status": JobStatus.FAILED.value,
+                    "lease_owner": None,
+                    "lease_expires_at": None,
+                    "idempotency_key": None,
+                    "last_error": job.last_error or "任务租约多次过期（执行进程中断），已放弃",
+                    "finished_at": now,
+                }
+            else:
+                values = {
+                    "status": JobStatus.RUNNING.value,
+                    "lease_owner": owner,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "attempts": BackgroundJob.attempts + 1,
+                }
+            guards = [BackgroundJob.id == job.id, self._claimable(now)]
+            if per_user_limit and job.user_id is not None and values["status"] == JobStatus.RUNNING.value:
+                running = aliased(BackgroundJob)
+                guards.append(
+                    select(func.count())
+                    .select_from(running)
+                    .where(self._live_running(running, now), running.user_id == job.user_id)
+                    .scalar_subquery()
+                    < per_user_limit
+                )
+            claimed = await db.execute(
+                update(BackgroundJob)
+                .where(*guards)
+                .values(updated_at=now, **values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if claimed.rowcount != 1:
+                return None
+            await db.refresh(job)
+            if queued_since is not None:
+                metrics.record_queue_wait("jobs", job.work_class, max(0.0, (now - queued_since).total_seconds()))
+            return job
+
+    async def queue_depths(self) -> dict[str, int]:
+        """各调度类别已到期、等待领取的任务数"""
+        now = _now()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(BackgroundJob.work_class, func.count())
+                .where(BackgroundJob.status == JobStatus.QUEUED.value, BackgroundJob.run_after <= now)
+                .group_by(BackgroundJob.work_class)
+            )
+            return {work_class: count for work_class, count in result.all()}
+
+    async def heartbeat(self, owner: str, job_id: int) -> bool:
+        """续租；返回 False 表示租约已不属于本 worker"""
+        now = _now()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(BackgroundJob)
+                .where(
+                    BackgroundJob.id == job_id,
+                    BackgroundJob.lease_owner == owner,
+                    BackgroundJob.status == JobStatus.RUNNING.value,
+                )
+                .values(lease_expires_at=now + timedelta(seconds=self.lease_seconds), updated_at=now)
+            )
+            await db.commit()
+            return result.rowcount == 1
+
+    async def _finish(self, owner: str, job_id: int, status: JobStatus, error: str | None = None) -> None:
+        now = _now()
+        async with self.session_factory() as db:
+            await db.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job_id, BackgroundJob.lease_owner == owner)
+                .values(
+                    status=status.value,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    idempotency_key=None,
+                    last_error=error,
+                    finished_at=now,
+                    updated_at=now,
+                )
+            )
+            await db.commit()
+
+    async def complete(self, owner: str, job_id: int) -> None:
+        await self._finish(owner, job_id, JobStatus.SUCCEEDED)
+
+    async def cancel(self, owner: str, job_id: int, reason: str = "cancelled") -> None:
+        await self._finish(owner, job_id, JobStatus.CANCELLED, reason)
+
+    async def fail(self, owner: str, job_id: int, error: str) -> BackgroundJob | None:
+        """记录一次失败：次数未用尽则按退避重新排队，否则标记 failed。返回更新后的任务。"""
+        now = _now()
+        async with self.session_factory() as db:
+            job = await db.get(BackgroundJob, job_id)
+            if job is None or job.lease_owner != owner:
+                return None
+            job.last_error = error
+            job.lease_owner = None
+            job.lease_expires_at = None
+            job.updated_at = now
+            if job.attempts < job.max_attempts:
+                delay = retry_delay(job.attempts, base=self.retry_base_seconds, cap=self.retry_max_seconds)
+                job.status = JobStatus.QUEUED.value
+                job.run_after = now + timedelta(seconds=delay)
+            else:
+                job.status = JobStatus.FAILED.value
+                job.idempotency_key = None
+                job.finished_at = now
+            await db.commit()
+            return job
+
+    async def release(self, owner: str, job_id: int) -> None:
+        """进程关闭时交还任务：立即重新排队，本次中断不计入执行次数"""
+        now = _now()
+        async with self.session_factory() as db:
+            await db.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == job_id, BackgroundJob.lease_owner == owner)
+                .values(
+                    status=JobStatus.QUEUED.value,
+                    attempts=BackgroundJob.attempts - 1,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    run_after=now,
+                    updated_at=now,
+                )
+            )
+            await db.commit()
+
+    async def reclaim_expired(self) -> int:
+        """把租约已过期的 running 任务放回队列（启动时调用），返回数量"""
+        now = _now()
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(BackgroundJob)
+                .where(
+                    BackgroundJob.status == JobStatus.RUNNING.value,
+                    BackgroundJob.lease_expires_at < now,
+                )
+                .values(
+                    status=JobStatus.QUEUED.value,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    run_after=now,
+                    updated_at=now,
+                )
+            )
+            await db.commit()
+            return result.rowcount
@@ -1,19 +1,38 @@
 """
-后台任务运行器 — 轻量级 asyncio 方案
+后台任务运行器 — asyncio 任务 + 持久化任务表
 
 职责：
 - 将长耗时 AI 图运行放入后台执行，不阻塞 API 响应
 - 管理任务生命周期（提交、超时、取消）
-- 预留队列升级接口（Celery/Arq 等）
+- 持久化任务（enqueue）：写入 background_jobs，随调用方事务提交；由本进程立即领取执行，
+  或由轮询循环领取到期 / 重试 / 租约过期的任务。执行期间续租，失败按指数退避重试，
+  进程关闭时交还任务，崩溃后由其他进程（或重启后的本进程）在租约过期后重新领取
+- 调度：任务按调度类别（interactive > batch > background）领取，同类别内按入队时的公平标签
+  在用户间轮转，单用户并发（按所有 worker 的执行中任务计）不超过 task_user_concurrency；
+  处理函数在 work_context 中执行，其模型调用按同一类别排队
 
-注意：当前为单进程方案，适合中小规模。
-生产环境建议升级为外部队列 + Worker。
+注意：submit 提交的协程只存在于当前进程，重启即丢失；需要可靠执行的任务用 enqueue。
 """
 
 import asyncio
+import json
 import logging
+import os
+import socket
+import uuid
+from contextlib import suppress
 from datetime import UTC, datetime
 
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import AISettings, get_settings
+from app.core.metrics import metrics
+from app.domain.ai_runtime.enums import JobStatus, WorkClass
+from app.infrastructure.db.models.ai_runtime import BackgroundJob
+
+from .jobs import JobStore, find_active_job, get_job_handler, new_job, next_fair_tag
+from .scheduler import work_context
+
 logger = logging.getLogger(__name__)
 
 # 默认超时 5 分钟
@@ -23,13 +42,21 @@ DEFAULT_TIMEOUT = 300
 class TaskInfo:
     """后台任务元数据"""
 
-    __slots__ = ("run_id", "task", "created_at", "timeout")
+    __slots__ = ("run_id", "task", "created_at", "timeout", "job_id", "user_id")
 
-    def __init__(self, run_id: int, task: asyncio.Task, timeout: int):
+    def __init__(self, run_id: int | str, task: asyncio.Task, timeout: int | None):
         self.run_id = run_id
         self.task = task
         self.created_at = datetime.now(UTC)
         self.timeout = timeout
+        self.job_id: int | None = None  # 持久化任务的 background_jobs.id
+        self.user_id: int | None = None  # 持久化任务的发起用户
+
+
+def _task_key(key: int | str) -> int | str:
+    """background_jobs.task_key 为字符串；AIRun.id 形式的键还原为 int，与 submit 的 run_id 一致"""
+    key = str(key)
+    return int(key) if key.isdigit() else key
 
 
 class BackgroundTaskRunner:
@@ -39,25 +66,48 @@ class BackgroundTaskRunner:
     用法：
         runner = BackgroundTaskRunner()
         runner.submit(run_id, coroutine, timeout=300)
+        await runner.enqueue(db, "chapter_analysis", payload, key=run_id)
         runner.cancel(run_id)
         info = runner.get_status(run_id)
+
+    run_id 为 AIRun.id；不对应 AIRun 的内部任务用带前缀的字符串键（如 "chapter-summary-12"）。
+    持久化任务执行时同样以 key 登记，cancel / get_status 对两类任务一致。
     """
 
-    def __init__(self):
-        self._tasks: dict[int, TaskInfo] = {}
+    def __init__(
+        self,
+        *,
+        session_factory: async_sessionmaker[AsyncSession] | None = None,
+        settings: AISettings | None = None,
+        worker_id: str | None = None,
+        execute_jobs: bool | None = None,
+    ):
+        self._tasks: dict[int | str, TaskInfo] = {}
+        self._session_factory = session_factory
+        self._settings = settings
+        self._store: JobStore | None = None
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._dispatcher: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._stopping = False
+        self._job_work: dict[int, asyncio.Task] = {}  # job_id → 处理函数本身的 task
+        # job_id → 入队快速路径等待领取时的交接 future：轮询循环先领到该任务时交给它执行
+        self._handoffs: dict[int, asyncio.Future[BackgroundJob]] = {}
+        self._execute_jobs = execute_jobs
 
     def submit(
         self,
-        run_id: int,
+        run_id: int | str,
         coro,
         *,
-        timeout: int = DEFAULT_TIMEOUT,
+        timeout: int | None = DEFAULT_TIMEOUT,
     ) -> TaskInfo:
-        """提交后台任务"""
+        """提交后台任务（timeout=None 表示由协程自行控制超时）"""
         if run_id in self._tasks:
             existing = self._tasks[run_id]
             if not existing.task.done():
                 logger.warning("run %s already has a running task, skipping", run_id)
+                coro.close()
                 return existing
 
         async def _wrapped():
@@ -75,10 +125,281 @@ class BackgroundTaskRunner:
         task = asyncio.create_task(_wrapped(), name=f"ai-run-{run_id}")
         info = TaskInfo(run_id, task, timeout)
         self._tasks[run_id] = info
-        logger.info("submitted background task for run %s (timeout=%ds)", run_id, timeout)
+        logger.info("submitted background task for run %s (timeout=%ss)", run_id, timeout)
         return info
 
-    def cancel(self, run_id: int) -> bool:
+    # ── 持久化任务 ──
+
+    @property
+    def settings(self) -> AISettings:
+        """构造时传入的配置；未传入时每次读取当前配置（环境变量覆盖即时生效）"""
+        return self._settings or get_settings().ai
+
+    @property
+    def execute_jobs(self) -> bool:
+        """本进程是否执行持久化任务（默认取 AI_TASK_RUN_IN_API；独立 worker 总是执行）"""
+        if self._execute_jobs is None:
+            self._execute_jobs = self.settings.task_run_in_api
+        return self._execute_jobs
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            if self._session_factory is None:
+                from app.infrastructure.db.session import get_session_factory
+
+                self._session_factory = get_session_factory()
+            self._store = JobStore(
+                self._session_factory,
+                lease_seconds=self.settings.task_lease_seconds,
+                retry_base_seconds=self.settings.task_retry_base_seconds,
+                retry_max_seconds=self.settings.task_retry_max_seconds,
+            )
+        return self._store
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        kind: str,
+        payload: dict,
+        *,
+        key: int | str,
+        work_class: WorkClass = WorkClass.BACKGROUND,
+        user_id: int | None = None,
+        priority: int | None = None,
+        idempotency_key: str | None = None,
+        max_attempts: int | None = None,
+        timeout: int = DEFAULT_TIMEOUT,
+    ) -> BackgroundJob:
+        """持久化入队（随 db 的事务提交）；idempotency_key 已有未结束任务时返回该任务。
+
+        priority 默认取 work_class 对应的优先级。本进程执行任务、有空闲并发且该用户未达并发上限时
+        立即尝试领取（任务提交后即可见），否则留给轮询循环（本进程或独立 worker）按公平顺序领取。
+        """
+        if get_job_handler(kind) is None:
+            raise ValueError(f"未注册的后台任务类型: {kind}")
+        if idempotency_key:
+            existing = await find_active_job(db, idempotency_key)
+            if existing is not None:
+                logger.info("job %s already active for idempotency key %s", existing.id, idempotency_key)
+                return existing
+
+        job = new_job(
+            kind,
+            payload,
+            task_key=str(key),
+            work_class=work_class,
+            user_id=user_id,
+            priority=priority,
+            max_attempts=max_attempts or self.settings.task_max_attempts,
+            timeout=timeout,
+            idempotency_key=idempotency_key,
+            fair_tag=await next_fair_tag(db, work_class, user_id),
+        )
+        db.add(job)
+        await db.flush()
+
+        if not self.execute_jobs:
+            return job
+        if self.active_job_count < self.settings.task_concurrency and not self._user_at_limit(user_id):
+            info = self.submit(_task_key(key), self._claim_and_execute(job.id), timeout=None)
+            info.job_id = job.id
+            info.user_id = user_id
+        else:
+            self._wake()
+        return job
+
+    async def _claim_and_execute(self, job_id: int) -> None:
+        """立即执行刚入队的任务：等待调用方事务提交后领取（最多约 6 秒，之后交给轮询循环）。
+
+        等待期间任务以调用方的 key 登记；轮询循环先领到该任务时经 _handoffs 交给这里执行，
+        不会因 key 已被占用而领取后无人执行。
+        """
+        handoff: asyncio.Future[BackgroundJob] = asyncio.get_running_loop().create_future()
+        self._handoffs[job_id] = handoff
+        job = None
+        try:
+            delay = 0.05
+            for _ in range(7):
+                try:
+                    job = await self.store.claim(
+                        self.worker_id, job_id, per_user_limit=self.settings.task_user_concurrency
+                    )
+                except Exception:
+                    logger.warning("claim job %s failed, will retry", job_id, exc_info=True)
+                if job is None:
+                    with suppress(TimeoutError):
+                        job = await asyncio.wait_for(asyncio.shield(handoff), timeout=delay)
+                    delay *= 2
+                if job is not None:
+                    break
+        except asyncio.CancelledError:
+            if job is None and handoff.done():
+                # 取消时轮询循环刚交来已领取的任务：按用户取消记录，不留下无人续租的 running 任务
+                with suppress(Exception):
+                    await self.store.cancel(self.worker_id, job_id)
+            raise
+        finally:
+            self._handoffs.pop(job_id, None)
+            if job is None:
+                self._wake()
+        if job is not None:
+            try:
+                await self._execute(job)
+            finally:
+                self._wake()
+
+    async def _execute_claimed(self, job: BackgroundJob) -> None:
+        try:
+            await self._execute(job)
+        finally:
+            self._wake()
+
+    async def _execute(self, job: BackgroundJob) -> None:
+        """执行已领取的任务并记录结果；期间按 1/3 租约续租"""
+        handler = get_job_handler(job.kind)
+        if handler is None:
+            await self.store.fail(self.worker_id, job.id, f"未注册的后台任务类型: {job.kind}")
+            return
+        payload = json.loads(job.payload or "{}")
+        logger.info("running job %s kind=%s attempt=%s/%s", job.id, job.kind, job.attempts, job.max_attempts)
+        # 处理函数单独成 task：进程关闭时只取消它，结果记录不会被打断；
+        # task 创建时复制 work_context，处理函数内的模型调用按任务的类别与用户排队
+        with work_context(job.work_class or WorkClass.BACKGROUND, job.user_id):
+            work = asyncio.create_task(handler.func(payload), name=f"job-{job.id}")
+        self._job_work[job.id] = work
+        heartbeat = asyncio.create_task(self._heartbeat(job.id, work), name=f"job-heartbeat-{job.id}")
+        try:
+            await asyncio.wait_for(work, timeout=job.timeout_seconds)
+        except asyncio.CancelledError:
+            if heartbeat.done() and not heartbeat.cancelled():
+                # 租约已丢失（被回收 / 其他 worker 领取）：处理函数已停止，结果由新的持有者记录
+                logger.warning("abandoned job %s kind=%s after losing its lease", job.id, job.kind)
+                return
+            # 进程关闭时交还任务供重新领取；其余取消视为用户取消
+            with suppress(Exception):
+                if self._stopping:
+                    await self.store.release(self.worker_id, job.id)
+                else:
+                    await self.store.cancel(self.worker_id, job.id)
+            raise
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"[:500] if str(exc) else type(exc).__name__
+            logger.warning("job %s kind=%s failed: %s", job.id, job.kind, error)
+            updated = await self.store.fail(self.worker_id, job.id, error)
+            if updated is not None and updated.status == JobStatus.FAILED.value:
+                await self._exhausted(updated, error)
+        else:
+            await self.store.complete(self.worker_id, job.id)
+        finally:
+            self._job_work.pop(job.id, None)
+            heartbeat.cancel()
+
+    def _heartbeat_interval(self) -> float:
+        return self.settings.task_lease_seconds / 3
+
+    async def _heartbeat(self, job_id: int, work: asyncio.Task) -> None:
+        """按 1/3 租约续租；租约已不属于本 worker 时取消处理函数，避免与新的持有者同时执行"""
+        while True:
+            await asyncio.sleep(self._heartbeat_interval())
+            try:
+                if not await self.store.heartbeat(self.worker_id, job_id):
+                    logger.warning("lost lease for job %s, cancelling its handler", job_id)
+                    work.cancel()
+                    return
+            except Exception:
+                logger.warning("heartbeat for job %s failed", job_id, exc_info=True)
+
+    async def _exhausted(self, job: BackgroundJob, error: str) -> None:
+        handler = get_job_handler(job.kind)
+        if handler is None or handler.on_exhausted is None:
+            return
+        try:
+            await handler.on_exhausted(json.loads(job.payload or "{}"), error)
+        except Exception:
+            logger.exception("on_exhausted callback failed for job %s", job.id)
+
+    async def dispatch_once(self) -> int:
+        """按空闲并发领取可执行任务并启动，返回启动数量"""
+        started = 0
+        while self.active_job_count < self.settings.task_concurrency:
+            job = await self.store.claim(
+                self.worker_id,
+                per_user_limit=self.settings.task_user_concurrency,
+            )
+            if job is None:
+                break
+            if job.status == JobStatus.FAILED.value:
+                logger.error("job %s kind=%s exhausted after interrupted attempts", job.id, job.kind)
+                await self._exhausted(job, job.last_error or "")
+                continue
+            handoff = self._handoffs.pop(job.id, None)
+            if handoff is not None:
+                # 入队快速路径还在等待领取该任务：交给它执行（它已以调用方的 key 登记）
+                handoff.set_result(job)
+                started += 1
+                continue
+            key = _task_key(job.task_key)
+            existing = self._tasks.get(key)
+            if existing is not None and not existing.task.done():
+                # 同一 key 的另一个任务仍在本进程执行：交还领取，留到下次轮询
+                logger.info("job %s waits for the running task of key %s", job.id, key)
+                await self.store.release(self.worker_id, job.id)
+                break
+            info = self.submit(key, self._execute_claimed(job), timeout=None)
+            info.job_id = job.id
+            info.user_id = job.user_id
+            started += 1
+        metrics.set_queue_depth("jobs", await self.store.queue_depths())
+        return started
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            try:
+                await self.dispatch_once()
+            except Exception:
+                logger.exception("background job dispatch failed")
+            self._wakeup.clear()
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.settings.task_poll_seconds)
+
+    def _wake(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        """启动轮询循环；先把租约已过期的任务放回队列（上次进程崩溃遗留）。
+
+        execute_jobs 为 False 的进程（只入队的 API）不启动。
+        """
+        if self._dispatcher is not None or not self.execute_jobs:
+            return
+        self._stopping = False
+        try:
+            reclaimed = await self.store.reclaim_expired()
+            if reclaimed:
+                logger.warning("reclaimed %d background jobs with expired leases", reclaimed)
+        except Exception:
+            logger.exception("failed to reclaim expired background jobs")
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop(), name="background-job-dispatcher")
+
+    async def stop(self) -> None:
+        """停止轮询并交还执行中的持久化任务"""
+        self._stopping = True
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._dispatcher
+            self._dispatcher = None
+        running = [info for info in self._tasks.values() if info.job_id is not None and not info.task.done()]
+        for info in running:
+            work = self._job_work.get(info.job_id)
+            (work or info.task).cancel()
+        if running:
+            await asyncio.gather(*(info.task for info in running), return_exceptions=True)
+
+    def cancel(self, run_id: int | str) -> bool:
         """取消后台任务"""
         info = self._tasks.get(run_id)
         if not info or info.task.done():
@@ -87,7 +408,7 @@ class BackgroundTaskRunner:
         logger.info("cancelled background task for run %s", run_id)
         return True
 
-    def get_status(self, run_id: int) -> dict | None:
+    def get_status(self, run_id: int | str) -> dict | None:
         """查询任务状态"""
         info = self._tasks.get(run_id)
         if not info:
@@ -98,8 +419,26 @@ class BackgroundTaskRunner:
             "cancelled": info.task.cancelled() if info.task.done() else False,
             "created_at": info.created_at.isoformat(),
             "timeout": info.timeout,
+            "job_id": info.job_id,
         }
 
+    @property
+    def active_job_count(self) -> int:
+        """本进程执行中的持久化任务数"""
+        return sum(1 for t in self._tasks.values() if t.job_id is not None and not t.task.done())
+
+    def running_by_user(self) -> dict[int, int]:
+        """本进程各用户执行中的持久化任务数（入队时的快速判断；跨 worker 的上限由 JobStore.claim 保证）"""
+        counts: dict[int, int] = {}
+        for info in self._tasks.values():
+            if info.job_id is not None and info.user_id is not None and not info.task.done():
+                counts[info.user_id] = counts.get(info.user_id, 0) + 1
+        return counts
+
+    def _user_at_limit(self, user_id: int | None) -> bool:
+        limit = self.settings.task_user_concurrency
+        return bool(limit and user_id is not None and self.running_by_user().get(user_id, 0) >= limit)
+
     @property
     def active_count(self) -> int:
         return sum(1 for t in self._tasks.values() if not t.task.done())
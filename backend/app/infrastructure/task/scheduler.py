@@ -0,0 +1,176 @@
+"""
+AI 工作调度 — 调度类别优先级 + 按用户的公平排队
+
+- 调度类别：interactive > batch（用户触发的批量）> background（自动后台），类别之间严格优先
+- 同一类别内按用户公平排队：请求按所属用户的虚拟完成时间排序，每个用户份额相同，
+  某个用户一次排入 100 个请求也只按自己的份额推进，其他用户的新请求可以插到前面
+- 按用户并发上限：已达上限的用户的等待者被跳过，空出的容量让给其他用户
+- 当前工作的类别与用户保存在 contextvar 中（work_context），未声明时视为 interactive；
+  后台任务在执行入口声明自己的类别，下游的模型调用（限流器排队）据此排序
+- 每个类别的排队数与等待时间按队列 scope 计入 metrics（/metrics 的 scheduler 段）
+
+FairQueue 用于进程内的等待队列（provider 限流器）；持久化任务表用同样的标签规则，见 jobs.next_fair_tag。
+"""
+
+import asyncio
+import itertools
+import time
+from collections import Counter, defaultdict
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from app.core.metrics import metrics
+from app.domain.ai_runtime.enums import WorkClass
+
+# 类别排序（越小越先）与持久化任务的 priority（越大越先）
+CLASS_RANK = {WorkClass.INTERACTIVE: 0, WorkClass.BATCH: 1, WorkClass.BACKGROUND: 2}
+JOB_PRIORITY = {WorkClass.INTERACTIVE: 100, WorkClass.BATCH: 50, WorkClass.BACKGROUND: 0}
+
+MAX_FINISH_TAGS = 1024  # 每个队列保留的用户虚拟完成时间条目数，超出时清理已追平的用户
+
+
+@dataclass(frozen=True)
+class WorkContext:
+    """当前 AI 工作的调度身份"""
+
+    work_class: WorkClass = WorkClass.INTERACTIVE
+    user_id: int | None = None
+
+
+_DEFAULT_WORK = WorkContext()
+_current_work: ContextVar[WorkContext | None] = ContextVar("ai_work_context", default=None)
+
+
+def current_work() -> WorkContext:
+    return _current_work.get() or _DEFAULT_WORK
+
+
+@contextmanager
+def work_context(work_class: WorkClass | str, user_id: int | None = None) -> Iterator[WorkContext]:
+    """在此范围内（含其中创建的 task）以指定类别与用户调度 AI 工作"""
+    work = WorkContext(WorkClass(work_class), user_id)
+    token = _current_work.set(work)
+    try:
+        yield work
+    finally:
+        _current_work.reset(token)
+
+
+@dataclass
+class _Waiter:
+    work: WorkContext
+    tag: float
+    seq: int
+    future: asyncio.Future
+    enqueued_at: float
+
+    @property
+    def order(self) -> tuple[int, float, int]:
+        return CLASS_RANK[self.work.work_class], self.tag, self.seq
+
+
+class FairQueue:
+    """容量受限的公平等待队列
+
+    capacity 为同时持有的槽位数；per_user_limit 为单个用户同时持有的上限（0 不限）。
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        *,
+        capacity: int = 1,
+        per_user_limit: int = 0,
+    ):
+        self.scope = scope
+        self.capacity = capacity
+        self.per_user_limit = per_user_limit
+        self._waiters: list[_Waiter] = []
+        self._running = 0
+        self._running_by_user: Counter[int] = Counter()
+        self._virtual_time: dict[WorkClass, float] = defaultdict(float)
+        self._finish: dict[tuple[WorkClass, int | None], float] = {}
+        self._seq = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def _at_limit(self, work: WorkContext) -> bool:
+        return bool(
+            self.per_user_limit
+            and work.user_id is not None
+            and self._running_by_user[work.user_id] >= self.per_user_limit
+        )
+
+    async def acquire(self, work: WorkContext | None = None) -> WorkContext:
+        """排队直到轮到（按类别、用户虚拟完成时间、到达顺序），返回占用槽位的工作身份"""
+        work = work or current_work()
+        key = (work.work_class, work.user_id)
+        tag = max(self._virtual_time[work.work_class], self._finish.get(key, 0.0)) + 1
+        self._finish[key] = tag
+        waiter = _Waiter(work, tag, next(self._seq), asyncio.get_running_loop().create_future(), time.monotonic())
+        self._waiters.append(waiter)
+        metrics.adjust_queue_depth(self.scope, work.work_class.value, 1)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                metrics.adjust_queue_depth(self.scope, work.work_class.value, -1)
+                self._dispatch()
+            elif not waiter.future.cancelled():
+                # 已分到槽位但在恢复执行前被取消：归还
+                self.release(work)
+            raise
+        return work
+
+    def release(self, work: WorkContext) -> None:
+        self._running -= 1
+        if work.user_id is not None:
+            self._running_by_user[work.user_id] -= 1
+            if self._running_by_user[work.user_id] <= 0:
+                del self._running_by_user[work.user_id]
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, work: WorkContext | None = None) -> AsyncIterator[WorkContext]:
+        work = await self.acquire(work)
+        try:
+            yield work
+        finally:
+            self.release(work)
+
+    def _dispatch(self) -> None:
+        while self._running < self.capacity:
+            eligible = [waiter for waiter in self._waiters if not self._at_limit(waiter.work)]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: w.order)
+            self._waiters.remove(waiter)
+            work = waiter.work
+            if waiter.future.done():
+                # 等待者已被取消、尚未来得及出队
+                metrics.adjust_queue_depth(self.scope, work.work_class.value, -1)
+                continue
+            self._virtual_time[work.work_class] = max(self._virtual_time[work.work_class], waiter.tag)
+            self._running += 1
+            if work.user_id is not None:
+                self._running_by_user[work.user_id] += 1
+            metrics.adjust_queue_depth(self.scope, work.work_class.value, -1)
+            metrics.record_queue_wait(self.scope, work.work_class.value, time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+        self._prune()
+
+    def _prune(self) -> None:
+        if len(self._finish) <= MAX_FINISH_TAGS:
+            return
+        # 完成时间已被虚拟时间追平的用户，下次入队时的标签与新用户相同，可以丢弃
+        self._finish = {key: tag for key, tag in self._finish.items() if tag > self._virtual_time[key[0]]}
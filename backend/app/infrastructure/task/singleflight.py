@@ -0,0 +1,42 @@
+"""
+进程内 single-flight — 相同 key 的并发调用合并为一次执行
+
+职责：
+- 第一个调用者（leader）以独立 asyncio.Task 执行协程，后来者 await 同一任务
+- 结果或异常原样分发给所有等待者；任务结束即从登记表移除，下次调用重新执行
+- 等待者被取消不会取消共享任务（asyncio.shield），其他等待者不受影响
+
+注意：仅在单进程（单事件循环）内去重；跨 worker 的重复由调用方的幂等写入兜底。
+"""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class SingleFlight:
+    """按 key 合并并发中的相同调用"""
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """key 已有进行中的调用则等待其结果，否则执行 fn()。"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # 标记已取回，避免无人等待时的 "never retrieved" 告警
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
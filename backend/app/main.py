@@ -15,6 +15,10 @@ from app.core.logging import setup_logging
 from app.core.middleware import RequestIDMiddleware, limiter, setup_cors
 from app.infrastructure.db.init_tables import ensure_token_blacklist_table
 from app.infrastructure.db.session import dispose_engine, get_async_engine
+from app.infrastructure.events import close_run_event_bus
+from app.infrastructure.llm.model_pool import chat_model_pool
+from app.infrastructure.llm.response_cache import close_response_cache
+from app.infrastructure.task.runner import background_runner
 
 logger = logging.getLogger(__name__)
 
@@ -39,9 +43,16 @@ async def lifespan(app: FastAPI):
     # 兜底：确保 token_blacklist 表存在（防御未运行 Alembic 的场景）
     await ensure_token_blacklist_table(engine)
 
+    # 持久化后台任务：回收上次进程遗留的过期租约并开始轮询
+    await background_runner.start()
+
     yield
 
     # 资源释放
+    await background_runner.stop()
+    await chat_model_pool.aclose()
+    await close_run_event_bus()
+    close_response_cache()
     await dispose_engine()
     logger.info("AINovel API 关闭")
 
@@ -55,12 +66,18 @@ def _startup_checks(settings) -> None:
     if len(settings.auth.secret_key) < 32:
         errors.append("AUTH_SECRET_KEY 长度不足 32 字符")
 
+    # 跨进程事件总线
+    if settings.ai.run_event_bus == "redis" and not settings.ai.run_event_bus_url:
+        errors.append("AI_RUN_EVENT_BUS=redis 时必须配置 AI_RUN_EVENT_BUS_URL")
+
     # 生产环境额外检查
     if settings.is_prod:
         if settings.app.debug:
             errors.append("生产环境不应开启 debug 模式")
         if "sqlite" in settings.db.url.lower():
             errors.append("生产环境不应使用 SQLite")
+        if settings.ai.scripted_provider_enabled:
+            errors.append("生产环境不应启用 scripted provider（AI_SCRIPTED_PROVIDER_ENABLED）")
         if not settings.encryption.encryption_key:
             warnings.append(
                 "生产环境建议显式设置 ENCRYPTION_KEY，"
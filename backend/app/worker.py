@@ -0,0 +1,96 @@
+"""
+后台任务 Worker — 独立进程执行持久化后台任务（章节知识分析等）
+
+用法：
+    python -m app.worker --concurrency 8
+
+- 与 API 共用数据库、session factory、服务层与任务处理函数；从 background_jobs 领取任务执行
+- API 设置 AI_TASK_RUN_IN_API=false 后只负责入队，Web 层与 LLM 密集的批处理层可分别扩缩容
+- 可同时运行多个 worker：任务按租约领取，不会重复执行；SIGTERM / SIGINT 时交还执行中的任务
+"""
+
+import argparse
+import asyncio
+import importlib
+import logging
+import signal
+
+from app.core.config import get_settings
+from app.core.logging import setup_logging
+from app.infrastructure.db.session import dispose_engine
+from app.infrastructure.llm.model_pool import chat_model_pool
+from app.infrastructure.llm.response_cache import close_response_cache
+from app.infrastructure.task.runner import BackgroundTaskRunner
+
+logger = logging.getLogger(__name__)
+
+# 导入即通过 register_job_handler 注册任务处理函数的模块
+JOB_MODULES = ("app.application.knowledge_graph_service",)
+
+
+def load_job_handlers() -> None:
+    for module in JOB_MODULES:
+        importlib.import_module(module)
+
+
+async def run_worker(
+    concurrency: int | None = None,
+    *,
+    runner: BackgroundTaskRunner | None = None,
+    stop_event: asyncio.Event | None = None,
+) -> None:
+    """运行 worker 直到 stop_event 被设置（默认由 SIGTERM / SIGINT 触发）"""
+    load_job_handlers()
+    if runner is None:
+        settings = get_settings().ai
+        if concurrency:
+            settings.task_concurrency = concurrency
+        runner = BackgroundTaskRunner(settings=settings, execute_jobs=True)
+
+    stop = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    handled_signals = []
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+            handled_signals.append(sig)
+        except (NotImplementedError, RuntimeError):
+            # Windows / 非主线程不支持信号处理，依赖 KeyboardInterrupt
+            pass
+
+    await runner.start()
+    logger.info(
+        "AINovel worker 启动 | worker_id=%s | concurrency=%s",
+        runner.worker_id,
+        runner.settings.task_concurrency,
+    )
+    try:
+        await stop.wait()
+    finally:
+        logger.info("AINovel worker 停止，交还执行中的任务")
+        for sig in handled_signals:
+            loop.remove_signal_handler(sig)
+        await runner.stop()
+        await chat_model_pool.aclose()
+        close_response_cache()
+        await dispose_engine()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.worker", description="AINovel 后台任务 worker")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="同时执行的任务数（默认取 AI_TASK_CONCURRENCY）",
+    )
+    args = parser.parse_args(argv)
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency 必须大于 0")
+
+    setup_logging(env=get_settings().app.env)
+    asyncio.run(run_worker(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,8 @@
 - 测试用 Settings（SQLite 内存库 + 固定密钥）
 - 异步 DB engine / session
 - FastAPI TestClient
-- 预置用户 / 项目 fixture
+- 预置用户 / 项目 / 章节 fixture
+- SQL 语句计数（防止查询次数回退）
 """
 
 import asyncio
@@ -13,10 +14,12 @@ import asyncio
 # ── 测试环境变量（必须在 import app 之前设置） ──
 import os
 from collections.abc import AsyncGenerator
+from contextlib import contextmanager
 
 import pytest
 import pytest_asyncio
 from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 os.environ.setdefault("APP_ENV", "test")
@@ -24,6 +27,8 @@ os.environ.setdefault("AUTH_SECRET_KEY", "test-secret-key-must-be-at-least-32-ch
 os.environ.setdefault("AUTH_ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 os.environ.setdefault("AUTH_REFRESH_TOKEN_EXPIRE_MINUTES", "10080")
 os.environ.setdefault("DB_URL", "sqlite+aiosqlite:///:memory:")
+# 摘要后台预生成默认关闭：避免章节写操作在测试间留下防抖任务；相关测试显式开启
+os.environ.setdefault("AI_SUMMARY_PREFETCH_ENABLED", "false")
 
 from app.infrastructure.db.base import Base  # noqa: E402
 from app.infrastructure.db.session import get_db  # noqa: E402
@@ -38,6 +43,14 @@ def reset_rate_limiter():
     limiter.reset()
 
 
+@pytest.fixture(autouse=True)
+def reset_model_pool():
+    """每个测试后清空 ChatModel 复用池，避免上个测试的假模型被命中"""
+    yield
+    from app.infrastructure.llm.model_pool import chat_model_pool
+    chat_model_pool.clear()
+
+
 # ── 事件循环 ──
 
 @pytest.fixture(scope="session")
@@ -74,6 +87,27 @@ async def db_session(db_engine) -> AsyncGenerator[AsyncSession, None]:
         await session.rollback()
 
 
+@pytest.fixture
+def count_queries(db_session):
+    """返回上下文管理器：块内 db_session 执行的 SQL 语句收集到列表。"""
+
+    @contextmanager
+    def _count():
+        statements: list[str] = []
+        engine = db_session.bind.sync_engine
+
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _before)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", _before)
+
+    return _count
+
+
 # ── FastAPI TestClient ──
 
 @pytest_asyncio.fixture
@@ -126,6 +160,45 @@ async def test_user(db_session):
     return user
 
 
+@pytest.fixture
+def make_chapters(db_session, test_user):
+    """返回工厂：为 test_user 创建项目及 count 个按序编号的章节，返回 (project, chapters)。
+
+    正文为「第N章正文」重复 content_repeat 次；summaries=True 时预置与正文同步的简要 / 详细摘要。
+    """
+    from app.infrastructure.db.models.manuscript import Chapter
+    from app.infrastructure.db.models.projects import Project
+
+    async def _make(count: int, *, content_repeat: int = 50, summaries: bool = False):
+        project = Project(name=f"章节项目{count}", description="x", user_id=test_user.id)
+        db_session.add(project)
+        await db_session.flush()
+
+        chapters = []
+        for i in range(count):
+            word_count = 5 * content_repeat
+            chapter = Chapter(
+                project_id=project.id,
+                title=f"第{i + 1}章",
+                content=f"第{i + 1}章正文" * content_repeat,
+                chapter_number=i + 1,
+                word_count=word_count,
+                status="draft",
+            )
+            if summaries:
+                chapter.summary_brief = f"第{i + 1}章简要"
+                chapter.summary_detailed = f"第{i + 1}章详细"
+                chapter.summary_source_word_count = word_count
+            chapters.append(chapter)
+        db_session.add_all(chapters)
+        await db_session.commit()
+        for chapter in chapters:
+            await db_session.refresh(chapter)
+        return project, chapters
+
+    return _make
+
+
 @pytest_asyncio.fixture
 async def auth_headers(client) -> dict:
     """注册并登录，返回带 JWT 的请求头"""
@@ -9,8 +9,9 @@ from sqlalchemy import select
 from app.infrastructure.db.models.ai_runtime import (
     LangGraphWorkflow, LangGraphSession, AIRun, AIRunEvent, AIGeneratedContent,
 )
+from app.infrastructure.graph.event_sink import RunEventSink
 from app.infrastructure.graph.runner import GraphRunner
-from app.infrastructure.graph.registry import graph_registry
+from app.infrastructure.graph.registry import bound_model, graph_registry
 from app.domain.ai_runtime.enums import RunStatus, EventType
 
 
@@ -40,6 +41,62 @@ def mock_graph_builder(model, **kwargs):
     return MockGraph()
 
 
+class MockStreamGraph:
+    """模拟带 metadata 的 astream_events：图节点与节点内部 runnable 混在一起"""
+
+    async def astream_events(self, state, version, **kwargs):
+        node = {"langgraph_node": "generate_outline"}
+        yield {"event": "on_chain_start", "name": "LangGraph", "metadata": {}}
+        yield {"event": "on_chain_start", "name": "generate_outline", "metadata": node}
+        yield {"event": "on_chain_start", "name": "RunnableSequence", "metadata": node}
+        yield {"event": "on_chain_end", "name": "RunnableSequence", "metadata": node}
+        yield {"event": "on_chain_end", "name": "generate_outline", "metadata": node}
+        yield {"event": "on_chain_start", "name": "__start__", "metadata": {"langgraph_node": "__start__"}}
+        yield {"event": "on_chain_end", "name": "LangGraph", "metadata": {}}
+
+
+class PausingStreamGraph:
+    """模型输出一个 chunk 后停顿，再输出下一个"""
+
+    async def astream_events(self, state, version, **kwargs):
+        import asyncio
+        from types import SimpleNamespace
+
+        node = {"langgraph_node": "generate_outline"}
+        yield {
+            "event": "on_chat_model_stream",
+            "name": "model",
+            "metadata": node,
+            "data": {"chunk": SimpleNamespace(content="一")},
+        }
+        await asyncio.sleep(0.2)
+        yield {
+            "event": "on_chat_model_stream",
+            "name": "model",
+            "metadata": node,
+            "data": {"chunk": SimpleNamespace(content="二")},
+        }
+
+
+def scripted_graph_builder(model, **kwargs):
+    """单节点真实 LangGraph 图：节点内调用本次绑定的模型"""
+    from typing import TypedDict
+
+    from langgraph.graph import END, START, StateGraph
+
+    class State(TypedDict):
+        text: str
+
+    async def write(state, config):
+        return {"text": (await bound_model(config).ainvoke("写一句话")).content}
+
+    graph = StateGraph(State)
+    graph.add_node("write", write)
+    graph.add_edge(START, "write")
+    graph.add_edge("write", END)
+    return graph.compile(**kwargs)
+
+
 class TestAIRun:
     async def test_create_and_query_airun(self, db_session):
         """AIRun 创建与查询"""
@@ -144,10 +201,13 @@ class TestAIRun:
         run = await runner.create_run(session, "chapter_outline")
 
         # 模拟记录若干事件
-        seq = await runner._record_event(run.id, EventType.NODE_START, "node_a", 0)
-        seq = await runner._record_event(run.id, EventType.NODE_END, "node_a", seq)
-        seq = await runner._record_event(run.id, EventType.NODE_START, "node_b", seq)
-        seq = await runner._record_event(run.id, EventType.NODE_END, "node_b", seq)
+        sink = RunEventSink(db_session, run.id)
+        seq = sink.record(EventType.NODE_START, "node_a", 0)
+        seq = sink.record(EventType.NODE_END, "node_a", seq)
+        seq = sink.record(EventType.NODE_START, "node_b", seq)
+        seq = sink.record(EventType.NODE_END, "node_b", seq)
+        assert sink.pending == 4
+        await sink.flush()
         await db_session.commit()
 
         result = await db_session.execute(
@@ -163,3 +223,91 @@ class TestAIRun:
         assert events[1].event_type == EventType.NODE_END.value
         assert events[2].sequence == 2
         assert events[3].sequence == 3
+
+    async def test_stream_persists_only_graph_node_events_in_batches(self, db_session):
+        """execute_stream 只落库图节点事件，节点内部 runnable 不产生事件"""
+        workflow = LangGraphWorkflow(
+            name="批量事件工作流",
+            workflow_type="chapter_outline",
+            project_id=1,
+            model_config_id=1,
+        )
+        db_session.add(workflow)
+        await db_session.flush()
+        session = LangGraphSession(workflow_id=workflow.id, thread_id="thread-event-batch")
+        db_session.add(session)
+        await db_session.flush()
+
+        runner = GraphRunner(db_session)
+        run = await runner.create_run(session, "chapter_outline")
+
+        with patch.object(graph_registry, "get", return_value=lambda model, **kwargs: MockStreamGraph()):
+            payloads = [payload async for payload in runner.execute_stream(run, None, {})]
+
+        assert [(p["type"], p["node"]) for p in payloads] == [
+            ("node_start", "generate_outline"),
+            ("node_end", "generate_outline"),
+            ("done", None),
+        ]
+        result = await db_session.execute(
+            select(AIRunEvent).where(AIRunEvent.run_id == run.id).order_by(AIRunEvent.sequence)
+        )
+        events = result.scalars().all()
+        assert [(e.event_type, e.node_name, e.sequence) for e in events] == [
+            (EventType.NODE_START.value, "generate_outline", 0),
+            (EventType.NODE_END.value, "generate_outline", 1),
+        ]
+
+    async def test_stream_flushes_buffered_tokens_when_model_pauses(self, db_session, monkeypatch):
+        """模型停顿时到合并时限即推出已缓冲的 token，不等下一个 chunk"""
+        monkeypatch.setenv("AI_STREAM_COALESCE_MS", "20")
+        monkeypatch.setenv("AI_STREAM_COALESCE_CHARS", "100")
+        workflow = LangGraphWorkflow(
+            name="停顿工作流",
+            workflow_type="chapter_outline",
+            project_id=1,
+            model_config_id=1,
+        )
+        db_session.add(workflow)
+        await db_session.flush()
+        session = LangGraphSession(workflow_id=workflow.id, thread_id="thread-pause")
+        db_session.add(session)
+        await db_session.flush()
+
+        runner = GraphRunner(db_session)
+        run = await runner.create_run(session, "chapter_outline")
+
+        with patch.object(graph_registry, "get", return_value=lambda model, **kwargs: PausingStreamGraph()):
+            payloads = [payload async for payload in runner.execute_stream(run, None, {})]
+
+        assert [(p["type"], (p.get("data") or {}).get("content")) for p in payloads] == [
+            ("token", "一"),
+            ("token", "二"),
+            ("done", None),
+        ]
+
+    async def test_execute_backfills_tokens_from_usage_callback(self, db_session):
+        """非流式 execute 经回调累计 usage，tokens_used 不再为 0"""
+        from app.infrastructure.llm.provider_adapters.scripted_provider import ScriptedChatModel
+
+        workflow = LangGraphWorkflow(
+            name="usage 工作流",
+            workflow_type="chapter_outline",
+            project_id=1,
+            model_config_id=1,
+        )
+        db_session.add(workflow)
+        await db_session.flush()
+        session = LangGraphSession(workflow_id=workflow.id, thread_id="thread-usage")
+        db_session.add(session)
+        await db_session.flush()
+
+        runner = GraphRunner(db_session)
+        run = await runner.create_run(session, "chapter_outline")
+        model = ScriptedChatModel(responses=["你好世界"], ttft=0, tokens_per_second=0)
+
+        with patch.object(graph_registry, "get", return_value=scripted_graph_builder):
+            result = await runner.execute(run, model, {"text": ""})
+
+        assert result["text"] == "你好世界"
+        assert run.tokens_used == (await model.ainvoke("写一句话")).usage_metadata["total_tokens"]
@@ -1,9 +1,7 @@
 """SSE 实时流集成测试"""
 
-import asyncio
 from unittest.mock import MagicMock
 
-from app.application.ai_workflow_service import RUN_QUEUES
 from app.domain.ai_runtime.enums import EventType, RunStatus
 from app.infrastructure.db.models.ai_runtime import (
     AIRun,
@@ -11,6 +9,7 @@ from app.infrastructure.db.models.ai_runtime import (
     LangGraphSession,
     LangGraphWorkflow,
 )
+from app.infrastructure.events import run_event_hub
 
 
 class MockSSEGraph:
@@ -95,26 +94,113 @@ class TestSSEStreaming:
         assert "done" in body
 
     async def test_sse_running_run_live_events(self, db_session, client, auth_headers):
-        """SSE 端点对 running run 推送实时事件（mock queue + GraphRunner）"""
+        """SSE 端点对 running run 推送实时事件（run channel 预置事件）"""
         run = await self._create_project_and_run(db_session, client, auth_headers, RunStatus.RUNNING.value)
 
-        # 注册一个 mock queue，预置事件
-        queue = asyncio.Queue()
-        await queue.put({"type": "token", "content": "hello", "run_id": run.id})
-        await queue.put({"type": "done", "status": "succeeded", "run_id": run.id})
-        RUN_QUEUES[run.id] = queue
+        channel = run_event_hub.open(run.id)
+        channel.publish({"type": "token", "content": "hello", "run_id": run.id})
+        channel.publish({"type": "done", "status": "succeeded", "run_id": run.id})
 
-        try:
-            resp = await client.get(
-                f"/api/v1/ai/runs/{run.id}/stream",
-                headers=auth_headers,
-            )
-            assert resp.status_code == 200
-            body = resp.text
-            assert "hello" in body
-            assert "done" in body
-        finally:
-            RUN_QUEUES.pop(run.id, None)
+        resp = await client.get(
+            f"/api/v1/ai/runs/{run.id}/stream",
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        body = resp.text
+        assert "hello" in body
+        assert "done" in body
+        assert "id: 1" in body
+
+    async def test_sse_resumes_after_last_event_id(self, db_session, client, auth_headers):
+        """带 Last-Event-ID 重连只收到之后的事件；多个订阅者互不抢占"""
+        run = await self._create_project_and_run(db_session, client, auth_headers, RunStatus.RUNNING.value)
+
+        channel = run_event_hub.open(run.id)
+        for text in ("first", "second"):
+            channel.publish({"type": "token", "content": text, "run_id": run.id})
+        channel.publish({"type": "done", "status": "succeeded", "run_id": run.id})
+
+        full = await client.get(f"/api/v1/ai/runs/{run.id}/stream", headers=auth_headers)
+        resumed = await client.get(
+            f"/api/v1/ai/runs/{run.id}/stream",
+            headers={**auth_headers, "Last-Event-ID": "1"},
+        )
+
+        assert "first" in full.text and "second" in full.text
+        assert "first" not in resumed.text
+        assert "second" in resumed.text and "done" in resumed.text
+
+    async def test_sse_falls_back_to_db_replay_when_buffer_moved_on(
+        self, db_session, client, auth_headers, monkeypatch
+    ):
+        """Last-Event-ID 已被挤出环形缓冲时先回放落库事件，再接上缓冲"""
+        run = await self._create_project_and_run(db_session, client, auth_headers, RunStatus.RUNNING.value)
+        db_session.add(AIRunEvent(run_id=run.id, event_type=EventType.NODE_START.value, node_name="node_a", sequence=0))
+        await db_session.commit()
+
+        monkeypatch.setattr(run_event_hub, "capacity", 2)
+        channel = run_event_hub.open(run.id)
+        for text in ("t1", "t2", "t3"):
+            channel.publish({"type": "token", "content": text, "run_id": run.id})
+        channel.publish({"type": "done", "status": "succeeded", "run_id": run.id})
+
+        resp = await client.get(
+            f"/api/v1/ai/runs/{run.id}/stream",
+            headers={**auth_headers, "Last-Event-ID": "1"},
+        )
+
+        body = resp.text
+        assert "node_a" in body
+        assert "t2" not in body
+        assert body.index("node_a") < body.index("t3") < body.index("done")
+
+    async def test_sse_replays_only_persisted_events_missing_from_cursor(
+        self, db_session, client, auth_headers, monkeypatch
+    ):
+        """缓冲越界时只回放游标与缓冲之间的落库事件，回放事件带可续传的 id"""
+        run = await self._create_project_and_run(db_session, client, auth_headers, RunStatus.RUNNING.value)
+        rows = [
+            (EventType.NODE_START, "node_a"),
+            (EventType.NODE_END, "node_a"),
+            (EventType.NODE_START, "node_b"),
+            (EventType.NODE_END, "node_b"),
+        ]
+        for seq, (etype, node) in enumerate(rows):
+            db_session.add(AIRunEvent(run_id=run.id, event_type=etype.value, node_name=node, sequence=seq))
+        await db_session.commit()
+
+        # 与 GraphRunner 一致：节点事件的 payload sequence = 落库 sequence + 1
+        monkeypatch.setattr(run_event_hub, "capacity", 3)
+        channel = run_event_hub.open(run.id)
+        for event_type, node, seq in [
+            ("node_start", "node_a", 1),
+            ("token", "node_a", 1),
+            ("node_end", "node_a", 2),
+            ("node_start", "node_b", 3),
+            ("token", "node_b", 3),
+            ("node_end", "node_b", 4),
+            ("done", None, 5),
+        ]:
+            channel.publish({"type": event_type, "node": node, "sequence": seq, "run_id": run.id})
+
+        resp = await client.get(
+            f"/api/v1/ai/runs/{run.id}/stream",
+            headers={**auth_headers, "Last-Event-ID": "2/1"},
+        )
+
+        body = resp.text
+        # node_a 的 node_start 客户端已收到；node_end(node_a)、node_start(node_b) 从数据库补齐
+        assert body.count('"node": "node_a"') == 1
+        assert body.count('"node": "node_b"') == 3
+        assert "id: 4/2" in body and "id: 4/3" in body
+        assert "id: 7/5" in body
+
+        resumed = await client.get(
+            f"/api/v1/ai/runs/{run.id}/stream",
+            headers={**auth_headers, "Last-Event-ID": "4/2"},
+        )
+        assert resumed.text.count('"node": "node_a"') == 0
+        assert resumed.text.count('"node": "node_b"') == 3
 
     async def test_sse_content_type_is_event_stream(self, db_session, client, auth_headers):
         """EventSourceResponse content-type 是 text/event-stream"""
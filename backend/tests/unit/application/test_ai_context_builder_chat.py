@@ -96,11 +96,11 @@ async def test_format_for_chat_with_character_counts(db_session, test_user, coun
         assert "角色2" in text
         assert "背景" in text
     if count == 10:
-        assert "角色9" in text
-        assert "性格：" not in text
+        # 每个角色先露名 + 简述，余下预算把靠前的角色升级为完整档案
+        assert "- 角色0\n  描述：" in text
+        assert "- 角色9：描述" in text
     if count == 25:
         assert "角色24" in text
-        assert "性格：" not in text
 
 
 @pytest.mark.asyncio
@@ -243,3 +243,63 @@ async def test_format_for_chat_budget_omits_worldbuilding_when_tight(db_session,
     assert "项目：" in text
     assert "【角色基础列表】" in text
     assert len(text) <= 100
+
+
+@pytest.mark.asyncio
+async def test_format_for_chat_budget_is_measured_in_tokens(db_session, test_user):
+    """同样的 token 预算下，英文关系条目（约 4 字符/token）比中文能放进更多字符。"""
+    project = await _create_project_with_characters(db_session, test_user.id, 3)
+    builder = AIContextBuilder(db_session)
+    ctx = await builder.get_project_context(project.id, mode="chat")
+    ctx["relationships"] = [
+        {"source_name": f"hero{idx}", "target_name": "guild", "relation_type": "member_of", "description": "x" * 200}
+        for idx in range(20)
+    ]
+
+    text = builder.format_for_chat_with_budget(ctx, max_tokens=600)
+
+    assert count_tokens_estimate(text) <= 600
+    assert len(text) > 600 * 1.6
+    assert all(f"hero{idx} --member_of--> guild" in text for idx in range(20))
+
+
+@pytest.mark.asyncio
+async def test_chat_context_ranks_entities_mentioned_in_focus_texts(db_session, test_user):
+    project = Project(name="提及项目", description="简介", user_id=test_user.id)
+    db_session.add(project)
+    await db_session.flush()
+    for idx in range(12):
+        db_session.add(Character(project_id=project.id, name=f"角色{idx:02d}", description=f"角色{idx:02d}的描述"))
+    for idx in range(20):
+        db_session.add(Location(project_id=project.id, name=f"地点{idx:02d}", description=f"地点{idx:02d}的描述"))
+    await db_session.commit()
+    builder = AIContextBuilder(db_session)
+
+    text = await builder.get_chat_context_text(
+        project.id,
+        focus_texts=["角色11走出地点18，又回头望了一眼地点18。", "角色03接下来该去哪？"],
+    )
+
+    character_lines = [line for line in text.splitlines() if line.startswith("- 角色")]
+    location_lines = [line for line in text.splitlines() if line.startswith("- 地点")]
+    # 被提及的排在最前（用户消息权重更高），其后每类只带 5 个未提及的
+    assert character_lines[0].startswith("- 角色03")
+    assert character_lines[1].startswith("- 角色11")
+    assert len(character_lines) == 2 + 5
+    # 地点18 超出默认 15 条上限，被提及后仍然进入上下文
+    assert location_lines[0].startswith("- 地点18")
+    assert len(location_lines) == 1 + 5
+
+
+@pytest.mark.asyncio
+async def test_chat_context_without_mentions_uses_cached_default(db_session, test_user):
+    project = await _create_project_with_worldbuilding(db_session, test_user.id)
+    builder = AIContextBuilder(db_session)
+
+    default = await builder.get_chat_context_text(project.id)
+    unfocused = await builder.get_chat_context_text(project.id, focus_texts=["今天写点什么？", None])
+
+    assert unfocused == default
+    snapshot = builder.cache.get(project.id, "chat", 0)
+    assert snapshot.mention_index is not None
+    assert len(snapshot.mention_index) == 4
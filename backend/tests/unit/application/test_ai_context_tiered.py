@@ -1,12 +1,15 @@
 """AIContextBuilder.get_tiered_chapter_context 单元测试。"""
 
+import asyncio
+
+from sqlalchemy import inspect
+
 from app.application.ai_context_builder import (
+    TIERED_SUMMARY_CONCURRENCY,
     TIERED_TOTAL_CHAPTERS,
     AIContextBuilder,
     TieredChapterContext,
 )
-from app.infrastructure.db.models.manuscript import Chapter
-from app.infrastructure.db.models.projects import Project
 from app.schemas.legacy_ai import ChapterSummarySchema
 
 
@@ -37,33 +40,35 @@ class _FakeChatModel:
         return _Structured()
 
 
-async def _make_chapters(db_session, user_id: int, count: int) -> tuple[Project, list[Chapter]]:
-    project = Project(name=f"分层项目{count}", description="x", user_id=user_id)
-    db_session.add(project)
-    await db_session.flush()
+class _SlowChatModel(_FakeChatModel):
+    """每次调用让出事件循环几轮，并记录同时在途的调用峰值。"""
 
-    chapters: list[Chapter] = []
-    for i in range(count):
-        ch = Chapter(
-            project_id=project.id,
-            title=f"第{i + 1}章",
-            content=f"第{i + 1}章正文" * 50,  # ~250 字
-            chapter_number=i + 1,
-            word_count=250,
-            status="draft",
-        )
-        db_session.add(ch)
-        chapters.append(ch)
-    await db_session.commit()
-    for ch in chapters:
-        await db_session.refresh(ch)
-    return project, chapters
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def with_structured_output(self, schema, method=None):
+        outer = self
+        inner = super().with_structured_output(schema, method)
+
+        class _Structured:
+            async def ainvoke(self, messages):
+                outer.in_flight += 1
+                outer.max_in_flight = max(outer.max_in_flight, outer.in_flight)
+                try:
+                    await asyncio.sleep(0.01)
+                    return await inner.ainvoke(messages)
+                finally:
+                    outer.in_flight -= 1
+
+        return _Structured()
 
 
 class TestGetTieredChapterContext:
-    async def test_only_one_chapter_returns_l1_only(self, db_session, test_user):
+    async def test_only_one_chapter_returns_l1_only(self, db_session, test_user, make_chapters):
         """1 章场景：只 L1，没有 L2/L3。"""
-        project, chapters = await _make_chapters(db_session, test_user.id, 1)
+        project, chapters = await make_chapters(1)
         builder = AIContextBuilder(db_session)
         chat_model = _FakeChatModel()
 
@@ -79,9 +84,9 @@ class TestGetTieredChapterContext:
         assert chat_model.call_count == 0  # 没有 L2/L3 → 不需要生成摘要
         assert result.summary_errors == []
 
-    async def test_four_chapters_l1_plus_three_l2(self, db_session, test_user):
+    async def test_four_chapters_l1_plus_three_l2(self, db_session, test_user, make_chapters):
         """4 章在第 4 章写 → L1=4, L2=[1,2,3], L3=[]。"""
-        project, chapters = await _make_chapters(db_session, test_user.id, 4)
+        project, chapters = await make_chapters(4)
         builder = AIContextBuilder(db_session)
         chat_model = _FakeChatModel()
 
@@ -100,9 +105,9 @@ class TestGetTieredChapterContext:
             assert ch.summary_detailed is not None
             assert ch.summary_source_word_count == ch.word_count
 
-    async def test_fifteen_chapters_at_15_l1_l2_l3(self, db_session, test_user):
+    async def test_fifteen_chapters_at_15_l1_l2_l3(self, db_session, test_user, make_chapters):
         """15 章在第 15 章写 → L1=15, L2=[12,13,14], L3=[5,6,7,8,9,10,11] 截到 6 章 = [6..11]。"""
-        project, chapters = await _make_chapters(db_session, test_user.id, 15)
+        project, chapters = await make_chapters(15)
         builder = AIContextBuilder(db_session)
         chat_model = _FakeChatModel()
 
@@ -116,11 +121,12 @@ class TestGetTieredChapterContext:
         assert [ch.chapter_number for ch in result.l2] == [12, 13, 14]
         assert [ch.chapter_number for ch in result.l3] == [6, 7, 8, 9, 10, 11]
         assert len(result.l2) + len(result.l3) + 1 == TIERED_TOTAL_CHAPTERS
-        assert chat_model.call_count == 9  # 3 详细 + 6 简要
+        # 3 详细 + 6 简要 + 窗口前已闭合的第 1–10 章篇章梗概（由 6–10 章简要合并）
+        assert chat_model.call_count == 10
 
-    async def test_hundred_chapters_at_100_l1_l2_l3(self, db_session, test_user):
+    async def test_hundred_chapters_at_100_l1_l2_l3(self, db_session, test_user, make_chapters):
         """100 章在第 100 章写 → 远古章节（≤ 90）不进 prompt。"""
-        project, chapters = await _make_chapters(db_session, test_user.id, 100)
+        project, chapters = await make_chapters(100)
         builder = AIContextBuilder(db_session)
         chat_model = _FakeChatModel()
 
@@ -137,9 +143,9 @@ class TestGetTieredChapterContext:
         all_returned = {result.l1.chapter_number, *(ch.chapter_number for ch in result.l2), *(ch.chapter_number for ch in result.l3)}
         assert min(all_returned) == 91
 
-    async def test_word_count_invalidation_triggers_regeneration(self, db_session, test_user):
-        """章节 word_count 变了 → summary_source_word_count 不匹配 → 重新生成。"""
-        project, chapters = await _make_chapters(db_session, test_user.id, 4)
+    async def test_content_rewrite_invalidation_triggers_regeneration(self, db_session, test_user, make_chapters):
+        """章节正文被改写 → 指纹与 summary_source_fingerprint 不匹配且变更幅度超阈值 → 重新生成。"""
+        project, chapters = await make_chapters(4)
         builder = AIContextBuilder(db_session)
         chat_model_first = _FakeChatModel()
 
@@ -167,9 +173,65 @@ class TestGetTieredChapterContext:
         # 其它 2 章保留原摘要
         assert all(ch.summary_detailed is not None for ch in result.l2)
 
-    async def test_summary_permanent_cache_no_regeneration_on_second_call(self, db_session, test_user):
+    async def test_same_length_rewrite_triggers_regeneration(self, db_session, test_user, make_chapters):
+        """字数不变但正文被大幅改写 → 指纹/草图变化 → 重新生成。"""
+        project, chapters = await make_chapters(4)
+        builder = AIContextBuilder(db_session)
+        await builder.get_tiered_chapter_context(project.id, chapters[3].id, _FakeChatModel())
+
+        chapters[0].content = "改" * len(chapters[0].content)
+        await db_session.commit()
+
+        chat_model = _FakeChatModel()
+        await builder.get_tiered_chapter_context(project.id, chapters[3].id, chat_model)
+        assert chat_model.call_count == 1
+
+    async def test_whitespace_and_small_edits_keep_summary(self, db_session, test_user, make_chapters):
+        """纯空白改动、小幅修改（低于变更阈值）→ 沿用旧摘要。"""
+        project, chapters = await make_chapters(4)
+        for ch in chapters:
+            ch.content = "".join(f"第{i}句，{ch.title}的主角在长街上奔跑。" for i in range(40))
+        await db_session.commit()
+        builder = AIContextBuilder(db_session)
+        await builder.get_tiered_chapter_context(project.id, chapters[3].id, _FakeChatModel())
+
+        chapters[0].content = chapters[0].content.replace("。", "。\n\n")
+        chapters[1].content = chapters[1].content.replace("第7句，", "第七句，", 1)
+        chapters[1].word_count = 251
+        await db_session.commit()
+
+        chat_model = _FakeChatModel()
+        await builder.get_tiered_chapter_context(project.id, chapters[3].id, chat_model)
+        assert chat_model.call_count == 0
+
+    async def test_refreshing_one_level_clears_outdated_other_level(self, db_session, test_user, make_chapters):
+        """两级共用来源快照：只重生成 L2 时，过期的 L3 摘要被清空而不是被误当新鲜。"""
+        project, chapters = await make_chapters(4)
+        target = chapters[0]
+        target.summary_brief = "旧的简要摘要"
+        builder = AIContextBuilder(db_session)
+        await builder.refresh_chapter_summaries([(target, "detailed"), (target, "brief")], _FakeChatModel())
+
+        target.content = "完全改写" * 100
+        await db_session.commit()
+        await builder.refresh_chapter_summaries([(target, "detailed")], _FakeChatModel())
+
+        assert target.summary_detailed
+        assert target.summary_brief is None
+
+    async def test_legacy_summary_without_fingerprint_uses_word_count(self, db_session, test_user, make_chapters):
+        project, chapters = await make_chapters(2)
+        legacy = chapters[0]
+        legacy.summary_detailed = "迁移前生成的摘要"
+        legacy.summary_source_word_count = legacy.word_count
+
+        assert not AIContextBuilder._summary_outdated(legacy, "detailed")
+        legacy.word_count = 999
+        assert AIContextBuilder._summary_outdated(legacy, "detailed")
+
+    async def test_summary_permanent_cache_no_regeneration_on_second_call(self, db_session, test_user, make_chapters):
         """word_count 不变 → 第二次完全不调 LLM（永久缓存）。"""
-        project, chapters = await _make_chapters(db_session, test_user.id, 4)
+        project, chapters = await make_chapters(4)
         builder = AIContextBuilder(db_session)
         chat_model_first = _FakeChatModel()
         await builder.get_tiered_chapter_context(
@@ -187,9 +249,9 @@ class TestGetTieredChapterContext:
         )
         assert chat_model_second.call_count == 0
 
-    async def test_summary_generation_failure_collected_not_fatal(self, db_session, test_user):
+    async def test_summary_generation_failure_collected_not_fatal(self, db_session, test_user, make_chapters):
         """单章摘要 LLM 失败 → 收集到 summary_errors，不抛错；其它章正常。"""
-        project, chapters = await _make_chapters(db_session, test_user.id, 4)
+        project, chapters = await make_chapters(4)
         builder = AIContextBuilder(db_session)
         # 模拟第 2 次调用失败（3 章并发顺序不严格保证，只保证至少 1 个失败被收集）
         chat_model = _FakeChatModel(fail_calls={2})
@@ -209,9 +271,112 @@ class TestGetTieredChapterContext:
         successful = [ch for ch in result.l2 if ch.summary_detailed]
         assert len(successful) >= 1
 
-    async def test_render_segment_includes_l1_full_l2_l3(self, db_session, test_user):
+    async def test_warm_call_loads_window_without_content(self, db_session, test_user, count_queries, make_chapters):
+        """摘要齐全时：只查 L1、前序窗口、摘要树节点三条语句，窗口行不加载正文。"""
+        project, chapters = await make_chapters(100)
+        builder = AIContextBuilder(db_session)
+        await builder.get_tiered_chapter_context(
+            project_id=project.id,
+            current_chapter_id=chapters[99].id,
+            chat_model=_FakeChatModel(),
+        )
+        db_session.expunge_all()
+
+        chat_model = _FakeChatModel()
+        with count_queries() as statements:
+            result = await builder.get_tiered_chapter_context(
+                project_id=project.id,
+                current_chapter_id=chapters[99].id,
+                chat_model=chat_model,
+            )
+
+        assert len(statements) == 3
+        assert chat_model.call_count == 0
+        assert result.l1.content == chapters[99].content
+        for ch in result.l2 + result.l3:
+            assert "content" in inspect(ch).unloaded
+            assert ch.summary_brief or ch.summary_detailed
+
+    async def test_stale_window_rows_load_content_for_generation(self, db_session, test_user, make_chapters):
+        """只给过期章节补拉正文，摘要 prompt 仍拿到全文。"""
+        project, chapters = await make_chapters(15)
+        builder = AIContextBuilder(db_session)
+        await builder.get_tiered_chapter_context(
+            project_id=project.id,
+            current_chapter_id=chapters[14].id,
+            chat_model=_FakeChatModel(),
+        )
+        chapters[12].content = "改写" * 200
+        chapters[12].word_count = 400
+        await db_session.commit()
+        db_session.expunge_all()
+
+        chat_model = _FakeChatModel()
+        result = await builder.get_tiered_chapter_context(
+            project_id=project.id,
+            current_chapter_id=chapters[14].id,
+            chat_model=chat_model,
+        )
+
+        assert chat_model.call_count == 1
+        refreshed = next(ch for ch in result.l2 if ch.chapter_number == 13)
+        assert refreshed.content == "改写" * 200
+        assert refreshed.summary_source_word_count == 400
+        untouched = [ch for ch in result.l2 + result.l3 if ch.chapter_number != 13]
+        assert all("content" in inspect(ch).unloaded for ch in untouched)
+
+    async def test_foreign_chapter_id_falls_back_to_last_chapter(self, db_session, test_user, make_chapters):
+        project, chapters = await make_chapters(5)
+        builder = AIContextBuilder(db_session)
+
+        result = await builder.get_tiered_chapter_context(
+            project_id=project.id,
+            current_chapter_id=999999,
+            chat_model=_FakeChatModel(),
+        )
+
+        assert result.l1.chapter_number == 5
+        assert [ch.chapter_number for ch in result.l2] == [2, 3, 4]
+        assert [ch.chapter_number for ch in result.l3] == [1]
+
+    async def test_concurrent_callers_generate_each_summary_once(self, db_session, db_engine, test_user, make_chapters):
+        """两个会话同时刷新同一窗口：相同 (章节, level, 正文指纹) 只调一次 LLM。"""
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        project, chapters = await make_chapters(4)
+        chat_model = _SlowChatModel()
+        factory = async_sessionmaker(db_engine, expire_on_commit=False)
+
+        async def _call():
+            async with factory() as session:
+                return await AIContextBuilder(session).get_tiered_chapter_context(
+                    project_id=project.id,
+                    current_chapter_id=chapters[3].id,
+                    chat_model=chat_model,
+                )
+
+        first, second = await asyncio.gather(_call(), _call())
+
+        assert chat_model.call_count == 3
+        assert [ch.summary_detailed for ch in first.l2] == [ch.summary_detailed for ch in second.l2]
+        assert chat_model.max_in_flight <= TIERED_SUMMARY_CONCURRENCY
+
+    async def test_summary_fan_out_is_bounded(self, db_session, test_user, make_chapters):
+        project, chapters = await make_chapters(10)
+        chat_model = _SlowChatModel()
+
+        await AIContextBuilder(db_session).get_tiered_chapter_context(
+            project_id=project.id,
+            current_chapter_id=chapters[9].id,
+            chat_model=chat_model,
+        )
+
+        assert chat_model.call_count == 9
+        assert chat_model.max_in_flight == TIERED_SUMMARY_CONCURRENCY
+
+    async def test_render_segment_includes_l1_full_l2_l3(self, db_session, test_user, make_chapters):
         """render_tiered_chapter_segment 默认形态：L1 全文 + L2 详细 + L3 简要。"""
-        project, chapters = await _make_chapters(db_session, test_user.id, 15)
+        project, chapters = await make_chapters(15)
         builder = AIContextBuilder(db_session)
         chat_model = _FakeChatModel()
         tiered = await builder.get_tiered_chapter_context(
@@ -229,9 +394,9 @@ class TestGetTieredChapterContext:
         # 当前章节正文出现在段中
         assert chapters[14].content in text
 
-    async def test_render_segment_l1_tail_truncation(self, db_session, test_user):
+    async def test_render_segment_l1_tail_truncation(self, db_session, test_user, make_chapters):
         """l1_tail_chars 模式：L1 取末尾 N 字 + 占位符。"""
-        project, chapters = await _make_chapters(db_session, test_user.id, 4)
+        project, chapters = await make_chapters(4)
         # 把当前章塞成 5 万字
         chapters[3].content = "x" * 50000
         chapters[3].word_count = 50000
@@ -252,9 +417,9 @@ class TestGetTieredChapterContext:
         assert "x" * 10000 in text  # 末尾 10000 字 'x' 都在
         assert "x" * 11000 not in text  # 不会保留更多
 
-    async def test_render_segment_drops_l2_when_include_l2_false(self, db_session, test_user):
+    async def test_render_segment_drops_l2_when_include_l2_false(self, db_session, test_user, make_chapters):
         """include_l2=False（最严降级）：L2 段不出现，L3 仍出现。"""
-        project, chapters = await _make_chapters(db_session, test_user.id, 15)
+        project, chapters = await make_chapters(15)
         builder = AIContextBuilder(db_session)
         chat_model = _FakeChatModel()
         tiered = await builder.get_tiered_chapter_context(
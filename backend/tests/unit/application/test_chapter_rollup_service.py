@@ -0,0 +1,117 @@
+"""章节摘要树：对齐覆盖、增量重建、分层上下文注入。"""
+
+from sqlalchemy import select
+
+from app.application.ai_context_builder import AIContextBuilder
+from app.application.chapter_rollup_service import ChapterRollupService, covering_nodes
+from app.infrastructure.db.models.manuscript import ChapterRollup
+from app.schemas.legacy_ai import ChapterSummarySchema
+
+
+class _FakeChatModel:
+    def __init__(self):
+        self.call_count = 0
+        self.prompts: list[str] = []
+
+    def with_structured_output(self, schema, method=None):
+        outer = self
+
+        class _Structured:
+            async def ainvoke(self, messages):
+                outer.call_count += 1
+                outer.prompts.append(messages[-1].content)
+                return ChapterSummarySchema(summary=f"梗概-{outer.call_count}-内容用来填够字数")
+
+        return _Structured()
+
+
+def _model_factory(chat_model):
+    async def _get():
+        return chat_model
+
+    return _get
+
+
+class TestCoveringNodes:
+    def test_short_prefix_is_all_leaves(self):
+        assert covering_nodes(1) == ([], 1)
+        assert covering_nodes(10) == ([], 1)
+
+    def test_largest_aligned_nodes_first(self):
+        nodes, remainder_start = covering_nodes(1235)
+
+        assert nodes == [(3, 0), (2, 10), (2, 11), (1, 120), (1, 121), (1, 122)]
+        assert remainder_start == 1231
+
+
+class TestRefreshAncestors:
+    async def test_builds_closed_nodes_only(self, db_session, test_user, make_chapters):
+        project, chapters = await make_chapters(230, content_repeat=1, summaries=True)
+        chat_model = _FakeChatModel()
+
+        errors = await ChapterRollupService(db_session).refresh_ancestors(
+            project.id, [ch.chapter_number for ch in chapters], _model_factory(chat_model)
+        )
+
+        rows = (await db_session.execute(select(ChapterRollup).where(ChapterRollup.project_id == project.id))).scalars()
+        nodes = {(row.level, row.node_index) for row in rows}
+        assert errors == []
+        # 篇章 1–220 共 22 个 + 卷 1–100 / 101–200；第 221–230 章与第 201–300 卷仍在写
+        assert nodes == {(1, i) for i in range(22)} | {(2, 0), (2, 1)}
+        assert chat_model.call_count == 24
+
+    async def test_leaf_edit_rebuilds_only_ancestor_chain(self, db_session, test_user, make_chapters):
+        project, chapters = await make_chapters(230, content_repeat=1, summaries=True)
+        service = ChapterRollupService(db_session)
+        await service.refresh_ancestors(
+            project.id, [ch.chapter_number for ch in chapters], _model_factory(_FakeChatModel())
+        )
+
+        unchanged = _FakeChatModel()
+        await service.refresh_ancestors(project.id, [57], _model_factory(unchanged))
+        assert unchanged.call_count == 0
+
+        chapters[56].summary_brief = "第57章改写后的简要"
+        await db_session.commit()
+        chat_model = _FakeChatModel()
+        await service.refresh_ancestors(project.id, [57], _model_factory(chat_model))
+
+        # 篇章 51–60 + 卷 1–100，每层一次
+        assert chat_model.call_count == 2
+        assert "第57章改写后的简要" in chat_model.prompts[0]
+        assert "第51–60章：梗概-1" in chat_model.prompts[1]
+
+    async def test_model_is_not_requested_when_fresh(self, db_session, test_user, make_chapters):
+        project, _chapters = await make_chapters(5, content_repeat=1, summaries=True)
+
+        async def _no_model():
+            raise AssertionError("不应查询模型")
+
+        assert await ChapterRollupService(db_session).refresh_ancestors(project.id, [5], _no_model) == []
+
+
+class TestTieredContextOutline:
+    async def test_read_path_covers_history_before_window(self, db_session, test_user, count_queries, make_chapters):
+        project, chapters = await make_chapters(235, content_repeat=1, summaries=True)
+        await ChapterRollupService(db_session).refresh_ancestors(
+            project.id, [ch.chapter_number for ch in chapters], _model_factory(_FakeChatModel())
+        )
+        db_session.expunge_all()
+
+        with count_queries() as statements:
+            tiered = await AIContextBuilder(db_session).get_tiered_chapter_context(project.id, chapters[234].id)
+
+        assert len(statements) == 3
+        assert [ch.chapter_number for ch in tiered.l3] == [226, 227, 228, 229, 230, 231]
+        assert [(node.first_chapter_number, node.last_chapter_number) for node in tiered.rollups] == [
+            (1, 100),
+            (101, 200),
+            (201, 210),
+            (211, 220),
+        ]
+        assert [ch.chapter_number for ch in tiered.earlier] == [221, 222, 223, 224, 225]
+
+        text = AIContextBuilder.render_tiered_chapter_segment(tiered)
+        assert text.index("【更早剧情梗概】") < text.index("【小说前情简述】")
+        assert "- 第1–100章（卷）：" in text
+        assert "- 第225章《第225章》：第225章简要" in text
@@ -115,11 +115,19 @@ class TestChapterService:
         service = ChapterService(db_session)
         ch1 = await service.create_chapter(project.id, test_user.id, ChapterCreate(title="草稿1", status="draft"))
         ch2 = await service.create_chapter(project.id, test_user.id, ChapterCreate(title="草稿2", status="draft"))
-        with patch.object(KnowledgeGraphService, "submit_chapter_analysis", new_callable=AsyncMock) as mock_submit:
-            mock_submit.return_value = 42
+        with (
+            patch.object(KnowledgeGraphService, "submit_chapter_analysis", new_callable=AsyncMock) as mock_submit,
+            patch.object(
+                KnowledgeGraphService, "submit_batch_chapter_analysis", new_callable=AsyncMock
+            ) as mock_batch_submit,
+        ):
+            mock_batch_submit.return_value = [42, 43]
             result = await service.batch_publish(
                 project.id, test_user.id, BatchPublishRequest(project_id=project.id, chapter_ids=[ch1.id, ch2.id])
             )
             assert result["success"] is True
             assert result["success_count"] == 2
-            assert mock_submit.await_count == 2
+            # 一个合并分析任务覆盖全部已发布章节，不再逐章提交
+            mock_submit.assert_not_awaited()
+            mock_batch_submit.assert_awaited_once()
+            assert mock_batch_submit.await_args.args[1] == [ch1.id, ch2.id]
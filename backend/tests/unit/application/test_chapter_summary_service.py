@@ -0,0 +1,190 @@
+"""章节摘要后台预生成：防抖调度、刷新任务、chat 只读路径。"""
+
+import asyncio
+
+from sqlalchemy import select
+
+from app.application import chapter_service as chapter_service_module
+from app.application.ai_context_builder import AIContextBuilder
+from app.application.chapter_service import ChapterService
+from app.application.chapter_summary_service import ChapterSummaryScheduler, refresh_chapter_summaries
+from app.infrastructure.db.models.manuscript import ChapterRollup
+from app.infrastructure.task.runner import BackgroundTaskRunner
+from app.schemas.chapters import ChapterCreate, ChapterUpdate
+from app.schemas.legacy_ai import ChapterSummarySchema
+
+
+class _FakeChatModel:
+    def __init__(self):
+        self.call_count = 0
+
+    def with_structured_output(self, schema, method=None):
+        outer = self
+
+        class _Structured:
+            async def ainvoke(self, _messages):
+                outer.call_count += 1
+                return ChapterSummarySchema(summary=f"摘要-{outer.call_count}-内容用来填够字数")
+
+        return _Structured()
+
+
+class _RecordingJob:
+    def __init__(self, *, hold: asyncio.Event | None = None):
+        self.calls: list[tuple[int, int, int, bool]] = []
+        self.hold = hold
+
+    async def __call__(self, project_id, chapter_id, user_id, include_window):
+        self.calls.append((project_id, chapter_id, user_id, include_window))
+        if self.hold is not None:
+            await self.hold.wait()
+
+
+class TestChapterSummaryScheduler:
+    async def test_repeated_saves_within_window_run_once(self):
+        job = _RecordingJob()
+        scheduler = ChapterSummaryScheduler(BackgroundTaskRunner(), job=job, debounce_seconds=0.05)
+
+        scheduler.schedule(1, 7, 3, include_window=True)
+        await asyncio.sleep(0.02)
+        scheduler.schedule(1, 7, 3)
+        scheduler.schedule(1, 7, 3)
+        assert scheduler.pending(7)
+        await asyncio.sleep(0.15)
+
+        assert job.calls == [(1, 7, 3, True)]
+        assert not scheduler.pending(7)
+
+    async def test_schedule_during_generation_runs_another_round(self):
+        hold = asyncio.Event()
+        job = _RecordingJob(hold=hold)
+        scheduler = ChapterSummaryScheduler(BackgroundTaskRunner(), job=job, debounce_seconds=0)
+
+        scheduler.schedule(1, 8, 3)
+        await asyncio.sleep(0.01)
+        scheduler.schedule(1, 8, 3)  # 生成中又保存了一次
+        hold.set()
+        await asyncio.sleep(0.05)
+
+        assert len(job.calls) == 2
+
+    async def test_chapters_are_debounced_independently(self):
+        job = _RecordingJob()
+        scheduler = ChapterSummaryScheduler(BackgroundTaskRunner(), job=job, debounce_seconds=0)
+
+        scheduler.schedule(1, 1, 3)
+        scheduler.schedule(1, 2, 3)
+        await asyncio.sleep(0.05)
+
+        assert sorted(call[1] for call in job.calls) == [1, 2]
+
+
+class TestRefreshChapterSummaries:
+    async def test_new_chapter_fills_previous_window(self, db_session, test_user, make_chapters):
+        project, chapters = await make_chapters(6, content_repeat=20)
+        chat_model = _FakeChatModel()
+
+        await refresh_chapter_summaries(
+            project.id, chapters[5].id, test_user.id, True, chat_model=chat_model, _db_session=db_session
+        )
+
+        # 本章两级 + L2（3/4/5 章详细）+ L3（1/2 章简要）
+        assert chat_model.call_count == 2 + 3 + 2
+        assert all(ch.summary_detailed for ch in chapters[2:6])
+        assert all(ch.summary_brief for ch in chapters[:2])
+
+    async def test_new_chapter_closes_previous_arc(self, db_session, test_user, make_chapters):
+        project, chapters = await make_chapters(11, content_repeat=20)
+        for ch in chapters[:10]:
+            ch.summary_detailed = f"{ch.title}详细"
+            ch.summary_brief = f"{ch.title}简要"
+            ch.summary_source_word_count = 100
+        await db_session.commit()
+        chat_model = _FakeChatModel()
+
+        await refresh_chapter_summaries(
+            project.id, chapters[10].id, test_user.id, True, chat_model=chat_model, _db_session=db_session
+        )
+
+        rollup = (
+            await db_session.execute(select(ChapterRollup).where(ChapterRollup.project_id == project.id))
+        ).scalar_one()
+        # 第 11 章两级摘要 + 刚闭合的第 1–10 章篇章梗概
+        assert chat_model.call_count == 3
+        assert (rollup.first_chapter_number, rollup.last_chapter_number) == (1, 10)
+
+    async def test_fresh_summaries_skip_model_lookup(self, db_session, test_user, make_chapters):
+        project, chapters = await make_chapters(1, content_repeat=20)
+        chapters[0].summary_detailed = "详"
+        chapters[0].summary_brief = "简"
+        chapters[0].summary_source_word_count = 100
+        await db_session.commit()
+        chat_model = _FakeChatModel()
+
+        await refresh_chapter_summaries(
+            project.id, chapters[0].id, test_user.id, False, chat_model=chat_model, _db_session=db_session
+        )
+
+        assert chat_model.call_count == 0
+
+    async def test_without_chat_model_config_is_noop(self, db_session, test_user, make_chapters):
+        project, chapters = await make_chapters(1, content_repeat=20)
+
+        await refresh_chapter_summaries(project.id, chapters[0].id, test_user.id, False, _db_session=db_session)
+
+        assert chapters[0].summary_detailed is None
+
+
+class TestChatPathReadOnly:
+    async def test_stale_summaries_reported_as_pending_without_llm(self, db_session, test_user, make_chapters):
+        project, chapters = await make_chapters(4, content_repeat=20)
+        chapters[0].summary_detailed = "旧摘要"
+        chapters[0].summary_source_word_count = 100
+        await db_session.commit()
+
+        tiered = await AIContextBuilder(db_session).get_tiered_chapter_context(project.id, chapters[3].id)
+
+        assert [ch.chapter_number for ch in tiered.l2] == [1, 2, 3]
+        assert tiered.pending_chapter_ids == [chapters[1].id, chapters[2].id]
+        text = AIContextBuilder.render_tiered_chapter_segment(tiered)
+        assert "旧摘要" in text
+        assert "（摘要后台生成中，本章已跳过）" in text
+
+
+class TestChapterServiceSchedulesRefresh:
+    async def test_content_writes_schedule_refresh(self, db_session, test_user, monkeypatch):
+        from app.application.project_service import ProjectService
+        from app.schemas.projects import ProjectCreate
+
+        monkeypatch.setenv("AI_SUMMARY_PREFETCH_ENABLED", "true")
+        calls: list[tuple] = []
+
+        class _Scheduler:
+            def schedule(self, project_id, chapter_id, user_id, *, include_window=False):
+                calls.append((chapter_id, include_window))
+
+        monkeypatch.setattr(chapter_service_module, "chapter_summary_scheduler", _Scheduler())
+        project = await ProjectService(db_session).create(ProjectCreate(name="调度项目"), test_user.id)
+        service = ChapterService(db_session)
+
+        chapter = await service.create_chapter(project.id, test_user.id, ChapterCreate(title="一", content="正文"))
+        await service.update_chapter(chapter.id, test_user.id, ChapterUpdate(title="改标题"))
+        await service.update_chapter(chapter.id, test_user.id, ChapterUpdate(content="新正文"))
+
+        assert calls == [(chapter.id, True), (chapter.id, False)]
+
+    async def test_disabled_prefetch_does_not_schedule(self, db_session, test_user, monkeypatch):
+        from app.application.project_service import ProjectService
+        from app.schemas.projects import ProjectCreate
+
+        calls: list = []
+
+        class _Scheduler:
+            def schedule(self, *args, **kwargs):
+                calls.append(args)
+
+        monkeypatch.setattr(chapter_service_module, "chapter_summary_scheduler", _Scheduler())
+        project = await ProjectService(db_session).create(ProjectCreate(name="关闭项目"), test_user.id)
+        await ChapterService(db_session).create_chapter(project.id, test_user.id, ChapterCreate(title="一"))
+
+        assert calls == []
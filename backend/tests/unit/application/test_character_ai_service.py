@@ -23,6 +23,8 @@ from app.schemas.projects import ProjectCreate
 
 
 class _FakeProvider:
+    provider_type = "fake"
+
     def __init__(self, chat_model):
         self.chat_model = chat_model
 
@@ -0,0 +1,188 @@
+"""项目上下文快照缓存 + 修订号失效测试。"""
+
+from sqlalchemy import select
+
+from app.application.ai_context_builder import AIContextBuilder
+from app.application.chapter_service import ChapterService
+from app.application.context_cache import ProjectContextCache, bump_project_revision
+from app.application.knowledge_graph_service import KnowledgeGraphService
+from app.application.project_service import ProjectService
+from app.application.worldbuilding_service import WorldbuildingService
+from app.infrastructure.db.models.projects import Project
+from app.infrastructure.db.models.story_knowledge import EntityRelationship
+from app.infrastructure.graph.tools.entity_write_tools import _create_entity, _update_entity
+from app.schemas.chapters import ChapterCreate, ChapterUpdate
+from app.schemas.knowledge import EntityChangeProposalCreate, ProposalAcceptRequest
+from app.schemas.projects import ProjectCreate, ProjectUpdate
+
+
+async def _revision(db_session, project_id: int) -> int:
+    result = await db_session.execute(select(Project.context_revision).where(Project.id == project_id))
+    return result.scalar_one()
+
+
+async def _seed(db_session, user_id: int, name: str = "缓存项目"):
+    project = await ProjectService(db_session).create(ProjectCreate(name=name, description="简介"), user_id)
+    await WorldbuildingService(db_session).create_entity(
+        project.id, "character", {"name": "阿宁", "description": "潜入专家"}
+    )
+    return project
+
+
+class TestProjectContextCache:
+    async def test_second_call_hits_cache_with_single_query(self, db_session, test_user, count_queries):
+        project = await _seed(db_session, test_user.id)
+        builder = AIContextBuilder(db_session, cache=ProjectContextCache())
+
+        first = await builder.get_chat_context_text(project.id)
+        with count_queries() as statements:
+            second = await builder.get_chat_context_text(project.id)
+
+        assert second == first
+        assert "阿宁" in second
+        assert len(statements) == 1
+        assert builder.cache.hits == 1
+
+    async def test_cache_miss_loads_context_in_four_round_trips(self, db_session, test_user, count_queries):
+        """修订号+项目、实体四桶 UNION、关系、状态事件 —— 与实体数量无关。"""
+        project = await _seed(db_session, test_user.id)
+        service = WorldbuildingService(db_session)
+        for i in range(3):
+            await service.create_entity(project.id, "location", {"name": f"地点{i}"})
+        await service.create_entity(project.id, "organization", {"name": "灰烬公会"})
+        builder = AIContextBuilder(db_session, cache=ProjectContextCache())
+
+        with count_queries() as statements:
+            ctx = await builder.get_project_context(project.id, mode="chat")
+
+        assert len(statements) == 4
+        assert [c["name"] for c in ctx["characters"]] == ["阿宁"]
+        assert [loc["name"] for loc in ctx["locations"]] == ["地点0", "地点1", "地点2"]
+        assert ctx["organizations"][0]["name"] == "灰烬公会"
+
+    async def test_entity_buckets_respect_limits_but_names_cover_all(self, db_session, test_user):
+        project = await _seed(db_session, test_user.id)
+        service = WorldbuildingService(db_session)
+        worldviews = [
+            await service.create_entity(project.id, "worldview", {"name": f"法则{i}", "rules": "律" * 400})
+            for i in range(12)
+        ]
+        character = await service.get_entity_by_name(project.id, "character", "阿宁")
+        db_session.add(
+            EntityRelationship(
+                project_id=project.id,
+                source_type="character",
+                source_id=character.id,
+                relation_type="信奉",
+                target_type="worldview",
+                target_id=worldviews[-1].id,
+            )
+        )
+        await db_session.commit()
+        builder = AIContextBuilder(db_session, cache=ProjectContextCache())
+
+        ctx = await builder.get_project_context(project.id, mode="chat")
+
+        assert len(ctx["worldviews"]) == 10
+        assert ctx["worldviews"][0]["rules"] == "律" * 300 + "…"
+        assert ctx["relationships"][0]["target_name"] == "法则11"
+
+    async def test_returned_context_is_a_copy(self, db_session, test_user):
+        project = await _seed(db_session, test_user.id)
+        builder = AIContextBuilder(db_session, cache=ProjectContextCache())
+
+        ctx = await builder.get_project_context(project.id, mode="chat")
+        ctx["characters"].clear()
+
+        again = await builder.get_project_context(project.id, mode="chat")
+        assert again["characters"][0]["name"] == "阿宁"
+
+    async def test_worldbuilding_write_invalidates_snapshot(self, db_session, test_user):
+        project = await _seed(db_session, test_user.id)
+        builder = AIContextBuilder(db_session, cache=ProjectContextCache())
+        assert "灰烬公会" not in await builder.get_chat_context_text(project.id)
+
+        before = await _revision(db_session, project.id)
+        await WorldbuildingService(db_session).create_entity(project.id, "organization", {"name": "灰烬公会"})
+
+        assert await _revision(db_session, project.id) == before + 1
+        assert "灰烬公会" in await builder.get_chat_context_text(project.id)
+
+    async def test_entity_write_tools_bump_revision(self, db_session, test_user):
+        project = await _seed(db_session, test_user.id)
+        builder = AIContextBuilder(db_session, cache=ProjectContextCache())
+        await builder.get_chat_context_text(project.id)
+
+        await _create_entity(db_session, project.id, "location", {"name": "旧城"})
+        await _update_entity(db_session, project.id, "character", "阿宁", {"description": "叛逃者"})
+
+        text = await builder.get_chat_context_text(project.id)
+        assert "旧城" in text
+        assert "叛逃者" in text
+
+    async def test_accept_proposal_invalidates_snapshot(self, db_session, test_user):
+        project = await _seed(db_session, test_user.id)
+        character = await WorldbuildingService(db_session).get_entity_by_name(project.id, "character", "阿宁")
+        builder = AIContextBuilder(db_session, cache=ProjectContextCache())
+        assert "[State Timeline]" not in await builder.get_chat_context_text(project.id)
+
+        service = KnowledgeGraphService(db_session)
+        proposal = await service.create_proposal(
+            project.id,
+            test_user.id,
+            EntityChangeProposalCreate(
+                title="阿宁受伤",
+                operations=[
+                    {
+                        "operation_type": "entity_state_event",
+                        "entity_type": "character",
+                        "entity_id": character.id,
+                        "state_key": "condition",
+                        "new_value": "重伤",
+                    }
+                ],
+            ),
+        )
+        await service.accept_proposal(proposal.id, test_user.id, ProposalAcceptRequest())
+
+        text = await builder.get_chat_context_text(project.id)
+        assert "[State Timeline]" in text
+        assert "重伤" in text
+
+    async def test_chapter_and_project_writes_bump_revision(self, db_session, test_user):
+        project = await _seed(db_session, test_user.id)
+        service = ChapterService(db_session)
+        start = await _revision(db_session, project.id)
+
+        chapter = await service.create_chapter(project.id, test_user.id, ChapterCreate(title="第一章", content="正文"))
+        await service.update_chapter(chapter.id, test_user.id, ChapterUpdate(content="新正文"))
+        await ProjectService(db_session).update_project(project.id, test_user.id, ProjectUpdate(description="新简介"))
+
+        assert await _revision(db_session, project.id) == start + 3
+
+    async def test_missing_project_returns_empty(self, db_session):
+        builder = AIContextBuilder(db_session, cache=ProjectContextCache())
+        assert await builder.get_project_context(999999, mode="chat") == {}
+
+    async def test_bump_ignores_none_project(self, db_session):
+        await bump_project_revision(db_session, None)
+
+
+class TestProjectContextCacheLRU:
+    def test_evicts_least_recently_used(self):
+        cache = ProjectContextCache(max_entries=2)
+        cache.put(1, "chat", 0, {"a": 1})
+        cache.put(2, "chat", 0, {"b": 2})
+        assert cache.get(1, "chat", 0) is not None
+        cache.put(3, "chat", 0, {"c": 3})
+
+        assert cache.get(2, "chat", 0) is None
+        assert cache.get(1, "chat", 0) is not None
+        assert len(cache) == 2
+
+    def test_stale_revision_misses(self):
+        cache = ProjectContextCache()
+        cache.put(1, "chat", 3, {})
+        assert cache.get(1, "chat", 4) is None
+        cache.invalidate(1)
+        assert len(cache) == 0
@@ -0,0 +1,42 @@
+"""ContextPacker 装箱顺序与预算。"""
+
+from app.application.context_packer import ContextPacker, estimate_tokens
+
+
+def test_estimate_tokens_by_script():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("汉字" * 8) == 10
+    assert estimate_tokens("abcd" * 10) == 10
+
+
+def test_every_item_named_before_any_is_detailed():
+    packer = ContextPacker(max_tokens=40)
+    section = packer.section("【角色】")
+    for idx in range(3):
+        packer.add(section, [f"- 角色{idx}", f"- 角色{idx}：" + "详" * 60])
+
+    text = packer.pack()
+
+    assert text.splitlines() == ["【角色】", "- 角色0", "- 角色1", "- 角色2"]
+
+
+def test_priority_decides_packing_but_not_output_order():
+    packer = ContextPacker(max_tokens=1000, max_chars=16)
+    late = packer.section("【地点】", priority=2)
+    early = packer.section("【角色】", priority=1)
+    packer.add(late, ["- 旧城"])
+    packer.add(early, ["- 主角", "- 主角：少年剑客"])
+
+    assert packer.pack() == "【角色】\n- 主角：少年剑客"
+
+    packer.max_chars = 40
+    assert packer.pack() == "【地点】\n- 旧城\n\n【角色】\n- 主角：少年剑客"
+
+
+def test_required_fragments_ignore_budget_and_empty_sections_are_dropped():
+    packer = ContextPacker(max_tokens=1)
+    packer.add(packer.section(), ["项目：长夜"], required=True)
+    packer.section("【角色基础列表】", required=True)
+    packer.section("【组织】")
+
+    assert packer.pack() == "项目：长夜\n\n【角色基础列表】"
@@ -1,5 +1,6 @@
 """KnowledgeGraphService proposal lifecycle tests."""
 
+import asyncio
 import json
 
 import pytest
@@ -1883,3 +1884,355 @@ class TestKnowledgeGraphService:
         assert conflicted.status == "conflicted"
         assert conflicted.operations[0].status == "conflicted"
         assert "要删除的关系不存在" in conflicted.operations[0].conflict_reason
+
+    async def _seed_story_chapters(self, db_session, project_id: int, count: int) -> list[Chapter]:
+        chapters = [
+            Chapter(
+                project_id=project_id,
+                title=f"Chapter {number}",
+                chapter_number=number,
+                order_index=number,
+                content=f"Events of chapter {number}.",
+                word_count=4,
+            )
+            for number in range(1, count + 1)
+        ]
+        db_session.add_all(chapters)
+        await db_session.commit()
+        return chapters
+
+    async def test_analyze_chapters_loads_snapshot_once_and_carries_pending_changes(self, db_session, test_user):
+        project, _character, _organization = await self._seed_entities(db_session, test_user.id)
+        chapters = await self._seed_story_chapters(db_session, project.id, 3)
+        jade_order = ChapterKnowledgeAnalysisDraft(
+            proposals=[
+                KnowledgeProposalDraft(
+                    title="Lin Zhao joins the Jade Order",
+                    operations=[
+                        KnowledgeOperationDraft(
+                            operation_type="entity_create",
+                            entity_type="organization",
+                            entity_name="Jade Order",
+                            payload={"name": "Jade Order", "description": "monks of the pass"},
+                        ),
+                        KnowledgeOperationDraft(
+                            operation_type="entity_state_event",
+                            entity_type="character",
+                            entity_name="Lin Zhao",
+                            state_key="condition",
+                            new_value="recovering",
+                        ),
+                    ],
+                )
+            ]
+        )
+
+        class ScriptedModel:
+            def __init__(self):
+                self.prompts: list[str] = []
+
+            async def ainvoke(self, messages):
+                prompt = messages[1].content
+                self.prompts.append(prompt)
+                if "《Chapter 3》" in prompt:
+                    raise ValueError("unparseable")
+                return jade_order if "《Chapter 1》" in prompt else ChapterKnowledgeAnalysisDraft(proposals=[])
+
+        model = ScriptedModel()
+        service = KnowledgeGraphService(db_session)
+        loads = 0
+        load_entities = service._load_analysis_entities
+
+        async def counting_load(project_id):
+            nonlocal loads
+            loads += 1
+            return await load_entities(project_id)
+
+        async def fake_get_config_and_model(_config_id: int, _user_id: int):
+            return None, FakeChatModel(model)
+
+        service._load_analysis_entities = counting_load
+        service._get_config_and_model = fake_get_config_and_model
+
+        results = [
+            item
+            async for item in service.analyze_chapters(
+                project.id,
+                [chapter.id for chapter in reversed(chapters)],
+                test_user.id,
+                model_config_id=123,
+                concurrency=1,
+            )
+        ]
+
+        assert [chapter_id for chapter_id, _outcome in results] == [chapter.id for chapter in chapters]
+        assert loads == 1
+        first, second, third = (outcome for _chapter_id, outcome in results)
+        assert first.proposal_count == 1
+        assert second.proposal_count == 0
+        assert isinstance(third, ValidationError)
+        # 第二章的提示基于第一章落库后的快照：待审核的新组织与状态变化都已带上
+        assert "pending=true" not in model.prompts[0]
+        assert '"name": "Jade Order"' in model.prompts[1]
+        assert '"new_value": "recovering"' in model.prompts[1]
+        assert "pending=true" in model.prompts[1]
+
+    async def test_analyze_chapters_pipelines_calls_but_applies_in_order(self, db_session, test_user):
+        project, _character, _organization = await self._seed_entities(db_session, test_user.id)
+        chapters = await self._seed_story_chapters(db_session, project.id, 4)
+
+        class SlowModel:
+            def __init__(self):
+                self.in_flight = 0
+                self.max_in_flight = 0
+
+            async def ainvoke(self, messages):
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                # 第一章最慢：后面的章节先拿到结果，但必须等第一章落库
+                await asyncio.sleep(0.05 if "《Chapter 1》" in messages[1].content else 0.01)
+                self.in_flight -= 1
+                return ChapterKnowledgeAnalysisDraft(proposals=[])
+
+        model = SlowModel()
+        service = KnowledgeGraphService(db_session)
+
+        async def fake_get_config_and_model(_config_id: int, _user_id: int):
+            return None, FakeChatModel(model)
+
+        service._get_config_and_model = fake_get_config_and_model
+
+        results = [
+            chapter_id
+            async for chapter_id, _outcome in service.analyze_chapters(
+                project.id, [chapter.id for chapter in chapters], test_user.id, model_config_id=123, concurrency=2
+            )
+        ]
+
+        assert results == [chapter.id for chapter in chapters]
+        assert model.max_in_flight == 2
+
+    async def test_analyze_chapters_shares_call_budget_with_chunks(self, db_session, test_user, monkeypatch):
+        project, _character, _organization = await self._seed_entities(db_session, test_user.id)
+        chapters = await self._seed_story_chapters(db_session, project.id, 3)
+        for chapter in chapters:
+            chapter.content = "\n\n".join(f"{chapter.title} paragraph {n} about the harbor." for n in range(4))
+        await db_session.commit()
+        monkeypatch.setenv("AI_KNOWLEDGE_ANALYSIS_CHUNK_CHARS", "40")
+
+        class SlowModel:
+            def __init__(self):
+                self.calls = 0
+                self.in_flight = 0
+                self.max_in_flight = 0
+
+            async def ainvoke(self, messages):
+                self.calls += 1
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                await asyncio.sleep(0.01)
+                self.in_flight -= 1
+                return ChapterKnowledgeAnalysisDraft(proposals=[])
+
+        model = SlowModel()
+        service = KnowledgeGraphService(db_session)
+
+        async def fake_get_config_and_model(_config_id: int, _user_id: int):
+            return None, FakeChatModel(model)
+
+        service._get_config_and_model = fake_get_config_and_model
+
+        async for _chapter_id, outcome in service.analyze_chapters(
+            project.id, [chapter.id for chapter in chapters], test_user.id, model_config_id=123, concurrency=2
+        ):
+            assert not isinstance(outcome, Exception)
+
+        # 每章分为多段，但各章节的分段调用共用批量的名额
+        assert model.calls > len(chapters)
+        assert model.max_in_flight == 2
+
+    async def test_single_and_batch_analysis_dedupe_chapters_across_jobs(self, db_session, test_user, monkeypatch):
+        project, _character, _organization = await self._seed_entities(db_session, test_user.id)
+        first, second, third = await self._seed_story_chapters(db_session, project.id, 3)
+        await self._seed_model_config(db_session, test_user.id)
+
+        import app.application.knowledge_graph_service as kg_module
+
+        # 只入队不执行：任务保持 queued
+        monkeypatch.setattr(kg_module.background_runner, "_execute_jobs", False)
+        service = KnowledgeGraphService(db_session)
+
+        assert len(await service.submit_batch_chapter_analysis(project.id, [first.id, second.id], test_user.id)) == 2
+        # 已在批量任务中的章节不再单独入队，重叠的批量任务只带新章节
+        assert await service.submit_chapter_analysis(project.id, second.id, test_user.id) is None
+        overlapping = await service.submit_batch_chapter_analysis(project.id, [second.id, third.id], test_user.id)
+        assert len(overlapping) == 1
+        assert await service.submit_chapter_analysis(project.id, third.id, test_user.id) is None
+        assert await service.submit_batch_chapter_analysis(project.id, [first.id, third.id], test_user.id) == []
+
+    async def test_batch_analysis_job_updates_runs_per_chapter(self, db_session, test_user, monkeypatch):
+        project, _character, _organization = await self._seed_entities(db_session, test_user.id)
+        chapters = await self._seed_story_chapters(db_session, project.id, 3)
+        await self._seed_model_config(db_session, test_user.id)
+
+        import app.application.knowledge_graph_service as kg_module
+
+        enqueued = []
+
+        async def fake_enqueue(db, kind, payload, **kwargs):
+            enqueued.append((kind, payload, kwargs))
+
+        monkeypatch.setattr(kg_module.background_runner, "enqueue", fake_enqueue)
+        service = KnowledgeGraphService(db_session)
+        run_ids = await service.submit_batch_chapter_analysis(
+            project.id, [chapter.id for chapter in chapters], test_user.id
+        )
+        await db_session.commit()
+
+        assert len(run_ids) == 3
+        [(kind, payload, kwargs)] = enqueued
+        assert kind == kg_module.CHAPTER_BATCH_ANALYSIS_JOB
+        assert [item["chapter_id"] for item in payload["runs"]] == [chapter.id for chapter in chapters]
+        assert kwargs["work_class"].value == "batch"
+
+        async def fake_analyze_chapters(self, project_id, chapter_ids, user_id, **kwargs):
+            for chapter_id in chapter_ids:
+                if chapter_id == chapters[1].id:
+                    yield chapter_id, ValidationError("模型输出无法解析")
+                else:
+                    yield chapter_id, ChapterKnowledgeAnalysisResponse(
+                        success=True, project_id=project_id, chapter_id=chapter_id, proposal_count=0, message="ok"
+                    )
+
+        monkeypatch.setattr(KnowledgeGraphService, "analyze_chapters", fake_analyze_chapters)
+        with pytest.raises(RuntimeError):
+            await kg_module._run_batch_chapter_analysis_background(payload, _db_session=db_session)
+
+        statuses = []
+        for run_id in run_ids:
+            run = await db_session.get(AIRun, run_id)
+            await db_session.refresh(run)
+            statuses.append(run.status)
+        assert statuses == [RunStatus.SUCCEEDED.value, RunStatus.FAILED.value, RunStatus.SUCCEEDED.value]
+
+    async def test_analyze_chapter_splits_long_chapter_and_merges_chunk_drafts(
+        self, db_session, test_user, monkeypatch
+    ):
+        project, character, _organization = await self._seed_entities(db_session, test_user.id)
+        paragraphs = [
+            "Lin Zhao walked the harbor at dawn, counting the ships.",
+            "Ash Guild clerks argued over the tariff ledgers all morning.",
+            "Lin Zhao met the Jade Order envoy beneath the lighthouse.",
+        ]
+        chapter = Chapter(
+            project_id=project.id,
+            title="Long Harbor",
+            chapter_number=8,
+            content="\n\n".join(paragraphs),
+            word_count=30,
+        )
+        db_session.add(chapter)
+        await db_session.commit()
+        monkeypatch.setenv("AI_KNOWLEDGE_ANALYSIS_CHUNK_CHARS", "70")
+        monkeypatch.setenv("AI_KNOWLEDGE_ANALYSIS_CONCURRENCY", "3")
+
+        def create_jade_order(description: str) -> KnowledgeProposalDraft:
+            return KnowledgeProposalDraft(
+                title="Jade Order appears",
+                evidence=description,
+                operations=[
+                    KnowledgeOperationDraft(
+                        operation_type="entity_create",
+                        entity_type="organization",
+                        entity_name="Jade Order",
+                        payload={"name": "Jade Order", "description": description},
+                    )
+                ],
+            )
+
+        def alignment(value: str) -> KnowledgeProposalDraft:
+            return KnowledgeProposalDraft(
+                title="Lin Zhao alignment",
+                operations=[
+                    KnowledgeOperationDraft(
+                        operation_type="entity_field_update",
+                        entity_type="character",
+                        entity_name="Lin Zhao",
+                        field_name="alignment",
+                        new_value=value,
+                    )
+                ],
+            )
+
+        drafts = {
+            1: [alignment("restless"), create_jade_order("rumoured monks")],
+            2: [],
+            3: [
+                alignment("wavering"),
+                create_jade_order("monks of the pass"),
+                KnowledgeProposalDraft(
+                    title="Lin Zhao allies with the Jade Order",
+                    operations=[
+                        KnowledgeOperationDraft(
+                            operation_type="entity_create",
+                            entity_type="organization",
+                            entity_name="Jade Order",
+                            payload={"name": "Jade Order"},
+                        ),
+                        KnowledgeOperationDraft(
+                            operation_type="relationship_upsert",
+                            entity_type="character",
+                            entity_name="Lin Zhao",
+                            relation_type="ally_of",
+                            target_type="organization",
+                            target_name="Jade Order",
+                        ),
+                    ],
+                ),
+            ],
+        }
+
+        class ChunkModel:
+            def __init__(self):
+                self.prompts: list[str] = []
+                self.in_flight = 0
+                self.max_in_flight = 0
+
+            async def ainvoke(self, messages):
+                prompt = messages[1].content
+                self.prompts.append(prompt)
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                part = int(prompt.split("（第 ", 1)[1].split("/", 1)[0])
+                # 第一段最慢：合并顺序必须按段落而不是按完成顺序
+                await asyncio.sleep(0.03 if part == 1 else 0.01)
+                self.in_flight -= 1
+                return ChapterKnowledgeAnalysisDraft(proposals=drafts[part])
+
+        model = ChunkModel()
+        service = KnowledgeGraphService(db_session)
+
+        async def fake_get_config_and_model(_config_id: int, _user_id: int):
+            return None, FakeChatModel(model)
+
+        service._get_config_and_model = fake_get_config_and_model
+
+        response = await service.analyze_chapter(project.id, chapter.id, test_user.id, model_config_id=123)
+
+        assert len(model.prompts) == 3
+        assert model.max_in_flight == 3
+        second = next(prompt for prompt in model.prompts if "（第 2/3 段" in prompt)
+        # 精简快照：第二段只提到 Ash Guild，Lin Zhao 只出现在全部实体名里
+        assert "tariff ledgers" in second and "counting the ships" not in second
+        assert '"name": "Ash Guild"' in second
+        assert '"name": "Lin Zhao"' not in second
+        assert "known_entity_names" in second
+
+        assert response.proposal_count == 2
+        field_proposal, jade_proposal = response.proposals
+        [field_op] = field_proposal.operations
+        assert field_op.entity_id == character.id
+        assert field_op.new_value == "wavering"
+        assert [op.operation_type for op in jade_proposal.operations] == ["entity_create", "relationship_upsert"]
+        assert jade_proposal.operations[0].payload["description"] == "rumoured monks"
+        assert jade_proposal.evidence == "rumoured monks\nmonks of the pass"
@@ -12,6 +12,7 @@ from app.application.project_service import ProjectService
 from app.application.prompt_template_service import PromptTemplateService
 from app.core.exceptions import NotFoundError
 from app.infrastructure.db.models.worldbuilding import Character
+from app.infrastructure.graph.instrumentation import RunMetricsHandler
 from app.infrastructure.graph.registry import graph_registry
 from app.schemas.projects import ProjectCreate
 from app.schemas.prompts import PromptTemplateCreate
@@ -92,8 +93,10 @@ class TestLegacyAIService:
 
         assert result["success"] is True
         assert result["response"] == "默认回复"
-        assert builder_calls == [{"model": model}]
+        assert builder_calls == [{"model": None, "checkpointer": None}]
         input_state, kwargs = graph.ainvoke_calls[0]
+        assert kwargs["config"]["configurable"]["model"] is model
+        assert any(isinstance(callback, RunMetricsHandler) for callback in kwargs["config"]["callbacks"])
         assert input_state["messages"][-1].content == "继续写"
         assert kwargs["context"].project_id == project.id
         assert kwargs["context"].session_factory == "session_factory"
@@ -0,0 +1,280 @@
+"""持久化后台任务：立即执行、退避重试、租约过期回收、优先级与幂等键、按类别与用户公平领取。"""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import AISettings
+from app.domain.ai_runtime.enums import JobStatus, WorkClass
+from app.infrastructure.db.models.ai_runtime import BackgroundJob
+from app.infrastructure.task import jobs
+from app.infrastructure.task.jobs import new_job, register_job_handler, retry_delay
+from app.infrastructure.task.runner import BackgroundTaskRunner
+from app.infrastructure.task.scheduler import current_work
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'jobs.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(BackgroundJob.__table__.create)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def make_runner(session_factory):
+    runners = []
+
+    def factory(**overrides):
+        settings = AISettings(
+            task_poll_seconds=0.02,
+            task_lease_seconds=30,
+            task_retry_base_seconds=0,
+            **overrides,
+        )
+        runner = BackgroundTaskRunner(session_factory=session_factory, settings=settings, worker_id=f"w{len(runners)}")
+        runners.append(runner)
+        return runner
+
+    yield factory
+    for runner in runners:
+        await runner.stop()
+
+
+@pytest.fixture
+def handlers(monkeypatch):
+    monkeypatch.setattr(jobs, "_handlers", {})
+    calls: list[dict] = []
+    exhausted: list[tuple[dict, str]] = []
+
+    async def on_exhausted(payload, error):
+        exhausted.append((payload, error))
+
+    @register_job_handler("ok")
+    async def ok(payload):
+        calls.append(payload)
+
+    @register_job_handler("flaky", on_exhausted=on_exhausted)
+    async def flaky(payload):
+        calls.append(payload)
+        if len(calls) < payload["succeed_on"]:
+            raise RuntimeError(f"boom {len(calls)}")
+
+    return calls, exhausted
+
+
+async def _wait_for_status(session_factory, job_id, status, timeout=3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        async with session_factory() as db:
+            job = await db.get(BackgroundJob, job_id)
+        if job.status == status.value or asyncio.get_running_loop().time() > deadline:
+            return job
+        await asyncio.sleep(0.02)
+
+
+async def test_enqueue_runs_after_commit_and_records_success(session_factory, make_runner, handlers):
+    calls, _ = handlers
+    runner = make_runner()
+
+    async with session_factory() as db:
+        job = await runner.enqueue(db, "ok", {"n": 1}, key=7)
+        assert runner.get_status(7)["job_id"] == job.id
+        await db.commit()
+
+    done = await _wait_for_status(session_factory, job.id, JobStatus.SUCCEEDED)
+    assert done.status == JobStatus.SUCCEEDED.value
+    assert done.attempts == 1
+    assert calls == [{"n": 1}]
+
+
+async def test_poll_loop_hands_job_to_waiting_enqueue_claim(session_factory, make_runner, handlers):
+    calls, _ = handlers
+    runner = make_runner()
+    await runner.start()
+    try:
+        async with session_factory() as db:
+            job = await runner.enqueue(db, "ok", {"n": 3}, key=77)
+            # 快速路径首次领取落空后才提交：轮询循环先于其退避重试领到任务
+            await asyncio.sleep(0.12)
+            await db.commit()
+
+        done = await _wait_for_status(session_factory, job.id, JobStatus.SUCCEEDED)
+    finally:
+        await runner.stop()
+
+    assert done.status == JobStatus.SUCCEEDED.value
+    assert done.attempts == 1
+    assert calls == [{"n": 3}]
+
+
+async def test_failures_retry_with_backoff_until_exhausted(session_factory, make_runner, handlers):
+    calls, exhausted = handlers
+    runner = make_runner(task_max_attempts=2)
+    await runner.start()
+    try:
+        async with session_factory() as db:
+            job = await runner.enqueue(db, "flaky", {"succeed_on": 5}, key="flaky-1", idempotency_key="flaky")
+            await db.commit()
+
+        failed = await _wait_for_status(session_factory, job.id, JobStatus.FAILED)
+    finally:
+        await runner.stop()
+
+    assert failed.status == JobStatus.FAILED.value
+    assert failed.attempts == 2
+    assert failed.last_error == "RuntimeError: boom 2"
+    assert failed.idempotency_key is None
+    assert len(calls) == 2
+    assert exhausted == [({"succeed_on": 5}, "RuntimeError: boom 2")]
+    assert [retry_delay(n, base=10, cap=30) for n in (1, 2, 3)] == [10, 20, 30]
+
+
+async def test_expired_lease_is_reclaimed_on_start(session_factory, make_runner, handlers):
+    calls, _ = handlers
+    async with session_factory() as db:
+        orphan = new_job("ok", {"n": 2}, task_key="orphan", priority=0, max_attempts=3, timeout=30)
+        orphan.status = JobStatus.RUNNING.value
+        orphan.attempts = 1
+        orphan.lease_owner = "crashed-worker"
+        orphan.lease_expires_at = orphan.run_after - timedelta(minutes=1)
+        db.add(orphan)
+        await db.commit()
+
+    runner = make_runner()
+    await runner.start()
+    try:
+        done = await _wait_for_status(session_factory, orphan.id, JobStatus.SUCCEEDED)
+    finally:
+        await runner.stop()
+
+    assert done.status == JobStatus.SUCCEEDED.value
+    assert done.attempts == 2
+    assert calls == [{"n": 2}]
+
+
+async def test_claim_order_and_idempotency(session_factory, make_runner, handlers):
+    runner = make_runner(task_concurrency=1)
+    async with session_factory() as db:
+        for key, priority in (("low", 0), ("high", 10)):
+            db.add(new_job("ok", {}, task_key=key, priority=priority, max_attempts=3, timeout=30))
+        await db.commit()
+
+        first = await runner.store.claim("w")
+        second = await runner.store.claim("other")
+        assert (first.task_key, second.task_key) == ("high", "low")
+        assert await runner.store.claim("third") is None
+
+        job = await runner.enqueue(db, "ok", {}, key="dedup", idempotency_key="same")
+        assert (await runner.enqueue(db, "ok", {}, key="dedup-2", idempotency_key="same")).id == job.id
+
+
+async def test_claim_prefers_higher_class_then_spreads_users(session_factory, make_runner, handlers):
+    runner = make_runner(task_run_in_api=False)
+    async with session_factory() as db:
+        # 用户 1 先排入三个批量任务，用户 2 随后排入一个；另有一个自动后台任务
+        for key, user_id, work_class in (
+            ("bg", 3, WorkClass.BACKGROUND),
+            ("a1", 1, WorkClass.BATCH),
+            ("a2", 1, WorkClass.BATCH),
+            ("a3", 1, WorkClass.BATCH),
+            ("b1", 2, WorkClass.BATCH),
+        ):
+            await runner.enqueue(db, "ok", {}, key=key, work_class=work_class, user_id=user_id)
+        await db.commit()
+
+    # 两个 worker 领取：用户 1 在每个 worker 上只有一个任务，上限仍按表中所有 worker 的 running 任务计
+    order = []
+    for owner in ("w0", "w1", "w1", "w0", "w1"):
+        job = await runner.store.claim(owner, per_user_limit=2)
+        if job is None:
+            break
+        order.append(job.task_key)
+
+    # 用户 2 不必等用户 1 的批量任务全部领完；用户 1 达到上限后第三个任务留在队列
+    assert order == ["a1", "b1", "a2", "bg"]
+    assert await runner.store.queue_depths() == {WorkClass.BATCH.value: 1}
+
+
+async def test_fair_tags_interleave_users_across_claims(session_factory, make_runner, handlers):
+    runner = make_runner(task_run_in_api=False)
+    async with session_factory() as db:
+        for key, user_id in (("a1", 1), ("a2", 1), ("a3", 1), ("b1", 2), ("b2", 2)):
+            await runner.enqueue(db, "ok", {}, key=key, work_class=WorkClass.BATCH, user_id=user_id)
+        await db.commit()
+
+    order = []
+    while job := await runner.store.claim("w"):
+        order.append(job.task_key)
+        await runner.store.complete("w", job.id)
+
+    # 后到的用户 2 与用户 1 轮流领取，而不是排在用户 1 的全部任务之后
+    assert order == ["a1", "b1", "a2", "b2", "a3"]
+
+
+async def test_job_handler_runs_in_its_work_context(session_factory, make_runner, monkeypatch):
+    monkeypatch.setattr(jobs, "_handlers", {})
+    seen = []
+
+    @register_job_handler("probe")
+    async def probe(payload):
+        seen.append(current_work())
+
+    runner = make_runner()
+    async with session_factory() as db:
+        job = await runner.enqueue(db, "probe", {}, key="probe-1", work_class=WorkClass.BATCH, user_id=9)
+        assert job.priority > 0
+        await db.commit()
+
+    await _wait_for_status(session_factory, job.id, JobStatus.SUCCEEDED)
+    assert [(work.work_class, work.user_id) for work in seen] == [(WorkClass.BATCH, 9)]
+
+
+@pytest.mark.parametrize("path", ["enqueue", "dispatch"])
+async def test_lost_lease_cancels_running_handler(session_factory, make_runner, monkeypatch, path):
+    monkeypatch.setattr(jobs, "_handlers", {})
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    @register_job_handler("slow")
+    async def slow(payload):
+        started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    runner = make_runner()
+    monkeypatch.setattr(runner, "_heartbeat_interval", lambda: 0.02)
+    async with session_factory() as db:
+        if path == "enqueue":
+            job = await runner.enqueue(db, "slow", {}, key="slow-1")
+        else:
+            job = new_job("slow", {}, task_key="slow-1", priority=0, max_attempts=3, timeout=60)
+            db.add(job)
+        await db.commit()
+    if path == "dispatch":
+        await runner.start()
+
+    await asyncio.wait_for(started.wait(), timeout=3)
+    # 另一个 worker 接管了租约（例如本 worker 卡顿导致租约过期后被回收再领取）
+    async with session_factory() as db:
+        stolen = await db.get(BackgroundJob, job.id)
+        stolen.lease_owner = "other-worker"
+        await db.commit()
+
+    await asyncio.wait_for(cancelled.wait(), timeout=3)
+    for _ in range(50):
+        if runner.active_job_count == 0:
+            break
+        await asyncio.sleep(0.02)
+    assert runner.active_job_count == 0
+    async with session_factory() as db:
+        job = await db.get(BackgroundJob, job.id)
+    # 结果留给新的持有者记录：本 worker 不改状态
+    assert (job.status, job.lease_owner) == (JobStatus.RUNNING.value, "other-worker")
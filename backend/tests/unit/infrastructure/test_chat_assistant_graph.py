@@ -9,10 +9,11 @@ from langchain_core.outputs import ChatGeneration, ChatResult
 from pydantic import PrivateAttr
 
 import app.infrastructure.graph.workflows  # noqa: F401
+from app.core.metrics import metrics
 from app.infrastructure.db.models.projects import Project
 from app.infrastructure.db.models.worldbuilding import Character
 from app.infrastructure.graph.chat_assistant_types import ChatAssistantContext
-from app.infrastructure.graph.registry import graph_registry
+from app.infrastructure.graph.registry import GraphRegistry, bind_model, graph_registry
 from app.infrastructure.graph.workflows.chat_assistant import _load_project_context
 
 
@@ -29,9 +30,16 @@ class EchoMockModel(BaseChatModel):
     def _generate(self, messages, stop=None, run_manager=None, **kwargs):
         self._last_messages = list(messages)
         system_text = "\n".join(str(getattr(m, "content", "")) for m in messages if getattr(m, "type", "") == "system")
-        return ChatResult(
-            generations=[ChatGeneration(message=AIMessage(content=f"系统包含外貌={'外貌' in system_text}"))]
+        message = AIMessage(
+            content=f"系统包含外貌={'外貌' in system_text}",
+            usage_metadata={
+                "input_tokens": 1200,
+                "output_tokens": 8,
+                "total_tokens": 1208,
+                "input_token_details": {"cache_read": 1024},
+            },
         )
+        return ChatResult(generations=[ChatGeneration(message=message)])
 
 
 @asynccontextmanager
@@ -61,8 +69,9 @@ async def _seed_project(db_session, user_id: int):
 async def test_load_project_context_uses_ai_context_builder_chat_budget(db_session, test_user):
     project = await _seed_project(db_session, test_user.id)
 
-    text = await _load_project_context(project.id, lambda: _same_session_factory(db_session))
+    text, focus = await _load_project_context(project.id, lambda: _same_session_factory(db_session))
 
+    assert focus == ""
     assert "图测试项目" in text
     assert "阿宁" in text
     assert "外貌：银发蓝眼" in text
@@ -70,6 +79,32 @@ async def test_load_project_context_uses_ai_context_builder_chat_budget(db_sessi
     assert len(text) <= 4000
 
 
+@pytest.mark.asyncio
+async def test_project_context_block_is_stable_across_messages(db_session, test_user):
+    project = await _seed_project(db_session, test_user.id)
+    db_session.add(Character(project_id=project.id, name="白鸦", description="情报贩子", appearance="黑色斗篷"))
+    await db_session.commit()
+    model = EchoMockModel()
+    graph = graph_registry.get("chat_assistant")(model=model)
+    context = ChatAssistantContext(
+        project_id=project.id,
+        session_factory=lambda: _same_session_factory(db_session),
+        chapter_context_segment="阿宁在旧城巷口等人。",
+    )
+
+    prompts = []
+    for message in ("白鸦会出现吗？", "换个话题，天气如何"):
+        await graph.ainvoke({"messages": [HumanMessage(content=message)]}, context=context)
+        system = next(m for m in model._last_messages if getattr(m, "type", "") == "system")
+        prompts.append(system.text)
+
+    # 缓存断点前的前缀与消息无关；消息提及的实体放在最后的聚焦段
+    prefix = prompts[0].split("# 本轮提及的设定")[0].rstrip()
+    assert prompts[1] == prefix
+    assert "# 本轮提及的设定" not in prompts[1]
+    assert "黑色斗篷" in prompts[0].split("# 本轮提及的设定")[1]
+
+
 def test_chat_assistant_registered():
     assert "chat_assistant" in graph_registry.registered_types
 
@@ -93,3 +128,63 @@ async def test_chat_assistant_graph_injects_project_context_and_template(db_sess
     assert "外貌：银发蓝眼" in system_text
     assert "# 用户提示词模板" in system_text
     assert "保持悬疑语气" in system_text
+
+
+@pytest.mark.asyncio
+async def test_chat_assistant_records_prompt_cache_usage(db_session, test_user):
+    project = await _seed_project(db_session, test_user.id)
+    graph = graph_registry.get("chat_assistant")(model=EchoMockModel())
+    context = ChatAssistantContext(
+        project_id=project.id,
+        session_factory=lambda: _same_session_factory(db_session),
+        chapter_context_segment="【当前章节正在写的内容】",
+    )
+    before = metrics.snapshot()["llm_usage"]
+
+    await graph.ainvoke({"messages": [HumanMessage(content="继续写")]}, context=context)
+
+    after = metrics.snapshot()["llm_usage"]
+    assert after["input_tokens"] - before["input_tokens"] == 1200
+    assert after["cache_read_tokens"] - before["cache_read_tokens"] == 1024
+
+
+@pytest.mark.asyncio
+async def test_compiled_chat_graph_is_cached_and_binds_model_per_call(db_session, test_user):
+    project = await _seed_project(db_session, test_user.id)
+    registry = GraphRegistry()
+    registry.register("chat_assistant")(graph_registry.get("chat_assistant"))
+    context = ChatAssistantContext(project_id=project.id, session_factory=lambda: _same_session_factory(db_session))
+    first_model, second_model = EchoMockModel(), EchoMockModel()
+
+    graph = registry.compile("chat_assistant")
+    await graph.ainvoke({"messages": [HumanMessage(content="甲")]}, config=bind_model(first_model), context=context)
+    assert registry.compile("chat_assistant") is graph
+    await graph.ainvoke({"messages": [HumanMessage(content="乙")]}, config=bind_model(second_model), context=context)
+
+    assert first_model._last_messages[-1].content == "甲"
+    assert second_model._last_messages[-1].content == "乙"
+    assert metrics.snapshot()["graph_cache"]["chat_assistant"]["hits"] >= 1
+
+
+def test_compile_cache_keys_on_tool_instances():
+    from langchain_core.tools import StructuredTool
+
+    registry = GraphRegistry()
+    built = []
+
+    @registry.register("tooled")
+    def _build(model=None, *, checkpointer=None, tools=None):
+        built.append(tools)
+        return object()
+
+    def _lookup(name: str) -> str:
+        return name
+
+    first = [StructuredTool.from_function(_lookup, name="lookup", description="查")]
+    second = [StructuredTool.from_function(_lookup, name="lookup", description="查")]
+
+    graph = registry.compile("tooled", tools=first)
+    # 同名的另一组工具实例不能拿到按 first 编译的图
+    assert registry.compile("tooled", tools=second) is not graph
+    assert registry.compile("tooled", tools=list(first)) is graph
+    assert [tools[0] for tools in built] == [first[0], second[0]]
@@ -0,0 +1,109 @@
+"""ChatModel 复用池：指纹命中、LRU 淘汰、按配置失效、延迟关闭客户端。"""
+
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from app.infrastructure.llm import model_pool
+from app.infrastructure.llm.model_pool import ChatModelPool, config_fingerprint
+from app.infrastructure.llm.provider_adapters import ProviderConfig
+
+
+class _Model:
+    def __init__(self):
+        self.http_async_client = httpx.AsyncClient()
+        self.http_client = httpx.Client()
+
+
+class _Provider:
+    provider_type = "fake"
+
+    def __init__(self):
+        self.built = 0
+
+    def build_chat_model(self, _config):
+        self.built += 1
+        return _Model()
+
+
+def _config(model_name: str = "m", **kwargs) -> ProviderConfig:
+    return ProviderConfig(api_key="sk-test", model_name=model_name, **kwargs)
+
+
+class TestFingerprint:
+    def test_stable_and_sensitive_to_every_field(self):
+        base = config_fingerprint("openai", _config(stop_sequences=["。"]))
+
+        assert base == config_fingerprint("openai", _config(stop_sequences=["。"]))
+        assert base != config_fingerprint("custom", _config(stop_sequences=["。"]))
+        assert base != config_fingerprint("openai", _config(stop_sequences=["。"], temperature=0.2))
+        assert "sk-test" not in base
+
+
+class TestChatModelPool:
+    async def test_same_config_reuses_instance(self):
+        pool, provider = ChatModelPool(4), _Provider()
+
+        first = await pool.get(provider, _config(), model_config_id=1)
+        second = await pool.get(provider, _config(), model_config_id=1)
+
+        assert first is second
+        assert provider.built == 1
+
+    async def test_lru_eviction_keeps_recently_used(self):
+        pool, provider = ChatModelPool(2), _Provider()
+        a = await pool.get(provider, _config("a"))
+        await pool.get(provider, _config("b"))
+        await pool.get(provider, _config("a"))
+        await pool.get(provider, _config("c"))
+
+        assert len(pool) == 2
+        assert await pool.get(provider, _config("a")) is a
+        assert provider.built == 3
+
+    async def test_default_capacity_follows_current_settings(self, monkeypatch):
+        pool, provider = model_pool.chat_model_pool, _Provider()
+        monkeypatch.setenv("AI_MODEL_POOL_SIZE", "1")
+        await pool.get(provider, _config("a"))
+        await pool.get(provider, _config("b"))
+
+        # 全局单例在导入时创建，容量仍按当前配置生效
+        assert pool.max_entries == 1
+        assert len(pool) == 1
+
+    async def test_invalidate_drops_every_fingerprint_of_config(self):
+        pool, provider = ChatModelPool(4), _Provider()
+        old = await pool.get(provider, _config(temperature=0.7), model_config_id=7)
+        await pool.get(provider, _config(temperature=0.3), model_config_id=7)
+        other = await pool.get(provider, _config("other"), model_config_id=8)
+
+        assert pool.invalidate(7) == 2
+        assert await pool.get(provider, _config(temperature=0.7), model_config_id=7) is not old
+        assert await pool.get(provider, _config("other"), model_config_id=8) is other
+
+    async def test_retired_clients_close_after_grace(self, monkeypatch):
+        pool, provider = ChatModelPool(1), _Provider()
+        evicted = await pool.get(provider, _config("a"))
+        kept = await pool.get(provider, _config("b"))
+        await pool.get(provider, _config("b"))
+        # 宽限期内不关闭：可能还有进行中的请求
+        assert not evicted.http_async_client.is_closed
+
+        later = time.monotonic() + model_pool.CLOSE_GRACE_SECONDS + 1
+        monkeypatch.setattr(model_pool, "time", SimpleNamespace(monotonic=lambda: later))
+        await pool.get(provider, _config("b"))
+        assert evicted.http_async_client.is_closed
+        assert evicted.http_client.is_closed
+        assert not kept.http_async_client.is_closed
+
+    async def test_aclose_closes_pooled_and_retiring(self):
+        pool, provider = ChatModelPool(1), _Provider()
+        evicted = await pool.get(provider, _config("a"))
+        pooled = await pool.get(provider, _config("b"))
+
+        await pool.aclose()
+
+        assert len(pool) == 0
+        assert evicted.http_async_client.is_closed
+        assert pooled.http_async_client.is_closed
@@ -0,0 +1,54 @@
+"""提示缓存块布局与缓存 token 解析。"""
+
+from langchain_anthropic import ChatAnthropic
+from langchain_openai import ChatOpenAI
+
+from app.infrastructure.llm.prompt_cache import (
+    MAX_CACHE_BREAKPOINTS,
+    PromptBlock,
+    build_system_message,
+    cached_token_counts,
+)
+
+_BLOCKS = [
+    PromptBlock("基础提示"),
+    PromptBlock("项目上下文", cache_breakpoint=True),
+    PromptBlock(""),
+    PromptBlock("章节内容", cache_breakpoint=True),
+    PromptBlock("模板"),
+]
+
+
+def test_anthropic_gets_cache_control_on_breakpoints():
+    model = ChatAnthropic(model="claude-sonnet-4-20250514", api_key="test-key")
+
+    message = build_system_message(_BLOCKS, model.bind_tools([]))
+
+    assert [block["text"] for block in message.content] == ["基础提示\n\n", "项目上下文\n\n", "章节内容\n\n", "模板"]
+    assert [bool(block.get("cache_control")) for block in message.content] == [False, True, True, False]
+
+
+def test_other_providers_get_plain_text_in_same_order():
+    model = ChatOpenAI(model="gpt-4o", api_key="test-key")
+
+    message = build_system_message(_BLOCKS, model)
+
+    assert message.content == "基础提示\n\n项目上下文\n\n章节内容\n\n模板"
+
+
+def test_breakpoints_are_capped_keeping_the_longest_prefixes():
+    model = ChatAnthropic(model="claude-sonnet-4-20250514", api_key="test-key")
+    blocks = [PromptBlock(f"块{i}", cache_breakpoint=True) for i in range(6)]
+
+    content = build_system_message(blocks, model).content
+
+    marked = [i for i, block in enumerate(content) if block.get("cache_control")]
+    assert marked == list(range(6 - MAX_CACHE_BREAKPOINTS, 6))
+
+
+def test_cached_token_counts():
+    usage = {"input_tokens": 1200, "input_token_details": {"cache_read": 1024, "cache_creation": 0}}
+
+    assert cached_token_counts(usage) == (1024, 0)
+    assert cached_token_counts({"input_tokens": 5}) == (0, 0)
+    assert cached_token_counts(None) == (0, 0)
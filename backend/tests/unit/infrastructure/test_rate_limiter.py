@@ -0,0 +1,138 @@
+"""Provider 限流：令牌桶突发、排队超时、AIMD、TPM 欠账、挂到 ChatModel 上的反馈。"""
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from app.core.exceptions import ProviderBusyError
+from app.core.metrics import metrics
+from app.infrastructure.llm import response_cache
+from app.infrastructure.llm.provider_adapters import ProviderConfig
+from app.infrastructure.llm.rate_limiter import (
+    ProviderRateLimiter,
+    RateLimiterRegistry,
+    is_rate_limit_error,
+)
+from app.infrastructure.llm.response_cache import with_response_cache
+
+
+class _RateLimitError(Exception):
+    status_code = 429
+
+
+class _ThrottledModel(GenericFakeChatModel):
+    async def _agenerate(self, *args, **kwargs):
+        raise _RateLimitError("slow down")
+
+
+class TestTokenBucket:
+    async def test_burst_then_paced(self):
+        limiter = ProviderRateLimiter("t:burst", requests_per_minute=60)
+
+        # 容量 = 10 秒配额
+        assert all([await limiter.aacquire(blocking=False) for _ in range(10)])
+        assert await limiter.aacquire(blocking=False) is False
+
+    async def test_queue_timeout_rejects_and_counts(self):
+        limiter = ProviderRateLimiter("t:timeout", requests_per_minute=6, queue_timeout=0.05)
+        await limiter.aacquire()
+
+        with pytest.raises(ProviderBusyError):
+            await limiter.aacquire()
+        assert metrics.rate_limit_rejections["t:timeout"] == 1
+        assert metrics.snapshot()["rate_limits"]["queue_wait_s"]["t:timeout"]["count"] == 1
+
+    async def test_token_debt_blocks_until_refilled(self):
+        limiter = ProviderRateLimiter("t:tpm", requests_per_minute=600, tokens_per_minute=600)
+        limiter.on_success(900)
+
+        wait = limiter._take()
+        # 欠 300 token，按 10 token/s 回补
+        assert 29 < wait <= 30
+
+
+class TestAIMD:
+    def test_halves_once_per_cooldown_then_recovers(self):
+        limiter = ProviderRateLimiter("t:aimd", requests_per_minute=60)
+
+        limiter.on_rate_limited()
+        limiter.on_rate_limited()
+        assert limiter.rpm == 30
+        assert metrics.rate_limit_throttled["t:aimd"] == 2
+
+        limiter.on_success(0)
+        assert limiter.rpm == 31
+
+    def test_retry_after_pauses_bucket(self):
+        limiter = ProviderRateLimiter("t:pause", requests_per_minute=60)
+
+        limiter.on_rate_limited(retry_after=5)
+
+        assert 4 < limiter._take() <= 5
+
+
+class TestAttach:
+    @pytest.fixture(autouse=True)
+    def _enable_rpm(self, monkeypatch):
+        # 限流默认关闭（RPM=0），这里显式开启
+        monkeypatch.setenv("AI_LLM_REQUESTS_PER_MINUTE", "60")
+
+    def _config(self) -> ProviderConfig:
+        return ProviderConfig(api_key="sk-attach", model_name="m")
+
+    async def test_model_calls_go_through_shared_limiter(self):
+        registry = RateLimiterRegistry()
+        model = GenericFakeChatModel(messages=iter([AIMessage(content="好")]))
+        registry.attach(model, "fake", self._config())
+        limiter = model.rate_limiter
+
+        await model.ainvoke("hi")
+
+        assert limiter is registry.get("fake", self._config())
+        assert limiter._requests < 10
+
+    async def test_429_halves_rate(self):
+        registry = RateLimiterRegistry()
+        model = _ThrottledModel(messages=iter([]))
+        registry.attach(model, "fake", self._config())
+
+        with pytest.raises(_RateLimitError):
+            await model.ainvoke("hi")
+
+        assert model.rate_limiter.rpm == model.rate_limiter.max_rpm / 2
+
+    async def test_cache_hits_skip_limiter_feedback(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("AI_LLM_CACHE_ENABLED", "true")
+        monkeypatch.setenv("AI_LLM_CACHE_PATH", str(tmp_path / "llm.db"))
+        monkeypatch.setattr(response_cache, "_cache", None)
+        registry = RateLimiterRegistry()
+        model = GenericFakeChatModel(messages=iter([AIMessage(content="一次")]))
+        registry.attach(model, "fake", self._config())
+        successes = []
+        monkeypatch.setattr(model.rate_limiter, "on_success", successes.append)
+
+        try:
+            await with_response_cache(model).ainvoke("同一提示")
+            await with_response_cache(model).ainvoke("同一提示")
+        finally:
+            response_cache.close_response_cache()
+
+        # 第二次命中缓存：没有请求 provider，不扣 token 也不加速
+        assert len(successes) == 1
+
+    def test_disabled_when_rpm_zero(self, monkeypatch):
+        monkeypatch.setenv("AI_LLM_REQUESTS_PER_MINUTE", "0")
+        model = GenericFakeChatModel(messages=iter([]))
+
+        RateLimiterRegistry().attach(model, "fake", self._config())
+
+        assert model.rate_limiter is None
+
+
+def test_is_rate_limit_error():
+    assert is_rate_limit_error(_RateLimitError())
+    assert not is_rate_limit_error(ValueError("bad"))
+
+    wrapped = RuntimeError("wrapped")
+    wrapped.__cause__ = _RateLimitError()
+    assert is_rate_limit_error(wrapped)
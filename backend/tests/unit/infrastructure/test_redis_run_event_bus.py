@@ -0,0 +1,134 @@
+"""Redis 事件总线：用进程内的 Redis Stream 替身验证跨"进程"订阅、续传与缓冲越界。"""
+
+import asyncio
+
+import pytest
+
+from app.infrastructure.events import EventsExpired
+from app.infrastructure.events.redis_bus import RedisRunEventBus
+
+
+class _FakeRedis:
+    """实现 RedisRunEventBus 用到的命令子集（RESP2 返回格式，bytes 值）"""
+
+    def __init__(self, *, trim_info: bool = True):
+        self.streams: dict[str, list[tuple[bytes, dict]]] = {}
+        self.values: dict[str, bytes] = {}
+        self.max_deleted: dict[str, bytes] = {}
+        self.trim_info = trim_info  # False 模拟 Redis 7 之前（XINFO 没有 max-deleted-entry-id）
+        self._seq = 0
+        self._changed = asyncio.Condition()
+
+    async def xadd(self, name, fields, maxlen=None, approximate=True):
+        self._seq += 1
+        entry_id = f"1000-{self._seq}".encode()
+        entries = self.streams.setdefault(name, [])
+        entries.append((entry_id, {k.encode(): v.encode() for k, v in fields.items()}))
+        if maxlen is not None and len(entries) > maxlen:
+            self.max_deleted[name] = entries[-maxlen - 1][0]
+            del entries[:-maxlen]
+        async with self._changed:
+            self._changed.notify_all()
+        return entry_id
+
+    def _after(self, name, cursor):
+        key = tuple(int(part) for part in cursor.split("-"))
+        return [e for e in self.streams.get(name, []) if tuple(int(p) for p in e[0].decode().split("-")) > key]
+
+    async def xread(self, streams, count=None, block=None):
+        ((name, cursor),) = streams.items()
+        async with self._changed:
+            if not self._after(name, cursor) and block:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), block / 1000)
+                except TimeoutError:
+                    pass
+        entries = self._after(name, cursor)[:count]
+        return [[name.encode(), entries]] if entries else []
+
+    async def xinfo_stream(self, name):
+        entries = self.streams[name]
+        info = {
+            "first-entry": entries[0] if entries else None,
+            "last-generated-id": f"1000-{self._seq}".encode(),
+        }
+        if self.trim_info:
+            info["max-deleted-entry-id"] = self.max_deleted.get(name, b"0-0")
+        return info
+
+    async def set(self, name, value, ex=None):
+        self.values[name] = value.encode()
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def get(self, name):
+        return self.values.get(name)
+
+    async def exists(self, name):
+        return int(name in self.values or name in self.streams)
+
+    async def expire(self, name, seconds):
+        return True
+
+    async def delete(self, name):
+        self.streams.pop(name, None)
+
+
+async def _collect(bus, run_id, after_id=None):
+    return [(event_id, event["type"]) async for event_id, event in bus.subscribe(run_id, after_id)]
+
+
+async def test_subscriber_on_another_bus_instance_receives_live_events():
+    redis = _FakeRedis()
+    publisher = RedisRunEventBus(redis, block_ms=1000)
+    subscriber = RedisRunEventBus(redis, block_ms=1000)
+    await publisher.open(1)
+    assert await subscriber.has_stream(1)
+
+    reader = asyncio.create_task(_collect(subscriber, 1))
+    await asyncio.sleep(0)
+    await publisher.publish(1, {"type": "token"})
+    await publisher.publish(1, {"type": "done"})
+
+    assert await asyncio.wait_for(reader, timeout=1) == [("1000-1", "token"), ("1000-2", "done")]
+    assert redis.values["ainovel:run:1:state"] == b"closed"
+
+
+async def test_resume_after_last_event_id_and_expired_cursor():
+    redis = _FakeRedis()
+    bus = RedisRunEventBus(redis, maxlen=2, block_ms=10)
+    await bus.open(2)
+    for event_type in ("a", "b", "c", "done"):
+        await bus.publish(2, {"type": event_type})
+
+    assert await _collect(bus, 2, "1000-3") == [("1000-4", "done")]
+    # 游标自身被裁掉、之后的事件都还在：不算丢失
+    assert await _collect(bus, 2, "1000-2") == [("1000-3", "c"), ("1000-4", "done")]
+    with pytest.raises(EventsExpired) as exc_info:
+        await _collect(bus, 2, "1000-1")
+    # 从最早留存条目续读，不会重读整个 Stream
+    assert exc_info.value.resume_after == "1000-2"
+    assert await _collect(bus, 2, exc_info.value.resume_after) == [("1000-3", "c"), ("1000-4", "done")]
+
+
+async def test_expiry_without_trim_info_compares_first_entry():
+    redis = _FakeRedis(trim_info=False)
+    bus = RedisRunEventBus(redis, maxlen=2, block_ms=10)
+    await bus.open(4)
+    for event_type in ("a", "b", "c", "done"):
+        await bus.publish(4, {"type": event_type})
+
+    assert await _collect(bus, 4, "1000-3") == [("1000-4", "done")]
+    with pytest.raises(EventsExpired) as exc_info:
+        await _collect(bus, 4, "1000-2")
+    assert exc_info.value.resume_after == "1000-2"
+
+
+async def test_closed_stream_without_terminal_event_ends_subscription():
+    redis = _FakeRedis()
+    bus = RedisRunEventBus(redis, block_ms=10)
+    await bus.open(3)
+    await bus.publish(3, {"type": "node_start"})
+    await bus.close(3)
+
+    assert await _collect(bus, 3) == [("1000-1", "node_start")]
@@ -0,0 +1,99 @@
+"""LLM 响应缓存：SQLite 往返、TTL、LRU 淘汰、temperature 绕过与命中计数。"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration
+
+from app.core.metrics import metrics
+from app.infrastructure.llm import response_cache
+from app.infrastructure.llm.response_cache import SQLiteResponseCache, with_response_cache
+
+
+class _SampledModel(GenericFakeChatModel):
+    temperature: float = 0.7
+
+
+def _generation(text: str) -> list[ChatGeneration]:
+    return [
+        ChatGeneration(
+            message=AIMessage(content=text, usage_metadata={"input_tokens": 3, "output_tokens": 1, "total_tokens": 4})
+        )
+    ]
+
+
+@pytest.fixture
+def enabled_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("AI_LLM_CACHE_ENABLED", "true")
+    monkeypatch.setenv("AI_LLM_CACHE_PATH", str(tmp_path / "cache" / "llm.db"))
+    monkeypatch.setattr(response_cache, "_cache", None)
+    yield
+    response_cache.close_response_cache()
+
+
+class TestSQLiteResponseCache:
+    def test_round_trip_keyed_by_prompt_and_llm_string(self, tmp_path):
+        cache = SQLiteResponseCache(str(tmp_path / "c.db"), max_entries=10, ttl_seconds=60)
+        cache.update("prompt", "model=a,temperature=0", _generation("答案"))
+
+        hit = cache.lookup("prompt", "model=a,temperature=0")
+        assert hit[0].message.content == "答案"
+        assert hit[0].message.usage_metadata["total_tokens"] == 4
+        assert cache.lookup("prompt", "model=b,temperature=0") is None
+        assert cache.lookup("other", "model=a,temperature=0") is None
+
+    def test_expired_entry_is_a_miss(self, tmp_path, monkeypatch):
+        cache = SQLiteResponseCache(str(tmp_path / "c.db"), max_entries=10, ttl_seconds=60)
+        cache.update("p", "m", _generation("旧"))
+
+        later = time.time() + 61
+        monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: later))
+
+        assert cache.lookup("p", "m") is None
+        assert len(cache) == 0
+
+    def test_lru_evicts_least_recently_read(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(response_cache, "_EVICT_CHECK_INTERVAL", 1)
+        clock = iter(range(100))
+        monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: float(next(clock))))
+        cache = SQLiteResponseCache(str(tmp_path / "c.db"), max_entries=2, ttl_seconds=1000)
+        cache.update("a", "m", _generation("a"))
+        cache.update("b", "m", _generation("b"))
+        cache.lookup("a", "m")
+
+        cache.update("c", "m", _generation("c"))
+
+        assert len(cache) == 2
+        assert cache.lookup("b", "m") is None
+        assert cache.lookup("a", "m") is not None
+
+
+class TestWithResponseCache:
+    def test_disabled_by_default(self):
+        model = GenericFakeChatModel(messages=iter([]))
+
+        assert with_response_cache(model) is model
+
+    @pytest.mark.usefixtures("enabled_cache")
+    async def test_repeated_deterministic_call_hits_cache(self):
+        model = GenericFakeChatModel(messages=iter([AIMessage(content="一次")]))
+        hits = metrics.llm_cache_hits.value
+
+        first = await with_response_cache(model).ainvoke("同一提示")
+        # 迭代器已耗尽：第二次若真的调用模型会抛 StopIteration
+        second = await with_response_cache(model).ainvoke("同一提示")
+
+        assert first.content == second.content == "一次"
+        assert metrics.llm_cache_hits.value == hits + 1
+        assert model.cache is None
+
+    @pytest.mark.usefixtures("enabled_cache")
+    def test_sampled_models_bypass_unless_allowed(self, monkeypatch):
+        model = _SampledModel(messages=iter([]))
+        assert with_response_cache(model) is model
+
+        monkeypatch.setenv("AI_LLM_CACHE_SAMPLED", "true")
+        assert with_response_cache(model).cache is response_cache.get_response_cache()
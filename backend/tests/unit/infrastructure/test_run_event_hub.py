@@ -0,0 +1,51 @@
+"""Run event hub：多订阅者广播、游标续读、缓冲越界与终止事件。"""
+
+import asyncio
+
+import pytest
+
+from app.infrastructure.events import EventsExpired, RunChannel, RunEventHub
+
+
+async def _collect(channel: RunChannel, after_id: int = 0) -> list[tuple[int, str]]:
+    return [(event_id, event["type"]) async for event_id, event in channel.subscribe(after_id)]
+
+
+async def test_every_subscriber_sees_every_event():
+    channel = RunChannel(1)
+    readers = [asyncio.create_task(_collect(channel)) for _ in range(3)]
+    await asyncio.sleep(0)
+
+    channel.publish({"type": "node_start"})
+    await asyncio.sleep(0)
+    channel.publish({"type": "token"})
+    channel.publish({"type": "done"})
+
+    results = await asyncio.wait_for(asyncio.gather(*readers), timeout=1)
+    assert results == [[(1, "node_start"), (2, "token"), (3, "done")]] * 3
+    assert channel.closed
+
+
+async def test_resume_from_cursor_and_expired_cursor():
+    channel = RunChannel(1, capacity=2)
+    for event_type in ("a", "b", "c", "done"):
+        channel.publish({"type": event_type})
+
+    assert await _collect(channel, after_id=2) == [(3, "c"), (4, "done")]
+    with pytest.raises(EventsExpired) as exc_info:
+        await _collect(channel, after_id=1)
+    assert exc_info.value.resume_after == "2"
+
+
+def test_hub_reopens_closed_channel_and_prunes_after_retention():
+    hub = RunEventHub(retention_seconds=0)
+    first = hub.open(7)
+    assert hub.open(7) is first
+
+    hub.publish(7, {"type": "done"})
+    second = hub.open(7)
+
+    assert second is not first and not second.closed
+    hub.close(7)
+    hub.open(8)
+    assert hub.get(7) is None
@@ -0,0 +1,79 @@
+"""RunMetricsHandler：节点耗时、TTFT、生成速度、provider 调用 / 错误与 usage 累计。"""
+
+from typing import TypedDict
+
+import pytest
+from langchain_core.callbacks import AsyncCallbackManager, BaseCallbackHandler
+from langgraph.graph import END, START, StateGraph
+
+import app.infrastructure.graph.instrumentation as instrumentation
+from app.core.metrics import MetricsCollector
+from app.infrastructure.graph.instrumentation import RunMetricsHandler, with_callback
+from app.infrastructure.llm.provider_adapters.scripted_provider import ScriptedChatModel, ScriptedProviderError
+
+
+class _State(TypedDict):
+    text: str
+
+
+def _build_graph(model, *, stream: bool):
+    async def write(state):
+        if stream:
+            return {"text": "".join([chunk.content async for chunk in model.astream("写")])}
+        return {"text": (await model.ainvoke("写")).content}
+
+    graph = StateGraph(_State)
+    graph.add_node("write", write)
+    graph.add_edge(START, "write")
+    graph.add_edge("write", END)
+    return graph.compile()
+
+
+@pytest.fixture
+def collector(monkeypatch):
+    collector = MetricsCollector()
+    monkeypatch.setattr(instrumentation, "metrics", collector)
+    return collector
+
+
+@pytest.mark.parametrize("stream", [False, True])
+async def test_records_node_latency_ttft_and_usage(collector, stream):
+    model = ScriptedChatModel(responses=["你好世界"], ttft=0.02, tokens_per_second=200)
+    handler = RunMetricsHandler("demo")
+
+    await _build_graph(model, stream=stream).ainvoke({"text": ""}, config={"callbacks": [handler]})
+
+    snapshot = collector.snapshot()
+    assert handler.usage["output_tokens"] == 4
+    assert handler.total_tokens == handler.usage["total_tokens"] > 0
+    assert snapshot["nodes"]["demo.write"]["count"] == 1
+    (provider,) = snapshot["providers"]["calls"]
+    assert snapshot["providers"]["calls"][provider] == 1
+    latency = snapshot["llm_latency"][provider]
+    assert latency["ttft_s"]["min"] >= 0.02
+    assert latency["tokens_per_second"]["count"] == 1
+
+
+async def test_provider_error_counted(collector):
+    model = ScriptedChatModel(error="server", error_every=1, ttft=0)
+    handler = RunMetricsHandler()
+
+    with pytest.raises(ScriptedProviderError):
+        await _build_graph(model, stream=False).ainvoke({"text": ""}, config={"callbacks": [handler]})
+
+    snapshot = collector.snapshot()
+    assert sum(snapshot["providers"]["errors"].values()) == 1
+    assert snapshot["nodes"]["write"]["count"] == 1
+    assert handler.usage is None
+
+
+def test_with_callback_keeps_existing_callbacks():
+    existing = BaseCallbackHandler()
+    handler = RunMetricsHandler()
+
+    config = with_callback({"callbacks": [existing], "tags": ["x"]}, handler)
+    managed = with_callback({"callbacks": AsyncCallbackManager(handlers=[existing])}, handler)
+
+    assert config == {"callbacks": [existing, handler], "tags": ["x"]}
+    assert managed["callbacks"].handlers == [existing, handler]
+    assert with_callback(None, handler) == {"callbacks": [handler]}
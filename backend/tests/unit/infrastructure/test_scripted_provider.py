@@ -0,0 +1,127 @@
+"""离线回放 provider：流式节奏、usage、structured output、错误注入与注册。"""
+
+import json
+import time
+
+import pytest
+
+from app.application.legacy_ai_service import _is_context_length_error
+from app.infrastructure.llm.provider_adapters import ProviderConfig, get_provider
+from app.infrastructure.llm.provider_adapters.scripted_provider import (
+    ScriptedChatModel,
+    ScriptedProviderError,
+    parse_model_options,
+)
+from app.infrastructure.llm.rate_limiter import is_rate_limit_error
+from app.schemas.knowledge import ChapterKnowledgeAnalysisDraft
+from app.schemas.legacy_ai import ChapterSummarySchema
+
+
+class TestScriptedChatModel:
+    async def test_stream_paces_tokens_and_reports_usage(self):
+        model = ScriptedChatModel(responses=["你好世界"], tokens_per_second=100, ttft=0.05)
+
+        started = time.monotonic()
+        first_at = None
+        chunks = []
+        async for chunk in model.astream("问候"):
+            first_at = first_at or time.monotonic()
+            chunks.append(chunk)
+        elapsed = time.monotonic() - started
+
+        assert "".join(chunk.content for chunk in chunks) == "你好世界"
+        assert first_at - started >= 0.05
+        assert elapsed >= 0.05 + 3 / 100
+        merged = chunks[0]
+        for chunk in chunks[1:]:
+            merged += chunk
+        assert merged.usage_metadata == {"input_tokens": 2, "output_tokens": 4, "total_tokens": 6}
+
+    async def test_responses_cycle_in_order(self):
+        model = ScriptedChatModel(responses=["甲", "乙"], ttft=0)
+
+        replies = [(await model.ainvoke("x")).content for _ in range(3)]
+
+        assert replies == ["甲", "乙", "甲"]
+
+    async def test_structured_output_recorded_and_synthesized(self):
+        model = ScriptedChatModel(
+            structured={"ChapterSummarySchema": [{"summary": "录制的章节摘要内容足够十个字"}]},
+            ttft=0,
+            tokens_per_second=0,
+        )
+
+        recorded = await model.with_structured_output(ChapterSummarySchema, method="json_mode").ainvoke("x")
+        synthesized = await model.with_structured_output(ChapterKnowledgeAnalysisDraft).ainvoke("x")
+
+        assert recorded == ChapterSummarySchema(summary="录制的章节摘要内容足够十个字")
+        assert isinstance(synthesized, ChapterKnowledgeAnalysisDraft)
+
+    async def test_structured_output_include_raw(self):
+        model = ScriptedChatModel(
+            structured={"ChapterSummarySchema": [{"summary": "录制的章节摘要内容足够十个字"}, {"summary": "太短"}]},
+            ttft=0,
+            tokens_per_second=0,
+        )
+        structured = model.with_structured_output(ChapterSummarySchema, include_raw=True)
+
+        ok = await structured.ainvoke("x")
+        bad = await structured.ainvoke("x")
+
+        assert ok["parsed"] == ChapterSummarySchema(summary="录制的章节摘要内容足够十个字")
+        assert ok["parsing_error"] is None
+        assert json.loads(ok["raw"].content) == {"summary": "录制的章节摘要内容足够十个字"}
+        # 解析失败不抛出：parsed 为 None，错误放在 parsing_error
+        assert bad["parsed"] is None
+        assert bad["parsing_error"] is not None
+        assert json.loads(bad["raw"].content) == {"summary": "太短"}
+
+    async def test_context_length_error_matches_service_detection(self):
+        model = ScriptedChatModel(max_context_tokens=3, ttft=0)
+
+        with pytest.raises(ScriptedProviderError) as exc_info:
+            await model.ainvoke("这句话超过三个字")
+
+        assert _is_context_length_error(exc_info.value)
+
+    async def test_periodic_rate_limit_fails_mid_stream(self):
+        model = ScriptedChatModel(
+            responses=["一二三四五"], error="rate_limit", error_every=2, error_after_tokens=2, ttft=0
+        )
+        await model.ainvoke("第一次正常")
+
+        received = []
+        with pytest.raises(ScriptedProviderError) as exc_info:
+            async for chunk in model.astream("第二次失败"):
+                received.append(chunk.content)
+
+        assert received == ["一", "二"]
+        assert is_rate_limit_error(exc_info.value)
+
+
+class TestScriptedProvider:
+    def test_options_parsed_from_model_name(self):
+        assert parse_model_options("bench, tps=80; ttft=0.3,every=5,error=server") == {
+            "model_name": "bench",
+            "tokens_per_second": 80.0,
+            "ttft": 0.3,
+            "error_every": 5,
+            "error": "server",
+        }
+        with pytest.raises(ValueError):
+            parse_model_options("speed=fast")
+
+    def test_disabled_by_default(self):
+        with pytest.raises(ValueError, match="AI_SCRIPTED_PROVIDER_ENABLED"):
+            get_provider("scripted").build_chat_model(ProviderConfig(api_key="k", model_name="scripted"))
+
+    def test_builds_from_script_file(self, tmp_path, monkeypatch):
+        script = tmp_path / "script.json"
+        script.write_text(json.dumps({"responses": ["录制回复"]}, ensure_ascii=False), encoding="utf-8")
+        monkeypatch.setenv("AI_SCRIPTED_PROVIDER_ENABLED", "true")
+        monkeypatch.setenv("AI_SCRIPTED_PROVIDER_SCRIPT", str(script))
+
+        model = get_provider("scripted").build_chat_model(ProviderConfig(api_key="k", model_name="tps=10"))
+
+        assert model.responses == ["录制回复"]
+        assert model.tokens_per_second == 10
@@ -0,0 +1,63 @@
+"""SingleFlight 并发合并测试。"""
+
+import asyncio
+
+import pytest
+
+from app.infrastructure.task.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    async def test_concurrent_callers_share_one_execution(self):
+        flights = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def _work():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "done"
+
+        waiters = [asyncio.create_task(flights.do("k", _work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        assert flights.in_flight("k")
+        release.set()
+
+        assert await asyncio.gather(*waiters) == ["done"] * 5
+        assert calls == 1
+        assert len(flights) == 0
+
+    async def test_exception_is_shared_then_forgotten(self):
+        flights = SingleFlight()
+        calls = 0
+
+        async def _fail():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(flights.do("k", _fail), flights.do("k", _fail), return_exceptions=True)
+        assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+        assert calls == 1
+
+        with pytest.raises(RuntimeError):
+            await flights.do("k", _fail)
+        assert calls == 2
+
+    async def test_cancelled_waiter_does_not_cancel_shared_call(self):
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def _work():
+            await release.wait()
+            return 42
+
+        first = asyncio.create_task(flights.do("k", _work))
+        second = asyncio.create_task(flights.do("k", _work))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+
+        assert await second == 42
@@ -1,5 +1,6 @@
 """Structured SSE event dispatch tests."""
 
+import asyncio
 import json
 from types import SimpleNamespace
 
@@ -84,3 +85,53 @@ async def test_stream_agent_events_emits_error_then_done():
 
     assert [item["type"] for item in parsed] == ["node_start", "error", "done"]
     assert parsed[1]["payload"]["message"] == "boom"
+
+
+class ChunkedGraph:
+    async def astream_events(self, input_state, **kwargs):
+        yield {"event": "on_chain_start", "name": "agent", "data": {}}
+        for char in "一二三四五":
+            yield {"event": "on_chat_model_stream", "name": "model", "data": {"chunk": SimpleNamespace(content=char)}}
+        yield {"event": "on_tool_start", "name": "search", "data": {"input": {}}}
+        yield {"event": "on_chat_model_stream", "name": "model", "data": {"chunk": SimpleNamespace(content="六")}}
+
+
+@pytest.mark.asyncio
+async def test_stream_agent_events_coalesces_text_until_boundary(monkeypatch):
+    monkeypatch.setenv("AI_STREAM_COALESCE_MS", "10000")
+    monkeypatch.setenv("AI_STREAM_COALESCE_CHARS", "3")
+
+    rows = [line async for line in stream_agent_events(ChunkedGraph(), {"messages": []}, context="ctx")]
+    parsed = [json.loads(row.removeprefix("data: ")) for row in rows]
+
+    assert [(item["type"], item["payload"].get("chunk")) for item in parsed] == [
+        ("node_start", None),
+        ("text", "一二三"),
+        ("text", "四五"),
+        ("tool_start", None),
+        ("text", "六"),
+        ("done", None),
+    ]
+
+
+class PausingGraph:
+    async def astream_events(self, input_state, **kwargs):
+        yield {"event": "on_chat_model_stream", "name": "model", "data": {"chunk": SimpleNamespace(content="一")}}
+        await asyncio.sleep(0.2)
+        yield {"event": "on_chat_model_stream", "name": "model", "data": {"chunk": SimpleNamespace(content="二")}}
+
+
+@pytest.mark.asyncio
+async def test_stream_agent_events_flushes_buffered_text_when_model_pauses(monkeypatch):
+    monkeypatch.setenv("AI_STREAM_COALESCE_MS", "20")
+    monkeypatch.setenv("AI_STREAM_COALESCE_CHARS", "100")
+
+    rows = [line async for line in stream_agent_events(PausingGraph(), {"messages": []}, context="ctx")]
+    parsed = [json.loads(row.removeprefix("data: ")) for row in rows]
+
+    # 停顿期间不等下一个 chunk，按时推出已缓冲的文本
+    assert [(item["type"], item["payload"].get("chunk")) for item in parsed] == [
+        ("text", "一"),
+        ("text", "二"),
+        ("done", None),
+    ]
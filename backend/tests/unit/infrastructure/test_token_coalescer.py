@@ -0,0 +1,65 @@
+"""流式 token 合并：按字符数、按时间窗口刷出，模型停顿时按时刷出，以及关闭合并。"""
+
+import asyncio
+
+import pytest
+
+from app.infrastructure.graph.coalescer import TokenCoalescer, with_flush_deadline
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_flushes_when_char_budget_reached():
+    coalescer = TokenCoalescer(interval_ms=1000, max_chars=4, clock=_Clock())
+
+    assert coalescer.add("你好") is None
+    assert coalescer.add("世界") == "你好世界"
+    assert not coalescer.pending
+
+
+def test_flushes_on_interval_measured_from_first_chunk():
+    clock = _Clock()
+    coalescer = TokenCoalescer(interval_ms=50, max_chars=100, clock=clock)
+
+    assert coalescer.add("a", source="model") is None
+    clock.now = 0.03
+    assert coalescer.add("b") is None
+    assert coalescer.flush_if_due() is None
+    assert coalescer.time_left() == pytest.approx(0.02)
+    clock.now = 0.05
+    assert coalescer.source == "model"
+    assert coalescer.flush_if_due() == "ab"
+    assert coalescer.flush() is None
+
+
+def test_zero_settings_pass_chunks_through():
+    coalescer = TokenCoalescer(interval_ms=0, max_chars=0, clock=_Clock())
+
+    assert coalescer.add("x") == "x"
+    assert coalescer.add("") is None
+
+
+async def test_deadline_fires_while_stream_is_paused():
+    coalescer = TokenCoalescer(interval_ms=20, max_chars=100)
+
+    async def events():
+        yield "一"
+        await asyncio.sleep(0.2)
+        yield "二"
+
+    flushed = []
+    async for event in with_flush_deadline(events(), coalescer):
+        if event is None:
+            flushed.append(coalescer.flush_if_due())
+        else:
+            assert coalescer.add(event) is None
+
+    # 停顿期间按时刷出第一段，等待中的事件不被取消
+    assert flushed == ["一"]
+    assert coalescer.flush() == "二"
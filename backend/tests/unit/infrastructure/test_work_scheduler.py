@@ -0,0 +1,90 @@
+"""AI 工作调度：类别优先、按用户公平排队、单用户并发上限与取消。"""
+
+import asyncio
+
+from app.core.metrics import metrics
+from app.domain.ai_runtime.enums import WorkClass
+from app.infrastructure.task.scheduler import FairQueue, WorkContext, current_work, work_context
+
+
+async def _drain(queue: FairQueue, works: list[WorkContext]) -> list[WorkContext]:
+    """在队列被占住时排入 works，随后逐个放行，返回获得槽位的顺序"""
+    order: list[WorkContext] = []
+    holder = await queue.acquire(WorkContext(WorkClass.INTERACTIVE, 0))
+
+    async def worker(work: WorkContext):
+        async with queue.slot(work):
+            order.append(work)
+
+    tasks = [asyncio.create_task(worker(work)) for work in works]
+    await asyncio.sleep(0)
+    queue.release(holder)
+    await asyncio.gather(*tasks)
+    return order
+
+
+async def test_interactive_work_jumps_ahead_of_queued_background():
+    queue = FairQueue("test-priority")
+    background = [WorkContext(WorkClass.BACKGROUND, 1) for _ in range(3)]
+    batch = WorkContext(WorkClass.BATCH, 1)
+    chat = WorkContext(WorkClass.INTERACTIVE, 2)
+
+    order = await _drain(queue, [*background, batch, chat])
+
+    assert order[:2] == [chat, batch]
+    assert queue.queued == 0 and queue.running == 0
+
+
+async def test_users_share_a_class_fairly():
+    queue = FairQueue("test-fair")
+    heavy = [WorkContext(WorkClass.BATCH, 1) for _ in range(4)]
+    light = [WorkContext(WorkClass.BATCH, 2) for _ in range(2)]
+
+    order = await _drain(queue, [*heavy, *light])
+
+    assert [work.user_id for work in order] == [1, 2, 1, 2, 1, 1]
+
+
+async def test_per_user_limit_leaves_capacity_to_other_users():
+    queue = FairQueue("test-limit", capacity=2, per_user_limit=1)
+    first = await queue.acquire(WorkContext(WorkClass.BATCH, 1))
+    blocked = asyncio.create_task(queue.acquire(WorkContext(WorkClass.BATCH, 1)))
+    other = asyncio.create_task(queue.acquire(WorkContext(WorkClass.BACKGROUND, 2)))
+    await asyncio.sleep(0)
+
+    assert other.done() and not blocked.done()
+    queue.release(first)
+    await asyncio.sleep(0)
+    assert blocked.done()
+    queue.release(blocked.result())
+    queue.release(other.result())
+    assert queue.running == 0
+
+
+async def test_cancelled_waiter_does_not_leak_slot():
+    queue = FairQueue("test-cancel")
+    holder = await queue.acquire()
+    waiter = asyncio.create_task(queue.acquire(WorkContext(WorkClass.BACKGROUND, 1)))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.sleep(0)
+    queue.release(holder)
+
+    async with queue.slot():
+        assert queue.running == 1
+    assert queue.running == 0 and queue.queued == 0
+    snapshot = metrics.snapshot()["scheduler"]["test-cancel"]
+    assert snapshot["background"]["queued"] == 0
+    assert snapshot["interactive"]["wait_s"]["count"] >= 1
+
+
+async def test_work_context_is_inherited_by_tasks():
+    assert current_work().work_class == WorkClass.INTERACTIVE
+    with work_context(WorkClass.BATCH, 5):
+        inner = asyncio.create_task(_current())
+    assert await inner == WorkContext(WorkClass.BATCH, 5)
+    assert current_work() == WorkContext()
+
+
+async def _current() -> WorkContext:
+    return current_work()
@@ -0,0 +1,36 @@
+"""正文指纹 / 草图 / 变更幅度测试。"""
+
+from app.domain.content_fingerprint import change_ratio, content_fingerprint, content_sketch
+
+BASE = "".join(f"第{i}段，主角穿过雨夜的长街，回头望见城楼上的灯火。" for i in range(60))
+
+
+class TestContentFingerprint:
+    def test_whitespace_only_changes_keep_fingerprint(self):
+        reflowed = BASE.replace("。", "。\n\n  ")
+        assert content_fingerprint(reflowed) == content_fingerprint(BASE)
+        assert content_sketch(reflowed) == content_sketch(BASE)
+
+    def test_same_length_edit_changes_fingerprint(self):
+        edited = BASE.replace("雨夜", "雪夜", 1)
+        assert len(edited) == len(BASE)
+        assert content_fingerprint(edited) != content_fingerprint(BASE)
+
+    def test_empty_content(self):
+        assert content_sketch(None) == ""
+        assert change_ratio("", "") == 0.0
+        assert change_ratio(content_sketch(BASE), "") == 1.0
+
+
+class TestChangeRatio:
+    def test_small_edit_is_small(self):
+        edited = BASE.replace("第3段，主角穿过雨夜的长街", "第3段，主角跑过雨夜的小巷")
+        assert change_ratio(content_sketch(BASE), content_sketch(edited)) < 0.2
+
+    def test_rewrite_is_large(self):
+        rewritten = "".join(f"第{i}节，少女在晨光里醒来，听见远处驼铃。" for i in range(60))
+        assert change_ratio(content_sketch(BASE), content_sketch(rewritten)) > 0.8
+
+    def test_identical_is_zero(self):
+        sketch = content_sketch(BASE)
+        assert change_ratio(sketch, sketch) == 0.0
@@ -0,0 +1,45 @@
+"""实体提及索引：多模式匹配、最左最长、词边界与计分。"""
+
+from app.domain.mention_index import MentionIndex
+
+
+def _index():
+    return MentionIndex(
+        [
+            ("李明", ("character", 1)),
+            ("李明远", ("character", 2)),
+            ("明月楼", ("location", 3)),
+            ("Al", ("character", 4)),
+            ("旧城", ("location", 5)),
+            ("旧城", ("organization", 6)),
+            ("雪", ("character", 7)),
+        ]
+    )
+
+
+def test_leftmost_longest_without_overlap():
+    matches = _index().matches("李明远走进明月楼，李明在楼下")
+
+    assert [(start, end) for start, end, _keys in matches] == [(0, 3), (5, 8), (9, 11)]
+    assert [keys for *_span, keys in matches] == [[("character", 2)], [("location", 3)], [("character", 1)]]
+
+
+def test_ascii_names_need_word_boundaries_and_ignore_case():
+    index = _index()
+
+    assert index.matches("Also, albert") == []
+    assert [keys for *_span, keys in index.matches("AL说：走吧")] == [[("character", 4)]]
+
+
+def test_same_name_maps_to_every_entity_and_short_names_are_skipped():
+    index = _index()
+
+    assert index.matches("旧城下雪了")[0][2] == [("location", 5), ("organization", 6)]
+    assert len(index) == 5
+
+
+def test_scores_weight_later_texts_and_positions():
+    scores = _index().scores([("李明……李明远", 1.0), ("李明", 3.0)])
+
+    assert scores[("character", 1)] > scores[("character", 2)]
+    assert set(scores) == {("character", 1), ("character", 2)}
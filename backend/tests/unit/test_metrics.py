@@ -67,3 +67,14 @@ class TestMetricsCollector:
         snap = m.snapshot()
         assert snap["nodes"]["generate"]["count"] == 2
         assert snap["nodes"]["generate"]["avg"] == 3.0
+
+    def test_record_llm_usage_cache_hit_ratio(self):
+        m = MetricsCollector()
+        m.record_llm_usage(input_tokens=1000, output_tokens=50, cache_creation_tokens=900)
+        m.record_llm_usage(input_tokens=1000, output_tokens=40, cache_read_tokens=900)
+        snap = m.snapshot()["llm_usage"]
+        assert snap["input_tokens"] == 2000
+        assert snap["output_tokens"] == 90
+        assert snap["cache_read_tokens"] == 900
+        assert snap["cache_creation_tokens"] == 900
+        assert snap["cache_hit_ratio"] == 0.45
@@ -0,0 +1,31 @@
+"""正文分段：段落边界合并、超长段落按句切分、整段不切。"""
+
+from app.domain.text_chunks import split_paragraph_chunks
+
+
+def test_short_or_disabled_returns_whole_content():
+    assert split_paragraph_chunks("第一段\n\n第二段", 100) == ["第一段\n\n第二段"]
+    assert split_paragraph_chunks("a" * 50, 0) == ["a" * 50]
+    assert split_paragraph_chunks("  \n ", 10) == []
+    assert split_paragraph_chunks(None, 10) == []
+
+
+def test_merges_paragraphs_up_to_limit():
+    content = "\n\n".join(["甲" * 4, "乙" * 4, "丙" * 4, "丁" * 9])
+
+    chunks = split_paragraph_chunks(content, 10)
+
+    assert chunks == ["甲甲甲甲\n乙乙乙乙", "丙丙丙丙", "丁" * 9]
+    assert all(len(chunk) <= 10 for chunk in chunks)
+
+
+def test_long_paragraph_splits_after_sentence_end_and_closing_quote():
+    paragraph = "他说：“走吧。”她没有回答。远处传来钟声！"
+
+    assert split_paragraph_chunks(paragraph, 10) == ["他说：“走吧。”", "她没有回答。", "远处传来钟声！"]
+
+
+def test_sentence_longer_than_limit_is_hard_split():
+    chunks = split_paragraph_chunks("字" * 25, 10)
+
+    assert chunks == ["字" * 10, "字" * 10, "字" * 5]
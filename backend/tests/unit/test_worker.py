@@ -0,0 +1,91 @@
+"""独立 worker：领取 API 入队的任务执行，停止时交还；只入队的 API 不执行任务。"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import worker
+from app.core.config import AISettings
+from app.domain.ai_runtime.enums import JobStatus
+from app.infrastructure.db.models.ai_runtime import BackgroundJob
+from app.infrastructure.task import jobs
+from app.infrastructure.task.jobs import register_job_handler
+from app.infrastructure.task.runner import BackgroundTaskRunner
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'worker.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(BackgroundJob.__table__.create)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.fixture
+def quiet_shutdown(monkeypatch):
+    """worker 退出时会释放全局模型池 / 引擎；测试中只验证任务流转"""
+    monkeypatch.setattr(worker, "load_job_handlers", lambda: None)
+    monkeypatch.setattr(worker, "dispose_engine", lambda: asyncio.sleep(0))
+    monkeypatch.setattr(jobs, "_handlers", {})
+
+
+async def test_api_enqueues_and_worker_executes(session_factory, quiet_shutdown):
+    processed = asyncio.Event()
+
+    @register_job_handler("echo")
+    async def echo(payload):
+        processed.set()
+
+    settings = AISettings(task_poll_seconds=0.02, task_concurrency=2)
+    api = BackgroundTaskRunner(session_factory=session_factory, settings=settings, execute_jobs=False)
+    async with session_factory() as db:
+        job = await api.enqueue(db, "echo", {}, key="echo-1")
+        await db.commit()
+    await api.start()
+    assert api.get_status("echo-1") is None
+
+    stop = asyncio.Event()
+    runner = BackgroundTaskRunner(session_factory=session_factory, settings=settings, execute_jobs=True)
+    task = asyncio.create_task(worker.run_worker(runner=runner, stop_event=stop))
+    await asyncio.wait_for(processed.wait(), timeout=2)
+    stop.set()
+    await asyncio.wait_for(task, timeout=2)
+
+    async with session_factory() as db:
+        assert (await db.get(BackgroundJob, job.id)).status == JobStatus.SUCCEEDED.value
+
+
+async def test_stopping_worker_hands_running_job_back(session_factory, quiet_shutdown):
+    started = asyncio.Event()
+
+    @register_job_handler("slow")
+    async def slow(payload):
+        started.set()
+        await asyncio.sleep(60)
+
+    settings = AISettings(task_poll_seconds=0.02)
+    async with session_factory() as db:
+        job = jobs.new_job("slow", {}, task_key="slow-1", priority=0, max_attempts=3, timeout=120)
+        db.add(job)
+        await db.commit()
+
+    stop = asyncio.Event()
+    runner = BackgroundTaskRunner(session_factory=session_factory, settings=settings, execute_jobs=True)
+    task = asyncio.create_task(worker.run_worker(runner=runner, stop_event=stop))
+    await asyncio.wait_for(started.wait(), timeout=2)
+    stop.set()
+    await asyncio.wait_for(task, timeout=2)
+
+    async with session_factory() as db:
+        released = await db.get(BackgroundJob, job.id)
+    assert released.status == JobStatus.QUEUED.value
+    assert released.attempts == 0
+    assert released.lease_owner is None
+
+
+def test_concurrency_must_be_positive():
+    with pytest.raises(SystemExit):
+        worker.main(["--concurrency", "0"])